@@ -0,0 +1,305 @@
+"""Cost-based admission control for analysis requests.
+
+Before any Earth Engine call, each analysis request's cost is estimated from
+its AOI area, the dataset's native scale and the number of years (or monthly
+composites) it covers. The unit is the megapixel: area / scale² × years. The
+estimate needs no EE call.
+
+- A request estimated above ADMISSION_MAX_COST megapixels is rejected with
+  HTTP 400, asking for a smaller area or fewer years.
+- Up to ADMISSION_MAX_RUNNING requests run at once, with a combined estimate
+  of at most ADMISSION_MAX_RUNNING_COST. A request larger than that budget
+  runs only when nothing else is running. Requests estimated at no more than
+  ADMISSION_FAST_LANE_COST only need a free slot, not cost budget.
+- Other requests wait in a queue served cheapest first. The wait counts
+  against the cost (halved every ADMISSION_AGING_SECONDS), so heavy requests
+  are delayed but not starved. A full queue (ADMISSION_MAX_QUEUE) or a wait
+  longer than ADMISSION_QUEUE_TIMEOUT gets HTTP 503 with Retry-After.
+
+`GET /admission` shows the running and queued requests. Responses carry
+X-Admission-Cost and X-Queue-Wait-Ms headers. The budgets apply per worker
+process.
+"""
+import contextlib
+import itertools
+import math
+import os
+import threading
+import time
+from datetime import date
+
+from flask import g, jsonify, request
+
+from cancellation import CancelledError, check_cancelled
+from telemetry import aoi_area_km2, current_span
+
+ADMISSION_ENABLED = os.environ.get('ADMISSION', '1') != '0'
+ADMISSION_MAX_COST = float(os.environ.get('ADMISSION_MAX_COST', '2000'))
+ADMISSION_MAX_RUNNING = int(os.environ.get('ADMISSION_MAX_RUNNING', '16'))
+ADMISSION_MAX_RUNNING_COST = float(os.environ.get('ADMISSION_MAX_RUNNING_COST', '400'))
+ADMISSION_FAST_LANE_COST = float(os.environ.get('ADMISSION_FAST_LANE_COST', '1'))
+ADMISSION_MAX_QUEUE = int(os.environ.get('ADMISSION_MAX_QUEUE', '64'))
+ADMISSION_QUEUE_TIMEOUT = float(os.environ.get('ADMISSION_QUEUE_TIMEOUT', '120'))
+ADMISSION_AGING_SECONDS = float(os.environ.get('ADMISSION_AGING_SECONDS', '10'))
+
+# How often a queued request checks whether it was cancelled
+QUEUE_POLL_SECONDS = 0.25
+
+# Native scale in metres of the datasets behind each transition matrix dataset
+TRANSITION_SCALES = {'dynamic_world': 10, 'igbp': 500}
+
+
+def _year_span(data, start_key, end_key, default_years):
+    try:
+        start, end = int(data[start_key]), int(data[end_key])
+    except (KeyError, TypeError, ValueError):
+        return default_years
+    return max(1, end - start + 1)
+
+
+def _date_span_years(data):
+    try:
+        start = date.fromisoformat(data['start_date'])
+        end = date.fromisoformat(data['end_date'])
+    except (KeyError, TypeError, ValueError):
+        return 1
+    return max(1, math.ceil(((end - start).days + 1) / 365))
+
+
+def _transition_scale(data):
+    return TRANSITION_SCALES.get(data.get('dataset', 'dynamic_world'), 10)
+
+
+# Endpoint -> (scale in metres, number of full-area reductions) for a request body
+COST_MODELS = {
+    'get_ndvi': lambda data: (30, _date_span_years(data)),
+    'get_igbp': lambda data: (500, 1),
+    'get_worldcover': lambda data: (10, 1),
+    'get_dynamic_world_route': lambda data: (10, 1),
+    'get_dynamic_world_for_year_route': lambda data: (10, 1),
+    'get_dynamic_world_timeseries_route': lambda data: (10, _year_span(data, 'start_year', 'end_year', 1)),
+    'get_yearly_stats': lambda data: (30, _year_span(data, 'start_year', 'end_year', 6)),
+    'get_monthly_profile': lambda data: (int(data.get('scale', 30)), 12 * _year_span(data, 'start_year', 'end_year', 3)),
+    'transition_matrix': lambda data: (_transition_scale(data), 2),
+}
+
+
+def estimate_cost(endpoint, data):
+    """Estimated cost of a request in megapixels, or None if it is not an analysis request."""
+    model = COST_MODELS.get(endpoint)
+    if model is None or not isinstance(data, dict) or not data.get('coordinates'):
+        return None
+    try:
+        scale, reductions = model(data)
+        area_m2 = aoi_area_km2(data['coordinates']) * 1e6
+    except (TypeError, ValueError, IndexError):
+        return None
+    return round(area_m2 / (max(scale, 1) ** 2) * reductions / 1e6, 3)
+
+
+class AdmissionRejected(Exception):
+    """The request cannot be admitted; carries the HTTP status to answer with."""
+
+    def __init__(self, message, status, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class _Ticket:
+    def __init__(self, seq, endpoint, cost):
+        self.seq = seq
+        self.endpoint = endpoint
+        self.cost = cost
+        self.enqueued = time.monotonic()
+        self.admitted = threading.Event()
+
+    def priority(self, now):
+        # Cheapest first; waiting halves the effective cost every ADMISSION_AGING_SECONDS
+        waited = now - self.enqueued
+        return (self.cost / (2 ** (waited / ADMISSION_AGING_SECONDS)), self.seq)
+
+
+class AdmissionController:
+    """Admits requests within the running budgets and queues the rest by priority."""
+
+    def __init__(self, max_running=ADMISSION_MAX_RUNNING, max_running_cost=ADMISSION_MAX_RUNNING_COST,
+                 max_queue=ADMISSION_MAX_QUEUE):
+        self.max_running = max_running
+        self.max_running_cost = max_running_cost
+        self.max_queue = max_queue
+        self.running = {}
+        self.queue = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self.admitted_total = 0
+        self.rejected_total = 0
+
+    def _fits(self, cost):
+        if not self.running:
+            return True
+        if cost <= ADMISSION_FAST_LANE_COST:
+            return len(self.running) < self.max_running
+        running_cost = sum(ticket.cost for ticket in self.running.values())
+        return len(self.running) < self.max_running and running_cost + cost <= self.max_running_cost
+
+    def _dispatch(self):
+        """Admit queued tickets in priority order while they fit."""
+        now = time.monotonic()
+        while self.queue:
+            ticket = min(self.queue, key=lambda t: t.priority(now))
+            if not self._fits(ticket.cost):
+                break
+            self.queue.remove(ticket)
+            self._admit(ticket)
+
+    def _admit(self, ticket):
+        self.running[ticket.seq] = ticket
+        self.admitted_total += 1
+        ticket.admitted.set()
+
+    def acquire(self, endpoint, cost, timeout=ADMISSION_QUEUE_TIMEOUT):
+        """Block until the request may run; returns its ticket."""
+        with self._lock:
+            ticket = _Ticket(next(self._seq), endpoint, cost)
+            self.queue.append(ticket)
+            self._dispatch()
+            if ticket.admitted.is_set():
+                return ticket
+            if len(self.queue) > self.max_queue:
+                self.queue.remove(ticket)
+                self.rejected_total += 1
+                raise AdmissionRejected('The server is busy, please retry shortly', 503, retry_after=5)
+
+        deadline = time.monotonic() + timeout
+        try:
+            while not ticket.admitted.wait(QUEUE_POLL_SECONDS):
+                check_cancelled()
+                if time.monotonic() >= deadline:
+                    raise AdmissionRejected('Timed out waiting for capacity, please retry', 503, retry_after=10)
+        except (AdmissionRejected, CancelledError):
+            with self._lock:
+                if ticket.admitted.is_set():
+                    # Admitted just as we gave up: hand the slot back
+                    self.running.pop(ticket.seq, None)
+                    self._dispatch()
+                else:
+                    self.queue.remove(ticket)
+                self.rejected_total += 1
+            raise
+        return ticket
+
+    def release(self, ticket):
+        with self._lock:
+            self.running.pop(ticket.seq, None)
+            self._dispatch()
+
+    def snapshot(self):
+        now = time.monotonic()
+        with self._lock:
+            queued = sorted(self.queue, key=lambda t: t.priority(now))
+            return {
+                'running': len(self.running),
+                'running_cost': round(sum(t.cost for t in self.running.values()), 3),
+                'queue_depth': len(queued),
+                'queued': [
+                    {'endpoint': t.endpoint, 'cost': t.cost, 'waiting_s': round(now - t.enqueued, 2)}
+                    for t in queued
+                ],
+                'admitted_total': self.admitted_total,
+                'rejected_total': self.rejected_total,
+                'budgets': {
+                    'max_cost': ADMISSION_MAX_COST,
+                    'max_running': self.max_running,
+                    'max_running_cost': self.max_running_cost,
+                    'fast_lane_cost': ADMISSION_FAST_LANE_COST,
+                    'max_queue': self.max_queue
+                }
+            }
+
+
+admission_controller = AdmissionController()
+
+
+def _too_large_message(cost):
+    return (f"This analysis is too large (estimated {cost:,.0f} megapixels, limit {ADMISSION_MAX_COST:,.0f}). "
+            "Select a smaller area or fewer years.")
+
+
+@contextlib.contextmanager
+def admitted(endpoint, cost):
+    """Hold an admission slot for work outside the request hooks, e.g. background refinement.
+
+    Raises AdmissionRejected like the request hook would.
+    """
+    if not ADMISSION_ENABLED or cost is None:
+        yield None
+        return
+    if cost > ADMISSION_MAX_COST:
+        raise AdmissionRejected(_too_large_message(cost), 400)
+    ticket = admission_controller.acquire(endpoint, cost)
+    try:
+        yield ticket
+    finally:
+        admission_controller.release(ticket)
+
+
+def _rejection(message, status, retry_after=None):
+    response = jsonify({'success': False, 'error': message})
+    response.status_code = status
+    if retry_after:
+        response.headers['Retry-After'] = str(retry_after)
+    return response
+
+
+def init_admission(app):
+    """Estimate, admit or queue analysis requests, and register `GET /admission`."""
+
+    @app.route('/admission')
+    def admission_status():
+        """Show running and queued analysis requests with their estimated costs."""
+        return jsonify({'success': True, **admission_controller.snapshot()})
+
+    if not ADMISSION_ENABLED:
+        return
+
+    @app.before_request
+    def admit_request():
+        if request.method != 'POST':
+            return None
+        cost = estimate_cost(request.endpoint, request.get_json(silent=True))
+        if cost is None:
+            return None
+
+        g.admission_cost = cost
+        span = current_span()
+        if span is not None:
+            span.set_attribute('admission.cost_mpx', cost)
+        if cost > ADMISSION_MAX_COST:
+            return _rejection(_too_large_message(cost), 400)
+
+        start = time.monotonic()
+        try:
+            g.admission_ticket = admission_controller.acquire(request.endpoint, cost)
+        except AdmissionRejected as e:
+            return _rejection(str(e), e.status, e.retry_after)
+        except CancelledError:
+            return _rejection('Request cancelled while queued', 409)
+        g.admission_wait_ms = round((time.monotonic() - start) * 1000, 1)
+        if span is not None:
+            span.set_attribute('admission.queue_ms', g.admission_wait_ms)
+        return None
+
+    @app.after_request
+    def add_admission_headers(response):
+        if 'admission_cost' in g:
+            response.headers['X-Admission-Cost'] = str(g.admission_cost)
+        if 'admission_wait_ms' in g:
+            response.headers['X-Queue-Wait-Ms'] = str(g.admission_wait_ms)
+        return response
+
+    @app.teardown_request
+    def release_admission(exc=None):
+        ticket = g.pop('admission_ticket', None)
+        if ticket is not None:
+            admission_controller.release(ticket)
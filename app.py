@@ -1,46 +1,123 @@
 import ee
-from flask import Flask, render_template, request, jsonify, send_file
+from flask import Flask, render_template, request, jsonify, send_file, make_response
 from datetime import datetime, timedelta
 import os
 import json
+import logging
 import geopandas as gpd
 from shapely.geometry import shape, mapping
+from assets import init_assets
+from compression import init_compression, round_geojson, drop_redundant_properties, DEFAULT_COORDINATE_PRECISION
+from raster_cache import (
+    raster_cache, coordinates_bbox, ndvi_statistics, threshold_statistics,
+    class_area_statistics, FLOAT_NODATA, CLASS_NODATA
+)
+from waterways_store import load_waterways
+from vector_tiles import waterways_tiles, MAX_ZOOM as VECTOR_TILE_MAX_ZOOM
+from cancellation import init_cancellation, check_cancelled, CancelledError
+from ee_memo import install_memo
+from fair_queue import init_fair_queue
+from profiling import init_profiling
+from telemetry import init_telemetry, traced, current_span
+from admission import init_admission
+from progressive import init_progressive, register_analysis
+from saved_areas import init_saved_areas
+from ee_transport import init_ee_transport, create_http_transport
+from ee_credentials import init_ee_credentials, manage_credentials
+from raster_tiles import init_raster_tiles, register_palette, ClassPalette, RampPalette, tile_url
 
 # Initialize Flask app
 app = Flask(__name__)
 
-# Initialize Earth Engine using service-account.json
-try:
-    # Use absolute path for the service account key file on PythonAnywhere
-    # Reference the home directory for PythonAnywhere
-    service_account_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'service-account.json')
-    
-    print(f"Looking for service account file at: {service_account_path}")
+# Fingerprinted CSS/JS bundles referenced by templates/index.html
+init_assets(app)
+
+# Compact JSON, compressed according to the client's Accept-Encoding
+app.config['JSONIFY_PRETTYPRINT_REGULAR'] = False
+init_compression(app)
+
+# Per-request cancellation tokens, checked before every EE call
+init_cancellation(app)
+
+# Identical EE expressions are evaluated once across routes and users (EE_MEMO_TTL)
+install_memo()
+
+# Weighted fair share of EE concurrency per client (FAIR_EE_CONCURRENCY, FAIR_WEIGHTS), see /fair-queue
+init_fair_queue(app)
+
+# Opt-in request profiling (X-Profile: 1 or PROFILE_SAMPLE_RATE), see /debug/profiles
+init_profiling(app)
+
+# Leveled logging with request ids and tracing spans (LOG_LEVEL, LOG_FORMAT, TRACE_EXPORTER)
+init_telemetry(app)
+logger = logging.getLogger('app')
+
+# Cost estimates, budgets and a cheapest-first queue for analysis requests, see /admission
+init_admission(app)
+
+# Coarse results first, refined at native scale in the background, see /progressive/<analysis>
+init_progressive(app)
+
+# Saved areas with their analysis results attached (SAVED_AREAS_PATH), see /saved_areas
+init_saved_areas(app)
+
+# Pooled keep-alive connections to the EE API (EE_HTTP_POOL_SIZE), see /ee-transport
+init_ee_transport(app)
+
+# Access tokens refreshed in the background before they expire (EE_TOKEN_REFRESH_MARGIN), see /ee-credentials
+init_ee_credentials(app)
+
+# PNG tiles of cached rasters rendered without EE (RASTER_TILE_CACHE_BYTES), see /raster_tiles/stats
+init_raster_tiles(app)
+
+# Record analysis requests for replay by loadtest.py
+if os.environ.get('REQUEST_RECORD_FILE'):
+    from loadtest import init_request_recorder
+    init_request_recorder(app, os.environ['REQUEST_RECORD_FILE'])
+
+# Initialize Earth Engine using service-account.json, the synthetic backend
+# used for load tests (EE_BACKEND=stub) or a recorded cassette (EE_BACKEND=replay)
+EE_BACKEND = os.environ.get('EE_BACKEND')
+if EE_BACKEND == 'stub':
+    from ee_stub import install_stub
+    install_stub()
+    logger.warning("Using the synthetic Earth Engine backend (EE_BACKEND=stub)")
+elif EE_BACKEND == 'replay':
+    from ee_cassette import install_player, CASSETTE_PATH
+    install_player()
+    logger.warning("Replaying Earth Engine calls from %s (EE_BACKEND=replay)", CASSETTE_PATH)
+else:
+    if EE_BACKEND == 'record':
+        from ee_cassette import install_recorder, CASSETTE_PATH
+        install_recorder()
+        logger.warning("Recording Earth Engine calls to %s (EE_BACKEND=record)", CASSETTE_PATH)
+    try:
+        # Use absolute path for the service account key file on PythonAnywhere
+        # Reference the home directory for PythonAnywhere
+        service_account_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'service-account.json')
     
-    # Read the service account email from the JSON file
-    with open(service_account_path, 'r') as f:
-        service_account_info = json.load(f)
+        logger.info("Looking for service account file at: %s", service_account_path)
     
-    service_account = service_account_info["client_email"]
+        # Read the service account email from the JSON file
+        with open(service_account_path, 'r') as f:
+            service_account_info = json.load(f)
     
-    print(f"Using service-account.json file for authentication from {service_account_path}")
-    credentials = ee.ServiceAccountCredentials(service_account, service_account_path)
-    ee.Initialize(credentials)
+        service_account = service_account_info["client_email"]
     
-    print(f"Earth Engine initialized with service account: {service_account}")
+        logger.info("Using service-account.json file for authentication from %s", service_account_path)
+        credentials = manage_credentials(ee.ServiceAccountCredentials(service_account, service_account_path))
+        ee.Initialize(credentials, http_transport=create_http_transport())
     
-except Exception as e:
-    print("Error initializing Earth Engine:", str(e))
-    print("Please make sure your service-account.json file is properly configured")
+        logger.info("Earth Engine initialized with service account: %s", service_account)
     
-    # For debugging - print detailed error information but not credentials
-    import traceback
-    print("Detailed error:")
-    traceback.print_exc()
+    except Exception as e:
+        # Log the detailed error with its traceback, but not credentials
+        logger.exception("Error initializing Earth Engine: %s", e)
+        logger.error("Please make sure your service-account.json file is properly configured")
     
-    # Do not use interactive auth for web server deployment
-    # Instead, raise a clear error
-    raise RuntimeError(f"Earth Engine authentication failed. Service account authentication is required for web deployment. Error: {str(e)}")
+        # Do not use interactive auth for web server deployment
+        # Instead, raise a clear error
+        raise RuntimeError(f"Earth Engine authentication failed. Service account authentication is required for web deployment. Error: {str(e)}")
 
 # Default coordinates (can be overridden by user selection)
 DEFAULT_COORDS = [
@@ -50,43 +127,182 @@ DEFAULT_COORDS = [
     [123.3, 13.3]
 ]
 
-def get_ndvi_statistics(ndvi_image, area_of_interest):
-    """Calculate detailed NDVI statistics for the area."""
-    # Get basic statistics
-    stats = ndvi_image.reduceRegion(
-        reducer=ee.Reducer.mean().combine(
-            reducer2=ee.Reducer.minMax(),
-            sharedInputs=True
-        ).combine(
-            reducer2=ee.Reducer.percentile([25, 50, 75]),
-            sharedInputs=True
-        ),
-        geometry=area_of_interest,
-        scale=30,  # Landsat resolution
-        maxPixels=1e9
-    ).getInfo()
+# Compositing modes accepted by calculate_ndvi and the /get_ndvi route
+NDVI_COMPOSITE_MODES = ('median', 'greenest', 'least_cloudy')
+# least_cloudy keeps the single-scene result callers got before the modes existed
+DEFAULT_NDVI_COMPOSITE_MODE = 'least_cloudy'
 
-    # Calculate area statistics for different NDVI ranges
-    area_stats = {}
-    ranges = [
-        ('water_or_bare', -1, 0.1, 'Water bodies or bare soil'),
-        ('sparse_vegetation', 0.1, 0.3, 'Sparse vegetation'),
-        ('moderate_vegetation', 0.3, 0.6, 'Moderate vegetation'),
-        ('dense_vegetation', 0.6, 1, 'Dense, healthy vegetation')
+# Scenes above this CLOUD_COVER percentage are skipped when compositing
+MAX_SCENE_CLOUD_COVER = 60
+
+# Upper bound on the number of scenes that go into a composite
+MAX_COMPOSITE_IMAGES = 50
+
+# Compositing strategies of annual Dynamic World label images, accepted by
+# get_dynamic_world_for_year and the Dynamic World year/timeseries routes
+DYNAMIC_WORLD_COMPOSITES = ('mode', 'monthly_sample', 'mean_probability')
+DEFAULT_DYNAMIC_WORLD_COMPOSITE = 'mode'
+
+# Images kept per month by the monthly_sample composite, and the image cap of mean_probability
+DYNAMIC_WORLD_IMAGES_PER_MONTH = 3
+DYNAMIC_WORLD_MAX_IMAGES = 24
+
+# Class probability bands of Dynamic World images, in label order
+DYNAMIC_WORLD_PROBABILITY_BANDS = [
+    'water', 'trees', 'grass', 'flooded_vegetation', 'crops',
+    'shrub_and_scrub', 'built', 'bare', 'snow_and_ice'
+]
+
+# Percentiles reported for each month by /get_monthly_profile, and its year limit
+MONTHLY_PROFILE_PERCENTILES = [10, 25, 50, 75, 90]
+MAX_MONTHLY_PROFILE_YEARS = 10
+
+# NDVI density classes as (name, min, max, description); max is exclusive
+NDVI_RANGES = [
+    ('water_or_bare', -1, 0.1, 'Water bodies or bare soil'),
+    ('sparse_vegetation', 0.1, 0.3, 'Sparse vegetation'),
+    ('moderate_vegetation', 0.3, 0.6, 'Moderate vegetation'),
+    ('dense_vegetation', 0.6, 1, 'Dense, healthy vegetation')
+]
+
+# IGBP classification classes and colors (MODIS MCD12Q1 LC_Type1)
+IGBP_CLASSES = {
+    1: {'name': 'Evergreen Needleleaf Forest', 'color': '05450a'},
+    2: {'name': 'Evergreen Broadleaf Forest', 'color': '086a10'},
+    3: {'name': 'Deciduous Needleleaf Forest', 'color': '54a708'},
+    4: {'name': 'Deciduous Broadleaf Forest', 'color': '78d203'},
+    5: {'name': 'Mixed Forest', 'color': '009900'},
+    6: {'name': 'Closed Shrublands', 'color': 'c6b044'},
+    7: {'name': 'Open Shrublands', 'color': 'dcd159'},
+    8: {'name': 'Woody Savannas', 'color': 'dade48'},
+    9: {'name': 'Savannas', 'color': 'fbff13'},
+    10: {'name': 'Grasslands', 'color': 'b6ff05'},
+    11: {'name': 'Permanent Wetlands', 'color': '27ff87'},
+    12: {'name': 'Croplands', 'color': 'c24f44'},
+    13: {'name': 'Urban and Built-up Lands', 'color': 'a5a5a5'},
+    14: {'name': 'Cropland/Natural Vegetation Mosaics', 'color': 'ff6d4c'},
+    15: {'name': 'Snow and Ice', 'color': '69fff8'},
+    16: {'name': 'Barren', 'color': 'f9ffa4'},
+    17: {'name': 'Water Bodies', 'color': '1c0dff'}
+}
+
+# ESA WorldCover v100 classes and colors
+WORLDCOVER_CLASSES = {
+    10: {'name': 'Tree cover', 'color': '006400'},
+    20: {'name': 'Shrubland', 'color': 'ffbb22'},
+    30: {'name': 'Grassland', 'color': 'ffff4c'},
+    40: {'name': 'Cropland', 'color': 'f096ff'},
+    50: {'name': 'Built-up', 'color': 'fa0000'},
+    60: {'name': 'Bare / sparse vegetation', 'color': 'b4b4b4'},
+    70: {'name': 'Snow and ice', 'color': 'f0f0f0'},
+    80: {'name': 'Permanent water bodies', 'color': '0064c8'},
+    90: {'name': 'Herbaceous wetland', 'color': '0096a0'},
+    95: {'name': 'Mangroves', 'color': '00cf75'},
+    100: {'name': 'Moss and lichen', 'color': 'fae6a0'}
+}
+
+# Dynamic World V1 label classes and colors
+DYNAMIC_WORLD_CLASSES = {
+    0: {'name': 'Water', 'color': '419bdf'},
+    1: {'name': 'Trees', 'color': '397d49'},
+    2: {'name': 'Grass', 'color': '88b053'},
+    3: {'name': 'Flooded Vegetation', 'color': '7a87c6'},
+    4: {'name': 'Crops', 'color': 'e49635'},
+    5: {'name': 'Shrub and Scrub', 'color': 'dfc35a'},
+    6: {'name': 'Built', 'color': 'c4281b'},
+    7: {'name': 'Bare', 'color': 'a59b8f'},
+    8: {'name': 'Snow and Ice', 'color': 'b39fe1'}
+}
+
+def parse_ndvi_bins(bin_edges=None, bin_labels=None):
+    """Turn user-supplied NDVI bin edges and labels into (name, min, max, description) ranges.
+    
+    Without bin edges the default NDVI_RANGES are returned. Labels are optional
+    and default to the NDVI interval of each bin.
+    """
+    if bin_edges is None:
+        return NDVI_RANGES
+    
+    try:
+        edges = [float(edge) for edge in bin_edges]
+    except (TypeError, ValueError):
+        raise Exception("bin_edges must be a list of numbers")
+    
+    if len(edges) < 2:
+        raise Exception("bin_edges must contain at least two values")
+    if any(upper <= lower for lower, upper in zip(edges, edges[1:])):
+        raise Exception("bin_edges must be strictly increasing")
+    if edges[0] < -1 or edges[-1] > 1:
+        raise Exception("bin_edges must lie between -1 and 1")
+    
+    if bin_labels is None:
+        bin_labels = [f"ndvi_{lower:g}_to_{upper:g}" for lower, upper in zip(edges, edges[1:])]
+    elif len(bin_labels) != len(edges) - 1:
+        raise Exception(f"Expected {len(edges) - 1} bin_labels for {len(edges)} bin_edges, got {len(bin_labels)}")
+    
+    return [
+        (str(label), lower, upper, f"NDVI {lower:g} to {upper:g}")
+        for label, lower, upper in zip(bin_labels, edges, edges[1:])
     ]
 
-    total_area = 0
-    for name, min_val, max_val, description in ranges:
-        range_mask = ndvi_image.gte(min_val).And(ndvi_image.lt(max_val))
-        area_pixels = range_mask.reduceRegion(
-            reducer=ee.Reducer.sum(),
+@traced('ndvi_statistics', dataset='landsat8_ndvi', scale=30)
+def get_ndvi_statistics(ndvi_image, area_of_interest, ranges=NDVI_RANGES, scale=30):
+    """Calculate detailed NDVI statistics for the area.
+    
+    The basic statistics and the area of every NDVI range are computed in a
+    single round trip: each pixel is assigned its bin index and one fixed
+    histogram over the indexes gives all range areas, however many bins there are.
+    """
+    edges = [ranges[0][1]] + [max_val for _, _, max_val, _ in ranges]
+    
+    # Bin index = number of interior edges the pixel is at or above
+    if len(edges) > 2:
+        bin_index = ndvi_image.gte(ee.Image.constant(edges[1:-1])).reduce(ee.Reducer.sum())
+    else:
+        bin_index = ndvi_image.multiply(0)
+    in_range = ndvi_image.gte(edges[0]).And(ndvi_image.lt(edges[-1]))
+    bin_index = bin_index.updateMask(in_range).rename('bin')
+    
+    result = ee.Dictionary({
+        # Get basic statistics
+        'stats': ndvi_image.reduceRegion(
+            reducer=ee.Reducer.mean().combine(
+                reducer2=ee.Reducer.minMax(),
+                sharedInputs=True
+            ).combine(
+                reducer2=ee.Reducer.percentile([25, 50, 75]),
+                sharedInputs=True
+            ),
             geometry=area_of_interest,
-            scale=30,
+            scale=scale,  # Landsat resolution, or coarser for progressive previews
             maxPixels=1e9
-        ).get('NDVI').getInfo()
+        ),
+        'histogram': bin_index.reduceRegion(
+            reducer=ee.Reducer.fixedHistogram(0, len(ranges), len(ranges)),
+            geometry=area_of_interest,
+            scale=scale,
+            maxPixels=1e9
+        )
+    }).getInfo()
+    
+    stats = result['stats']
+    if stats.get('NDVI_mean') is None:
+        # Composites of empty collections are fully masked
+        raise Exception(
+            "No usable Landsat imagery found for the specified time range and area. "
+            "Try a longer date range."
+        )
+    # fixedHistogram returns [[bucket_min, pixel_count], ...] with one row per bin
+    bin_counts = {int(bucket): count for bucket, count in (result['histogram'].get('bin') or [])}
+
+    # Calculate area statistics for different NDVI ranges
+    area_stats = {}
+    total_area = 0
+    for index, (name, min_val, max_val, description) in enumerate(ranges):
+        area_pixels = bin_counts.get(index, 0)
         
-        # Convert pixel count to area in hectares (30m x 30m = 900m² per pixel)
-        area_hectares = (area_pixels * 900) / 10000
+        # Convert pixel count to area in hectares (30m x 30m = 900m² per pixel at native scale)
+        area_hectares = (area_pixels * scale * scale) / 10000
         total_area += area_hectares
         
         area_stats[name] = {
@@ -98,7 +314,7 @@ def get_ndvi_statistics(ndvi_image, area_of_interest):
     
     # Calculate percentages
     for stat in area_stats.values():
-        stat['percentage'] = round((stat['area_hectares'] / total_area) * 100, 2)
+        stat['percentage'] = round((stat['area_hectares'] / total_area) * 100, 2) if total_area > 0 else 0
 
     return {
         'basic_stats': {
@@ -113,6 +329,7 @@ def get_ndvi_statistics(ndvi_image, area_of_interest):
         'total_area_hectares': round(total_area, 2)
     }
 
+@traced(dataset='igbp', scale=500)
 def get_igbp_land_cover(start_date, end_date, coordinates):
     """Get IGBP land cover classification for an area.
     
@@ -141,11 +358,11 @@ def get_igbp_land_cover(start_date, end_date, coordinates):
         
         # Calculate area in square kilometers for debugging
         area_size = area_of_interest.area().divide(1000 * 1000).getInfo()
-        print(f"Area size: {area_size} square kilometers")
+        logger.debug("Area size: %s square kilometers", area_size)
         
         # If area is too large, provide a warning
         if area_size > 10000:  # 10,000 sq km threshold
-            print(f"Warning: Selected area is very large ({area_size} sq km). Consider selecting a smaller area.")
+            logger.warning("Selected area is very large (%s sq km). Consider selecting a smaller area.", area_size)
         
         # Get the MODIS Land Cover Type Yearly Global 500m dataset (IGBP classification)
         # Using collection 061 as specified in the sample code
@@ -156,7 +373,7 @@ def get_igbp_land_cover(start_date, end_date, coordinates):
         if collection_size == 0:
             raise Exception("MODIS land cover dataset is not available")
         
-        print(f"Found {collection_size} images in MODIS collection")
+        logger.debug("Found %s images in MODIS collection", collection_size)
         
         # Always get the most recent data available, regardless of input date
         latest_image = modis_lc.sort('system:time_start', False).first()
@@ -164,7 +381,7 @@ def get_igbp_land_cover(start_date, end_date, coordinates):
         # Get the actual year from the image timestamp
         timestamp = latest_image.get('system:time_start').getInfo()
         actual_year = datetime.fromtimestamp(timestamp / 1000).year
-        print(f"Using data from the latest available year: {actual_year}")
+        logger.debug("Using data from the latest available year: %s", actual_year)
         
         # Make sure we actually have an image
         if latest_image is None:
@@ -173,27 +390,6 @@ def get_igbp_land_cover(start_date, end_date, coordinates):
         # Select the LC_Type1 band and clip to the area of interest
         igbp_image = latest_image.select('LC_Type1').clip(area_of_interest)
         
-        # Define the IGBP classification classes and colors based on the sample code
-        igbp_classes = {
-            1: {'name': 'Evergreen Needleleaf Forest', 'color': '05450a'},
-            2: {'name': 'Evergreen Broadleaf Forest', 'color': '086a10'},
-            3: {'name': 'Deciduous Needleleaf Forest', 'color': '54a708'},
-            4: {'name': 'Deciduous Broadleaf Forest', 'color': '78d203'},
-            5: {'name': 'Mixed Forest', 'color': '009900'},
-            6: {'name': 'Closed Shrublands', 'color': 'c6b044'},
-            7: {'name': 'Open Shrublands', 'color': 'dcd159'},
-            8: {'name': 'Woody Savannas', 'color': 'dade48'},
-            9: {'name': 'Savannas', 'color': 'fbff13'},
-            10: {'name': 'Grasslands', 'color': 'b6ff05'},
-            11: {'name': 'Permanent Wetlands', 'color': '27ff87'},
-            12: {'name': 'Croplands', 'color': 'c24f44'},
-            13: {'name': 'Urban and Built-up Lands', 'color': 'a5a5a5'},
-            14: {'name': 'Cropland/Natural Vegetation Mosaics', 'color': 'ff6d4c'},
-            15: {'name': 'Snow and Ice', 'color': '69fff8'},
-            16: {'name': 'Barren', 'color': 'f9ffa4'},
-            17: {'name': 'Water Bodies', 'color': '1c0dff'}
-        }
-        
         # Create a list of colors for visualization exactly as in the Earth Engine example
         palette = [
             '05450a', '086a10', '54a708', '78d203', '009900', 'c6b044', 'dcd159',
@@ -220,7 +416,7 @@ def get_igbp_land_cover(start_date, end_date, coordinates):
             maxPixels=1e9
         ).getInfo()
         
-        print(f"Land cover histogram: {histogram}")
+        logger.debug("Land cover histogram: %s", histogram)
         
         # Process histogram to get areas for each class
         area_stats = {}
@@ -234,27 +430,28 @@ def get_igbp_land_cover(start_date, end_date, coordinates):
                 # Class values in the histogram come as strings, convert to int
                 class_value = int(float(class_val_str))
                 
-                if class_value in igbp_classes:
+                if class_value in IGBP_CLASSES:
                     # Calculate area in hectares (500m x 500m = 25ha per pixel)
                     area_hectares = (pixel_count * 25)
                     total_area += area_hectares
                     
-                    area_stats[igbp_classes[class_value]['name']] = {
+                    area_stats[IGBP_CLASSES[class_value]['name']] = {
                         'class_value': class_value,
-                        'color': '#' + igbp_classes[class_value]['color'],
+                        'color': '#' + IGBP_CLASSES[class_value]['color'],
                         'area_hectares': round(area_hectares, 2),
                         'pixel_count': pixel_count
                     }
         
         # If no data was found, we'll use a simpler approach as a fallback
         if not area_stats:
-            print("No data found with histogram method, trying direct calculation")
+            logger.info("No data found with histogram method, trying direct calculation")
             
             # Use a reduced scale for large areas to prevent computation timeouts
             scale = 500  # Default MODIS resolution is 500m
             
             # Loop through each class and calculate area
-            for class_value, class_info in igbp_classes.items():
+            for class_value, class_info in IGBP_CLASSES.items():
+                check_cancelled()
                 try:
                     # Create mask for this class
                     class_mask = igbp_image.eq(class_value)
@@ -278,8 +475,10 @@ def get_igbp_land_cover(start_date, end_date, coordinates):
                             'area_hectares': round(area_hectares, 2),
                             'pixel_count': area_pixels
                         }
+                except CancelledError:
+                    raise
                 except Exception as e:
-                    print(f"Error calculating area for class {class_value}: {str(e)}")
+                    logger.warning("Error calculating area for class %s: %s", class_value, e)
         
         # Even if we don't find any specific land cover classes, we should still show the map
         # Just report it as unknown/unclassified
@@ -293,7 +492,7 @@ def get_igbp_land_cover(start_date, end_date, coordinates):
                 'pixel_count': 0,
                 'percentage': 100.0
             }
-            print("Warning: No specific land cover classes found in the selected area.")
+            logger.warning("No specific land cover classes found in the selected area.")
         else:
             # Calculate percentages
             for stat in area_stats.values():
@@ -307,7 +506,7 @@ def get_igbp_land_cover(start_date, end_date, coordinates):
         }
         
     except ee.EEException as e:
-        print(f"Earth Engine error: {str(e)}")
+        logger.error("Earth Engine error: %s", e)
         # More detailed error info
         if "permission denied" in str(e).lower():
             raise Exception("Access to Earth Engine data denied. Please check your authentication.")
@@ -317,10 +516,13 @@ def get_igbp_land_cover(start_date, end_date, coordinates):
             raise Exception("Quota exceeded. Please try again later or select a smaller area.")
         else:
             raise Exception(f"Earth Engine error: {str(e)}")
+    except CancelledError:
+        raise
     except Exception as e:
-        print(f"Error in IGBP classification: {str(e)}")
+        logger.error("Error in IGBP classification: %s", e)
         raise Exception(f"Failed to retrieve land cover data: {str(e)}")
 
+@traced(dataset='landsat8_ndvi')
 def get_ndvi_map_for_year(year, coordinates):
     """Get NDVI map for a specific year."""
     area_of_interest = ee.Geometry.Polygon([coordinates])
@@ -354,13 +556,17 @@ def get_ndvi_map_for_year(year, coordinates):
         }
     return None
 
-def get_yearly_ndvi_stats(coordinates, start_year, end_year):
+@traced(dataset='landsat8_ndvi', scale=30)
+def get_yearly_ndvi_stats(coordinates, start_year, end_year, ranges=NDVI_RANGES):
     """Get NDVI statistics for each year in the range."""
     area_of_interest = ee.Geometry.Polygon([coordinates])
     yearly_stats = []
     map_tiles = []
 
     for year in range(start_year, end_year + 1):
+        # Stop between years if the client cancelled or superseded this request
+        check_cancelled()
+        
         start_date = f"{year}-01-01"
         end_date = f"{year}-12-31"
         
@@ -376,7 +582,7 @@ def get_yearly_ndvi_stats(coordinates, start_year, end_year):
                            .clip(area_of_interest)
             
             # Get statistics for the year
-            stats = get_ndvi_statistics(annual_ndvi, area_of_interest)
+            stats = get_ndvi_statistics(annual_ndvi, area_of_interest, ranges)
             stats['year'] = year
             yearly_stats.append(stats)
             
@@ -387,33 +593,160 @@ def get_yearly_ndvi_stats(coordinates, start_year, end_year):
     
     return yearly_stats, map_tiles
 
-def calculate_ndvi(start_date, end_date, coordinates):
-    """Calculate NDVI for the specified date range and area."""
-    # Convert coordinates to Earth Engine geometry
-    area_of_interest = ee.Geometry.Polygon([coordinates])
+def mask_landsat_clouds(image):
+    """Mask cloud, dilated cloud and cloud shadow pixels using the QA_PIXEL band."""
+    qa = image.select('QA_PIXEL')
+    # Bit 1: dilated cloud, bit 3: cloud, bit 4: cloud shadow
+    clear = qa.bitwiseAnd(1 << 1).eq(0) \
+        .And(qa.bitwiseAnd(1 << 3).eq(0)) \
+        .And(qa.bitwiseAnd(1 << 4).eq(0))
+    return image.updateMask(clear)
+
+def add_ndvi_band(image):
+    """Append an NDVI band computed from the Landsat 8 NIR (B5) and red (B4) bands."""
+    return image.addBands(image.normalizedDifference(['B5', 'B4']).rename('NDVI'))
+
+def empty_ndvi_image():
+    """A float NDVI band with every pixel masked, standing in for an empty composite."""
+    return ee.Image.constant(0).toFloat().rename('NDVI').updateMask(ee.Image.constant(0))
+
+def build_ndvi_image(start_date, end_date, area_of_interest, mode=DEFAULT_NDVI_COMPOSITE_MODE):
+    """Build an unclipped NDVI image for the date range using the given compositing mode.
+    
+    Supported compositing modes:
+    median: per-pixel median NDVI of the cloud-masked scenes
+    greenest: quality mosaic keeping the highest NDVI observation per pixel
+    least_cloudy: the single scene with the lowest CLOUD_COVER (the default)
+    
+    Scenes are not counted up front: an empty collection composites to a fully
+    masked NDVI band, which get_ndvi_statistics() reports as missing imagery.
+    """
+    if mode not in NDVI_COMPOSITE_MODES:
+        raise Exception(f"Unknown composite mode '{mode}'. Expected one of: {', '.join(NDVI_COMPOSITE_MODES)}")
     
     # Get Landsat 8 collection
     l8 = ee.ImageCollection('LANDSAT/LC08/C02/T1_TOA') \
         .filterBounds(area_of_interest) \
-        .filterDate(start_date, end_date) \
-        .sort('CLOUD_COVER') \
-        .first()
+        .filterDate(start_date, end_date)
+    empty = ee.ImageCollection([empty_ndvi_image()])
     
-    if l8 is None:
-        raise Exception("No Landsat imagery found for the specified time range and area")
+    if mode == 'least_cloudy':
+        # limit() with a property keeps the top scenes without sorting the whole collection
+        scene = l8.limit(1, 'CLOUD_COVER') \
+            .map(lambda image: image.normalizedDifference(['B5', 'B4']).rename('NDVI'))
+        return scene.merge(empty).mosaic()
     
-    # Calculate NDVI
-    ndvi = l8.normalizedDifference(['B5', 'B4']).rename('NDVI')
+    # Drop very cloudy scenes on metadata alone and composite at most the
+    # MAX_COMPOSITE_IMAGES least cloudy ones, so long date ranges neither pull
+    # hundreds of scenes in nor lean towards their first months.
+    scenes = l8.filter(ee.Filter.lt('CLOUD_COVER', MAX_SCENE_CLOUD_COVER)) \
+        .limit(MAX_COMPOSITE_IMAGES, 'CLOUD_COVER') \
+        .map(mask_landsat_clouds) \
+        .map(add_ndvi_band) \
+        .select('NDVI') \
+        .merge(empty)
+    
+    if mode == 'greenest':
+        return scenes.qualityMosaic('NDVI')
+    return scenes.median()
+
+@traced(dataset='landsat8_ndvi', scale=30)
+def calculate_ndvi(start_date, end_date, coordinates, mode=DEFAULT_NDVI_COMPOSITE_MODE, ranges=NDVI_RANGES, scale=30):
+    """Calculate NDVI for the specified date range and area."""
+    # Convert coordinates to Earth Engine geometry
+    area_of_interest = ee.Geometry.Polygon([coordinates])
+    
+    ndvi = build_ndvi_image(start_date, end_date, area_of_interest, mode)
     
     # Clip to the area of interest
     ndvi = ndvi.clip(area_of_interest)
     
     # Get detailed statistics
-    statistics = get_ndvi_statistics(ndvi, area_of_interest)
+    statistics = get_ndvi_statistics(ndvi, area_of_interest, ranges, scale)
     
     return ndvi, statistics
 
-def get_esa_worldcover(coordinates):
+@traced(dataset='landsat8_ndvi')
+def get_monthly_ndvi_profile(coordinates, start_year, end_year, scale=30):
+    """Get mean and percentile NDVI for every month of a year range in one round trip.
+    
+    The month list is mapped on the server: each month's cloud-masked scenes are
+    reduced to a median NDVI composite and summarized over the area. Months
+    without usable imagery come back with null statistics.
+    """
+    area_of_interest = ee.Geometry.Polygon([coordinates])
+    month_count = (end_year - start_year + 1) * 12
+    first_month = ee.Date.fromYMD(start_year, 1, 1)
+    
+    scenes = ee.ImageCollection('LANDSAT/LC08/C02/T1_TOA') \
+        .filterBounds(area_of_interest) \
+        .filterDate(first_month, first_month.advance(month_count, 'month')) \
+        .filter(ee.Filter.lt('CLOUD_COVER', MAX_SCENE_CLOUD_COVER)) \
+        .map(mask_landsat_clouds) \
+        .map(add_ndvi_band) \
+        .select('NDVI')
+    
+    reducer = ee.Reducer.mean().combine(
+        reducer2=ee.Reducer.percentile(MONTHLY_PROFILE_PERCENTILES),
+        sharedInputs=True
+    ).combine(
+        reducer2=ee.Reducer.count(),
+        sharedInputs=True
+    )
+    
+    def summarize_month(offset):
+        month_start = first_month.advance(offset, 'month')
+        month_scenes = scenes.filterDate(month_start, month_start.advance(1, 'month'))
+        # The median of an empty month has no bands, so its statistics are an empty dictionary
+        stats = month_scenes.median().reduceRegion(
+            reducer=reducer,
+            geometry=area_of_interest,
+            scale=scale,
+            maxPixels=1e9
+        )
+        return ee.Dictionary({'scenes': month_scenes.size(), 'stats': stats})
+    
+    months = ee.List.sequence(0, month_count - 1).map(summarize_month).getInfo()
+    
+    years = list(range(start_year, end_year + 1))
+    profile = {
+        'years': years,
+        'months': list(range(1, 13)),
+        'scale': scale,
+        'mean': [],
+        'scene_count': [],
+        'valid_pixels': [],
+        'empty_months': []
+    }
+    for percentile in MONTHLY_PROFILE_PERCENTILES:
+        profile[f"p{percentile}"] = []
+    
+    for row, year in enumerate(years):
+        for key in ('mean', 'scene_count', 'valid_pixels', *(f"p{p}" for p in MONTHLY_PROFILE_PERCENTILES)):
+            profile[key].append([])
+        for month in range(12):
+            entry = months[row * 12 + month]
+            stats = entry.get('stats') or {}
+            mean = stats.get('NDVI_mean')
+            
+            profile['scene_count'][row].append(entry.get('scenes', 0))
+            profile['valid_pixels'][row].append(int(stats.get('NDVI_count') or 0))
+            profile['mean'][row].append(round(mean, 3) if mean is not None else None)
+            for percentile in MONTHLY_PROFILE_PERCENTILES:
+                value = stats.get(f"NDVI_p{percentile}")
+                profile[f"p{percentile}"][row].append(round(value, 3) if value is not None else None)
+            
+            if mean is None:
+                profile['empty_months'].append({
+                    'year': year,
+                    'month': month + 1,
+                    'reason': 'no_scenes' if not entry.get('scenes') else 'all_pixels_masked'
+                })
+    
+    return profile
+
+@traced(dataset='worldcover', scale=10)
+def get_esa_worldcover(coordinates, scale=10):
     """Get ESA WorldCover 10m v100 classification for an area.
     
     The ESA WorldCover classification includes 11 land cover classes:
@@ -428,18 +761,22 @@ def get_esa_worldcover(coordinates):
     90: Herbaceous wetland
     95: Mangroves
     100: Moss and lichen
+    
+    A coarser `scale` gives a quick approximate result for progressive previews.
     """
     try:
+        current_span().set_attribute('scale', scale)
+        
         # Convert coordinates to Earth Engine geometry
         area_of_interest = ee.Geometry.Polygon([coordinates])
         
         # Calculate area in square kilometers for debugging
         area_size = area_of_interest.area().divide(1000 * 1000).getInfo()
-        print(f"Area size: {area_size} square kilometers")
+        logger.debug("Area size: %s square kilometers", area_size)
         
         # If area is too large, provide a warning
         if area_size > 10000:  # 10,000 sq km threshold
-            print(f"Warning: Selected area is very large ({area_size} sq km). Consider selecting a smaller area.")
+            logger.warning("Selected area is very large (%s sq km). Consider selecting a smaller area.", area_size)
         
         # Get the ESA WorldCover 10m dataset
         esa_wc = ee.ImageCollection("ESA/WorldCover/v100").first()
@@ -451,21 +788,6 @@ def get_esa_worldcover(coordinates):
         # Select the Map band and clip to the area of interest
         worldcover_image = esa_wc.select('Map').clip(area_of_interest)
         
-        # Define the ESA WorldCover classification classes and colors
-        worldcover_classes = {
-            10: {'name': 'Tree cover', 'color': '006400'},
-            20: {'name': 'Shrubland', 'color': 'ffbb22'},
-            30: {'name': 'Grassland', 'color': 'ffff4c'},
-            40: {'name': 'Cropland', 'color': 'f096ff'},
-            50: {'name': 'Built-up', 'color': 'fa0000'},
-            60: {'name': 'Bare / sparse vegetation', 'color': 'b4b4b4'},
-            70: {'name': 'Snow and ice', 'color': 'f0f0f0'},
-            80: {'name': 'Permanent water bodies', 'color': '0064c8'},
-            90: {'name': 'Herbaceous wetland', 'color': '0096a0'},
-            95: {'name': 'Mangroves', 'color': '00cf75'},
-            100: {'name': 'Moss and lichen', 'color': 'fae6a0'}
-        }
-        
         # Create a list of colors for visualization
         palette = [
             '006400', 'ffbb22', 'ffff4c', 'f096ff', 'fa0000', 'b4b4b4',
@@ -490,11 +812,11 @@ def get_esa_worldcover(coordinates):
         histogram = worldcover_image.reduceRegion(
             reducer=ee.Reducer.frequencyHistogram(),
             geometry=area_of_interest,
-            scale=10,  # ESA WorldCover is 10m resolution
+            scale=scale,  # ESA WorldCover is 10m resolution
             maxPixels=1e9
         ).getInfo()
         
-        print(f"Land cover histogram: {histogram}")
+        logger.debug("Land cover histogram: %s", histogram)
         
         # Process histogram to get areas for each class
         area_stats = {}
@@ -508,27 +830,25 @@ def get_esa_worldcover(coordinates):
                 # Class values in the histogram come as strings, convert to int
                 class_value = int(float(class_val_str))
                 
-                if class_value in worldcover_classes:
-                    # Calculate area in hectares (10m x 10m = 100m² per pixel)
-                    area_hectares = (pixel_count * 100) / 10000
+                if class_value in WORLDCOVER_CLASSES:
+                    # Calculate area in hectares (10m x 10m = 100m² per pixel at native scale)
+                    area_hectares = (pixel_count * scale * scale) / 10000
                     total_area += area_hectares
                     
-                    area_stats[worldcover_classes[class_value]['name']] = {
+                    area_stats[WORLDCOVER_CLASSES[class_value]['name']] = {
                         'class_value': class_value,
-                        'color': '#' + worldcover_classes[class_value]['color'],
+                        'color': '#' + WORLDCOVER_CLASSES[class_value]['color'],
                         'area_hectares': round(area_hectares, 2),
                         'pixel_count': pixel_count
                     }
         
         # If no data was found, try a direct calculation approach
         if not area_stats:
-            print("No data found with histogram method, trying direct calculation")
-            
-            # ESA WorldCover resolution is 10m
-            scale = 10
+            logger.info("No data found with histogram method, trying direct calculation")
             
             # Loop through each class and calculate area
-            for class_value, class_info in worldcover_classes.items():
+            for class_value, class_info in WORLDCOVER_CLASSES.items():
+                check_cancelled()
                 try:
                     # Create mask for this class
                     class_mask = worldcover_image.eq(class_value)
@@ -542,8 +862,8 @@ def get_esa_worldcover(coordinates):
                     ).get('Map').getInfo()
                     
                     if area_pixels is not None and area_pixels > 0:
-                        # Calculate area in hectares (10m x 10m = 100m² per pixel)
-                        area_hectares = (area_pixels * 100) / 10000
+                        # Calculate area in hectares (10m x 10m = 100m² per pixel at native scale)
+                        area_hectares = (area_pixels * scale * scale) / 10000
                         total_area += area_hectares
                         
                         area_stats[class_info['name']] = {
@@ -552,8 +872,10 @@ def get_esa_worldcover(coordinates):
                             'area_hectares': round(area_hectares, 2),
                             'pixel_count': area_pixels
                         }
+                except CancelledError:
+                    raise
                 except Exception as e:
-                    print(f"Error calculating area for class {class_value}: {str(e)}")
+                    logger.warning("Error calculating area for class %s: %s", class_value, e)
         
         # Even if we don't find any specific land cover classes, we should still show the map
         # Just report it as unknown/unclassified
@@ -567,7 +889,7 @@ def get_esa_worldcover(coordinates):
                 'pixel_count': 0,
                 'percentage': 100.0
             }
-            print("Warning: No specific land cover classes found in the selected area.")
+            logger.warning("No specific land cover classes found in the selected area.")
         else:
             # Calculate percentages
             for stat in area_stats.values():
@@ -581,7 +903,7 @@ def get_esa_worldcover(coordinates):
         }
         
     except ee.EEException as e:
-        print(f"Earth Engine error: {str(e)}")
+        logger.error("Earth Engine error: %s", e)
         # More detailed error info
         if "permission denied" in str(e).lower():
             raise Exception("Access to Earth Engine data denied. Please check your authentication.")
@@ -591,11 +913,14 @@ def get_esa_worldcover(coordinates):
             raise Exception("Quota exceeded. Please try again later or select a smaller area.")
         else:
             raise Exception(f"Earth Engine error: {str(e)}")
+    except CancelledError:
+        raise
     except Exception as e:
-        print(f"Error in ESA WorldCover classification: {str(e)}")
+        logger.error("Error in ESA WorldCover classification: %s", e)
         raise Exception(f"Failed to retrieve land cover data: {str(e)}")
 
-def get_dynamic_world(coordinates):
+@traced(dataset='dynamic_world', scale=10)
+def get_dynamic_world(coordinates, scale=10):
     """Get Dynamic World V1 land cover classification for an area.
     
     Dynamic World V1 includes the following land cover classes:
@@ -608,18 +933,22 @@ def get_dynamic_world(coordinates):
     6: built
     7: bare
     8: snow_and_ice
+    
+    A coarser `scale` gives a quick approximate result for progressive previews.
     """
     try:
+        current_span().set_attribute('scale', scale)
+        
         # Convert coordinates to Earth Engine geometry
         area_of_interest = ee.Geometry.Polygon([coordinates])
         
         # Calculate area in square kilometers for debugging
         area_size = area_of_interest.area().divide(1000 * 1000).getInfo()
-        print(f"Area size: {area_size} square kilometers")
+        logger.debug("Area size: %s square kilometers", area_size)
         
         # If area is too large, provide a warning
         if area_size > 10000:  # 10,000 sq km threshold
-            print(f"Warning: Selected area is very large ({area_size} sq km). Consider selecting a smaller area.")
+            logger.warning("Selected area is very large (%s sq km). Consider selecting a smaller area.", area_size)
         
         # Get the Dynamic World V1 dataset
         # We'll use the most recent data available for the area
@@ -635,7 +964,7 @@ def get_dynamic_world(coordinates):
             
         # Check if we have any images
         dw_count = dw_col.size().getInfo()
-        print(f"Found {dw_count} Dynamic World images")
+        logger.debug("Found %s Dynamic World images", dw_count)
         
         if dw_count == 0:
             # Try a longer time range if no recent images
@@ -644,7 +973,7 @@ def get_dynamic_world(coordinates):
                 .filterBounds(area_of_interest) \
                 .filterDate(start_date, end_date)
             dw_count = dw_col.size().getInfo()
-            print(f"Found {dw_count} Dynamic World images in the extended range")
+            logger.debug("Found %s Dynamic World images in the extended range", dw_count)
         
         if dw_count == 0:
             raise Exception("No Dynamic World data found for the selected area")
@@ -659,7 +988,7 @@ def get_dynamic_world(coordinates):
             linked_col = dw_col.linkCollection(s2_col, s2_col.first().bandNames())
             linked_image = ee.Image(linked_col.first())
         except Exception as e:
-            print(f"Error linking collections: {str(e)}")
+            logger.warning("Error linking collections: %s", e)
             # Fallback to just using the most recent Dynamic World image
             linked_image = dw_col.sort('system:time_start', False).first()
         
@@ -688,19 +1017,6 @@ def get_dynamic_world(coordinates):
             'b39fe1',
         ]
         
-        # Define a dictionary of class information
-        class_info = {
-            0: {'name': 'Water', 'color': '419bdf'},
-            1: {'name': 'Trees', 'color': '397d49'},
-            2: {'name': 'Grass', 'color': '88b053'},
-            3: {'name': 'Flooded Vegetation', 'color': '7a87c6'},
-            4: {'name': 'Crops', 'color': 'e49635'},
-            5: {'name': 'Shrub and Scrub', 'color': 'dfc35a'},
-            6: {'name': 'Built', 'color': 'c4281b'},
-            7: {'name': 'Bare', 'color': 'a59b8f'},
-            8: {'name': 'Snow and Ice', 'color': 'b39fe1'}
-        }
-        
         # Clip to the area of interest
         dw_image = linked_image.clip(area_of_interest)
         
@@ -723,11 +1039,11 @@ def get_dynamic_world(coordinates):
         histogram = dw_image.select('label').reduceRegion(
             reducer=ee.Reducer.frequencyHistogram(),
             geometry=area_of_interest,
-            scale=10,  # Dynamic World has 10m resolution
+            scale=scale,  # Dynamic World has 10m resolution
             maxPixels=1e9
         ).getInfo()
         
-        print(f"Land cover histogram: {histogram}")
+        logger.debug("Land cover histogram: %s", histogram)
         
         # Process histogram to get areas for each class
         area_stats = {}
@@ -741,24 +1057,25 @@ def get_dynamic_world(coordinates):
                 # Class values in the histogram come as strings, convert to int
                 class_value = int(float(class_val_str))
                 
-                if class_value in class_info:
-                    # Calculate area in hectares (10m x 10m = 100m² per pixel)
-                    area_hectares = (pixel_count * 100) / 10000
+                if class_value in DYNAMIC_WORLD_CLASSES:
+                    # Calculate area in hectares (10m x 10m = 100m² per pixel at native scale)
+                    area_hectares = (pixel_count * scale * scale) / 10000
                     total_area += area_hectares
                     
-                    area_stats[class_info[class_value]['name']] = {
+                    area_stats[DYNAMIC_WORLD_CLASSES[class_value]['name']] = {
                         'class_value': class_value,
-                        'color': '#' + class_info[class_value]['color'],
+                        'color': '#' + DYNAMIC_WORLD_CLASSES[class_value]['color'],
                         'area_hectares': round(area_hectares, 2),
                         'pixel_count': pixel_count
                     }
         
         # If no data was found, try calculating probabilities directly
         if not area_stats:
-            print("No data found with histogram method, trying probability calculation")
+            logger.info("No data found with histogram method, trying probability calculation")
             
             # Dynamic World provides probability bands for each class
             for idx, class_name in enumerate(class_names):
+                check_cancelled()
                 try:
                     # Calculate area with probability > 0.5 for this class
                     class_area = dw_image.select(class_name).gt(0.5)
@@ -767,23 +1084,25 @@ def get_dynamic_world(coordinates):
                     area_pixels = class_area.reduceRegion(
                         reducer=ee.Reducer.sum(),
                         geometry=area_of_interest,
-                        scale=10,
+                        scale=scale,
                         maxPixels=1e9
                     ).get(class_name).getInfo()
                     
                     if area_pixels is not None and area_pixels > 0:
-                        # Convert pixel count to area in hectares (10m x 10m = 100m² per pixel)
-                        area_hectares = (area_pixels * 100) / 10000
+                        # Convert pixel count to area in hectares (10m x 10m = 100m² per pixel at native scale)
+                        area_hectares = (area_pixels * scale * scale) / 10000
                         total_area += area_hectares
                         
-                        area_stats[class_info[idx]['name']] = {
+                        area_stats[DYNAMIC_WORLD_CLASSES[idx]['name']] = {
                             'class_value': idx,
-                            'color': '#' + class_info[idx]['color'],
+                            'color': '#' + DYNAMIC_WORLD_CLASSES[idx]['color'],
                             'area_hectares': round(area_hectares, 2),
                             'pixel_count': area_pixels
                         }
+                except CancelledError:
+                    raise
                 except Exception as e:
-                    print(f"Error calculating area for class {class_name}: {str(e)}")
+                    logger.warning("Error calculating area for class %s: %s", class_name, e)
         
         # Create a fallback with unclassified if no data found
         if not area_stats:
@@ -796,7 +1115,7 @@ def get_dynamic_world(coordinates):
                 'pixel_count': 0,
                 'percentage': 100.0
             }
-            print("Warning: No specific land cover classes found in the selected area.")
+            logger.warning("No specific land cover classes found in the selected area.")
         else:
             # Calculate percentages
             for stat in area_stats.values():
@@ -810,7 +1129,7 @@ def get_dynamic_world(coordinates):
         }
         
     except ee.EEException as e:
-        print(f"Earth Engine error: {str(e)}")
+        logger.error("Earth Engine error: %s", e)
         # More detailed error info
         if "permission denied" in str(e).lower():
             raise Exception("Access to Earth Engine data denied. Please check your authentication.")
@@ -820,13 +1139,73 @@ def get_dynamic_world(coordinates):
             raise Exception("Quota exceeded. Please try again later or select a smaller area.")
         else:
             raise Exception(f"Earth Engine error: {str(e)}")
+    except CancelledError:
+        raise
     except Exception as e:
-        print(f"Error in Dynamic World classification: {str(e)}")
+        logger.error("Error in Dynamic World classification: %s", e)
         raise Exception(f"Failed to retrieve land cover data: {str(e)}")
 
-def get_dynamic_world_for_year(year, coordinates):
-    """Get Dynamic World V1 land cover classification for a specific year."""
+def check_dynamic_world_composite(strategy):
+    if strategy not in DYNAMIC_WORLD_COMPOSITES:
+        raise Exception(f"Unknown composite '{strategy}'. Expected one of: {', '.join(DYNAMIC_WORLD_COMPOSITES)}")
+
+def sample_dynamic_world_images(dw_col, year, area_of_interest, strategy=DEFAULT_DYNAMIC_WORLD_COMPOSITE):
+    """Select the images of a year's Dynamic World collection that a composite strategy uses.
+    
+    mode: every image
+    monthly_sample: the DYNAMIC_WORLD_IMAGES_PER_MONTH least cloudy images of each
+        month, by the CLOUDY_PIXEL_PERCENTAGE of their Sentinel-2 source scene
+    mean_probability: a fixed pseudo-random sample of at most DYNAMIC_WORLD_MAX_IMAGES
+    """
+    if strategy == 'monthly_sample':
+        s2 = ee.ImageCollection('COPERNICUS/S2_HARMONIZED') \
+            .filterBounds(area_of_interest) \
+            .filterDate(f"{year}-01-01", f"{year}-12-31")
+        
+        def least_cloudy_of_month(month):
+            month_filter = ee.Filter.calendarRange(month, month, 'month')
+            month_dw = dw_col.filter(month_filter)
+            # Dynamic World images share their system:index with the Sentinel-2 scene they were
+            # made from, so only the month's source scenes are ranked, without a join
+            scene_ids = s2.filter(month_filter) \
+                .filter(ee.Filter.inList('system:index', month_dw.aggregate_array('system:index'))) \
+                .limit(DYNAMIC_WORLD_IMAGES_PER_MONTH, 'CLOUDY_PIXEL_PERCENTAGE') \
+                .aggregate_array('system:index')
+            return month_dw.filter(ee.Filter.inList('system:index', scene_ids)) \
+                .toList(DYNAMIC_WORLD_IMAGES_PER_MONTH)
+        
+        return ee.ImageCollection(ee.List.sequence(1, 12).map(least_cloudy_of_month).flatten())
+    
+    if strategy == 'mean_probability':
+        # A seeded random column spreads the sample over the year and keeps it stable between calls
+        return ee.ImageCollection(dw_col.randomColumn('sample', 0)).sort('sample').limit(DYNAMIC_WORLD_MAX_IMAGES)
+    
+    return dw_col
+
+def build_dynamic_world_composite(dw_col, strategy=DEFAULT_DYNAMIC_WORLD_COMPOSITE):
+    """Reduce Dynamic World images to one label image.
+    
+    mean_probability takes the class with the highest mean probability; the
+    other strategies take the most frequent label per pixel.
+    """
+    if strategy == 'mean_probability':
+        return dw_col.select(DYNAMIC_WORLD_PROBABILITY_BANDS).mean() \
+            .toArray().arrayArgmax().arrayGet([0]) \
+            .rename('label')
+    return dw_col.select(['label']).mode()
+
+@traced(dataset='dynamic_world', scale=10)
+def get_dynamic_world_for_year(year, coordinates, composite_strategy=DEFAULT_DYNAMIC_WORLD_COMPOSITE):
+    """Get Dynamic World V1 land cover classification for a specific year.
+    
+    `composite_strategy` trades accuracy for speed on large areas (see
+    sample_dynamic_world_images); the result reports how many images it used.
+    """
+    check_dynamic_world_composite(composite_strategy)
+    
     try:
+        current_span().set_attribute('composite', composite_strategy)
+        
         # Convert coordinates to Earth Engine geometry
         area_of_interest = ee.Geometry.Polygon([coordinates])
         
@@ -838,17 +1217,28 @@ def get_dynamic_world_for_year(year, coordinates):
         dw_col = ee.ImageCollection('GOOGLE/DYNAMICWORLD/V1') \
             .filterBounds(area_of_interest) \
             .filterDate(start_date, end_date)
+        sampled = sample_dynamic_world_images(dw_col, year, area_of_interest, composite_strategy)
             
-        # Check if we have any images
-        dw_count = dw_col.size().getInfo()
-        print(f"Found {dw_count} Dynamic World images for year {year}")
+        # Check if we have any images, and how many the composite uses, in one request
+        image_counts = ee.Dictionary({'available': dw_col.size(), 'used': sampled.size()}).getInfo()
+        logger.debug("Found %s Dynamic World images for year %s, using %s", image_counts['available'], year, image_counts['used'])
         
-        if dw_count == 0:
-            print(f"No images found for year {year}, returning empty result")
+        if image_counts['used'] == 0:
+            logger.info("No images found for year %s, returning empty result", year)
             return None
         
+        composite_info = {
+            'strategy': composite_strategy,
+            'images_available': image_counts['available'],
+            'images_used': image_counts['used']
+        }
+        if composite_strategy == 'monthly_sample':
+            composite_info['images_per_month'] = DYNAMIC_WORLD_IMAGES_PER_MONTH
+        elif composite_strategy == 'mean_probability':
+            composite_info['max_images'] = DYNAMIC_WORLD_MAX_IMAGES
+        
         # Get most probabilities image (composite)
-        composite = dw_col.select(['label']).mode()
+        composite = build_dynamic_world_composite(sampled, composite_strategy)
         
         # Clip to the area of interest
         dw_image = composite.clip(area_of_interest)
@@ -878,19 +1268,6 @@ def get_dynamic_world_for_year(year, coordinates):
             'b39fe1',
         ]
         
-        # Define a dictionary of class information
-        class_info = {
-            0: {'name': 'Water', 'color': '419bdf'},
-            1: {'name': 'Trees', 'color': '397d49'},
-            2: {'name': 'Grass', 'color': '88b053'},
-            3: {'name': 'Flooded Vegetation', 'color': '7a87c6'},
-            4: {'name': 'Crops', 'color': 'e49635'},
-            5: {'name': 'Shrub and Scrub', 'color': 'dfc35a'},
-            6: {'name': 'Built', 'color': 'c4281b'},
-            7: {'name': 'Bare', 'color': 'a59b8f'},
-            8: {'name': 'Snow and Ice', 'color': 'b39fe1'}
-        }
-        
         # Create visualization using the label band
         vis_params = {
             'min': 0,
@@ -921,14 +1298,14 @@ def get_dynamic_world_for_year(year, coordinates):
                 # Class values in the histogram come as strings, convert to int
                 class_value = int(float(class_val_str))
                 
-                if class_value in class_info:
+                if class_value in DYNAMIC_WORLD_CLASSES:
                     # Calculate area in hectares (10m x 10m = 100m² per pixel)
                     area_hectares = (pixel_count * 100) / 10000
                     total_area += area_hectares
                     
-                    area_stats[class_info[class_value]['name']] = {
+                    area_stats[DYNAMIC_WORLD_CLASSES[class_value]['name']] = {
                         'class_value': class_value,
-                        'color': '#' + class_info[class_value]['color'],
+                        'color': '#' + DYNAMIC_WORLD_CLASSES[class_value]['color'],
                         'area_hectares': round(area_hectares, 2),
                         'pixel_count': pixel_count
                     }
@@ -945,23 +1322,32 @@ def get_dynamic_world_for_year(year, coordinates):
             'tile_url': map_id['tile_fetcher'].url_format,
             'year': year,
             'date': f"{year}-01-01",  # Add date field for compatibility with display code
+            'composite': composite_info,
             'area_stats': area_stats,
             'total_area_hectares': round(total_area, 2)
         }
         
+    except CancelledError:
+        raise
     except Exception as e:
-        print(f"Error in Dynamic World classification for year {year}: {str(e)}")
+        logger.error("Error in Dynamic World classification for year %s: %s", year, e)
         return None
 
-def get_dynamic_world_timeseries(coordinates, start_year, end_year):
+@traced(dataset='dynamic_world', scale=10)
+def get_dynamic_world_timeseries(coordinates, start_year, end_year, composite_strategy=DEFAULT_DYNAMIC_WORLD_COMPOSITE):
     """Get Dynamic World land cover classification for a range of years."""
+    # Checked up front: get_dynamic_world_for_year's errors are only logged per year
+    check_dynamic_world_composite(composite_strategy)
     timeseries_data = []
     map_tiles = []
     
     for year in range(start_year, end_year + 1):
+        # Stop between years if the client cancelled or superseded this request
+        check_cancelled()
+        
         try:
-            print(f"Processing Dynamic World data for year {year}...")
-            year_data = get_dynamic_world_for_year(year, coordinates)
+            logger.debug("Processing Dynamic World data for year %s...", year)
+            year_data = get_dynamic_world_for_year(year, coordinates, composite_strategy)
             
             if year_data:
                 timeseries_data.append(year_data)
@@ -969,22 +1355,228 @@ def get_dynamic_world_timeseries(coordinates, start_year, end_year):
                     'year': year,
                     'tile_url': year_data['tile_url']
                 })
+        except CancelledError:
+            raise
         except Exception as e:
-            print(f"Error processing year {year}: {str(e)}")
+            logger.error("Error processing year %s: %s", year, e)
     
     return timeseries_data, map_tiles
 
+# Land cover datasets supported by the transition matrix. The multiplier packs a
+# (from, to) class pair into one value and must exceed the largest class value.
+TRANSITION_DATASETS = {
+    'dynamic_world': {'classes': DYNAMIC_WORLD_CLASSES, 'scale': 10, 'multiplier': 10},
+    'igbp': {'classes': IGBP_CLASSES, 'scale': 500, 'multiplier': 100}
+}
+
+def get_land_cover_for_year(dataset, year, area_of_interest):
+    """Get the annual land cover label image of a transition dataset."""
+    if dataset == 'igbp':
+        return ee.ImageCollection("MODIS/061/MCD12Q1") \
+            .filterDate(f"{year}-01-01", f"{year}-12-31") \
+            .first() \
+            .select('LC_Type1')
+    
+    dw_col = ee.ImageCollection('GOOGLE/DYNAMICWORLD/V1') \
+        .filterBounds(area_of_interest) \
+        .filterDate(f"{year}-01-01", f"{year}-12-31")
+    return build_dynamic_world_composite(dw_col)
+
+@traced()
+def get_land_cover_transitions(dataset, from_year, to_year, coordinates, include_map=False):
+    """Get the from/to land cover transition matrix between two years.
+    
+    Both label images are packed into a single band (from-class * multiplier +
+    to-class) so one frequency histogram yields every transition at once.
+    """
+    try:
+        spec = TRANSITION_DATASETS[dataset]
+        classes = spec['classes']
+        multiplier = spec['multiplier']
+        scale = spec['scale']
+        current_span().set_attribute('scale', scale)
+        
+        # Convert coordinates to Earth Engine geometry
+        area_of_interest = ee.Geometry.Polygon([coordinates])
+        
+        from_image = get_land_cover_for_year(dataset, from_year, area_of_interest).clip(area_of_interest)
+        to_image = get_land_cover_for_year(dataset, to_year, area_of_interest).clip(area_of_interest)
+        
+        transitions = from_image.multiply(multiplier).add(to_image).rename('transition')
+        
+        histogram = transitions.reduceRegion(
+            reducer=ee.Reducer.frequencyHistogram(),
+            geometry=area_of_interest,
+            scale=scale,
+            maxPixels=1e9
+        ).getInfo()
+        
+        # Rows are the from-class, columns the to-class, both in class value order
+        class_values = sorted(classes)
+        position = {class_value: i for i, class_value in enumerate(class_values)}
+        matrix = [[0.0] * len(class_values) for _ in class_values]
+        pixel_area_hectares = (scale * scale) / 10000
+        
+        for code_str, pixel_count in (histogram.get('transition') or {}).items():
+            code = int(float(code_str))
+            from_class, to_class = divmod(code, multiplier)
+            if from_class in position and to_class in position:
+                matrix[position[from_class]][position[to_class]] += pixel_count * pixel_area_hectares
+        
+        total_area = sum(sum(row) for row in matrix)
+        unchanged_area = sum(matrix[i][i] for i in range(len(class_values)))
+        
+        result = {
+            'dataset': dataset,
+            'from_year': from_year,
+            'to_year': to_year,
+            'classes': [
+                {'class_value': class_value, 'name': classes[class_value]['name'], 'color': '#' + classes[class_value]['color']}
+                for class_value in class_values
+            ],
+            'matrix_hectares': [[round(area, 2) for area in row] for row in matrix],
+            'from_totals_hectares': {
+                classes[class_value]['name']: round(sum(matrix[i]), 2)
+                for i, class_value in enumerate(class_values)
+            },
+            'to_totals_hectares': {
+                classes[class_value]['name']: round(sum(row[i] for row in matrix), 2)
+                for i, class_value in enumerate(class_values)
+            },
+            'unchanged_area_hectares': round(unchanged_area, 2),
+            'changed_area_hectares': round(total_area - unchanged_area, 2),
+            'total_area_hectares': round(total_area, 2)
+        }
+        
+        if include_map:
+            # Show only changed pixels, colored by the class they changed to
+            change_image = to_image.updateMask(from_image.neq(to_image))
+            map_id = change_image.getMapId({
+                'min': class_values[0],
+                'max': class_values[-1],
+                'palette': [classes[class_value]['color'] for class_value in class_values]
+            })
+            result['tile_url'] = map_id['tile_fetcher'].url_format
+        
+        return result
+        
+    except ee.EEException as e:
+        logger.error("Earth Engine error: %s", e)
+        # More detailed error info
+        if "permission denied" in str(e).lower():
+            raise Exception("Access to Earth Engine data denied. Please check your authentication.")
+        elif "timeout" in str(e).lower():
+            raise Exception("Request timed out. The selected area may be too large.")
+        elif "quota" in str(e).lower():
+            raise Exception("Quota exceeded. Please try again later or select a smaller area.")
+        else:
+            raise Exception(f"Earth Engine error: {str(e)}")
+    except CancelledError:
+        raise
+    except Exception as e:
+        logger.error("Error computing land cover transitions: %s", e)
+        raise Exception(f"Failed to compute land cover transitions: {str(e)}")
+
+# Datasets that can be pulled into the local raster cache
+RASTER_DATASETS = {
+    'ndvi': {'band': 'NDVI', 'scale': 30, 'dtype': 'float32', 'nodata': FLOAT_NODATA},
+    'igbp': {'band': 'LC_Type1', 'scale': 500, 'dtype': 'uint8', 'nodata': CLASS_NODATA, 'classes': IGBP_CLASSES},
+    'worldcover': {'band': 'Map', 'scale': 10, 'dtype': 'uint8', 'nodata': CLASS_NODATA, 'classes': WORLDCOVER_CLASSES},
+    'dynamic_world': {'band': 'label', 'scale': 10, 'dtype': 'uint8', 'nodata': CLASS_NODATA, 'classes': DYNAMIC_WORLD_CLASSES}
+}
+
+# Local tiles of cached rasters use the colours of the EE tiles: the class tables,
+# and for NDVI the red-yellow-green palette from -1 to 1
+register_palette('ndvi', RampPalette(['ff0000', 'ffff00', '008000'], -1, 1))
+for dataset, spec in RASTER_DATASETS.items():
+    if 'classes' in spec:
+        register_palette(dataset, ClassPalette(spec['classes']))
+
+def build_raster_source(dataset, params, area_of_interest):
+    """Build the Earth Engine image behind a cached raster dataset."""
+    if dataset == 'ndvi':
+        return build_ndvi_image(params['start_date'], params['end_date'], area_of_interest, params['mode'])
+    if dataset == 'igbp':
+        return ee.ImageCollection("MODIS/061/MCD12Q1").sort('system:time_start', False).first().select('LC_Type1')
+    if dataset == 'worldcover':
+        return ee.ImageCollection("ESA/WorldCover/v100").first().select('Map')
+    
+    year = params['year']
+    dw_col = ee.ImageCollection('GOOGLE/DYNAMICWORLD/V1') \
+        .filterBounds(area_of_interest) \
+        .filterDate(f"{year}-01-01", f"{year}-12-31")
+    return build_dynamic_world_composite(dw_col)
+
+def raster_params(dataset, data):
+    """Cache parameters of a raster dataset from a /cached_stats or /cached_raster request body."""
+    if dataset == 'ndvi':
+        return {
+            'start_date': data.get('start_date'),
+            'end_date': data.get('end_date'),
+            'mode': data.get('mode', DEFAULT_NDVI_COMPOSITE_MODE)
+        }
+    if dataset == 'dynamic_world':
+        return {'year': int(data.get('year', datetime.now().year - 1))}
+    if dataset == 'igbp':
+        # The latest MODIS year changes over time, so key the cache by the current year
+        return {'latest_as_of': datetime.now().year}
+    return {}
+
+@traced()
+def get_cached_raster(dataset, params, coordinates):
+    """Return (sidecar, cache_hit) for a cached raster covering the polygon, fetching it on a miss."""
+    spec = RASTER_DATASETS[dataset]
+    bbox = coordinates_bbox(coordinates)
+    current_span().set_attribute('scale', spec['scale'])
+    
+    sidecar = raster_cache.find(dataset, params, bbox)
+    current_span().set_attribute('cache_hit', sidecar is not None)
+    if sidecar is not None:
+        return sidecar, True
+    
+    # Cache the whole bounding box so any polygon inside it can be answered locally later
+    source = build_raster_source(dataset, params, ee.Geometry.Rectangle(list(bbox)))
+    sidecar = raster_cache.get_or_fetch(
+        dataset, params, bbox, source,
+        spec['band'], spec['scale'], spec['dtype'], spec['nodata']
+    )
+    return sidecar, False
+
 @app.route('/')
 def home():
     """Render the home page."""
-    return render_template('index.html')
+    response = make_response(render_template('index.html'))
+    # The shell is revalidated on every visit; the hashed assets it links to are cached for a year
+    response.headers['Cache-Control'] = 'no-cache'
+    response.add_etag()
+    return response.make_conditional(request)
+
+def run_ndvi_analysis(data, scale=30):
+    """NDVI tile URL and statistics for a /get_ndvi request body."""
+    mode = data.get('mode', DEFAULT_NDVI_COMPOSITE_MODE)
+    ranges = parse_ndvi_bins(data.get('bin_edges'), data.get('bin_labels'))
+    ndvi, statistics = calculate_ndvi(data.get('start_date'), data.get('end_date'), data['coordinates'], mode, ranges, scale)
+    
+    # Create visualization parameters
+    vis_params = {
+        'min': -1,
+        'max': 1,
+        'palette': ['red', 'yellow', 'green']
+    }
+    
+    # Get the NDVI map
+    map_id = ndvi.getMapId(vis_params)
+    
+    return {
+        'tile_url': map_id['tile_fetcher'].url_format,
+        'mode': mode,
+        'statistics': statistics
+    }
 
 @app.route('/get_ndvi', methods=['POST'])
 def get_ndvi():
     """Get NDVI data for the specified time range and area."""
     data = request.get_json()
-    start_date = data.get('start_date')
-    end_date = data.get('end_date')
     coordinates = data.get('coordinates')
     
     if not coordinates:
@@ -994,22 +1586,9 @@ def get_ndvi():
         })
     
     try:
-        ndvi, statistics = calculate_ndvi(start_date, end_date, coordinates)
-        
-        # Create visualization parameters
-        vis_params = {
-            'min': -1,
-            'max': 1,
-            'palette': ['red', 'yellow', 'green']
-        }
-        
-        # Get the NDVI map
-        map_id = ndvi.getMapId(vis_params)
-        
         return jsonify({
             'success': True,
-            'tile_url': map_id['tile_fetcher'].url_format,
-            'statistics': statistics
+            **run_ndvi_analysis(data)
         })
     except Exception as e:
         return jsonify({
@@ -1113,7 +1692,7 @@ def get_dynamic_world_for_year_route():
         })
     
     try:
-        result = get_dynamic_world_for_year(year, coordinates)
+        result = get_dynamic_world_for_year(year, coordinates, data.get('composite', DEFAULT_DYNAMIC_WORLD_COMPOSITE))
         
         if result is None:
             return jsonify({
@@ -1146,7 +1725,9 @@ def get_dynamic_world_timeseries_route():
         })
     
     try:
-        timeseries_data, map_tiles = get_dynamic_world_timeseries(coordinates, start_year, end_year)
+        timeseries_data, map_tiles = get_dynamic_world_timeseries(
+            coordinates, start_year, end_year, data.get('composite', DEFAULT_DYNAMIC_WORLD_COMPOSITE)
+        )
         
         if not timeseries_data:
             return jsonify({
@@ -1165,6 +1746,47 @@ def get_dynamic_world_timeseries_route():
             'error': str(e)
         })
 
+@app.route('/transition_matrix', methods=['POST'])
+def transition_matrix():
+    """Get the land cover transition matrix between two years for the specified area."""
+    data = request.get_json()
+    coordinates = data.get('coordinates')
+    dataset = data.get('dataset', 'dynamic_world')
+    from_year = data.get('from_year')
+    to_year = data.get('to_year')
+    include_map = bool(data.get('include_map', False))
+    
+    if not coordinates:
+        return jsonify({
+            'success': False,
+            'error': 'No area coordinates provided'
+        })
+    
+    if dataset not in TRANSITION_DATASETS:
+        return jsonify({
+            'success': False,
+            'error': f"Unknown dataset '{dataset}'. Expected one of: {', '.join(TRANSITION_DATASETS)}"
+        })
+    
+    if not from_year or not to_year:
+        return jsonify({
+            'success': False,
+            'error': 'Both from_year and to_year are required'
+        })
+    
+    try:
+        transitions = get_land_cover_transitions(dataset, int(from_year), int(to_year), coordinates, include_map)
+        
+        return jsonify({
+            'success': True,
+            'transition_data': transitions
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        })
+
 @app.route('/get_yearly_stats', methods=['POST'])
 def get_yearly_stats():
     """Get NDVI statistics for multiple years."""
@@ -1180,7 +1802,8 @@ def get_yearly_stats():
         })
     
     try:
-        yearly_stats, map_tiles = get_yearly_ndvi_stats(coordinates, start_year, end_year)
+        ranges = parse_ndvi_bins(data.get('bin_edges'), data.get('bin_labels'))
+        yearly_stats, map_tiles = get_yearly_ndvi_stats(coordinates, start_year, end_year, ranges)
         return jsonify({
             'success': True,
             'yearly_stats': yearly_stats,
@@ -1192,16 +1815,136 @@ def get_yearly_stats():
             'error': str(e)
         })
 
-@app.route('/save_area', methods=['POST'])
-def save_area():
-    """Save a user-defined area."""
+@app.route('/get_monthly_profile', methods=['POST'])
+def get_monthly_profile():
+    """Get a years x 12 matrix of monthly NDVI statistics."""
     data = request.get_json()
-    coords = data.get('coordinates')
+    coordinates = data.get('coordinates')
     
-    if not coords:
-        return jsonify({'success': False, 'error': 'No coordinates provided'})
+    if not coordinates:
+        return jsonify({
+            'success': False,
+            'error': 'No area coordinates provided'
+        })
     
-    return jsonify({'success': True, 'message': 'Area saved successfully'})
+    try:
+        start_year = int(data.get('start_year', datetime.now().year - 2))
+        end_year = int(data.get('end_year', datetime.now().year))
+        scale = int(data.get('scale', 30))
+    except (TypeError, ValueError):
+        return jsonify({
+            'success': False,
+            'error': 'start_year, end_year and scale must be whole numbers'
+        })
+    
+    if end_year < start_year or end_year - start_year + 1 > MAX_MONTHLY_PROFILE_YEARS:
+        return jsonify({
+            'success': False,
+            'error': f"The year range must cover 1 to {MAX_MONTHLY_PROFILE_YEARS} years"
+        })
+    
+    try:
+        profile = get_monthly_ndvi_profile(coordinates, start_year, end_year, scale)
+        return jsonify({
+            'success': True,
+            'profile': profile
+        })
+    except ee.EEException as e:
+        logger.error("Earth Engine error: %s", e)
+        return jsonify({
+            'success': False,
+            'error': f"Earth Engine error: {str(e)}"
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        })
+
+@app.route('/cached_stats', methods=['POST'])
+def cached_stats():
+    """Compute statistics for an area from the local raster cache.
+    
+    Pixels are fetched from Earth Engine only the first time a dataset is
+    requested for an area; later requests for the same or any enclosed polygon
+    (e.g. a different NDVI threshold or a sub-area) are answered locally.
+    """
+    data = request.get_json()
+    coordinates = data.get('coordinates')
+    dataset = data.get('dataset', 'ndvi')
+    
+    if not coordinates:
+        return jsonify({
+            'success': False,
+            'error': 'No area coordinates provided'
+        })
+    
+    if dataset not in RASTER_DATASETS:
+        return jsonify({
+            'success': False,
+            'error': f"Unknown dataset '{dataset}'. Expected one of: {', '.join(RASTER_DATASETS)}"
+        })
+    
+    try:
+        params = raster_params(dataset, data)
+        sidecar, cache_hit = get_cached_raster(dataset, params, coordinates)
+        values, areas = raster_cache.read_polygon(sidecar, coordinates)
+        
+        if dataset == 'ndvi':
+            ranges = parse_ndvi_bins(data.get('bin_edges'), data.get('bin_labels'))
+            statistics = ndvi_statistics(values, areas, ranges)
+            threshold = data.get('threshold')
+            if threshold is not None:
+                statistics['threshold_stats'] = threshold_statistics(values, areas, float(threshold))
+        else:
+            statistics = class_area_statistics(values, areas, RASTER_DATASETS[dataset]['classes'])
+        
+        return jsonify({
+            'success': True,
+            'cache_hit': cache_hit,
+            'raster_key': sidecar['key'],
+            'tile_url': tile_url(sidecar['key'], raster_cache.save_clip(coordinates)),
+            'statistics': statistics
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        })
+
+@app.route('/cached_raster', methods=['POST'])
+def cached_raster():
+    """Look up a cached raster covering an area without fetching anything.
+    
+    The map uses this to show local /raster_tiles, clipped to the area like the
+    Earth Engine tiles, when the raster has already been cached by /cached_stats.
+    """
+    data = request.get_json()
+    coordinates = data.get('coordinates')
+    dataset = data.get('dataset')
+    
+    if not coordinates or dataset not in RASTER_DATASETS:
+        return jsonify({
+            'success': False,
+            'error': 'Area coordinates and a cached dataset are required'
+        })
+    
+    try:
+        sidecar = raster_cache.find(dataset, raster_params(dataset, data), coordinates_bbox(coordinates))
+        if sidecar is None:
+            return jsonify({'success': True, 'cached': False})
+        
+        return jsonify({
+            'success': True,
+            'cached': True,
+            'raster_key': sidecar['key'],
+            'tile_url': tile_url(sidecar['key'], raster_cache.save_clip(coordinates))
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        })
 
 @app.route('/camsur.geojson')
 def serve_camsur_geojson():
@@ -1218,6 +1961,22 @@ def serve_waterways_geojson():
     """Serve the Waterways GeoJSON file."""
     return send_file('waterways.geojson')
 
+@app.route('/vt/waterways/<int:z>/<int:x>/<int:y>.pbf')
+def serve_waterways_tile(z, x, y):
+    """Serve a Mapbox Vector Tile of the waterways layer."""
+    if z > VECTOR_TILE_MAX_ZOOM or x >= 2 ** z or y >= 2 ** z:
+        return jsonify({'success': False, 'error': 'Tile out of range'}), 404
+    
+    try:
+        tile = waterways_tiles.get_tile(z, x, y)
+    except FileNotFoundError:
+        return jsonify({'success': False, 'error': 'Waterways data not available'}), 404
+    
+    response = make_response(tile)
+    response.headers['Content-Type'] = 'application/vnd.mapbox-vector-tile'
+    response.headers['Cache-Control'] = 'public, max-age=86400'
+    return response
+
 @app.route('/clip_waterways', methods=['POST'])
 def clip_waterways():
     """Clip waterways to the selected area."""
@@ -1226,6 +1985,9 @@ def clip_waterways():
         return jsonify({'success': False, 'error': 'No coordinates provided'})
     
     try:
+        precision = int(data.get('precision', DEFAULT_COORDINATE_PRECISION))
+        keep_properties = data.get('properties')
+        
         # Create a GeoDataFrame from the selected area
         area_polygon = {
             'type': 'Polygon',
@@ -1233,14 +1995,15 @@ def clip_waterways():
         }
         area_gdf = gpd.GeoDataFrame(geometry=[shape(area_polygon)], crs="EPSG:4326")
         
-        # Read the waterways GeoJSON
-        waterways_gdf = gpd.read_file('waterways.geojson')
+        # Read only the waterways near the selected area
+        waterways_gdf = load_waterways(area_gdf.total_bounds)
         
         # Clip waterways to the selected area
         clipped_waterways = gpd.clip(waterways_gdf, area_gdf)
         
-        # Convert back to GeoJSON
+        # Convert back to GeoJSON, dropping empty properties and excess coordinate precision
         clipped_geojson = json.loads(clipped_waterways.to_json())
+        clipped_geojson = round_geojson(drop_redundant_properties(clipped_geojson, keep_properties), precision)
         
         return jsonify({
             'success': True, 
@@ -1249,5 +2012,12 @@ def clip_waterways():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
+# Analyses available through /progressive/<analysis>, with their native scale in metres
+register_analysis('ndvi', 'get_ndvi', 30, run_ndvi_analysis)
+register_analysis('worldcover', 'get_worldcover', 10,
+                  lambda data, scale: {'worldcover_data': get_esa_worldcover(data['coordinates'], scale)})
+register_analysis('dynamic_world', 'get_dynamic_world_route', 10,
+                  lambda data, scale: {'dynamicworld_data': get_dynamic_world(data['coordinates'], scale)})
+
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000) 
\ No newline at end of file
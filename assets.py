@@ -0,0 +1,123 @@
+"""Fingerprinted, precompressed static assets for the web UI.
+
+The CSS and JavaScript behind templates/index.html live under static/. At
+startup build_assets() copies each file to static/dist/ with a content hash in
+its name and writes gzip (and, when the brotli package is installed, brotli)
+variants next to it. Hashed names never change content, so they are served
+with a one-year immutable Cache-Control header and only the small HTML shell
+is revalidated on repeat visits.
+"""
+import gzip
+import hashlib
+import json
+import os
+
+from flask import abort, request, send_from_directory
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+MANIFEST_PATH = os.path.join(DIST_DIR, 'manifest.json')
+
+# Source files (relative to static/) that get fingerprinted
+ASSET_SOURCES = [
+    'css/app.css',
+    'js/app.js',
+    'js/forecast.js',
+    'js/tour.js'
+]
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Precompressed variants in order of preference: (encoding, file suffix)
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+MIMETYPES = {
+    '.css': 'text/css',
+    '.js': 'application/javascript'
+}
+
+
+def _write_if_missing(path, content):
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+
+def build_assets():
+    """Write hashed and precompressed copies of every asset and return the manifest.
+    
+    The manifest maps each source path to its hashed path under static/dist/.
+    Files that already exist are left alone, so this is cheap to run at startup.
+    """
+    manifest = {}
+    for source in ASSET_SOURCES:
+        with open(os.path.join(STATIC_DIR, source), 'rb') as f:
+            content = f.read()
+
+        digest = hashlib.sha256(content).hexdigest()[:12]
+        root, ext = os.path.splitext(source)
+        hashed = f"{root}.{digest}{ext}"
+        target = os.path.join(DIST_DIR, hashed)
+
+        _write_if_missing(target, content)
+        # mtime=0 keeps the gzip output identical between builds
+        _write_if_missing(target + '.gz', gzip.compress(content, compresslevel=9, mtime=0))
+        if brotli is not None:
+            _write_if_missing(target + '.br', brotli.compress(content, quality=11))
+
+        manifest[source] = hashed
+
+    os.makedirs(DIST_DIR, exist_ok=True)
+    with open(MANIFEST_PATH, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def init_assets(app):
+    """Build the asset manifest and register the asset_url() helper and /assets/ route."""
+    manifest = build_assets()
+    hashed_files = set(manifest.values())
+
+    @app.template_global()
+    def asset_url(source):
+        """Return the fingerprinted URL of a file under static/."""
+        return '/assets/' + manifest[source]
+
+    @app.route('/assets/<path:filename>')
+    def serve_asset(filename):
+        """Serve a fingerprinted asset, preferring a precompressed variant."""
+        if filename not in hashed_files:
+            abort(404)
+
+        encoding = None
+        served = filename
+        for candidate, suffix in ENCODINGS:
+            if request.accept_encodings[candidate] and os.path.exists(os.path.join(DIST_DIR, filename + suffix)):
+                encoding = candidate
+                served = filename + suffix
+                break
+
+        response = send_from_directory(
+            DIST_DIR, served,
+            mimetype=MIMETYPES.get(os.path.splitext(filename)[1], 'application/octet-stream')
+        )
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+        return response
+
+    return manifest
+
+
+if __name__ == '__main__':
+    for source, hashed in build_assets().items():
+        print(f"{source} -> dist/{hashed}")
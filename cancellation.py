@@ -0,0 +1,162 @@
+"""Cooperative cancellation of long-running analysis requests.
+
+Every request gets a cancellation token keyed by its X-Request-ID header (or a
+generated id). A token is tripped when:
+
+- the client sends `DELETE /requests/<id>`,
+- a newer request from the same client session (X-Client-Session) hits the
+  same endpoint, or
+- the client's connection is found closed.
+
+Tokens are checked before every Earth Engine round trip through an ee_calls
+interceptor, and explicitly between years in the per-year loops, so superseded
+work stops at the next EE call instead of running to completion.
+"""
+import contextvars
+import socket
+import ssl
+import threading
+import uuid
+
+from flask import g, jsonify, request
+
+import ee_calls
+
+
+class CancelledError(Exception):
+    """Raised inside a request whose cancellation token has been tripped."""
+
+
+class CancellationToken:
+    """Cancellation state for one request."""
+
+    def __init__(self, request_id, supersede_key=None, disconnected=None):
+        self.request_id = request_id
+        self.supersede_key = supersede_key
+        self.reason = None
+        self._event = threading.Event()
+        self._disconnected = disconnected
+
+    def cancel(self, reason='cancelled'):
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    @property
+    def cancelled(self):
+        if not self._event.is_set() and self._disconnected is not None and self._disconnected():
+            self.cancel('client disconnected')
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        if self.cancelled:
+            raise CancelledError(f"Request {self.request_id} cancelled: {self.reason}")
+
+
+_tokens = {}
+_latest = {}
+_lock = threading.Lock()
+_current = contextvars.ContextVar('cancellation_token', default=None)
+
+
+def register(request_id, supersede_key=None, disconnected=None):
+    """Create and activate a token, cancelling any older request with the same supersede key."""
+    token = CancellationToken(request_id, supersede_key, disconnected)
+    with _lock:
+        if supersede_key is not None:
+            previous = _latest.get(supersede_key)
+            if previous is not None and previous is not token:
+                previous.cancel('superseded')
+            _latest[supersede_key] = token
+        _tokens[request_id] = token
+    _current.set(token)
+    return token
+
+
+def release(token):
+    """Forget a finished request's token."""
+    with _lock:
+        if _tokens.get(token.request_id) is token:
+            del _tokens[token.request_id]
+        if token.supersede_key is not None and _latest.get(token.supersede_key) is token:
+            del _latest[token.supersede_key]
+    if _current.get() is token:
+        _current.set(None)
+
+
+def cancel(request_id, reason='cancelled by client'):
+    """Trip the token of a running request. Returns False if it is unknown or already finished."""
+    with _lock:
+        token = _tokens.get(request_id)
+    if token is None:
+        return False
+    token.cancel(reason)
+    return True
+
+
+def current_token():
+    return _current.get()
+
+
+def check_cancelled():
+    """Raise CancelledError if the current request has been cancelled."""
+    token = _current.get()
+    if token is not None:
+        token.raise_if_cancelled()
+
+
+def _cancellation_interceptor(name, call, *args, **kwargs):
+    check_cancelled()
+    return call(*args, **kwargs)
+
+
+def client_disconnected(environ):
+    """Best-effort check whether the client closed its connection.
+
+    Peeks at the request socket exposed by the werkzeug and gunicorn servers. A
+    readable socket with no data means the peer hung up. Servers that do not
+    expose the socket, and TLS sockets, which cannot be peeked at, are reported
+    as connected.
+    """
+    sock = environ.get('werkzeug.socket') or environ.get('gunicorn.socket')
+    if sock is None or isinstance(sock, ssl.SSLSocket):
+        return False
+    try:
+        return sock.recv(1, socket.MSG_PEEK | socket.MSG_DONTWAIT) == b''
+    except (BlockingIOError, InterruptedError, ValueError):
+        return False
+    except OSError:
+        return True
+
+
+def init_cancellation(app):
+    """Register request tokens, the EE interceptor and `DELETE /requests/<id>`."""
+    ee_calls.add_interceptor(_cancellation_interceptor)
+
+    @app.before_request
+    def register_request_token():
+        request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+        session = request.headers.get('X-Client-Session')
+        supersede_key = f"{session}:{request.endpoint}" if session else None
+        environ = request.environ
+        g.cancellation_token = register(request_id, supersede_key, lambda: client_disconnected(environ))
+
+    @app.after_request
+    def add_request_id_header(response):
+        token = g.get('cancellation_token')
+        if token is not None:
+            response.headers['X-Request-ID'] = token.request_id
+        return response
+
+    @app.teardown_request
+    def release_request_token(exc=None):
+        token = g.pop('cancellation_token', None)
+        if token is not None:
+            release(token)
+
+    @app.route('/requests/<request_id>', methods=['DELETE'])
+    def cancel_request(request_id):
+        """Cancel a running request by its X-Request-ID."""
+        if cancel(request_id):
+            return jsonify({'success': True, 'request_id': request_id})
+        return jsonify({'success': False, 'error': 'Request not found or already finished'}), 404
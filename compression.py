@@ -0,0 +1,120 @@
+"""Response compression and GeoJSON size reduction.
+
+init_compression() registers an after_request hook that gzip- or
+brotli-compresses JSON and text responses above a size threshold, based on the
+client's Accept-Encoding. round_geojson() and drop_redundant_properties() shrink
+GeoJSON payloads before they are serialized.
+"""
+import gzip
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Responses smaller than this are sent uncompressed
+MIN_COMPRESS_SIZE = 1024
+
+# 6 decimal places of a degree is roughly 10 cm on the ground
+DEFAULT_COORDINATE_PRECISION = 6
+
+COMPRESSIBLE_MIMETYPES = {
+    'application/json',
+    'application/geo+json',
+    'application/javascript',
+    'application/vnd.mapbox-vector-tile',
+    'text/html',
+    'text/css',
+    'text/plain'
+}
+
+
+def choose_encoding(accept_encodings):
+    """Pick the best supported encoding the client accepts, or None."""
+    if brotli is not None and accept_encodings['br']:
+        return 'br'
+    if accept_encodings['gzip']:
+        return 'gzip'
+    return None
+
+
+def compress(data, encoding):
+    if encoding == 'br':
+        # Quality 5 keeps compression fast enough for per-request use
+        return brotli.compress(data, quality=5)
+    return gzip.compress(data, compresslevel=6)
+
+
+def init_compression(app, min_size=MIN_COMPRESS_SIZE):
+    """Compress eligible responses according to the request's Accept-Encoding."""
+    from flask import request
+
+    @app.after_request
+    def compress_response(response):
+        if (
+            response.direct_passthrough
+            or response.is_streamed
+            or response.status_code < 200
+            or response.status_code >= 300
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES
+        ):
+            return response
+
+        data = response.get_data()
+        if len(data) < min_size:
+            return response
+
+        encoding = choose_encoding(request.accept_encodings)
+        response.vary.add('Accept-Encoding')
+        if encoding is None:
+            return response
+
+        response.set_data(compress(data, encoding))
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+    return app
+
+
+def round_coordinates(coordinates, precision):
+    """Round a (possibly nested) GeoJSON coordinate array."""
+    if coordinates and isinstance(coordinates[0], (int, float)):
+        return [round(value, precision) for value in coordinates]
+    return [round_coordinates(part, precision) for part in coordinates]
+
+
+def round_geojson(geojson, precision=DEFAULT_COORDINATE_PRECISION):
+    """Return a copy of a GeoJSON object with every coordinate rounded to `precision` decimals."""
+    if isinstance(geojson, list):
+        return [round_geojson(item, precision) for item in geojson]
+    if not isinstance(geojson, dict):
+        return geojson
+
+    rounded = {}
+    for key, value in geojson.items():
+        if key == 'coordinates':
+            rounded[key] = round_coordinates(value, precision)
+        elif key == 'bbox':
+            rounded[key] = [round(v, precision) for v in value]
+        elif key in ('geometry', 'geometries', 'features'):
+            rounded[key] = round_geojson(value, precision)
+        else:
+            rounded[key] = value
+    return rounded
+
+
+def drop_redundant_properties(feature_collection, keep=None):
+    """Strip empty properties (and, with `keep`, everything not listed) from each feature in place.
+
+    Also drops per-feature bboxes, which clients can compute from the geometry.
+    """
+    for feature in feature_collection.get('features', []):
+        feature.pop('bbox', None)
+        properties = feature.get('properties') or {}
+        feature['properties'] = {
+            name: value for name, value in properties.items()
+            if value not in (None, '') and (keep is None or name in keep)
+        }
+    feature_collection.pop('bbox', None)
+    return feature_collection
@@ -0,0 +1,97 @@
+"""Interceptors around Earth Engine round trips.
+
+`getInfo()` and `getMapId()` both end in a call to `ee.data.computeValue` or
+`ee.data.getMapId`. `install()` wraps those functions once, and interceptors
+added with `add_interceptor()` run around every call in the order they were
+added. An interceptor is a callable `(name, call, *args, **kwargs)` that
+returns `call(*args, **kwargs)` or raises; a caching interceptor (ee_memo.py)
+may return a stored result without calling further down. `set_backend()` replaces the function
+at the bottom of the chain, e.g. with the synthetic backend in ee_stub.py.
+"""
+import functools
+import hashlib
+import json
+import threading
+
+import ee
+from ee import serializer
+
+# ee.data functions that make a round trip to Earth Engine
+INTERCEPTED_CALLS = ('computeValue', 'getMapId')
+
+_interceptors = []
+_originals = {}
+_lock = threading.Lock()
+
+
+def _chain(name, original):
+    @functools.wraps(original)
+    def call(*args, **kwargs):
+        interceptors = list(_interceptors)
+        backend = _originals[name]
+
+        def invoke(index, *call_args, **call_kwargs):
+            if index == len(interceptors):
+                return backend(*call_args, **call_kwargs)
+            return interceptors[index](name, functools.partial(invoke, index + 1), *call_args, **call_kwargs)
+
+        return invoke(0, *args, **kwargs)
+    return call
+
+
+def install(names=INTERCEPTED_CALLS):
+    """Wrap the given ee.data functions so interceptors see every call. Safe to call repeatedly."""
+    with _lock:
+        for name in names:
+            if name not in _originals:
+                _originals[name] = getattr(ee.data, name)
+                setattr(ee.data, name, _chain(name, _originals[name]))
+
+
+def set_backend(name, backend):
+    """Replace the function that actually performs an intercepted call."""
+    install((name,))
+    with _lock:
+        _originals[name] = backend
+
+
+def get_backend(name):
+    """Return the function that currently performs an intercepted call."""
+    install((name,))
+    return _originals[name]
+
+
+def _canonical(value):
+    if isinstance(value, ee.ComputedObject):
+        return serializer.encode(value, for_cloud_api=True)
+    if isinstance(value, dict):
+        return {key: _canonical(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(item) for item in value]
+    return value
+
+
+def expression_key(name, *args, **kwargs):
+    """A stable hash of a call and its serialized expression graph."""
+    encoded = json.dumps([name, _canonical(list(args)), _canonical(kwargs)], sort_keys=True, default=str)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+def map_id_to_json(map_id):
+    """The JSON-serializable parts of a getMapId result."""
+    return {'mapid': map_id['mapid'], 'token': map_id.get('token', ''),
+            'url_format': map_id['tile_fetcher'].url_format}
+
+
+def map_id_from_json(data):
+    """Rebuild a getMapId result saved with map_id_to_json()."""
+    return {'mapid': data['mapid'], 'token': data['token'],
+            'tile_fetcher': ee.data.TileFetcher(data['url_format'], map_name=data['mapid'])}
+
+
+def add_interceptor(interceptor):
+    """Add an interceptor; the first one added is the outermost."""
+    with _lock:
+        if interceptor not in _interceptors:
+            _interceptors.append(interceptor)
+    install()
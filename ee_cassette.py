@@ -0,0 +1,146 @@
+"""Record and replay Earth Engine calls.
+
+EE_BACKEND=record authenticates normally and appends every `computeValue`
+(getInfo) and `getMapId` result to the cassette file, along with how long the
+call took. Each result is keyed by a hash of its serialized expression graph.
+The algorithm list fetched by ee.Initialize() is recorded too.
+
+EE_BACKEND=replay needs no credentials or network. Calls are answered from the
+cassette after sleeping for the recorded latency times EE_CASSETTE_LATENCY_SCALE
+(0 disables sleeping). An expression recorded several times replays its
+results and latencies in recorded order, then starts over. Recorded
+EEExceptions are raised again. An expression that is not in the cassette
+raises an EEException.
+
+    EE_CASSETTE                  cassette file (default ee_cassette.jsonl)
+    EE_CASSETTE_LATENCY_SCALE    latency multiplier when replaying (default 1)
+
+Replayed map ids keep their recorded tile URLs, so map tiles still come from
+Earth Engine while the tokens are valid.
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+import ee
+
+import ee_calls
+
+CASSETTE_PATH = os.environ.get('EE_CASSETTE', 'ee_cassette.jsonl')
+LATENCY_SCALE = float(os.environ.get('EE_CASSETTE_LATENCY_SCALE', '1'))
+
+logger = logging.getLogger(__name__)
+
+
+def _encode_result(name, result):
+    return ee_calls.map_id_to_json(result) if name == 'getMapId' else result
+
+
+def _decode_result(name, result):
+    return ee_calls.map_id_from_json(result) if name == 'getMapId' else result
+
+
+class CassetteRecorder:
+    """Appends the result of every call to a JSONL cassette."""
+
+    def __init__(self, path=CASSETTE_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def write(self, entry):
+        line = json.dumps(entry, default=str) + '\n'
+        with self.lock, open(self.path, 'a') as f:
+            f.write(line)
+
+    def wrap(self, name, backend):
+        def record(*args, **kwargs):
+            key = ee_calls.expression_key(name, *args, **kwargs)
+            entry = {'call': name, 'key': key, 'recorded_at': time.time()}
+            start = time.perf_counter()
+            try:
+                result = backend(*args, **kwargs)
+            except ee.EEException as e:
+                entry.update(error=str(e), latency_ms=round((time.perf_counter() - start) * 1000, 2))
+                self.write(entry)
+                raise
+            entry.update(result=_encode_result(name, result),
+                         latency_ms=round((time.perf_counter() - start) * 1000, 2))
+            self.write(entry)
+            return result
+        return record
+
+
+class CassettePlayer:
+    """Serves recorded calls offline."""
+
+    def __init__(self, path=CASSETTE_PATH, latency_scale=LATENCY_SCALE):
+        self.latency_scale = latency_scale
+        self.entries = {}
+        self.positions = {}
+        self.algorithms = None
+        self.lock = threading.Lock()
+        with open(path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                if entry['call'] == 'getAlgorithms':
+                    self.algorithms = entry['result']
+                else:
+                    self.entries.setdefault(entry['key'], []).append(entry)
+        logger.info("Loaded %d recorded expressions from %s", len(self.entries), path)
+
+    def _next_entry(self, key):
+        with self.lock:
+            entries = self.entries.get(key)
+            if not entries:
+                return None
+            position = self.positions.get(key, 0)
+            self.positions[key] = (position + 1) % len(entries)
+            return entries[position]
+
+    def play(self, name):
+        def replay(*args, **kwargs):
+            entry = self._next_entry(ee_calls.expression_key(name, *args, **kwargs))
+            if entry is None:
+                raise ee.EEException(f"{name} call not found in the cassette; record it with EE_BACKEND=record")
+            if self.latency_scale > 0:
+                time.sleep(entry['latency_ms'] * self.latency_scale / 1000)
+            if 'error' in entry:
+                raise ee.EEException(entry['error'])
+            return _decode_result(name, entry['result'])
+        return replay
+
+
+def install_recorder(path=CASSETTE_PATH):
+    """Record calls to `path`; call before ee.Initialize() so the algorithm list is recorded."""
+    recorder = CassetteRecorder(path)
+    get_algorithms = ee.data.getAlgorithms
+
+    def record_algorithms():
+        algorithms = get_algorithms()
+        recorder.write({'call': 'getAlgorithms', 'key': None, 'recorded_at': time.time(), 'result': algorithms})
+        return algorithms
+
+    ee.data.getAlgorithms = record_algorithms
+    for name in ee_calls.INTERCEPTED_CALLS:
+        ee_calls.set_backend(name, recorder.wrap(name, ee_calls.get_backend(name)))
+    return recorder
+
+
+def install_player(path=CASSETTE_PATH):
+    """Initialize the ee library offline, answering calls from the cassette at `path`."""
+    player = CassettePlayer(path)
+    if player.algorithms is not None:
+        ee.data.getAlgorithms = lambda: player.algorithms
+    else:
+        from ee_stub import load_algorithms
+        ee.data.getAlgorithms = load_algorithms
+    # Initialization would otherwise download the API discovery document
+    ee.data._install_cloud_api_resource = lambda: None
+    for name in ee_calls.INTERCEPTED_CALLS:
+        ee_calls.set_backend(name, player.play(name))
+    ee.Initialize(None)
+    return player
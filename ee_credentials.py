@@ -0,0 +1,219 @@
+"""Background OAuth token refresh for the Earth Engine service account.
+
+Service account credentials fetch a new access token lazily, inside whichever
+EE call first finds the token expired, so one user request every hour pays the
+round trip to the token endpoint and fails if that endpoint is slow or down.
+ManagedCredentials wraps the credentials, fetches the first token at startup
+and refreshes it from a background thread EE_TOKEN_REFRESH_MARGIN seconds
+(default 600) before it expires. A failed refresh is retried with backoff
+while the current token is still valid. Request threads only read the shared
+token. They refresh it themselves, one thread at a time, only when it has
+actually expired or the API answers 401.
+
+`GET /ee-credentials` reports the token's age and remaining lifetime, refresh
+latency, failures, and how many refreshes happened on a request path (normally
+zero). verify_service_account.py runs the same refresh and prints these.
+"""
+import datetime
+import logging
+import os
+import threading
+import time
+
+import google.auth.credentials
+import google_auth_httplib2
+import httplib2
+from flask import jsonify
+
+EE_TOKEN_REFRESH_MARGIN = float(os.environ.get('EE_TOKEN_REFRESH_MARGIN', '600'))
+
+# Timeout of a token request made by the background thread
+REFRESH_TIMEOUT_SECONDS = 30
+# Backoff between failed background refreshes
+RETRY_MIN_SECONDS = 5
+RETRY_MAX_SECONDS = 120
+# Request threads treat the token as expired this long before its expiry, to allow for clock skew
+EXPIRY_SKEW_SECONDS = 10
+
+logger = logging.getLogger(__name__)
+
+
+def _utcnow():
+    # google-auth keeps expiry as a naive UTC datetime
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+class ManagedCredentials(google.auth.credentials.Credentials):
+    """Credentials whose token is kept fresh by a background thread and shared by all threads."""
+
+    def __init__(self, credentials, margin=EE_TOKEN_REFRESH_MARGIN):
+        super().__init__()
+        self._credentials = credentials
+        self.margin = margin
+        self._refresh_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+        self.refreshed_at = None
+        self.next_refresh_at = None
+        self.refreshes = 0
+        self.background_refreshes = 0
+        self.inline_refreshes = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.refresh_seconds = 0.0
+        self.last_refresh_seconds = None
+        self.max_refresh_seconds = 0.0
+        self.last_error = None
+
+    @property
+    def expired(self):
+        # google-auth's default threshold (3m45s) would pull refreshes onto request paths for short-lived tokens
+        return self.expiry is not None and _utcnow() >= self.expiry - datetime.timedelta(seconds=EXPIRY_SKEW_SECONDS)
+
+    @property
+    def quota_project_id(self):
+        return getattr(self._credentials, 'quota_project_id', None)
+
+    def _refresh(self, request, background, seen_token):
+        with self._refresh_lock:
+            if not background and self.token != seen_token and self.valid:
+                # Another thread refreshed while we waited for the lock
+                return
+            started = time.perf_counter()
+            try:
+                self._credentials.refresh(request)
+            except Exception as e:
+                self.failures += 1
+                self.consecutive_failures += 1
+                self.last_error = str(e)
+                raise
+            seconds = time.perf_counter() - started
+            # Publish the expiry first: a reader seeing the new token must not see the old expiry
+            self.expiry = self._credentials.expiry
+            self.token = self._credentials.token
+            self.refreshed_at = time.time()
+            self.refreshes += 1
+            self.consecutive_failures = 0
+            self.last_error = None
+            self.refresh_seconds += seconds
+            self.last_refresh_seconds = seconds
+            self.max_refresh_seconds = max(self.max_refresh_seconds, seconds)
+            if background:
+                self.background_refreshes += 1
+            else:
+                self.inline_refreshes += 1
+                logger.warning("Access token refreshed on a request path in %.0f ms", seconds * 1000)
+
+    def refresh(self, request):
+        # Called on a request path: after a 401, or when the background refresh fell behind
+        self._refresh(request, background=False, seen_token=self.token)
+
+    def before_request(self, request, method, url, headers):
+        token = self.token
+        if not self.valid:
+            self._refresh(request, background=False, seen_token=token)
+        self.apply(headers)
+
+    def apply(self, headers, token=None):
+        headers['authorization'] = f"Bearer {token or self.token}"
+        if self.quota_project_id:
+            headers['x-goog-user-project'] = self.quota_project_id
+
+    def _seconds_until_refresh(self):
+        if self.expiry is None:
+            return None
+        remaining = (self.expiry - _utcnow()).total_seconds()
+        # Tokens shorter-lived than the margin are refreshed half way through
+        return max(RETRY_MIN_SECONDS, min(remaining - self.margin, remaining / 2))
+
+    def _run(self):
+        request = google_auth_httplib2.Request(httplib2.Http(timeout=REFRESH_TIMEOUT_SECONDS))
+        # No expiry means the token never expires
+        delay = self._seconds_until_refresh()
+        while delay is not None:
+            self.next_refresh_at = time.time() + delay
+            if self._stopped.wait(delay):
+                return
+            try:
+                self._refresh(request, background=True, seen_token=self.token)
+                delay = self._seconds_until_refresh()
+            except Exception as e:
+                delay = min(RETRY_MAX_SECONDS, RETRY_MIN_SECONDS * 2 ** (self.consecutive_failures - 1))
+                logger.warning("Background token refresh failed (attempt %d, retrying in %ds): %s",
+                               self.consecutive_failures, delay, e)
+
+    def _start_thread(self):
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name='ee-token-refresh', daemon=True)
+        self._thread.start()
+
+    def _after_fork_in_child(self):
+        # The parent's refresher thread may have held the lock when the process forked, and it
+        # does not exist in the child to release it; give the child its own lock and event
+        stopped = self._stopped.is_set()
+        self._refresh_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+        if not stopped:
+            self._start_thread()
+
+    def refresh_now(self):
+        """Fetch a new token now, off any request path."""
+        request = google_auth_httplib2.Request(httplib2.Http(timeout=REFRESH_TIMEOUT_SECONDS))
+        self._refresh(request, background=True, seen_token=self.token)
+
+    def start(self):
+        """Fetch the first token now and keep it fresh in a background thread."""
+        try:
+            self.refresh_now()
+        except Exception as e:
+            # The first EE call retries inline and reports the error to its request
+            logger.error("Could not fetch an access token at startup: %s", e)
+        self._start_thread()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+
+    def status(self):
+        now = time.time()
+        return {
+            'valid': self.valid,
+            'token_age_seconds': round(now - self.refreshed_at, 1) if self.refreshed_at else None,
+            'expires_in_seconds': round((self.expiry - _utcnow()).total_seconds(), 1) if self.expiry else None,
+            'next_refresh_in_seconds': round(self.next_refresh_at - now, 1) if self.next_refresh_at else None,
+            'refresh_margin_seconds': self.margin,
+            'refreshes': self.refreshes,
+            'background_refreshes': self.background_refreshes,
+            'inline_refreshes': self.inline_refreshes,
+            'failures': self.failures,
+            'consecutive_failures': self.consecutive_failures,
+            'last_error': self.last_error,
+            'last_refresh_ms': round(self.last_refresh_seconds * 1000, 1) if self.last_refresh_seconds else None,
+            'avg_refresh_ms': round(self.refresh_seconds / self.refreshes * 1000, 1) if self.refreshes else None,
+            'max_refresh_ms': round(self.max_refresh_seconds * 1000, 1),
+            'refresher_running': self._thread is not None and self._thread.is_alive()
+        }
+
+
+managed_credentials = None
+
+
+def manage_credentials(credentials):
+    """Wrap credentials in ManagedCredentials and start refreshing them; pass the result to ee.Initialize."""
+    global managed_credentials
+    managed_credentials = ManagedCredentials(credentials).start()
+    # A worker forked after this keeps the token but not the thread
+    os.register_at_fork(after_in_child=managed_credentials._after_fork_in_child)
+    return managed_credentials
+
+
+def init_ee_credentials(app):
+    """Register `GET /ee-credentials`."""
+
+    @app.route('/ee-credentials')
+    def ee_credentials_status():
+        """Show the age, lifetime and refresh history of the EE access token."""
+        if managed_credentials is None:
+            return jsonify({'success': True, 'managed': False})
+        return jsonify({'success': True, 'managed': True, **managed_credentials.status()})
@@ -0,0 +1,173 @@
+"""Memoization of Earth Engine getInfo() results by expression.
+
+Every `computeValue` call is keyed by a hash of its canonical serialized
+expression graph (ee_calls.expression_key). Identical expressions built by
+different routes or users, such as the same AOI area or the same annual
+composite statistics, are evaluated by Earth Engine only once:
+
+- Results are kept in an in-memory LRU for EE_MEMO_TTL seconds (default 3600),
+  up to EE_MEMO_MAX_BYTES of JSON in total (default 64 MB). Results larger than
+  EE_MEMO_MAX_ENTRY_BYTES (default 1 MB) are not kept.
+- While an expression is being evaluated, identical calls wait for that result
+  instead of starting their own.
+- Errors are never cached.
+
+Misses go to the cross-process cache in shared_cache.py (SQLite by default),
+so results computed by one gunicorn worker are reused by the others, and only
+one worker evaluates a given expression at a time. Map ids from `getMapId` are
+shared the same way for EE_MEMO_MAPID_TTL seconds (default 3600).
+
+EE_MEMO=0 disables both layers, e.g. to measure raw backend latency with
+loadtest.py. The hits made during a request are counted on its tracing span
+(`ee.memo_hits`).
+"""
+import collections
+import json
+import logging
+import os
+import threading
+import time
+
+import cancellation
+import ee_calls
+from shared_cache import open_shared_cache
+from telemetry import current_span
+
+MEMO_ENABLED = os.environ.get('EE_MEMO', '1') != '0'
+MEMO_TTL = float(os.environ.get('EE_MEMO_TTL', '3600'))
+MEMO_MAX_BYTES = int(os.environ.get('EE_MEMO_MAX_BYTES', str(64 * 1024 * 1024)))
+MEMO_MAX_ENTRY_BYTES = int(os.environ.get('EE_MEMO_MAX_ENTRY_BYTES', str(1024 * 1024)))
+MEMO_MAPID_TTL = float(os.environ.get('EE_MEMO_MAPID_TTL', '3600'))
+
+# Shared cache keys are prefixed with the backend, so stub or replayed results never mix with real ones
+KEY_PREFIX = 'ee:{}:'.format(os.environ.get('EE_BACKEND') if os.environ.get('EE_BACKEND') in ('stub', 'replay') else 'live')
+
+# How often a call waiting for an identical in-flight call checks for cancellation
+WAIT_POLL_SECONDS = 0.25
+
+logger = logging.getLogger(__name__)
+
+
+class ExpressionCache:
+    """LRU with TTL and a byte budget, holding results as JSON text."""
+
+    def __init__(self, ttl=MEMO_TTL, max_bytes=MEMO_MAX_BYTES, max_entry_bytes=MEMO_MAX_ENTRY_BYTES):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self._entries = collections.OrderedDict()
+        self._in_flight = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires, encoded = entry
+        if expires < time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return encoded
+
+    def _remove(self, key):
+        _, encoded = self._entries.pop(key)
+        self._bytes -= len(encoded)
+
+    def _store(self, key, encoded):
+        if len(encoded) > self.max_entry_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (time.monotonic() + self.ttl, encoded)
+        self._bytes += len(encoded)
+        while self._bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def get_or_compute(self, key, compute):
+        """Return the cached result for key, computing it at most once at a time."""
+        while True:
+            with self._lock:
+                encoded = self._lookup(key)
+                if encoded is not None:
+                    self.hits += 1
+                    break
+                done = self._in_flight.get(key)
+                if done is None:
+                    done = self._in_flight[key] = threading.Event()
+                    self.misses += 1
+                    leader = True
+                else:
+                    leader = False
+
+            if not leader:
+                # Wait for the identical call; if it failed, compute it ourselves on the next pass
+                while not done.wait(WAIT_POLL_SECONDS):
+                    cancellation.check_cancelled()
+                continue
+
+            try:
+                result = compute()
+                with self._lock:
+                    self._store(key, json.dumps(result))
+                return result
+            finally:
+                with self._lock:
+                    self._in_flight.pop(key, None)
+                done.set()
+
+        span = current_span()
+        if span is not None:
+            span.set_attribute('ee.memo_hits', span.attributes.get('ee.memo_hits', 0) + 1)
+        # A fresh copy, so callers can modify their result
+        return json.loads(encoded)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+
+expression_cache = ExpressionCache()
+shared_cache = None
+
+
+def _compute_value(key, call):
+    if shared_cache is None:
+        return call()
+    return shared_cache.get_or_compute(KEY_PREFIX + key, call, MEMO_TTL)
+
+
+def _memo_interceptor(name, call, *args, **kwargs):
+    key = ee_calls.expression_key(name, *args, **kwargs)
+    if name == 'computeValue':
+        return expression_cache.get_or_compute(key, lambda: _compute_value(key, lambda: call(*args, **kwargs)))
+    if name == 'getMapId' and shared_cache is not None:
+        map_id = shared_cache.get_or_compute(
+            KEY_PREFIX + key, lambda: ee_calls.map_id_to_json(call(*args, **kwargs)), MEMO_MAPID_TTL
+        )
+        return ee_calls.map_id_from_json(map_id)
+    return call(*args, **kwargs)
+
+
+def install_memo():
+    """Memoize EE results in process and across workers; interceptors added afterwards only see misses."""
+    global shared_cache
+    if MEMO_ENABLED:
+        shared_cache = open_shared_cache()
+        ee_calls.add_interceptor(_memo_interceptor)
@@ -0,0 +1,540 @@
+"""Synthetic Earth Engine backend for load tests.
+
+With EE_BACKEND=stub, app.py calls `install_stub()` instead of authenticating.
+No service account or network access is needed:
+
+- The algorithm list that ee.Initialize() fetches comes from a local snapshot.
+  EE_ALGORITHMS_SNAPSHOT points to it; the default is the copy bundled with
+  the earthengine-api package.
+- `computeValue` (getInfo) and `getMapId` are replaced under the ee_calls
+  interceptors by synthetic responders. `computePixels` is replaced too on
+  clients that have it.
+
+The responders evaluate the serialized expression graph just far enough to
+know the band names, class values, region area and scale involved. They then
+return correctly shaped, deterministic results (histograms, statistics,
+counts), so every route runs its normal code path. Pixel requests
+(`Image.sampleRectangle`, computePixels) get random blocks of the requested
+size, with the class values of categorical bands. Latency and errors are
+injected to behave like the real service:
+
+    EE_STUB_LATENCY_MS         median computeValue latency (default 400)
+    EE_STUB_MAPID_LATENCY_MS   median getMapId latency (default 250)
+    EE_STUB_LATENCY_SIGMA      log-normal spread (default 0.4)
+    EE_STUB_MS_PER_MEGAPIXEL   extra latency per million pixels reduced (default 20)
+    EE_STUB_LATENCY_SCALE      multiplier for all latencies; 0 disables sleeping (default 1)
+    EE_STUB_CONCURRENCY        concurrent requests served; others queue (default 40)
+    EE_STUB_ERROR_RATE         fraction of calls failing with an EEException (default 0)
+"""
+import hashlib
+import json
+import math
+import os
+import random
+import threading
+import time
+
+import ee
+import numpy as np
+from ee import _cloud_api_utils, serializer
+
+import ee_calls
+
+EE_ALGORITHMS_SNAPSHOT = os.environ.get(
+    'EE_ALGORITHMS_SNAPSHOT',
+    os.path.join(os.path.dirname(ee.__file__), 'tests', 'algorithms.json')
+)
+
+LATENCY_MS = float(os.environ.get('EE_STUB_LATENCY_MS', '400'))
+MAPID_LATENCY_MS = float(os.environ.get('EE_STUB_MAPID_LATENCY_MS', '250'))
+LATENCY_SIGMA = float(os.environ.get('EE_STUB_LATENCY_SIGMA', '0.4'))
+MS_PER_MEGAPIXEL = float(os.environ.get('EE_STUB_MS_PER_MEGAPIXEL', '20'))
+LATENCY_SCALE = float(os.environ.get('EE_STUB_LATENCY_SCALE', '1'))
+CONCURRENCY = int(os.environ.get('EE_STUB_CONCURRENCY', '40'))
+ERROR_RATE = float(os.environ.get('EE_STUB_ERROR_RATE', '0'))
+
+TILE_URL = 'https://earthengine.invalid/v1alpha/{mapid}/tiles/{{z}}/{{x}}/{{y}}'
+
+# Band names and class values of the datasets the app reads
+DYNAMIC_WORLD_BANDS = [
+    'water', 'trees', 'grass', 'flooded_vegetation', 'crops',
+    'shrub_and_scrub', 'built', 'bare', 'snow_and_ice'
+]
+DATASET_BANDS = {
+    'MODIS/061/MCD12Q1': ['LC_Type1', 'LC_Type2', 'LC_Type3', 'LC_Type4', 'LC_Type5', 'QC'],
+    'ESA/WorldCover/v100': ['Map'],
+    'GOOGLE/DYNAMICWORLD/V1': DYNAMIC_WORLD_BANDS + ['label'],
+    'LANDSAT/LC08/C02/T1_TOA': [f"B{i}" for i in range(1, 12)] + ['QA_PIXEL'],
+    'COPERNICUS/S2_HARMONIZED': [f"B{i}" for i in range(1, 9)] + ['B8A', 'B9', 'B10', 'B11', 'B12', 'QA60'],
+}
+BAND_CLASSES = {
+    'LC_Type1': list(range(1, 18)),
+    'Map': [10, 20, 30, 40, 50, 60, 70, 80, 90, 95, 100],
+    'label': list(range(9)),
+}
+NDVI_BANDS = ('NDVI', 'nd')
+
+DEFAULT_PIXELS = 1_000_000
+DEFAULT_SCALE = 30
+
+# Pixel limit of a single sampleRectangle request, as enforced by EE
+SAMPLE_RECTANGLE_MAX_PIXELS = 262144
+# Side of sampled blocks whose region or pixel grid is unknown
+DEFAULT_SAMPLE_SIZE = 64
+
+
+class _Image:
+    """Band names of an image, with the class values of categorical bands."""
+
+    def __init__(self, bands, classes=None, constant=None, crs_transform=None):
+        self.bands = list(bands)
+        self.classes = dict(classes or {})
+        self.constant = constant
+        # Affine transform of the pixel grid set by reproject()
+        self.crs_transform = crs_transform
+
+    def renamed(self, names):
+        classes = {new: self.classes[old] for old, new in zip(self.bands, names) if old in self.classes}
+        return _Image(names, classes)
+
+    def selected(self, selectors):
+        bands = [b for b in selectors if b in self.bands] or list(selectors)
+        return _Image(bands, {b: self.classes[b] for b in bands if b in self.classes})
+
+
+class _Collection:
+    def __init__(self, image, max_size=None):
+        self.image = image
+        # Upper bound on the size of a limited collection, or the size of one built from images
+        self.max_size = max_size
+
+
+class _Geometry:
+    def __init__(self, area_m2, bounds=None):
+        self.area_m2 = area_m2
+        # (west, south, east, north)
+        self.bounds = bounds
+
+
+class _Reducer:
+    def __init__(self, outputs, kind, options=None):
+        self.outputs = outputs
+        self.kind = kind
+        self.options = options or {}
+
+
+def _ring_area_m2(ring):
+    """Approximate area of a lon/lat ring in m²."""
+    if len(ring) < 3:
+        return 0.0
+    mean_lat = math.radians(sum(p[1] for p in ring) / len(ring))
+    points = [(math.radians(p[0]) * math.cos(mean_lat) * 6371008.8, math.radians(p[1]) * 6371008.8) for p in ring]
+    return abs(sum(x1 * y2 - x2 * y1 for (x1, y1), (x2, y2) in zip(points, points[1:] + points[:1]))) / 2
+
+
+def _points(coordinates):
+    """Flatten GeoJSON-style coordinates (or a flat [west, south, east, north] box) to [x, y] points."""
+    if not coordinates:
+        return []
+    if isinstance(coordinates[0], (int, float)):
+        return [coordinates[i:i + 2] for i in range(0, len(coordinates) - 1, 2)]
+    return [point for part in coordinates for point in _points(part)]
+
+
+def _bounds(coordinates):
+    points = _points(coordinates)
+    if not points:
+        return None
+    return (min(p[0] for p in points), min(p[1] for p in points), max(p[0] for p in points), max(p[1] for p in points))
+
+
+def _polygon_area_m2(coordinates):
+    """Area of GeoJSON-style coordinates: a bbox, ring, polygon (outer ring) or list of polygons."""
+    if not coordinates:
+        return 0.0
+    if isinstance(coordinates[0], (int, float)):
+        west, south, east, north = coordinates[:4]
+        return _ring_area_m2([[west, south], [east, south], [east, north], [west, north]])
+    if isinstance(coordinates[0][0], (int, float)):
+        return _ring_area_m2(coordinates)
+    if isinstance(coordinates[0][0][0], (int, float)):
+        return _ring_area_m2(coordinates[0])
+    return sum(_polygon_area_m2(polygon) for polygon in coordinates)
+
+
+class _Evaluator:
+    """Walks a serialized expression graph and fabricates results of the right shape."""
+
+    def __init__(self, expression, rng):
+        self.values = expression['values']
+        self.result = expression['result']
+        self.rng = rng
+        self.pixels = 0
+        self._cache = {}
+
+    def run(self):
+        return self.node(self.values[self.result], {})
+
+    def ref(self, key, env):
+        if not env and key in self._cache:
+            return self._cache[key]
+        value = self.node(self.values[key], env)
+        if not env:
+            self._cache[key] = value
+        return value
+
+    def node(self, node, env):
+        if 'constantValue' in node:
+            return node['constantValue']
+        if 'valueReference' in node:
+            return self.ref(node['valueReference'], env)
+        if 'argumentReference' in node:
+            return env.get(node['argumentReference'])
+        if 'arrayValue' in node:
+            return [self.node(v, env) for v in node['arrayValue'].get('values', [])]
+        if 'dictionaryValue' in node:
+            return {k: self.node(v, env) for k, v in node['dictionaryValue'].get('values', {}).items()}
+        if 'functionDefinitionValue' in node:
+            return node['functionDefinitionValue']
+        if 'functionInvocationValue' in node:
+            invocation = node['functionInvocationValue']
+            name = invocation.get('functionName')
+            arguments = invocation.get('arguments', {})
+            if name == 'Collection.map':
+                return self.map_collection(arguments, env)
+            if name == 'List.map':
+                return self.map_list(arguments, env)
+            args = {k: self.node(v, env) for k, v in arguments.items()}
+            return self.invoke(name, args)
+        return None
+
+    def map_collection(self, arguments, env):
+        collection = self.node(arguments['collection'], env)
+        function = self.node(arguments['baseAlgorithm'], env)
+        if not isinstance(collection, _Collection) or not isinstance(function, dict):
+            return collection
+        names = function.get('argumentNames', [])
+        body_env = dict(env, **{names[0]: collection.image}) if names else env
+        mapped = self.ref(function['body'], body_env)
+        return _Collection(mapped, collection.max_size) if isinstance(mapped, _Image) else collection
+
+    def map_list(self, arguments, env):
+        items = self.node(arguments['list'], env)
+        function = self.node(arguments['baseAlgorithm'], env)
+        if not isinstance(items, list) or not isinstance(function, dict):
+            return items
+        names = function.get('argumentNames', [])
+        return [self.ref(function['body'], dict(env, **{names[0]: item}) if names else env) for item in items]
+
+    # --- Function handlers -------------------------------------------------
+
+    def invoke(self, name, args):
+        if name in ('ImageCollection.load', 'Image.load'):
+            asset = args.get('id')
+            bands = DATASET_BANDS.get(asset, ['b1'])
+            image = _Image(bands, {b: BAND_CLASSES[b] for b in bands if b in BAND_CLASSES})
+            return _Collection(image) if name.startswith('ImageCollection') else image
+
+        if name == 'Join.apply':
+            return args.get('primary')
+        if name == 'ImageCollection.fromImages':
+            images = args.get('images') or []
+            first = images[0] if images else None
+            return _Collection(first if isinstance(first, _Image) else _Image(['b1']), len(images))
+        if name == 'Collection.size':
+            collection = args.get('collection')
+            max_size = collection.max_size if isinstance(collection, _Collection) else None
+            return min(self.rng.randint(5, 40), max_size if max_size is not None else 40)
+        if name == 'Collection.limit':
+            # Also what sort() calls, without a limit
+            collection, limit = args.get('collection'), args.get('limit')
+            if isinstance(collection, _Collection) and limit is not None:
+                return _Collection(collection.image, min(limit, collection.max_size or limit))
+        if name == 'Collection.toList':
+            collection = args.get('collection')
+            if isinstance(collection, _Collection):
+                count = min(args.get('count') or 0, collection.max_size or args.get('count') or 0)
+                return [collection.image] * self.rng.randint(0, count)
+        if name in ('Collection.first', 'ImageCollection.mosaic', 'ImageCollection.qualityMosaic') or name.startswith('reduce.'):
+            collection = args.get('collection')
+            return collection.image if isinstance(collection, _Collection) else _Image(['b1'])
+        if name == 'ImageCollection.reduce':
+            collection, reducer = args.get('collection'), args.get('reducer')
+            if isinstance(collection, _Collection) and isinstance(reducer, _Reducer):
+                if len(reducer.outputs) == 1:
+                    return collection.image
+                return _Image([f"{b}_{o}" for b in collection.image.bands for o in reducer.outputs])
+            return _Image(['b1'])
+        if name.startswith('Collection.') or name.startswith('ImageCollection.'):
+            collection = args.get('collection') or args.get('collection1')
+            return collection if isinstance(collection, _Collection) else _Collection(_Image(['b1']))
+
+        if name.startswith('Reducer.'):
+            return self.reducer(name, args)
+        if name.startswith('GeometryConstructors.') or name == 'Geometry':
+            coordinates = args.get('coordinates') or []
+            return _Geometry(_polygon_area_m2(coordinates), _bounds(coordinates))
+        if name == 'Geometry.area':
+            geometry = args.get('geometry')
+            return geometry.area_m2 if isinstance(geometry, _Geometry) else 1e8
+        if name.startswith('Geometry.'):
+            return args.get('geometry')
+
+        if name == 'List.sequence':
+            start, end, step = args.get('start', 0), args.get('end'), args.get('step') or 1
+            count = int((end - start) / step) + 1 if end is not None else int(args.get('count') or 0)
+            return [start + i * step for i in range(max(0, count))]
+        if name == 'List.flatten':
+            items = args.get('list') or []
+            return [v for item in items for v in (item if isinstance(item, list) else [item])]
+        if name.startswith('Number.'):
+            return self.number(name, args)
+        if name in ('Element.get', 'Image.get', 'Dictionary.get', 'Feature.get'):
+            container = args.get('object', args.get('dictionary'))
+            key = args.get('property', args.get('key'))
+            if isinstance(container, dict) and key in container:
+                return container[key]
+            if key == 'system:time_start':
+                return int((time.time() - 30 * 86400) * 1000)
+            return self.rng.uniform(0, 1)
+
+        if name.startswith('Image.'):
+            return self.image(name, args)
+        return None
+
+    def reducer(self, name, args):
+        kind = name.split('.', 1)[1]
+        if kind == 'combine':
+            first, second = args.get('reducer1'), args.get('reducer2')
+            return _Reducer(first.outputs + second.outputs, 'combine')
+        if kind == 'minMax':
+            return _Reducer(['min', 'max'], kind)
+        if kind == 'percentile':
+            names = args.get('outputNames') or [f"p{int(p)}" for p in args.get('percentiles', [50])]
+            return _Reducer(names, kind)
+        if kind in ('frequencyHistogram', 'fixedHistogram', 'histogram'):
+            return _Reducer(['histogram'], kind, args)
+        return _Reducer([kind], kind)
+
+    def number(self, name, args):
+        left = args.get('left', args.get('input'))
+        right = args.get('right')
+        if not isinstance(left, (int, float)):
+            return self.rng.uniform(0, 1)
+        operation = name.split('.', 1)[1]
+        if isinstance(right, (int, float)):
+            if operation == 'divide':
+                return left / right if right else 0
+            if operation == 'multiply':
+                return left * right
+            if operation == 'add':
+                return left + right
+            if operation == 'subtract':
+                return left - right
+        return left
+
+    def image(self, name, args):
+        operation = name.split('.', 1)[1]
+        source = next((args[k] for k in ('input', 'image', 'image1', 'dstImg', 'value') if isinstance(args.get(k), _Image)), None)
+
+        if operation == 'constant':
+            value = args.get('value')
+            count = len(value) if isinstance(value, list) else 1
+            if count == 1:
+                return _Image(['constant'], constant=value)
+            return _Image([f"constant_{i}" for i in range(count)])
+        if operation == 'normalizedDifference':
+            return _Image(['nd'])
+        if operation == 'pixelArea':
+            return _Image(['area'])
+        if operation == 'reduceRegion':
+            return self.reduce_region(args)
+        if source is None:
+            return _Image(['b1'])
+        if operation == 'reproject':
+            return _Image(source.bands, source.classes, source.constant, args.get('crsTransform'))
+        if operation == 'sampleRectangle':
+            return self.sample_rectangle(source, args)
+        if operation == 'rename':
+            return source.renamed(args.get('names') or source.bands)
+        if operation == 'select':
+            selectors = args.get('bandSelectors') or source.bands
+            selected = source.selected(selectors)
+            return selected.renamed(args['newNames']) if args.get('newNames') else selected
+        if operation == 'arrayArgmax':
+            # Index of the largest element of the pixel arrays made by toArray from the source bands
+            return _Image(['array'], {'array': list(range(len(source.bands)))})
+        if operation == 'reduce':
+            reducer = args.get('reducer')
+            return _Image(reducer.outputs if isinstance(reducer, _Reducer) else ['b1'])
+        if operation == 'addBands':
+            other = args.get('srcImg')
+            if isinstance(other, _Image):
+                return _Image(source.bands + other.bands, {**source.classes, **other.classes})
+            return source
+        if operation in ('eq', 'neq', 'gt', 'gte', 'lt', 'lte', 'And', 'Or', 'not', 'mask'):
+            return _Image(source.bands, {b: [0, 1] for b in source.bands})
+        if operation in ('multiply', 'add') and source.classes:
+            other = args.get('image2')
+            if operation == 'add' and isinstance(other, _Image) and other.classes:
+                b1, b2 = source.bands[0], other.bands[0]
+                if b1 in source.classes and b2 in other.classes:
+                    packed = sorted({a + b for a in source.classes[b1] for b in other.classes[b2]})
+                    return _Image(source.bands, {b1: packed})
+            factor = other.constant if isinstance(other, _Image) else other
+            if isinstance(factor, (int, float)) and operation == 'multiply':
+                return _Image(source.bands, {b: [v * factor for v in c] for b, c in source.classes.items()})
+        return source
+
+    def reduce_region(self, args):
+        image, reducer = args.get('image'), args.get('reducer')
+        if not isinstance(image, _Image) or not isinstance(reducer, _Reducer):
+            return {}
+        geometry = args.get('geometry')
+        scale = args.get('scale') or DEFAULT_SCALE
+        pixels = int(geometry.area_m2 / (scale * scale)) if isinstance(geometry, _Geometry) else DEFAULT_PIXELS
+        pixels = max(pixels, 1)
+        self.pixels += pixels
+
+        result = {}
+        for band in image.bands:
+            for output in reducer.outputs:
+                key = band if len(reducer.outputs) == 1 else f"{band}_{output}"
+                result[key] = self.band_value(band, image.classes.get(band), output, reducer, pixels)
+        return result
+
+    def pixel_block(self, image, band, height, width):
+        """A height x width array of synthetic pixel values of one band."""
+        self.pixels += height * width
+        generator = np.random.default_rng(self.rng.getrandbits(64))
+        classes = image.classes.get(band)
+        if classes:
+            return generator.choice(classes, size=(height, width))
+        low, high = (-0.2, 0.9) if band in NDVI_BANDS else (0.0, 1.0)
+        return generator.uniform(low, high, size=(height, width))
+
+    def sample_rectangle(self, image, args):
+        """A feature whose band properties are 2-D pixel arrays of the region on the image's grid."""
+        region = args.get('region')
+        transform = image.crs_transform
+        if isinstance(region, _Geometry) and region.bounds and transform:
+            west, south, east, north = region.bounds
+            width = max(1, round((east - west) / abs(transform[0])))
+            height = max(1, round((north - south) / abs(transform[4])))
+        else:
+            width = height = DEFAULT_SAMPLE_SIZE
+        if width * height > SAMPLE_RECTANGLE_MAX_PIXELS:
+            raise ee.EEException(
+                f"Too many pixels in sample; must be <= {SAMPLE_RECTANGLE_MAX_PIXELS}. Got {width * height}."
+            )
+        return {band: self.pixel_block(image, band, height, width).tolist() for band in image.bands}
+
+    def band_value(self, band, classes, output, reducer, pixels):
+        rng = self.rng
+        if reducer.kind == 'fixedHistogram':
+            low = reducer.options.get('min', 0)
+            high = reducer.options.get('max', 1)
+            steps = int(reducer.options.get('steps', 10))
+            weights = [rng.random() for _ in range(steps)]
+            total = sum(weights) or 1
+            width = (high - low) / steps if steps else 0
+            return [[low + i * width, round(pixels * w / total, 4)] for i, w in enumerate(weights)]
+        if output == 'histogram':
+            values = classes or list(range(10))
+            chosen = rng.sample(values, k=min(len(values), rng.randint(3, 8)))
+            weights = [rng.random() for _ in chosen]
+            total = sum(weights)
+            return {str(v): round(pixels * w / total, 4) for v, w in zip(chosen, weights)}
+        if output == 'sum':
+            return round(pixels * rng.uniform(0.01, 0.3), 4)
+        if output == 'count':
+            return pixels
+
+        low, high = (-0.2, 0.9) if band in NDVI_BANDS else (0.0, 1.0)
+        if output == 'min':
+            return rng.uniform(low, low + 0.2)
+        if output == 'max':
+            return rng.uniform(high - 0.1, high)
+        if output.startswith('p') and output[1:].isdigit():
+            return low + (high - low) * (0.15 + 0.7 * int(output[1:]) / 100)
+        return rng.uniform(low + 0.3 * (high - low), low + 0.7 * (high - low))
+
+
+class SyntheticBackend:
+    """computeValue/getMapId replacements with injected latency, queueing and errors."""
+
+    def __init__(self):
+        self._slots = threading.BoundedSemaphore(max(1, CONCURRENCY))
+
+    def _wait(self, median_ms, extra_ms, rng):
+        if LATENCY_SCALE <= 0:
+            return
+        latency = median_ms * math.exp(rng.gauss(0, LATENCY_SIGMA)) + extra_ms
+        time.sleep(latency * LATENCY_SCALE / 1000)
+
+    def _serve(self, median_ms, extra_ms, rng):
+        with self._slots:
+            self._wait(median_ms, extra_ms, rng)
+        if ERROR_RATE > 0 and random.random() < ERROR_RATE:
+            raise ee.EEException('Computation timed out.')
+
+    @staticmethod
+    def _evaluate(obj):
+        expression = serializer.encode(obj, for_cloud_api=True)
+        encoded = json.dumps(expression, sort_keys=True)
+        # Same expression, same answer; latency still varies per call
+        rng = random.Random(hashlib.sha256(encoded.encode()).hexdigest())
+        evaluator = _Evaluator(expression, rng)
+        return evaluator, evaluator.run()
+
+    def compute_value(self, obj):
+        evaluator, result = self._evaluate(obj)
+        self._serve(LATENCY_MS, evaluator.pixels / 1e6 * MS_PER_MEGAPIXEL, random.Random())
+        return result
+
+    def compute_pixels(self, params):
+        """A NUMPY_NDARRAY computePixels response: a structured array with a field per band."""
+        evaluator, image = self._evaluate(params['expression'])
+        if not isinstance(image, _Image):
+            image = _Image(['b1'])
+        dimensions = params['grid']['dimensions']
+        height, width = dimensions['height'], dimensions['width']
+        blocks = {band: evaluator.pixel_block(image, band, height, width) for band in image.bands}
+        result = np.zeros((height, width), dtype=[(band, block.dtype) for band, block in blocks.items()])
+        for band, block in blocks.items():
+            result[band] = block
+        self._serve(LATENCY_MS, evaluator.pixels / 1e6 * MS_PER_MEGAPIXEL, random.Random())
+        return result
+
+    def get_map_id(self, params):
+        encoded = json.dumps(serializer.encode(params['image'], for_cloud_api=True), sort_keys=True)
+        map_name = 'projects/stub/maps/' + hashlib.sha256(encoded.encode()).hexdigest()[:32]
+        self._serve(MAPID_LATENCY_MS, 0, random.Random())
+        return {
+            'mapid': map_name,
+            'token': '',
+            'tile_fetcher': ee.data.TileFetcher(TILE_URL.format(mapid=map_name), map_name=map_name)
+        }
+
+
+def load_algorithms(path=EE_ALGORITHMS_SNAPSHOT):
+    """Load the EE algorithm signatures from a snapshot of the algorithms list."""
+    with open(path) as f:
+        snapshot = json.load(f)
+    if 'algorithms' in snapshot:
+        return _cloud_api_utils.convert_algorithms(snapshot)
+    return snapshot
+
+
+def install_stub():
+    """Initialize the ee library against the synthetic backend instead of Earth Engine."""
+    backend = SyntheticBackend()
+    ee.data.getAlgorithms = load_algorithms
+    # Initialization would otherwise download the API discovery document
+    ee.data._install_cloud_api_resource = lambda: None
+    ee_calls.set_backend('computeValue', backend.compute_value)
+    ee_calls.set_backend('getMapId', backend.get_map_id)
+    if hasattr(ee.data, 'computePixels'):
+        ee.data.computePixels = backend.compute_pixels
+    ee.Initialize(None)
+    return backend
@@ -0,0 +1,399 @@
+"""Pooled keep-alive HTTP transport for Earth Engine API calls.
+
+By default the EE client sends every request through one httplib2.Http, which
+keeps a single connection per host and is not safe to share between threads.
+Concurrent requests then either interfere with each other or open a new TCP
+and TLS connection for a call. PooledHttp is a drop-in httplib2.Http that sends
+requests through a thread-safe urllib3 pool of EE_HTTP_POOL_SIZE keep-alive
+connections per host. The default matches FAIR_EE_CONCURRENCY, the most EE
+calls a worker runs at once. Calls beyond that wait up to EE_HTTP_POOL_TIMEOUT
+seconds for a free connection instead of opening and discarding extra ones.
+
+`GET /ee-transport` reports requests, connections opened and closed (churn),
+connection reuse, pool utilization and the time calls waited for a connection.
+
+`python ee_transport.py bench` compares a fresh connection per call with the
+pool against a local HTTPS stand-in that adds a simulated network round trip
+to each request and two to each new connection (TCP and TLS handshakes).
+"""
+import argparse
+import http.server
+import json
+import os
+import shutil
+import socket
+import socketserver
+import ssl
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httplib2
+import urllib3
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from flask import jsonify
+
+from fair_queue import FAIR_EE_CONCURRENCY
+
+EE_HTTP_POOL_SIZE = int(os.environ.get('EE_HTTP_POOL_SIZE', str(FAIR_EE_CONCURRENCY)))
+EE_HTTP_POOL_TIMEOUT = float(os.environ.get('EE_HTTP_POOL_TIMEOUT', '60'))
+
+# Separate pools are kept for this many hosts (EE API, OAuth token endpoint, ...)
+MAX_HOSTS = 4
+
+
+class TransportMetrics:
+    """Counters and gauges of a connection pool."""
+
+    def __init__(self, pool_size):
+        self.pool_size = pool_size
+        self.requests = 0
+        self.errors = 0
+        self.connections_opened = 0
+        self.connections_closed = 0
+        self.connect_seconds = 0.0
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def checked_out(self, waited):
+        with self._lock:
+            self.in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+            if waited > 0.001:
+                self.waits += 1
+            self.wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+
+    def checked_in(self):
+        with self._lock:
+            self.in_use -= 1
+
+    def connected(self, seconds):
+        with self._lock:
+            self.connections_opened += 1
+            self.connect_seconds += seconds
+
+    def closed(self):
+        with self._lock:
+            self.connections_closed += 1
+
+    def finished(self, failed):
+        with self._lock:
+            self.requests += 1
+            self.errors += failed
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'pool_size': self.pool_size,
+                'in_use': self.in_use,
+                'peak_in_use': self.peak_in_use,
+                'utilization': round(self.in_use / self.pool_size, 3),
+                'requests': self.requests,
+                'errors': self.errors,
+                'connections_opened': self.connections_opened,
+                'connections_closed': self.connections_closed,
+                'connection_reuse': round(1 - self.connections_opened / self.requests, 3) if self.requests else None,
+                'avg_connect_ms': round(self.connect_seconds / self.connections_opened * 1000, 2)
+                if self.connections_opened else None,
+                'pool_waits': self.waits,
+                'avg_pool_wait_ms': round(self.wait_seconds / self.requests * 1000, 2) if self.requests else None,
+                'max_pool_wait_ms': round(self.max_wait_seconds * 1000, 2)
+            }
+
+
+# --- Metered urllib3 classes -----------------------------------------------
+
+class _MeteredConnectionMixin:
+    metrics = None
+
+    def connect(self):
+        started = time.perf_counter()
+        super().connect()
+        if self.metrics is not None:
+            self.metrics.connected(time.perf_counter() - started)
+
+    def close(self):
+        was_open = self.sock is not None
+        super().close()
+        if was_open and self.metrics is not None:
+            self.metrics.closed()
+
+
+class _MeteredHTTPConnection(_MeteredConnectionMixin, HTTPConnection):
+    pass
+
+
+class _MeteredHTTPSConnection(_MeteredConnectionMixin, HTTPSConnection):
+    pass
+
+
+class _MeteredPoolMixin:
+    metrics = None
+
+    def _new_conn(self):
+        conn = super()._new_conn()
+        conn.metrics = self.metrics
+        return conn
+
+    def _get_conn(self, timeout=None):
+        started = time.perf_counter()
+        conn = super()._get_conn(timeout)
+        self.metrics.checked_out(time.perf_counter() - started)
+        return conn
+
+    def _put_conn(self, conn):
+        self.metrics.checked_in()
+        super()._put_conn(conn)
+
+
+class _MeteredHTTPConnectionPool(_MeteredPoolMixin, HTTPConnectionPool):
+    ConnectionCls = _MeteredHTTPConnection
+
+
+class _MeteredHTTPSConnectionPool(_MeteredPoolMixin, HTTPSConnectionPool):
+    ConnectionCls = _MeteredHTTPSConnection
+
+
+class _MeteredPoolManager(urllib3.PoolManager):
+    def __init__(self, metrics, **kwargs):
+        super().__init__(**kwargs)
+        self.metrics = metrics
+        self.pool_classes_by_scheme = {'http': _MeteredHTTPConnectionPool, 'https': _MeteredHTTPSConnectionPool}
+
+    def _new_pool(self, scheme, host, port, request_context=None):
+        pool = super()._new_pool(scheme, host, port, request_context)
+        pool.metrics = self.metrics
+        return pool
+
+
+# --- httplib2-compatible transport -----------------------------------------
+
+class PooledHttp(httplib2.Http):
+    """An httplib2.Http that is safe to share between threads and reuses pooled connections."""
+
+    def __init__(self, pool_size=EE_HTTP_POOL_SIZE, timeout=None, ca_certs=None, metrics=None):
+        super().__init__(timeout=timeout, ca_certs=ca_certs)
+        self.pool_size = pool_size
+        self.metrics = metrics if metrics is not None else TransportMetrics(pool_size)
+        self._pool_ca_certs = ca_certs or httplib2.CA_CERTS
+        self._pool = None
+        self._pool_pid = None
+
+    @property
+    def pool(self):
+        """This process's connection pool, created on first use.
+
+        ee.Initialize() already sends requests from the gunicorn master, and
+        workers forked from a preloaded master must not share its sockets, so
+        a forked worker starts a pool (and metrics) of its own.
+        """
+        pid = os.getpid()
+        if self._pool_pid != pid:
+            if self._pool_pid is not None:
+                self.metrics = TransportMetrics(self.pool_size)
+            # Threads racing on first use may each build a pool; all but one are simply dropped
+            self._pool = _MeteredPoolManager(
+                self.metrics,
+                num_pools=MAX_HOSTS,
+                maxsize=self.pool_size,
+                block=True,
+                cert_reqs='CERT_REQUIRED',
+                ca_certs=self._pool_ca_certs
+            )
+            self._pool_pid = pid
+        return self._pool
+
+    def request(self, uri, method='GET', body=None, headers=None,
+                redirections=httplib2.DEFAULT_MAX_REDIRECTS, connection_type=None):
+        decode = method != 'HEAD'
+        failed = True
+        try:
+            response = self.pool.request(
+                method, uri, body=body, headers=headers,
+                redirect=False, retries=False, decode_content=decode,
+                timeout=urllib3.Timeout(total=self.timeout),
+                pool_timeout=EE_HTTP_POOL_TIMEOUT
+            )
+            failed = False
+        except urllib3.exceptions.NewConnectionError as e:
+            # The exceptions httplib2 raises, which googleapiclient knows how to retry.
+            # NewConnectionError subclasses urllib3's TimeoutError, so it is checked first.
+            raise ConnectionError(str(e)) from e
+        except urllib3.exceptions.TimeoutError as e:
+            raise socket.timeout(str(e)) from e
+        except urllib3.exceptions.HTTPError as e:
+            raise ConnectionError(str(e)) from e
+        finally:
+            self.metrics.finished(failed)
+
+        info = {name.lower(): value for name, value in response.headers.items()}
+        info['status'] = str(response.status)
+        if decode and 'content-encoding' in info:
+            # The body is already decompressed, as httplib2 would have done
+            info['-content-encoding'] = info.pop('content-encoding')
+            info['content-length'] = str(len(response.data))
+        result = httplib2.Response(info)
+        result.reason = response.reason
+        return result, response.data
+
+    def close(self):
+        if self._pool is not None and self._pool_pid == os.getpid():
+            self._pool.clear()
+
+
+transport = None
+
+
+def create_http_transport():
+    """The pooled transport to pass to ee.Initialize(http_transport=...)."""
+    global transport
+    transport = PooledHttp()
+    return transport
+
+
+def init_ee_transport(app):
+    """Register `GET /ee-transport`."""
+
+    @app.route('/ee-transport')
+    def ee_transport_status():
+        """Show connection pool utilization and churn of the EE transport."""
+        if transport is None:
+            return jsonify({'success': True, 'pooled': False})
+        return jsonify({'success': True, 'pooled': True, **transport.metrics.snapshot()})
+
+
+# --- Local HTTPS stand-in and benchmark ------------------------------------
+
+def _self_signed_certificate(directory):
+    """Create a certificate for localhost / 127.0.0.1 with openssl; returns (cert, key) paths."""
+    if shutil.which('openssl') is None:
+        raise SystemExit('openssl is needed to create the stand-in certificate')
+    cert, key = os.path.join(directory, 'cert.pem'), os.path.join(directory, 'key.pem')
+    subprocess.run([
+        'openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+        '-keyout', key, '-out', cert, '-subj', '/CN=localhost',
+        '-addext', 'subjectAltName=DNS:localhost,IP:127.0.0.1'
+    ], check=True, capture_output=True)
+    return cert, key
+
+
+class _StandInHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately; without this, delayed ACKs add ~40 ms per response
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        # TCP and TLS handshakes each cost a round trip
+        time.sleep(2 * self.server.rtt)
+        self.request = self.server.ssl_context.wrap_socket(self.request, server_side=True)
+        super().setup()
+
+    def _respond(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+        time.sleep(self.server.rtt)
+        body = json.dumps({'result': {'value': 42}}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = _respond
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _StandInServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+
+def start_stand_in(cert, key, rtt, port=0):
+    """Serve the HTTPS stand-in in a background thread; returns the server."""
+    server = _StandInServer(('127.0.0.1', port), _StandInHandler)
+    server.rtt = rtt
+    server.ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    server.ssl_context.load_cert_chain(cert, key)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _run_bench(make_http, url, requests, concurrency):
+    """Send requests POSTs from concurrency threads; returns (latencies, seconds, errors)."""
+    def call(_):
+        http = make_http()
+        started = time.perf_counter()
+        response, _ = http.request(url, 'POST', body='{}', headers={'Content-Type': 'application/json'})
+        return time.perf_counter() - started, response.status != 200
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(call, range(requests)))
+    return [latency for latency, _ in results], time.perf_counter() - started, sum(e for _, e in results)
+
+
+def bench(requests, concurrency, rtt_ms, pool_size):
+    with tempfile.TemporaryDirectory() as directory:
+        cert, key = _self_signed_certificate(directory)
+        server = start_stand_in(cert, key, rtt_ms / 1000)
+        url = f"https://127.0.0.1:{server.server_address[1]}/v1/projects/bench/value:compute"
+        pooled = PooledHttp(pool_size=pool_size, ca_certs=cert)
+
+        modes = {
+            # A new httplib2.Http per call: no connection is reused
+            'fresh': lambda: httplib2.Http(ca_certs=cert),
+            'pooled': lambda: pooled,
+        }
+        print(f"{requests} requests, {concurrency} threads, simulated RTT {rtt_ms} ms, pool size {pool_size}")
+        print(f"{'mode':8} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'errors':>7} {'connections':>12}")
+        for mode, make_http in modes.items():
+            latencies, seconds, errors = _run_bench(make_http, url, requests, concurrency)
+            latencies.sort()
+            connections = pooled.metrics.connections_opened if mode == 'pooled' else requests
+            print(f"{mode:8} {requests / seconds:8.1f} {statistics.median(latencies) * 1000:8.1f} "
+                  f"{latencies[int(len(latencies) * 0.95)] * 1000:8.1f} {errors:7d} {connections:12d}")
+        print(json.dumps(pooled.metrics.snapshot(), indent=2))
+        server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    bench_parser = subparsers.add_parser('bench', help='Compare fresh connections with the pool')
+    bench_parser.add_argument('--requests', type=int, default=400)
+    bench_parser.add_argument('--concurrency', type=int, default=FAIR_EE_CONCURRENCY)
+    bench_parser.add_argument('--rtt-ms', type=float, default=20, help='Simulated network round trip')
+    bench_parser.add_argument('--pool-size', type=int, default=EE_HTTP_POOL_SIZE)
+
+    serve_parser = subparsers.add_parser('serve', help='Run only the HTTPS stand-in')
+    serve_parser.add_argument('--port', type=int, default=8443)
+    serve_parser.add_argument('--rtt-ms', type=float, default=20)
+
+    args = parser.parse_args()
+    if args.command == 'bench':
+        bench(args.requests, args.concurrency, args.rtt_ms, args.pool_size)
+    else:
+        directory = tempfile.mkdtemp()
+        cert, _ = _self_signed_certificate(directory)
+        server = start_stand_in(cert, os.path.join(directory, 'key.pem'), args.rtt_ms / 1000, args.port)
+        print(f"HTTPS stand-in on https://127.0.0.1:{server.server_address[1]} (CA certificate {cert})")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
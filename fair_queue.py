@@ -0,0 +1,264 @@
+"""Weighted fair sharing of Earth Engine concurrency between clients.
+
+Each request is attributed to a client: its X-API-Key, else its web UI
+session, else its address. Keys and sessions are only kept hashed. Clients
+belong to a class with a weight, set by FAIR_WEIGHTS (default
+`interactive=4,api=1,other=2`):
+
+- `api`: requests carrying X-API-Key, e.g. batch scripts.
+- `interactive`: requests with a session cookie the server issued with an HTML
+  page, i.e. the web UI. The cookie is signed with FAIR_SESSION_SECRET, so a
+  script cannot claim the interactive weight with a header of its choosing.
+- `other`: everything else.
+
+Set FAIR_SESSION_SECRET when workers do not share it through a preloaded app;
+otherwise each process signs with its own random key, and a session issued by
+one worker is served as `other` by the rest.
+
+At most FAIR_EE_CONCURRENCY Earth Engine calls run at once per worker. When
+calls have to wait, the next slot goes to the waiting client that has used the
+least EE time relative to its weight (start-time fair queueing). A client that
+has been idle does not bank credit: it starts level with the least-served
+active client. A single batch client can then use every slot while nobody else
+is waiting, but as soon as interactive users arrive each active client gets a
+weight-proportional share.
+
+`GET /fair-queue` reports per-client usage, active calls and waiting calls.
+"""
+import collections
+import contextvars
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+
+from flask import jsonify, request
+
+import ee_calls
+from cancellation import check_cancelled
+
+FAIR_EE_CONCURRENCY = int(os.environ.get('FAIR_EE_CONCURRENCY', '8'))
+FAIR_WEIGHTS = os.environ.get('FAIR_WEIGHTS', 'interactive=4,api=1,other=2')
+FAIR_SESSION_SECRET = os.environ.get('FAIR_SESSION_SECRET') or secrets.token_hex(32)
+
+# Cookie holding the signed web UI session, and how long it lasts
+SESSION_COOKIE = 'fair_session'
+SESSION_MAX_AGE = 30 * 86400
+
+# Clients idle for this long are dropped from the accounting table
+CLIENT_IDLE_SECONDS = 600
+# How often a waiting call checks whether its request was cancelled
+WAIT_POLL_SECONDS = 0.25
+# Initial guess of an EE call's duration, used to charge calls when they start
+INITIAL_CALL_SECONDS = 0.5
+
+
+def parse_weights(spec):
+    """Parse `class=weight,...` into a dict."""
+    weights = {}
+    for item in spec.split(','):
+        if '=' in item:
+            name, weight = item.split('=', 1)
+            weights[name.strip()] = max(float(weight), 0.01)
+    return weights
+
+
+class _Client:
+    def __init__(self, client_id, client_class, weight):
+        self.client_id = client_id
+        self.client_class = client_class
+        self.weight = weight
+        self.vtime = 0.0
+        self.active = 0
+        self.waiting = collections.deque()
+        self.calls = 0
+        self.ee_seconds = 0.0
+        self.last_seen = time.monotonic()
+
+
+class FairScheduler:
+    """Grants EE call slots to clients in weighted fair order."""
+
+    def __init__(self, slots=FAIR_EE_CONCURRENCY, weights=None):
+        self.slots = slots
+        self.weights = weights if weights is not None else parse_weights(FAIR_WEIGHTS)
+        self.in_use = 0
+        self.clients = {}
+        self.average_seconds = INITIAL_CALL_SECONDS
+        self._lock = threading.Lock()
+
+    def _client(self, client_id, client_class):
+        client = self.clients.get(client_id)
+        if client is None:
+            weight = self.weights.get(client_class, self.weights.get('other', 1.0))
+            client = self.clients[client_id] = _Client(client_id, client_class, weight)
+        if not client.active and not client.waiting:
+            # A returning client starts level with the least-served busy client
+            busy = [c.vtime for c in self.clients.values() if c.active or c.waiting]
+            if busy:
+                client.vtime = max(client.vtime, min(busy))
+        client.last_seen = time.monotonic()
+        return client
+
+    def _grant(self, client):
+        self.in_use += 1
+        client.active += 1
+        # Charge the expected duration now so one client cannot take every free slot at once
+        charge = self.average_seconds / client.weight
+        client.vtime += charge
+        return charge
+
+    def _dispatch(self):
+        while self.in_use < self.slots:
+            candidates = [c for c in self.clients.values() if c.waiting]
+            if not candidates:
+                return
+            client = min(candidates, key=lambda c: c.vtime)
+            waiter = client.waiting.popleft()
+            waiter['charge'] = self._grant(client)
+            waiter['event'].set()
+
+    def acquire(self, client_id, client_class):
+        """Wait for a slot; returns a grant to pass to release()."""
+        with self._lock:
+            client = self._client(client_id, client_class)
+            if self.in_use < self.slots and not any(c.waiting for c in self.clients.values()):
+                return client, self._grant(client), time.monotonic()
+            waiter = {'event': threading.Event(), 'charge': None}
+            client.waiting.append(waiter)
+
+        try:
+            while not waiter['event'].wait(WAIT_POLL_SECONDS):
+                check_cancelled()
+        except BaseException:
+            with self._lock:
+                if waiter['event'].is_set():
+                    self._finish(client, waiter['charge'], 0.0)
+                else:
+                    client.waiting.remove(waiter)
+            raise
+        return client, waiter['charge'], time.monotonic()
+
+    def _finish(self, client, charge, seconds):
+        self.in_use -= 1
+        client.active -= 1
+        client.vtime += seconds / client.weight - charge
+        self._dispatch()
+
+    def release(self, grant):
+        client, charge, started = grant
+        seconds = time.monotonic() - started
+        with self._lock:
+            client.calls += 1
+            client.ee_seconds += seconds
+            self.average_seconds = 0.9 * self.average_seconds + 0.1 * seconds
+            self._finish(client, charge, seconds)
+            self._forget_idle()
+
+    def _forget_idle(self):
+        cutoff = time.monotonic() - CLIENT_IDLE_SECONDS
+        for client_id, client in list(self.clients.items()):
+            if client.last_seen < cutoff and not client.active and not client.waiting:
+                del self.clients[client_id]
+
+    def snapshot(self):
+        with self._lock:
+            total = sum(c.ee_seconds for c in self.clients.values()) or 1.0
+            return {
+                'slots': self.slots,
+                'in_use': self.in_use,
+                'waiting': sum(len(c.waiting) for c in self.clients.values()),
+                'weights': self.weights,
+                'clients': sorted((
+                    {
+                        'client': c.client_id,
+                        'class': c.client_class,
+                        'weight': c.weight,
+                        'active': c.active,
+                        'waiting': len(c.waiting),
+                        'ee_calls': c.calls,
+                        'ee_seconds': round(c.ee_seconds, 3),
+                        'share': round(c.ee_seconds / total, 3)
+                    } for c in self.clients.values()
+                ), key=lambda c: -c['ee_seconds'])
+            }
+
+
+fair_scheduler = FairScheduler()
+_current_client = contextvars.ContextVar('fair_queue_client', default=('local', 'other'))
+
+
+def current_client():
+    """(client id, class) the EE calls of the current context are attributed to."""
+    return _current_client.get()
+
+
+def attribute_to(client):
+    """Attribute the EE calls of the current context, e.g. a background thread, to a client."""
+    _current_client.set(client)
+
+
+def _digest(value):
+    return hashlib.sha256(value.encode('utf-8')).hexdigest()[:12]
+
+
+def _signature(session_id):
+    return hmac.new(FAIR_SESSION_SECRET.encode(), session_id.encode(), hashlib.sha256).hexdigest()
+
+
+def issue_session():
+    """Return a new signed session cookie value."""
+    session_id = secrets.token_urlsafe(16)
+    return f"{session_id}.{_signature(session_id)}"
+
+
+def verify_session(value):
+    """Return the session id of a signed cookie value, or None if it was not issued here."""
+    session_id, _, signature = (value or '').rpartition('.')
+    if session_id and hmac.compare_digest(signature, _signature(session_id)):
+        return session_id
+    return None
+
+
+def identify_client(headers, remote_addr, cookies=None):
+    """Return (client id, class) for a request's headers, cookies and address."""
+    # Keys and sessions are hashed, so /fair-queue cannot be used to impersonate a client
+    api_key = headers.get('X-API-Key')
+    if api_key:
+        return 'key:' + _digest(api_key), 'api'
+    session_id = verify_session((cookies or {}).get(SESSION_COOKIE))
+    if session_id:
+        return 'session:' + _digest(session_id), 'interactive'
+    return f"addr:{remote_addr}", 'other'
+
+
+def _fair_queue_interceptor(name, call, *args, **kwargs):
+    grant = fair_scheduler.acquire(*_current_client.get())
+    try:
+        return call(*args, **kwargs)
+    finally:
+        fair_scheduler.release(grant)
+
+
+def init_fair_queue(app):
+    """Attribute requests to clients, schedule EE calls fairly and register `GET /fair-queue`."""
+    ee_calls.add_interceptor(_fair_queue_interceptor)
+
+    @app.before_request
+    def set_client():
+        _current_client.set(identify_client(request.headers, request.remote_addr, request.cookies))
+
+    @app.after_request
+    def issue_session_cookie(response):
+        # Pages carry the session their scripts' analysis requests are weighted by
+        if response.mimetype == 'text/html' and not verify_session(request.cookies.get(SESSION_COOKIE)):
+            response.set_cookie(SESSION_COOKIE, issue_session(), max_age=SESSION_MAX_AGE,
+                                httponly=True, samesite='Lax')
+        return response
+
+    @app.route('/fair-queue')
+    def fair_queue_status():
+        """Show per-client EE usage and waiting calls."""
+        return jsonify({'success': True, **fair_scheduler.snapshot()})
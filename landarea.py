@@ -0,0 +1,291 @@
+"""Headless bulk analysis of many AOIs, without going through HTTP.
+
+    python -m landarea batch --aoi regions.geojson --analyses ndvi,igbp --years 2015-2024
+
+Every feature of the GeoJSON file is an AOI, identified by its `id`, the
+property named by --id-property (default `name`), or its index. Each AOI,
+analysis and year is one task. Tasks run on a pool of --workers threads (or
+processes with --pool process) that call the same functions as the web routes:
+
+- `ndvi`: calculate_ndvi(), the median NDVI composite of each year.
+- `ndvi_annual_mean`: get_yearly_ndvi_stats(), the mean NDVI of each year.
+- `igbp`: get_igbp_land_cover(), once per AOI: it always uses the latest MODIS
+  year, reported as `data_year`.
+- `worldcover`: get_esa_worldcover(), once per AOI.
+- `dynamic_world`: get_dynamic_world_for_year(), the yearly steps of
+  get_dynamic_world_timeseries(), composited with --dw-composite.
+
+Finished tasks are appended to a checkpoint file (default
+`<output>.checkpoint.jsonl`), so an interrupted run picks up where it stopped
+when started again with the same arguments. Failed tasks are retried on the
+next run. When every task has run, the results are written to --output as
+Parquet or CSV in long format, one row per metric:
+
+    aoi_id, analysis, year, data_year, class, metric, value
+
+`metric` is `area_hectares` or `percentage` for a class, or `total_area_hectares`
+and the NDVI summary statistics (`mean_ndvi`, ...) with an empty `class`.
+--backend stub or replay runs against ee_stub.py or a recorded cassette.
+Multi-polygon features are analysed through their largest polygon.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+ANALYSES = ['ndvi', 'ndvi_annual_mean', 'igbp', 'worldcover', 'dynamic_world']
+# Analyses computed once per AOI rather than per year
+YEARLESS_ANALYSES = {'igbp', 'worldcover'}
+OUTPUT_COLUMNS = ['aoi_id', 'analysis', 'year', 'data_year', 'class', 'metric', 'value']
+CLASS_METRICS = ['area_hectares', 'percentage']
+
+logger = logging.getLogger('landarea')
+
+
+def parse_years(value):
+    """Parse `2015-2024` or `2020` into a list of years."""
+    start, _, end = value.partition('-')
+    start, end = int(start), int(end or start)
+    if end < start:
+        raise argparse.ArgumentTypeError(f"Year range {value} ends before it starts")
+    return list(range(start, end + 1))
+
+
+def _largest_ring(geometry):
+    """Exterior ring of a Polygon, or of the largest polygon of a MultiPolygon."""
+    from shapely.geometry import shape
+
+    if geometry['type'] == 'Polygon':
+        return geometry['coordinates'][0]
+    if geometry['type'] == 'MultiPolygon':
+        largest = max(geometry['coordinates'], key=lambda polygon: shape({'type': 'Polygon', 'coordinates': polygon}).area)
+        return largest[0]
+    raise ValueError(f"Unsupported geometry type {geometry['type']}")
+
+
+def load_aois(path, id_property='name'):
+    """Return [(aoi id, coordinate ring)] for the features of a GeoJSON file."""
+    with open(path) as f:
+        data = json.load(f)
+    if data.get('type') == 'FeatureCollection':
+        features = data['features']
+    elif data.get('type') == 'Feature':
+        features = [data]
+    else:
+        features = [{'type': 'Feature', 'geometry': data, 'properties': {}}]
+
+    aois, seen = [], set()
+    for index, feature in enumerate(features):
+        if not feature.get('geometry'):
+            logger.warning("Skipping feature %d without a geometry", index)
+            continue
+        properties = feature.get('properties') or {}
+        aoi_id = str(feature.get('id', properties.get(id_property, index)))
+        if aoi_id in seen:
+            aoi_id = f"{aoi_id}#{index}"
+        seen.add(aoi_id)
+        if feature['geometry']['type'] == 'MultiPolygon':
+            logger.warning("AOI %s is a MultiPolygon; analysing its largest polygon", aoi_id)
+        aois.append((aoi_id, [[float(lon), float(lat)] for lon, lat, *_ in _largest_ring(feature['geometry'])]))
+    return aois
+
+
+def plan_tasks(aois, analyses, years, dw_composite='mode'):
+    """One task per AOI, analysis and year (or per AOI for year-less analyses)."""
+    tasks = []
+    for aoi_id, ring in aois:
+        digest = hashlib.sha256(json.dumps(ring).encode()).hexdigest()[:12]
+        for analysis in analyses:
+            for year in ([None] if analysis in YEARLESS_ANALYSES else years):
+                key = f"{aoi_id}|{digest}|{analysis}|{year if year is not None else '-'}"
+                task = {'key': key, 'aoi_id': aoi_id, 'coordinates': ring, 'analysis': analysis, 'year': year}
+                if analysis == 'dynamic_world' and dw_composite != 'mode':
+                    # Other composites are other results: a checkpoint of one never resumes another
+                    task['key'] += f"|{dw_composite}"
+                    task['composite'] = dw_composite
+                tasks.append(task)
+    return tasks
+
+
+def flatten_result(task, result):
+    """Long-format rows for the area and NDVI statistics of one analysis result."""
+    base = {'aoi_id': task['aoi_id'], 'analysis': task['analysis'], 'year': task['year'],
+            'data_year': result.get('year', task['year'])}
+    rows = []
+    for name, value in (result.get('basic_stats') or {}).items():
+        rows.append({**base, 'class': None, 'metric': name, 'value': value})
+    if 'total_area_hectares' in result:
+        rows.append({**base, 'class': None, 'metric': 'total_area_hectares', 'value': result['total_area_hectares']})
+    for name, stat in (result.get('area_stats') or {}).items():
+        for metric in CLASS_METRICS:
+            if stat.get(metric) is not None:
+                rows.append({**base, 'class': name, 'metric': metric, 'value': stat[metric]})
+    return rows
+
+
+# --- Workers ---------------------------------------------------------------
+
+_app = None
+_app_lock = threading.Lock()
+
+
+def _load_app():
+    """Import app.py once per process; it initializes Earth Engine for EE_BACKEND."""
+    global _app
+    with _app_lock:
+        if _app is None:
+            import app
+            _app = app
+    return _app
+
+
+def _analyse(app, task):
+    coordinates, year = task['coordinates'], task['year']
+    analysis = task['analysis']
+    if analysis == 'ndvi':
+        _, statistics = app.calculate_ndvi(f"{year}-01-01", f"{year}-12-31", coordinates, mode='median')
+        return statistics
+    if analysis == 'ndvi_annual_mean':
+        yearly_stats, _ = app.get_yearly_ndvi_stats(coordinates, year, year)
+        return yearly_stats[0] if yearly_stats else None
+    if analysis == 'igbp':
+        # The dates are not used; the latest year of the product is analysed
+        return app.get_igbp_land_cover(None, None, coordinates)
+    if analysis == 'worldcover':
+        return app.get_esa_worldcover(coordinates)
+    if analysis == 'dynamic_world':
+        return app.get_dynamic_world_for_year(year, coordinates, task.get('composite', 'mode'))
+    raise ValueError(f"Unknown analysis {analysis}")
+
+
+def run_task(task):
+    """Run one task; returns a checkpoint record with its rows or error."""
+    started = time.monotonic()
+    record = {'key': task['key']}
+    try:
+        result = _analyse(_load_app(), task)
+        # No scenes or classes for this year is a result, not an error
+        record['rows'] = flatten_result(task, result) if result else []
+    except Exception as e:
+        record['error'] = str(e)
+    record['seconds'] = round(time.monotonic() - started, 2)
+    return record
+
+
+# --- Checkpoints and output ------------------------------------------------
+
+def read_checkpoint(path):
+    """Successful records of a checkpoint file by task key."""
+    done = {}
+    if not os.path.exists(path):
+        return done
+    with open(path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A line cut short when the previous run was killed
+                continue
+            if 'error' not in record:
+                done[record['key']] = record
+    return done
+
+
+def write_output(rows, path, fmt):
+    import pandas as pd
+
+    frame = pd.DataFrame(rows, columns=OUTPUT_COLUMNS)
+    frame['year'] = frame['year'].astype('Int64')
+    frame['data_year'] = pd.to_numeric(frame['data_year'], errors='coerce').astype('Int64')
+    if fmt == 'parquet':
+        frame.to_parquet(path, index=False)
+    else:
+        frame.to_csv(path, index=False)
+
+
+def batch(args):
+    fmt = args.format or ('csv' if args.output.endswith('.csv') else 'parquet')
+    checkpoint_path = args.checkpoint or f"{args.output}.checkpoint.jsonl"
+    analyses = [name.strip() for name in args.analyses.split(',') if name.strip()]
+    unknown = set(analyses) - set(ANALYSES)
+    if unknown:
+        raise SystemExit(f"Unknown analyses: {', '.join(sorted(unknown))}. Choose from {', '.join(ANALYSES)}")
+
+    tasks = plan_tasks(load_aois(args.aoi, args.id_property), analyses, args.years, args.dw_composite)
+    done = read_checkpoint(checkpoint_path)
+    pending = [task for task in tasks if task['key'] not in done]
+    logger.info("%d tasks, %d already in %s, %d to run", len(tasks), len(tasks) - len(pending), checkpoint_path, len(pending))
+
+    failed = 0
+    if pending:
+        if args.pool == 'process':
+            # Spawned, not forked, so no worker shares another's EE connections
+            executor = ProcessPoolExecutor(args.workers, mp_context=multiprocessing.get_context('spawn'))
+        else:
+            executor = ThreadPoolExecutor(args.workers)
+        with open(checkpoint_path, 'a') as checkpoint, executor:
+            futures = {executor.submit(run_task, task): task for task in pending}
+            for finished, future in enumerate(as_completed(futures), 1):
+                task = futures[future]
+                record = future.result()
+                checkpoint.write(json.dumps(record) + '\n')
+                checkpoint.flush()
+                if 'error' in record:
+                    failed += 1
+                    logger.warning("[%d/%d] %s %s %s failed: %s", finished, len(pending),
+                                   task['aoi_id'], task['analysis'], task['year'] or '', record['error'])
+                else:
+                    done[record['key']] = record
+                    logger.info("[%d/%d] %s %s %s: %d rows in %.1fs", finished, len(pending),
+                                task['aoi_id'], task['analysis'], task['year'] or '', len(record['rows']), record['seconds'])
+
+    rows = [row for task in tasks if task['key'] in done for row in done[task['key']]['rows']]
+    write_output(rows, args.output, fmt)
+    logger.info("Wrote %d rows for %d/%d tasks to %s", len(rows), len(tasks) - failed, len(tasks), args.output)
+    if failed:
+        logger.error("%d tasks failed; run the same command again to retry them", failed)
+        return 1
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    batch_parser = subparsers.add_parser('batch', help='Analyse every feature of a GeoJSON file')
+    batch_parser.add_argument('--aoi', required=True, help='GeoJSON file of AOI polygons')
+    batch_parser.add_argument('--analyses', default='ndvi,igbp', help=f"Comma-separated, from {', '.join(ANALYSES)}")
+    batch_parser.add_argument('--years', type=parse_years, default=parse_years('2020'), help='e.g. 2015-2024')
+    batch_parser.add_argument('--dw-composite', choices=['mode', 'monthly_sample', 'mean_probability'], default='mode',
+                              help='Dynamic World composite; the sampled ones are cheaper for large AOIs')
+    batch_parser.add_argument('--output', default='landarea_results.parquet')
+    batch_parser.add_argument('--format', choices=['parquet', 'csv'], help='Default: from the output extension')
+    batch_parser.add_argument('--checkpoint', help='Default: <output>.checkpoint.jsonl')
+    batch_parser.add_argument('--id-property', default='name', help='Feature property naming each AOI')
+    batch_parser.add_argument('--workers', type=int, default=8)
+    batch_parser.add_argument('--pool', choices=['thread', 'process'], default='thread')
+    batch_parser.add_argument('--backend', choices=['live', 'stub', 'replay'], default='live')
+
+    args = parser.parse_args(argv)
+    # Progress lines keep their own handler: importing app.py configures the root logger from LOG_LEVEL
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    if args.backend != 'live':
+        # Read by app.py when it is imported, also in process pool workers
+        os.environ['EE_BACKEND'] = args.backend
+    # Worker logs below WARNING would drown the progress lines
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    return batch(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
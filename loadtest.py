@@ -0,0 +1,432 @@
+"""Load test the app against the synthetic Earth Engine backend.
+
+    python loadtest.py run [--server CMD ...] [--target URL] [--levels 1,2,4,8,16,32]
+                           [--stage-seconds 20] [--replay requests.jsonl] [--output report.json]
+
+Every server command is started with EE_BACKEND=stub (see ee_stub.py), or with
+EE_BACKEND=replay for `--backend replay` (see ee_cassette.py), so runs need no
+credentials and use no quota. A command contains a `{port}`
+placeholder, e.g.
+
+    --server "gunicorn -w 4 --threads 8 -b 127.0.0.1:{port} app:app"
+
+Without --server or --target, the built-in threaded werkzeug server
+(`python loadtest.py serve`) is used. At each concurrency level, closed-loop
+workers send a weighted mix of requests for every analysis route, with random
+areas over Bicol. Alternatively, they replay a request log recorded by running
+the app with REQUEST_RECORD_FILE set. Each route and server configuration gets
+a report of throughput, p50/p95/p99 latency, error rate and the concurrency
+level where it saturates.
+"""
+import argparse
+import http.client
+import itertools
+import json
+import os
+import random
+import shlex
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+from datetime import datetime
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Area that generated AOIs fall within (west, south, east, north)
+AOI_BOUNDS = (123.0, 12.8, 124.2, 14.0)
+# Side length range of generated AOIs in degrees
+AOI_SIZE = (0.02, 0.3)
+
+DEFAULT_LEVELS = [1, 2, 4, 8, 16, 32]
+DEFAULT_STAGE_SECONDS = 20
+
+# A level is saturated when throughput grows less than this fraction over the
+# previous level, errors exceed ERROR_THRESHOLD, or p95 exceeds P95_FACTOR times
+# the p95 at the lowest level
+THROUGHPUT_GAIN_THRESHOLD = 0.10
+ERROR_THRESHOLD = 0.01
+P95_FACTOR = 3.0
+
+
+def random_aoi(rng):
+    """A closed rectangular ring somewhere inside AOI_BOUNDS."""
+    west_bound, south_bound, east_bound, north_bound = AOI_BOUNDS
+    width = rng.uniform(*AOI_SIZE)
+    height = rng.uniform(*AOI_SIZE)
+    west = rng.uniform(west_bound, east_bound - width)
+    south = rng.uniform(south_bound, north_bound - height)
+    return [[west, south], [west + width, south], [west + width, south + height], [west, south + height], [west, south]]
+
+
+def _year(rng):
+    return rng.randint(2017, datetime.now().year - 1)
+
+
+def _ndvi(rng):
+    year = _year(rng)
+    return {'coordinates': random_aoi(rng), 'start_date': f"{year}-01-01", 'end_date': f"{year}-12-31",
+            'mode': rng.choice(['median', 'greenest', 'least_cloudy'])}
+
+
+def _year_range(rng):
+    end_year = _year(rng)
+    return {'coordinates': random_aoi(rng), 'start_year': end_year - rng.randint(1, 4), 'end_year': end_year}
+
+
+def _cached_stats(rng):
+    dataset = rng.choice(['ndvi', 'igbp', 'worldcover', 'dynamic_world'])
+    if dataset == 'ndvi':
+        return dict(_ndvi(rng), dataset=dataset)
+    return {'coordinates': random_aoi(rng), 'dataset': dataset, 'year': _year(rng)}
+
+
+def _transition(rng):
+    to_year = _year(rng)
+    return {'coordinates': random_aoi(rng), 'dataset': rng.choice(['dynamic_world', 'igbp']),
+            'from_year': to_year - rng.randint(1, 4), 'to_year': to_year, 'include_map': rng.random() < 0.5}
+
+
+# Route name -> (weight, path, request body factory)
+ROUTE_MIX = {
+    'ndvi': (3, '/get_ndvi', _ndvi),
+    'igbp': (2, '/get_igbp_land_cover', lambda rng: {'coordinates': random_aoi(rng)}),
+    'worldcover': (2, '/get_esa_worldcover', lambda rng: {'coordinates': random_aoi(rng)}),
+    'dynamic_world': (2, '/get_dynamic_world', lambda rng: {'coordinates': random_aoi(rng)}),
+    'dynamic_world_year': (1, '/get_dynamic_world_for_year',
+                           lambda rng: {'coordinates': random_aoi(rng), 'year': _year(rng)}),
+    'dynamic_world_timeseries': (1, '/get_dynamic_world_timeseries', _year_range),
+    'yearly_stats': (1, '/get_yearly_stats', _year_range),
+    'monthly_profile': (1, '/get_monthly_profile', _year_range),
+    'cached_stats': (1, '/cached_stats', _cached_stats),
+    'transition_matrix': (1, '/transition_matrix', _transition),
+    'clip_waterways': (1, '/clip_waterways', lambda rng: {'coordinates': random_aoi(rng)}),
+}
+ROUTE_NAMES = {path: name for name, (_, path, _) in ROUTE_MIX.items()}
+
+
+class GeneratedRequests:
+    """Endless weighted random requests over ROUTE_MIX."""
+
+    def __init__(self, routes=None, seed=None):
+        self.routes = [name for name in ROUTE_MIX if not routes or name in routes]
+        self.weights = [ROUTE_MIX[name][0] for name in self.routes]
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def next(self):
+        with self.lock:
+            name = self.rng.choices(self.routes, self.weights)[0]
+            _, path, factory = ROUTE_MIX[name]
+            return name, path, factory(self.rng)
+
+
+class ReplayedRequests:
+    """Cycles through a recorded JSONL request log."""
+
+    def __init__(self, path, routes=None):
+        entries = []
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    name = ROUTE_NAMES.get(entry['path'], entry['path'])
+                    if not routes or name in routes:
+                        entries.append((name, entry['path'], entry.get('body')))
+        if not entries:
+            raise ValueError(f"No replayable requests in {path}")
+        self.entries = itertools.cycle(entries)
+        self.lock = threading.Lock()
+
+    def next(self):
+        with self.lock:
+            return next(self.entries)
+
+
+def init_request_recorder(app, path):
+    """Append every JSON POST to a load-test route to `path`, for replay with --replay."""
+    from flask import request
+
+    lock = threading.Lock()
+
+    @app.after_request
+    def record_request(response):
+        if request.method == 'POST' and request.path in ROUTE_NAMES and request.is_json:
+            line = json.dumps({'path': request.path, 'body': request.get_json(silent=True), 'time': time.time()})
+            with lock, open(path, 'a') as f:
+                f.write(line + '\n')
+        return response
+
+
+# --- Running a stage -------------------------------------------------------
+
+class _Client:
+    """A keep-alive HTTP connection that reconnects once when the server dropped it."""
+
+    def __init__(self, base_url, timeout):
+        parsed = urllib.parse.urlsplit(base_url)
+        self.host = parsed.hostname
+        self.port = parsed.port or (443 if parsed.scheme == 'https' else 80)
+        self.connection_class = http.client.HTTPSConnection if parsed.scheme == 'https' else http.client.HTTPConnection
+        self.timeout = timeout
+        self.connection = None
+
+    def post(self, path, body):
+        payload = json.dumps(body).encode('utf-8')
+        headers = {'Content-Type': 'application/json', 'Connection': 'keep-alive'}
+        for attempt in range(2):
+            if self.connection is None:
+                self.connection = self.connection_class(self.host, self.port, timeout=self.timeout)
+            try:
+                self.connection.request('POST', path, payload, headers)
+                response = self.connection.getresponse()
+                data = response.read()
+                if response.getheader('Connection', '').lower() == 'close' or response.version == 10:
+                    self.close()
+                return response.status, data
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                self.close()
+                if attempt:
+                    raise
+        raise RuntimeError('unreachable')
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+def _percentile(values, percent):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(percent / 100 * len(ordered) + 0.5)) - 1))
+    return round(ordered[index], 1)
+
+
+def _summarize(samples, elapsed):
+    latencies = [s['latency_ms'] for s in samples]
+    errors = sum(1 for s in samples if s['error'])
+    return {
+        'requests': len(samples),
+        'throughput_rps': round(len(samples) / elapsed, 2) if elapsed else 0,
+        'p50_ms': _percentile(latencies, 50),
+        'p95_ms': _percentile(latencies, 95),
+        'p99_ms': _percentile(latencies, 99),
+        'error_rate': round(errors / len(samples), 4) if samples else 0,
+        'errors': errors
+    }
+
+
+def run_stage(base_url, concurrency, seconds, source, timeout=300):
+    """Run closed-loop workers for `seconds`; returns overall and per-route summaries."""
+    samples = []
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+
+    def worker():
+        client = _Client(base_url, timeout)
+        while time.monotonic() < deadline:
+            name, path, body = source.next()
+            start = time.perf_counter()
+            error = None
+            try:
+                status, data = client.post(path, body)
+                if status >= 400:
+                    error = f"HTTP {status}"
+                else:
+                    try:
+                        if json.loads(data).get('success') is False:
+                            error = 'app error'
+                    except ValueError:
+                        error = 'invalid JSON'
+            except (OSError, http.client.HTTPException) as e:
+                client.close()
+                error = type(e).__name__
+            sample = {'route': name, 'latency_ms': (time.perf_counter() - start) * 1000, 'error': error}
+            with lock:
+                samples.append(sample)
+        client.close()
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    by_route = {}
+    for sample in samples:
+        by_route.setdefault(sample['route'], []).append(sample)
+    error_kinds = {}
+    for sample in samples:
+        if sample['error']:
+            error_kinds[sample['error']] = error_kinds.get(sample['error'], 0) + 1
+
+    return {
+        'concurrency': concurrency,
+        'seconds': round(elapsed, 2),
+        'overall': _summarize(samples, elapsed),
+        'error_kinds': error_kinds,
+        'routes': {name: _summarize(route_samples, elapsed) for name, route_samples in sorted(by_route.items())}
+    }
+
+
+def find_saturation(stages, key=None):
+    """Return (concurrency, reason) of the first saturated stage, or (None, None)."""
+    series = [(s['concurrency'], s['overall'] if key is None else s['routes'].get(key)) for s in stages]
+    series = [(level, summary) for level, summary in series if summary and summary['requests']]
+    if not series:
+        return None, None
+
+    baseline_p95 = series[0][1]['p95_ms'] or 0
+    previous = None
+    for level, summary in series:
+        if summary['error_rate'] > ERROR_THRESHOLD:
+            return level, f"error rate {summary['error_rate']:.1%}"
+        if baseline_p95 and summary['p95_ms'] > P95_FACTOR * baseline_p95:
+            return level, f"p95 {summary['p95_ms']:.0f} ms > {P95_FACTOR:g}x baseline"
+        if previous is not None and summary['throughput_rps'] < previous * (1 + THROUGHPUT_GAIN_THRESHOLD):
+            return level, 'throughput stopped growing'
+        previous = summary['throughput_rps']
+    return None, None
+
+
+# --- Servers ---------------------------------------------------------------
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _wait_until_ready(base_url, process, timeout=60):
+    parsed = urllib.parse.urlsplit(base_url)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            with socket.create_connection((parsed.hostname, parsed.port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server at {base_url} did not start within {timeout}s")
+
+
+def start_server(command, log_file=None, backend='stub'):
+    """Start a server command with an offline EE backend on a free port; returns (process, base_url)."""
+    port = _free_port()
+    env = dict(os.environ, EE_BACKEND=backend, LOG_LEVEL=os.environ.get('LOG_LEVEL', 'WARNING'))
+    output = open(log_file, 'a') if log_file else subprocess.DEVNULL
+    process = subprocess.Popen(shlex.split(command.format(port=port)), cwd=BASE_DIR, env=env,
+                               stdout=output, stderr=subprocess.STDOUT)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        _wait_until_ready(base_url, process)
+    except Exception:
+        process.terminate()
+        raise
+    return process, base_url
+
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def serve(port):
+    """Run the app on the threaded werkzeug server with an offline EE backend (stub by default)."""
+    os.environ.setdefault('EE_BACKEND', 'stub')
+    sys.path.insert(0, BASE_DIR)
+    from app import app
+    app.run(host='127.0.0.1', port=port, threaded=True, debug=False, use_reloader=False)
+
+
+# --- Reporting -------------------------------------------------------------
+
+def _format_ms(value):
+    return '-' if value is None else f"{value:.0f}"
+
+
+def print_report(label, stages):
+    print(f"\n=== {label} ===")
+    print(f"{'route':<26}{'conc':>6}{'req':>7}{'rps':>8}{'p50':>8}{'p95':>8}{'p99':>8}{'err%':>7}")
+    for name in ['(all)'] + sorted({route for stage in stages for route in stage['routes']}):
+        for stage in stages:
+            summary = stage['overall'] if name == '(all)' else stage['routes'].get(name)
+            if not summary:
+                continue
+            print(f"{name:<26}{stage['concurrency']:>6}{summary['requests']:>7}{summary['throughput_rps']:>8.2f}"
+                  f"{_format_ms(summary['p50_ms']):>8}{_format_ms(summary['p95_ms']):>8}"
+                  f"{_format_ms(summary['p99_ms']):>8}{summary['error_rate'] * 100:>7.1f}")
+        level, reason = find_saturation(stages, None if name == '(all)' else name)
+        print(f"{'':<26}saturation: {f'{level} ({reason})' if level else 'not reached'}")
+
+
+def run(args):
+    routes = args.routes.split(',') if args.routes else None
+    levels = [int(level) for level in args.levels.split(',')]
+    targets = [(url, None) for url in args.target or []]
+    servers = args.server or ([] if targets else [f"{sys.executable} loadtest.py serve --port {{port}}"])
+
+    report = {'levels': levels, 'stage_seconds': args.stage_seconds, 'configurations': []}
+    for label, command in [(url, None) for url, _ in targets] + [(cmd, cmd) for cmd in servers]:
+        process, base_url = start_server(command, args.server_log, args.backend) if command else (None, label)
+        try:
+            source = ReplayedRequests(args.replay, routes) if args.replay else GeneratedRequests(routes, args.seed)
+            stages = []
+            for level in levels:
+                print(f"[{label}] concurrency {level} for {args.stage_seconds}s...", flush=True)
+                stages.append(run_stage(base_url, level, args.stage_seconds, source))
+            print_report(label, stages)
+            report['configurations'].append({
+                'label': label,
+                'stages': stages,
+                'saturation': {
+                    name: dict(zip(('concurrency', 'reason'), find_saturation(stages, None if name == '(all)' else name)))
+                    for name in ['(all)'] + sorted({r for s in stages for r in s['routes']})
+                }
+            })
+        finally:
+            if process is not None:
+                stop_server(process)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.output}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load test the app against the synthetic Earth Engine backend.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='ramp concurrency and report latency per route')
+    run_parser.add_argument('--server', action='append',
+                            help='server command with a {port} placeholder; repeat to compare configurations')
+    run_parser.add_argument('--target', action='append', help='base URL of an already running app')
+    run_parser.add_argument('--levels', default=','.join(map(str, DEFAULT_LEVELS)))
+    run_parser.add_argument('--stage-seconds', type=float, default=DEFAULT_STAGE_SECONDS)
+    run_parser.add_argument('--routes', help=f"comma-separated subset of: {', '.join(ROUTE_MIX)}")
+    run_parser.add_argument('--replay', help='JSONL request log recorded with REQUEST_RECORD_FILE')
+    run_parser.add_argument('--seed', type=int)
+    run_parser.add_argument('--backend', choices=['stub', 'replay'], default='stub',
+                            help='EE backend of spawned servers; replay reads EE_CASSETTE (see ee_cassette.py)')
+    run_parser.add_argument('--server-log', help='append the output of spawned servers to this file')
+    run_parser.add_argument('--output', help='write the full report as JSON')
+
+    serve_parser = commands.add_parser('serve', help='run the app with the stub backend')
+    serve_parser.add_argument('--port', type=int, default=5050)
+
+    args = parser.parse_args()
+    if args.command == 'serve':
+        serve(args.port)
+    else:
+        run(args)
@@ -0,0 +1,260 @@
+"""Opt-in per-request profiling.
+
+A request is profiled when it carries an `X-Profile: 1` header or is picked by
+random sampling (PROFILE_SAMPLE_RATE, 0 to 1). While it runs, a background
+thread samples the request thread's stack every PROFILE_INTERVAL_MS, so time
+spent waiting on Earth Engine shows up as well as CPU time. Every EE round trip
+(computeValue for getInfo, getMapId) is recorded with its duration through an
+ee_calls interceptor.
+
+The slowest PROFILE_KEEP profiles are kept in memory:
+
+- `GET /debug/profiles` lists them with their EE calls.
+- `GET /debug/profiles/<id>` returns collapsed stacks ("frame;frame;frame count"
+  per line) for flamegraph.pl, speedscope or inferno.
+
+If PROFILE_TOKEN is set, the header trigger and the debug routes require a
+matching X-Profile-Token header. Otherwise the debug routes only answer local
+requests.
+"""
+import collections
+import contextvars
+import heapq
+import itertools
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+
+from flask import g, jsonify, request, make_response
+
+import ee_calls
+
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_INTERVAL_MS = float(os.environ.get('PROFILE_INTERVAL_MS', '5'))
+PROFILE_KEEP = int(os.environ.get('PROFILE_KEEP', '20'))
+PROFILE_TOKEN = os.environ.get('PROFILE_TOKEN')
+
+LOCAL_ADDRESSES = ('127.0.0.1', '::1')
+
+
+class RequestProfile:
+    """Stack samples and EE calls collected for one request."""
+
+    def __init__(self, profile_id, method, path, thread_id):
+        self.profile_id = profile_id
+        self.method = method
+        self.path = path
+        self.thread_id = thread_id
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.duration_ms = None
+        self.status = None
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self.ee_calls = []
+
+    def elapsed_ms(self):
+        return (time.perf_counter() - self._start) * 1000
+
+    def add_sample(self, frame):
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        self.stacks[';'.join(reversed(stack))] += 1
+        self.samples += 1
+
+    def finish(self, status):
+        self.duration_ms = round(self.elapsed_ms(), 2)
+        self.status = status
+
+    def collapsed(self):
+        """Return the samples in collapsed-stack format."""
+        return '\n'.join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+    def summary(self):
+        ee_time = sum(call['duration_ms'] for call in self.ee_calls)
+        return {
+            'id': self.profile_id,
+            'method': self.method,
+            'path': self.path,
+            'status': self.status,
+            'started_at': self.started_at,
+            'duration_ms': self.duration_ms,
+            'samples': self.samples,
+            'interval_ms': PROFILE_INTERVAL_MS,
+            'ee_time_ms': round(ee_time, 2),
+            'ee_calls': self.ee_calls
+        }
+
+
+class _Sampler(threading.Thread):
+    """Samples the stacks of all threads with an active profile."""
+
+    def __init__(self):
+        super().__init__(name='request-profiler', daemon=True)
+        self.active = {}
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+
+    def add(self, profile):
+        with self.lock:
+            self.active[profile.profile_id] = profile
+            self.wake.set()
+
+    def remove(self, profile):
+        with self.lock:
+            self.active.pop(profile.profile_id, None)
+            if not self.active:
+                self.wake.clear()
+
+    def run(self):
+        interval = PROFILE_INTERVAL_MS / 1000
+        while True:
+            self.wake.wait()
+            time.sleep(interval)
+            with self.lock:
+                profiles = list(self.active.values())
+            if not profiles:
+                continue
+            frames = sys._current_frames()
+            for profile in profiles:
+                frame = frames.get(profile.thread_id)
+                if frame is not None:
+                    profile.add_sample(frame)
+
+
+class SlowestProfiles:
+    """Keeps the N slowest finished profiles."""
+
+    def __init__(self, size=PROFILE_KEEP):
+        self.size = size
+        self._heap = []
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def add(self, profile):
+        entry = (profile.duration_ms, next(self._counter), profile)
+        with self._lock:
+            if len(self._heap) < self.size:
+                heapq.heappush(self._heap, entry)
+            elif entry[0] > self._heap[0][0]:
+                heapq.heapreplace(self._heap, entry)
+
+    def all(self):
+        with self._lock:
+            return [profile for _, _, profile in sorted(self._heap, reverse=True)]
+
+    def get(self, profile_id):
+        return next((p for p in self.all() if p.profile_id == profile_id), None)
+
+
+_sampler = _Sampler()
+_sampler_started = threading.Lock()
+_current = contextvars.ContextVar('request_profile', default=None)
+
+slowest_profiles = SlowestProfiles()
+
+
+def _start_sampler():
+    with _sampler_started:
+        if not _sampler.is_alive():
+            _sampler.start()
+
+
+def _profiling_interceptor(name, call, *args, **kwargs):
+    profile = _current.get()
+    if profile is None:
+        return call(*args, **kwargs)
+
+    offset = profile.elapsed_ms()
+    start = time.perf_counter()
+    error = None
+    try:
+        return call(*args, **kwargs)
+    except Exception as e:
+        error = type(e).__name__
+        raise
+    finally:
+        profile.ee_calls.append({
+            'call': name,
+            'offset_ms': round(offset, 2),
+            'duration_ms': round((time.perf_counter() - start) * 1000, 2),
+            'error': error
+        })
+
+
+def _authorized():
+    if PROFILE_TOKEN:
+        return request.headers.get('X-Profile-Token') == PROFILE_TOKEN
+    return request.remote_addr in LOCAL_ADDRESSES
+
+
+def _should_profile():
+    if request.path.startswith('/debug/') or request.path.startswith('/assets/'):
+        return False
+    if request.headers.get('X-Profile') == '1':
+        return not PROFILE_TOKEN or _authorized()
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def init_profiling(app):
+    """Register the profiling hooks, the EE interceptor and the /debug/profiles routes."""
+    ee_calls.add_interceptor(_profiling_interceptor)
+
+    @app.before_request
+    def start_profile():
+        if not _should_profile():
+            return
+        token = g.get('cancellation_token')
+        profile_id = token.request_id if token is not None else uuid.uuid4().hex
+        profile = RequestProfile(profile_id, request.method, request.path, threading.get_ident())
+        g.profile = profile
+        _current.set(profile)
+        _start_sampler()
+        _sampler.add(profile)
+
+    @app.after_request
+    def finish_profile(response):
+        profile = g.get('profile')
+        if profile is not None:
+            profile.finish(response.status_code)
+            response.headers['X-Profile-ID'] = profile.profile_id
+        return response
+
+    @app.teardown_request
+    def store_profile(exc=None):
+        profile = g.pop('profile', None)
+        if profile is None:
+            return
+        _sampler.remove(profile)
+        _current.set(None)
+        if profile.duration_ms is None:
+            profile.finish(500)
+        slowest_profiles.add(profile)
+
+    @app.route('/debug/profiles')
+    def list_profiles():
+        """List the slowest profiled requests with their EE calls."""
+        if not _authorized():
+            return jsonify({'success': False, 'error': 'Not authorized'}), 403
+        return jsonify({
+            'success': True,
+            'profiles': [profile.summary() for profile in slowest_profiles.all()]
+        })
+
+    @app.route('/debug/profiles/<profile_id>')
+    def get_profile(profile_id):
+        """Return one profile as collapsed stacks for flamegraph tools."""
+        if not _authorized():
+            return jsonify({'success': False, 'error': 'Not authorized'}), 403
+        profile = slowest_profiles.get(profile_id)
+        if profile is None:
+            return jsonify({'success': False, 'error': 'Profile not found'}), 404
+        response = make_response(profile.collapsed())
+        response.headers['Content-Type'] = 'text/plain; charset=utf-8'
+        return response
@@ -0,0 +1,320 @@
+"""Progressive coarse-to-fine analysis results.
+
+`POST /progressive/<analysis>` takes the same body as the normal route for
+that analysis (`ndvi`, `worldcover` or `dynamic_world`). It answers as soon as
+the statistics have been computed at a coarse scale, PROGRESSIVE_COARSE_FACTOR
+(default 8) times the native pixel size. That is 64 times fewer pixels, so
+large areas show numbers within seconds. The response contains:
+
+- `result`: shaped like the normal route's response;
+- `error_estimate`: a 95% sampling margin for each class percentage and area,
+  treating the coarse pixels as independent samples of the area;
+- `job_id`: the refinement at native scale continues in the background.
+
+The final result can be fetched by polling `GET /progressive/jobs/<job_id>`
+or streamed as server-sent events from `GET /progressive/jobs/<job_id>/events`
+(events `coarse`, then `final` or `error`). The final result also reports
+`observed_error`, the largest coarse-to-final difference in class percentage.
+`DELETE /requests/<job_id>` cancels a refinement. Both passes go through
+admission control, and their EE calls are fair-queued as the requesting
+client. The refinement is traced as a trace of its own; its root span and the
+request's coarse span share a `job_id` attribute.
+"""
+import contextvars
+import itertools
+import json
+import math
+import os
+import threading
+import time
+import uuid
+
+from flask import Response, jsonify, request
+
+import cancellation
+from admission import AdmissionRejected, admitted, estimate_cost
+from fair_queue import attribute_to, current_client
+from telemetry import current_span, span
+
+PROGRESSIVE_COARSE_FACTOR = int(os.environ.get('PROGRESSIVE_COARSE_FACTOR', '8'))
+# Finished jobs are kept this long for polling
+PROGRESSIVE_JOB_TTL = float(os.environ.get('PROGRESSIVE_JOB_TTL', '900'))
+MAX_PROGRESSIVE_JOBS = 500
+
+# z value of the 95% confidence margin
+CONFIDENCE_Z = 1.96
+# Interquartile range / this approximates the standard deviation of a normal distribution
+IQR_TO_SIGMA = 1.349
+# Server-sent event streams send a comment this often to keep proxies from closing them
+SSE_KEEPALIVE_SECONDS = 15
+
+
+class ProgressiveAnalysis:
+    """An analysis that can run at any scale.
+
+    `run(data, scale)` returns the normal route's response body for `data`.
+    `endpoint` names the normal route, for cost estimates.
+    """
+
+    def __init__(self, name, endpoint, native_scale, run):
+        self.name = name
+        self.endpoint = endpoint
+        self.native_scale = native_scale
+        self.run = run
+
+
+_analyses = {}
+
+
+def register_analysis(name, endpoint, native_scale, run):
+    _analyses[name] = ProgressiveAnalysis(name, endpoint, native_scale, run)
+
+
+def _area_statistics(result):
+    """Find the area_stats / total_area_hectares block inside a route result."""
+    for value in result.values():
+        if isinstance(value, dict) and 'area_stats' in value:
+            return value
+    return result if 'area_stats' in result else None
+
+
+def error_estimate(result, scale):
+    """95% sampling margins for the class percentages and areas computed at `scale`."""
+    stats = _area_statistics(result)
+    if not stats or not stats.get('total_area_hectares'):
+        return None
+    total_hectares = stats['total_area_hectares']
+    pixels = max(1, int(total_hectares * 10000 / (scale * scale)))
+    estimate = {'method': 'sampling', 'confidence': 0.95, 'scale': scale, 'pixels': pixels, 'area_stats': {}}
+
+    for name, stat in stats['area_stats'].items():
+        share = (stat.get('percentage') or 0) / 100
+        margin = CONFIDENCE_Z * math.sqrt(share * (1 - share) / pixels)
+        estimate['area_stats'][name] = {
+            'percentage_margin': round(margin * 100, 2),
+            'area_hectares_margin': round(margin * total_hectares, 2)
+        }
+
+    basic = stats.get('basic_stats')
+    if basic and basic.get('q3_ndvi') is not None and basic.get('q1_ndvi') is not None:
+        sigma = (basic['q3_ndvi'] - basic['q1_ndvi']) / IQR_TO_SIGMA
+        estimate['mean_ndvi_margin'] = round(CONFIDENCE_Z * sigma / math.sqrt(pixels), 4)
+    return estimate
+
+
+def observed_error(coarse, final):
+    """Largest absolute difference in class percentage between two results."""
+    coarse_stats, final_stats = _area_statistics(coarse), _area_statistics(final)
+    if not coarse_stats or not final_stats:
+        return None
+    names = set(coarse_stats['area_stats']) | set(final_stats['area_stats'])
+    return round(max(
+        (abs(coarse_stats['area_stats'].get(n, {}).get('percentage', 0) -
+             final_stats['area_stats'].get(n, {}).get('percentage', 0)) for n in names),
+        default=0.0
+    ), 2)
+
+
+class ProgressiveJob:
+    """Coarse and final results of one progressive analysis."""
+
+    def __init__(self, job_id, analysis):
+        self.job_id = job_id
+        self.analysis = analysis
+        self.stage = 'coarse'
+        self.coarse = None
+        self.final = None
+        self.error = None
+        self.created = time.monotonic()
+        self.finished_at = None
+        self.version = 0
+        self._changed = threading.Condition()
+
+    def update(self, **fields):
+        with self._changed:
+            for key, value in fields.items():
+                setattr(self, key, value)
+            if self.stage in ('done', 'error'):
+                self.finished_at = time.monotonic()
+            self.version += 1
+            self._changed.notify_all()
+
+    def wait_for_change(self, version, timeout):
+        with self._changed:
+            self._changed.wait_for(lambda: self.version != version, timeout)
+            return self.version
+
+    def to_dict(self):
+        return {
+            'job_id': self.job_id,
+            'analysis': self.analysis,
+            'stage': self.stage,
+            'coarse': self.coarse,
+            'final': self.final,
+            'error': self.error
+        }
+
+
+class ProgressiveJobs:
+    """Running and recently finished jobs."""
+
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def create(self, analysis):
+        job = ProgressiveJob(uuid.uuid4().hex, analysis)
+        with self._lock:
+            self._expire()
+            self._jobs[job.job_id] = job
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _expire(self):
+        now = time.monotonic()
+        for job_id, job in list(self._jobs.items()):
+            if job.finished_at is not None and now - job.finished_at > PROGRESSIVE_JOB_TTL:
+                del self._jobs[job_id]
+        # Never keep more than MAX_PROGRESSIVE_JOBS, oldest finished first
+        finished = sorted((j for j in self._jobs.values() if j.finished_at is not None), key=lambda j: j.finished_at)
+        for job in finished[:max(0, len(self._jobs) - MAX_PROGRESSIVE_JOBS + 1)]:
+            del self._jobs[job.job_id]
+
+
+progressive_jobs = ProgressiveJobs()
+
+
+def _refine(job, analysis, data, cost, client, request_trace_id):
+    """Compute the native-scale result of a job; runs in a background thread with an empty context."""
+    attribute_to(client)
+    token = cancellation.register(job.job_id)
+    try:
+        # No current span here, so this starts a new trace
+        with admitted(analysis.endpoint, cost), \
+                span('progressive.refine', analysis=analysis.name, job_id=job.job_id,
+                     request_trace_id=request_trace_id):
+            result = analysis.run(data, analysis.native_scale)
+        job.update(stage='done', final={
+            'result': result,
+            'scale': analysis.native_scale,
+            'observed_error': observed_error(job.coarse['result'], result)
+        })
+    except Exception as e:
+        job.update(stage='error', error=str(e))
+    finally:
+        cancellation.release(token)
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def init_progressive(app):
+    """Register the progressive analysis routes."""
+
+    @app.route('/progressive/<analysis_name>', methods=['POST'])
+    def start_progressive(analysis_name):
+        """Return coarse statistics now and refine them at native scale in the background."""
+        analysis = _analyses.get(analysis_name)
+        if analysis is None:
+            return jsonify({
+                'success': False,
+                'error': f"Unknown analysis '{analysis_name}'. Expected one of: {', '.join(_analyses)}"
+            }), 404
+
+        data = request.get_json()
+        if not data or not data.get('coordinates'):
+            return jsonify({
+                'success': False,
+                'error': 'No area coordinates provided'
+            })
+
+        factor = max(1, int(data.get('coarse_factor', PROGRESSIVE_COARSE_FACTOR)))
+        coarse_scale = analysis.native_scale * factor
+        cost = estimate_cost(analysis.endpoint, data)
+        job = progressive_jobs.create(analysis_name)
+
+        try:
+            with admitted(analysis.endpoint, cost / (factor * factor) if cost is not None else None), \
+                    span('progressive.coarse', analysis=analysis_name, scale=coarse_scale, job_id=job.job_id):
+                coarse = analysis.run(data, coarse_scale)
+        except AdmissionRejected as e:
+            job.update(stage='error', error=str(e))
+            response = jsonify({'success': False, 'error': str(e)})
+            response.status_code = e.status
+            if e.retry_after:
+                response.headers['Retry-After'] = str(e.retry_after)
+            return response
+        except Exception as e:
+            job.update(stage='error', error=str(e))
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            })
+
+        job.update(stage='refining', coarse={
+            'result': coarse,
+            'scale': coarse_scale,
+            'error_estimate': error_estimate(coarse, coarse_scale)
+        })
+        # The refinement outlives the request, so it gets none of the request's context
+        # (span, cancellation token, profiler) except the client it is fair-queued as
+        request_span = current_span()
+        threading.Thread(
+            target=contextvars.Context().run,
+            args=(_refine, job, analysis, data, cost, current_client(),
+                  request_span.trace_id if request_span is not None else None),
+            name=f"progressive-{job.job_id[:8]}", daemon=True
+        ).start()
+
+        return jsonify({
+            'success': True,
+            'job_id': job.job_id,
+            'stage': 'coarse',
+            'scale': coarse_scale,
+            'result': coarse,
+            'error_estimate': job.coarse['error_estimate'],
+            'poll_url': f"/progressive/jobs/{job.job_id}",
+            'stream_url': f"/progressive/jobs/{job.job_id}/events"
+        })
+
+    @app.route('/progressive/jobs/<job_id>')
+    def get_progressive_job(job_id):
+        """Get the current stage and results of a progressive analysis."""
+        job = progressive_jobs.get(job_id)
+        if job is None:
+            return jsonify({'success': False, 'error': 'Job not found or expired'}), 404
+        return jsonify({'success': True, **job.to_dict()})
+
+    @app.route('/progressive/jobs/<job_id>/events')
+    def stream_progressive_job(job_id):
+        """Stream the coarse and final results of a progressive analysis as server-sent events."""
+        job = progressive_jobs.get(job_id)
+        if job is None:
+            return jsonify({'success': False, 'error': 'Job not found or expired'}), 404
+
+        def events():
+            version = -1
+            sent = set()
+            for _ in itertools.count():
+                if job.coarse is not None and 'coarse' not in sent:
+                    sent.add('coarse')
+                    yield _sse('coarse', job.coarse)
+                if job.stage == 'done':
+                    yield _sse('final', job.final)
+                    return
+                if job.stage == 'error':
+                    yield _sse('error', {'error': job.error})
+                    return
+                new_version = job.wait_for_change(version, SSE_KEEPALIVE_SECONDS)
+                if new_version == version:
+                    yield ': keepalive\n\n'
+                version = new_version
+
+        response = Response(events(), mimetype='text/event-stream')
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Accel-Buffering'] = 'no'
+        return response
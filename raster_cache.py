@@ -0,0 +1,569 @@
+"""Local raster cache for NDVI and land cover pixel arrays.
+
+Pixel arrays for an area are fetched from Earth Engine once, written to disk as
+.npy files with a JSON sidecar describing the grid, and reopened memory-mapped
+afterwards. Statistics, reclassification and area sums for any polygon inside a
+cached grid are then computed locally with NumPy instead of another EE request.
+
+The arrays on disk are kept under RASTER_CACHE_MAX_BYTES (default 2 GB): after
+each new raster is written, the least recently opened ones are deleted. The
+polygon rings that local map tiles are clipped to are kept in `clips/`.
+"""
+import hashlib
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+# Directory holding the cached .npy arrays and their .json sidecars
+CACHE_DIR = os.environ.get(
+    'RASTER_CACHE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'raster_cache')
+)
+
+# Metres per degree of latitude, used to size EPSG:4326 pixels from a scale in metres
+METERS_PER_DEGREE = 111320.0
+
+# Largest block requested from EE in a single call (pixels per side).
+# sampleRectangle is limited to 262144 pixels per request.
+MAX_CHUNK_SIZE = 512
+
+# Refuse to cache grids larger than this many pixels
+MAX_CACHE_PIXELS = 200_000_000
+
+# Disk budget of the cached arrays; least recently used rasters are evicted beyond it
+RASTER_CACHE_MAX_BYTES = int(os.environ.get('RASTER_CACHE_MAX_BYTES', str(2 * 1024 ** 3)))
+
+# Fill values written where the source image is masked
+FLOAT_NODATA = -9999.0
+CLASS_NODATA = 255
+
+
+class RasterGrid:
+    """A north-up EPSG:4326 pixel grid covering a bounding box."""
+
+    def __init__(self, west, north, pixel_size, width, height):
+        self.west = west
+        self.north = north
+        self.pixel_size = pixel_size
+        self.width = width
+        self.height = height
+
+    @classmethod
+    def for_bbox(cls, bbox, scale):
+        """Build a grid covering bbox (west, south, east, north) at roughly `scale` metres."""
+        west, south, east, north = bbox
+        pixel_size = scale / METERS_PER_DEGREE
+        width = max(1, int(math.ceil((east - west) / pixel_size)))
+        height = max(1, int(math.ceil((north - south) / pixel_size)))
+        return cls(west, north, pixel_size, width, height)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['west'], data['north'], data['pixel_size'], data['width'], data['height'])
+
+    def to_dict(self):
+        return {
+            'crs': 'EPSG:4326',
+            'west': self.west,
+            'north': self.north,
+            'pixel_size': self.pixel_size,
+            'width': self.width,
+            'height': self.height,
+            # GDAL-style geotransform for tools that expect one
+            'geotransform': [self.west, self.pixel_size, 0, self.north, 0, -self.pixel_size]
+        }
+
+    @property
+    def bbox(self):
+        return (
+            self.west,
+            self.north - self.height * self.pixel_size,
+            self.west + self.width * self.pixel_size,
+            self.north
+        )
+
+    def contains_bbox(self, bbox):
+        west, south, east, north = self.bbox
+        return bbox[0] >= west and bbox[1] >= south and bbox[2] <= east and bbox[3] <= north
+
+    def window(self, bbox):
+        """Return (row0, row1, col0, col1) of the pixels intersecting bbox."""
+        col0 = max(0, int(math.floor((bbox[0] - self.west) / self.pixel_size)))
+        col1 = min(self.width, int(math.ceil((bbox[2] - self.west) / self.pixel_size)))
+        row0 = max(0, int(math.floor((self.north - bbox[3]) / self.pixel_size)))
+        row1 = min(self.height, int(math.ceil((self.north - bbox[1]) / self.pixel_size)))
+        return row0, max(row0, row1), col0, max(col0, col1)
+
+    def chunk(self, row0, row1, col0, col1):
+        """Return the sub-grid for a pixel window."""
+        return RasterGrid(
+            self.west + col0 * self.pixel_size,
+            self.north - row0 * self.pixel_size,
+            self.pixel_size,
+            col1 - col0,
+            row1 - row0
+        )
+
+    def pixel_centers(self, row0, row1, col0, col1):
+        """Return (lon, lat) arrays of pixel centres for a window, shaped (rows, 1) and (1, cols)."""
+        lons = self.west + (np.arange(col0, col1) + 0.5) * self.pixel_size
+        lats = self.north - (np.arange(row0, row1) + 0.5) * self.pixel_size
+        return lons[np.newaxis, :], lats[:, np.newaxis]
+
+    def pixel_area_hectares(self, row0, row1):
+        """Return the area of one pixel in each row of a window, shaped (rows, 1)."""
+        lats = self.north - (np.arange(row0, row1) + 0.5) * self.pixel_size
+        side_m = self.pixel_size * METERS_PER_DEGREE
+        return (side_m * side_m * np.cos(np.radians(lats)) / 10000)[:, np.newaxis]
+
+
+def coordinates_bbox(coordinates):
+    """Return the (west, south, east, north) bounding box of a coordinate ring."""
+    ring = np.asarray(coordinates, dtype=float)
+    return (
+        float(ring[:, 0].min()),
+        float(ring[:, 1].min()),
+        float(ring[:, 0].max()),
+        float(ring[:, 1].max())
+    )
+
+
+def ring_mask(coordinates, lons, lats):
+    """Vectorized even-odd test of points against a polygon ring.
+
+    `lons` and `lats` broadcast against each other, e.g. shaped (1, cols) and (rows, 1).
+    """
+    ring = np.asarray(coordinates, dtype=float)
+    if not np.array_equal(ring[0], ring[-1]):
+        ring = np.vstack([ring, ring[:1]])
+
+    inside = np.zeros(np.broadcast(lons, lats).shape, dtype=bool)
+    for (x1, y1), (x2, y2) in zip(ring[:-1], ring[1:]):
+        if y1 == y2:
+            continue
+        # Points whose latitude is spanned by this edge
+        spans = (lats >= min(y1, y2)) & (lats < max(y1, y2))
+        x_cross = x1 + (lats - y1) * (x2 - x1) / (y2 - y1)
+        inside ^= spans & (lons < x_cross)
+    return inside
+
+
+def polygon_mask(coordinates, grid, row0, row1, col0, col1):
+    """Rasterize a polygon ring onto a grid window."""
+    lons, lats = grid.pixel_centers(row0, row1, col0, col1)
+    return ring_mask(coordinates, lons, lats)
+
+
+def fetch_with_compute_pixels(image, grid, band, nodata):
+    """Fetch a block of pixels through EE's computePixels API."""
+    import ee
+    result = ee.data.computePixels({
+        'expression': image.select([band]),
+        'fileFormat': 'NUMPY_NDARRAY',
+        'grid': {
+            'dimensions': {'width': grid.width, 'height': grid.height},
+            'affineTransform': {
+                'scaleX': grid.pixel_size,
+                'shearX': 0,
+                'translateX': grid.west,
+                'shearY': 0,
+                'scaleY': -grid.pixel_size,
+                'translateY': grid.north
+            },
+            'crsCode': 'EPSG:4326'
+        }
+    })
+    return np.asarray(result[band])
+
+
+def fetch_with_sample_rectangle(image, grid, band, nodata):
+    """Fetch a block of pixels with sampleRectangle, for clients without computePixels."""
+    import ee
+    west, south, east, north = grid.bbox
+    region = ee.Geometry.Rectangle([west, south, east, north], 'EPSG:4326', False)
+    sample = image.select([band]) \
+        .reproject(crs='EPSG:4326', crsTransform=[grid.pixel_size, 0, grid.west, 0, -grid.pixel_size, grid.north]) \
+        .sampleRectangle(region=region, defaultValue=nodata) \
+        .get(band) \
+        .getInfo()
+    values = np.asarray(sample)
+    if values.ndim != 2:
+        raise Exception(
+            f"sampleRectangle returned a {values.ndim}-D payload of shape {values.shape} for band "
+            f"'{band}', expected a {grid.height}x{grid.width} block"
+        )
+    # sampleRectangle can be off by a pixel at the edges; pad or trim to the requested block
+    block = np.full((grid.height, grid.width), nodata, dtype=values.dtype)
+    rows = min(grid.height, values.shape[0])
+    cols = min(grid.width, values.shape[1])
+    block[:rows, :cols] = values[:rows, :cols]
+    return block
+
+
+def default_fetcher(image, grid, band, nodata):
+    """Fetch pixels with computePixels when the client supports it, else sampleRectangle."""
+    import ee
+    if hasattr(ee.data, 'computePixels'):
+        return fetch_with_compute_pixels(image, grid, band, nodata)
+    return fetch_with_sample_rectangle(image, grid, band, nodata)
+
+
+class RasterCache:
+    """Disk-backed cache of single-band rasters keyed by dataset, parameters and grid."""
+
+    def __init__(self, cache_dir=CACHE_DIR, fetch_pixels=default_fetcher, max_bytes=RASTER_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.fetch_pixels = fetch_pixels
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._index = None
+
+    def _read_sidecar(self, path):
+        """Return the sidecar stored at path, or None if it is missing or unreadable."""
+        try:
+            with open(path) as f:
+                sidecar = json.load(f)
+            sidecar['key']
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        return sidecar
+
+    def _load_index(self):
+        """Read every sidecar in the cache directory into memory."""
+        index = {}
+        if os.path.isdir(self.cache_dir):
+            for name in os.listdir(self.cache_dir):
+                if not name.endswith('.json'):
+                    continue
+                sidecar = self._read_sidecar(os.path.join(self.cache_dir, name))
+                if sidecar is not None:
+                    index[sidecar['key']] = sidecar
+        return index
+
+    @property
+    def index(self):
+        with self._lock:
+            if self._index is None:
+                self._index = self._load_index()
+            return self._index
+
+    def lookup(self, key):
+        """Return the sidecar of the raster stored under key; raises KeyError if it is not cached.
+
+        Another worker process may have written the raster after this one loaded
+        its index, so a miss reads the sidecar from disk before giving up.
+        """
+        sidecar = self.index.get(key)
+        if sidecar is not None:
+            return sidecar
+        # Keys are hex digests; anything else cannot name a file in the cache
+        if not key or any(c not in '0123456789abcdef' for c in key):
+            raise KeyError(key)
+        sidecar = self._read_sidecar(os.path.join(self.cache_dir, key + '.json'))
+        if sidecar is None or sidecar['key'] != key:
+            raise KeyError(key)
+        with self._lock:
+            self._index[key] = sidecar
+        return sidecar
+
+    @staticmethod
+    def params_key(dataset, params):
+        return hashlib.sha256(json.dumps([dataset, params], sort_keys=True).encode()).hexdigest()[:16]
+
+    def find(self, dataset, params, bbox):
+        """Return the sidecar of a cached raster covering bbox, or None."""
+        params_key = self.params_key(dataset, params)
+        for sidecar in list(self.index.values()):
+            if sidecar['params_key'] == params_key and RasterGrid.from_dict(sidecar['grid']).contains_bbox(bbox):
+                # Another worker may have evicted it; forget it so the caller fetches it again
+                if not os.path.exists(self._array_path(sidecar['key'])):
+                    self._remove(sidecar['key'])
+                    continue
+                return sidecar
+        return None
+
+    def _array_path(self, key):
+        return os.path.join(self.cache_dir, key + '.npy')
+
+    def open(self, sidecar):
+        """Open a cached raster read-only as a memory map."""
+        path = self._array_path(sidecar['key'])
+        try:
+            array = np.load(path, mmap_mode='r')
+        except FileNotFoundError:
+            self._remove(sidecar['key'])
+            raise
+        # The array's mtime records its last use for eviction; atime is often disabled
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return array
+
+    def _remove(self, key):
+        """Drop a raster from the index and delete its sidecar, then its array."""
+        with self._lock:
+            if self._index is not None:
+                self._index.pop(key, None)
+        for path in (os.path.join(self.cache_dir, key + '.json'), self._array_path(key)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def enforce_budget(self, keep=None):
+        """Delete the least recently used rasters until the arrays fit in max_bytes.
+
+        `keep` (the raster just written) is never evicted. Returns the evicted keys.
+        """
+        entries = []
+        for key in list(self.index):
+            try:
+                stat = os.stat(self._array_path(key))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, key))
+
+        total = sum(size for _, size, _ in entries)
+        evicted = []
+        for _, size, key in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            try:
+                self._remove(key)
+            except OSError:
+                # Still open elsewhere on platforms that cannot delete open files
+                continue
+            total -= size
+            evicted.append(key)
+        return evicted
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def get_or_fetch(self, dataset, params, bbox, image, band, scale, dtype, nodata):
+        """Return a sidecar covering bbox, fetching the raster from EE on a miss.
+
+        `image` is only evaluated on a miss. Masked pixels are filled with `nodata`.
+        Writing a new raster evicts older ones beyond the disk budget.
+        """
+        sidecar = self.find(dataset, params, bbox)
+        if sidecar is not None:
+            return sidecar
+
+        grid = RasterGrid.for_bbox(bbox, scale)
+        if grid.width * grid.height > MAX_CACHE_PIXELS:
+            raise Exception(
+                f"Area is too large to cache at {scale}m ({grid.width}x{grid.height} pixels). "
+                "Select a smaller area."
+            )
+
+        params_key = self.params_key(dataset, params)
+        key = hashlib.sha256(
+            json.dumps([params_key, [round(v, 6) for v in bbox], scale]).encode()
+        ).hexdigest()[:24]
+
+        with self._key_lock(key):
+            # Another thread may have fetched it while we waited
+            sidecar = self.find(dataset, params, bbox)
+            if sidecar is not None:
+                return sidecar
+
+            os.makedirs(self.cache_dir, exist_ok=True)
+            array_path = self._array_path(key)
+            # The key lock only covers this process; other workers may be fetching
+            # the same raster, so each writes its own temporary file
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix=f"{key}.", suffix='.tmp')
+            os.close(fd)
+            filled = image.unmask(nodata)
+
+            started = time.time()
+            try:
+                out = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=dtype, shape=(grid.height, grid.width))
+                for row0 in range(0, grid.height, MAX_CHUNK_SIZE):
+                    row1 = min(grid.height, row0 + MAX_CHUNK_SIZE)
+                    for col0 in range(0, grid.width, MAX_CHUNK_SIZE):
+                        col1 = min(grid.width, col0 + MAX_CHUNK_SIZE)
+                        block = self.fetch_pixels(filled, grid.chunk(row0, row1, col0, col1), band, nodata)
+                        out[row0:row1, col0:col1] = block
+                out.flush()
+                del out
+                os.replace(tmp_path, array_path)
+            except BaseException:
+                try:
+                    os.remove(tmp_path)
+                except FileNotFoundError:
+                    pass
+                raise
+
+            sidecar = {
+                'key': key,
+                'dataset': dataset,
+                'params': params,
+                'params_key': params_key,
+                'band': band,
+                'scale': scale,
+                'dtype': np.dtype(dtype).name,
+                'nodata': nodata,
+                'grid': grid.to_dict(),
+                'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+                'fetch_seconds': round(time.time() - started, 3)
+            }
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix=f"{key}.", suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(sidecar, f)
+            os.replace(tmp_path, os.path.join(self.cache_dir, key + '.json'))
+            self.index[key] = sidecar
+            self.enforce_budget(keep=key)
+            return sidecar
+
+    def _clip_path(self, clip_key):
+        return os.path.join(self.cache_dir, 'clips', clip_key + '.json')
+
+    def save_clip(self, coordinates):
+        """Store a polygon ring that local tiles are clipped to and return its key.
+
+        Tile requests only carry the key, and may be served by another worker,
+        so rings are kept on disk next to the rasters.
+        """
+        ring = [[round(float(lon), 7), round(float(lat), 7)] for lon, lat in coordinates]
+        encoded = json.dumps(ring, separators=(',', ':'))
+        clip_key = hashlib.sha256(encoded.encode()).hexdigest()[:16]
+        path = self._clip_path(clip_key)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                f.write(encoded)
+            os.replace(tmp_path, path)
+        return clip_key
+
+    def load_clip(self, clip_key):
+        """Return the polygon ring stored under clip_key; raises KeyError if there is none."""
+        if not clip_key or any(c not in '0123456789abcdef' for c in clip_key):
+            raise KeyError(clip_key)
+        try:
+            with open(self._clip_path(clip_key)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            raise KeyError(clip_key)
+
+    def read_polygon(self, sidecar, coordinates):
+        """Return (values, pixel_area_hectares) for the valid pixels inside a polygon."""
+        grid = RasterGrid.from_dict(sidecar['grid'])
+        row0, row1, col0, col1 = grid.window(coordinates_bbox(coordinates))
+        window = np.asarray(self.open(sidecar)[row0:row1, col0:col1])
+
+        inside = polygon_mask(coordinates, grid, row0, row1, col0, col1)
+        valid = inside & (window != sidecar['nodata'])
+        if np.issubdtype(window.dtype, np.floating):
+            valid &= ~np.isnan(window)
+
+        areas = np.broadcast_to(grid.pixel_area_hectares(row0, row1), window.shape)
+        return window[valid], areas[valid]
+
+
+def reclassify(values, edges):
+    """Map continuous values to bin indexes 0..len(edges)-2; values outside the edges get -1."""
+    edges = np.asarray(edges, dtype=float)
+    bins = np.digitize(values, edges[1:-1], right=False)
+    outside = (values < edges[0]) | (values >= edges[-1])
+    return np.where(outside, -1, bins)
+
+
+def ndvi_statistics(values, areas, ranges):
+    """Compute the get_ndvi_statistics payload locally from NDVI pixel values.
+
+    `ranges` is a list of (name, min, max, description) tuples with contiguous edges.
+    """
+    if values.size == 0:
+        raise Exception("No valid NDVI pixels inside the selected area")
+
+    weights = areas / areas.sum()
+    mean = float(np.sum(values * weights))
+    q1, median, q3 = np.percentile(values, [25, 50, 75])
+
+    edges = [ranges[0][1]] + [max_val for _, _, max_val, _ in ranges]
+    bins = reclassify(values, edges)
+    in_range = bins >= 0
+    range_areas = np.bincount(bins[in_range], weights=areas[in_range], minlength=len(ranges))
+
+    total_area = float(range_areas.sum())
+    area_stats = {}
+    for (name, min_val, max_val, description), area_hectares in zip(ranges, range_areas):
+        area_stats[name] = {
+            'description': description,
+            'min_ndvi': min_val,
+            'max_ndvi': max_val,
+            'area_hectares': round(float(area_hectares), 2),
+            'percentage': round(float(area_hectares) / total_area * 100, 2) if total_area > 0 else 0
+        }
+
+    return {
+        'basic_stats': {
+            'mean_ndvi': round(mean, 3),
+            'min_ndvi': round(float(values.min()), 3),
+            'max_ndvi': round(float(values.max()), 3),
+            'median_ndvi': round(float(median), 3),
+            'q1_ndvi': round(float(q1), 3),
+            'q3_ndvi': round(float(q3), 3)
+        },
+        'area_stats': area_stats,
+        'total_area_hectares': round(total_area, 2)
+    }
+
+
+def threshold_statistics(values, areas, threshold):
+    """Split the area of a polygon at an NDVI threshold."""
+    above = float(areas[values >= threshold].sum())
+    below = float(areas[values < threshold].sum())
+    return {
+        'threshold': threshold,
+        'area_above_hectares': round(above, 2),
+        'area_below_hectares': round(below, 2)
+    }
+
+
+def class_area_statistics(values, areas, classes):
+    """Compute land cover area_stats locally from class label pixels.
+
+    `classes` maps class value to {'name': ..., 'color': ...} as in app.py.
+    """
+    values = values.astype(np.int64)
+    pixel_counts = np.bincount(values, minlength=max(classes) + 1)
+    class_areas = np.bincount(values, weights=areas, minlength=max(classes) + 1)
+
+    area_stats = {}
+    total_area = 0
+    for class_value, info in classes.items():
+        if class_value >= len(pixel_counts) or pixel_counts[class_value] == 0:
+            continue
+        area_hectares = float(class_areas[class_value])
+        total_area += area_hectares
+        area_stats[info['name']] = {
+            'class_value': class_value,
+            'color': '#' + info['color'],
+            'area_hectares': round(area_hectares, 2),
+            'pixel_count': int(pixel_counts[class_value])
+        }
+
+    for stat in area_stats.values():
+        stat['percentage'] = round((stat['area_hectares'] / total_area) * 100, 2) if total_area > 0 else 0
+
+    return {
+        'area_stats': area_stats,
+        'total_area_hectares': round(total_area, 2)
+    }
+
+
+# Shared cache instance used by the Flask routes
+raster_cache = RasterCache()
@@ -0,0 +1,238 @@
+"""PNG map tiles rendered locally from the raster cache.
+
+Rasters pulled into raster_cache.py by /cached_stats can be shown on the map
+without Earth Engine: `GET /raster_tiles/<raster_key>/<z>/<x>/<y>.png` samples
+the cached EPSG:4326 array at the centre of each Web Mercator tile pixel
+(nearest neighbour) and colours it through a palette lookup table:
+
+- class rasters (IGBP, ESA WorldCover, Dynamic World) map each class value to
+  its colour in app.py's class tables, the same colours as the EE tiles;
+- NDVI is quantized onto a 255-step red-yellow-green ramp from -1 to 1.
+
+Tiles are encoded as 8-bit indexed PNGs, with index 0 transparent for nodata,
+unknown classes and pixels outside the cached bounding box. A `?clip=<key>`
+of a polygon stored with RasterCache.save_clip() also leaves the pixels
+outside that polygon transparent, like the clipped EE tiles. Encoded tiles are
+kept in an in-memory LRU of RASTER_TILE_CACHE_BYTES (default 64 MB). Cached
+rasters never change once written, so a tile is rendered at most once while
+it stays in the LRU.
+"""
+import collections
+import os
+import struct
+import threading
+import zlib
+
+import numpy as np
+from flask import jsonify, make_response, request
+
+from raster_cache import RasterGrid, raster_cache, ring_mask
+from vector_tiles import mercator_to_lonlat, tile_bounds
+
+TILE_SIZE = 256
+RASTER_TILE_MAX_ZOOM = 20
+RASTER_TILE_CACHE_BYTES = int(os.environ.get('RASTER_TILE_CACHE_BYTES', str(64 * 1024 * 1024)))
+
+# zlib level of the encoded tiles; higher levels barely shrink palette tiles
+PNG_COMPRESSION = 6
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+def _rgb(color):
+    color = color.lstrip('#')
+    return [int(color[i:i + 2], 16) for i in (0, 2, 4)]
+
+
+class ClassPalette:
+    """Colours of the values of a class raster, from a {value: {'color': 'rrggbb'}} table."""
+
+    def __init__(self, classes):
+        values = sorted(classes)
+        # Palette index of every possible uint8 value; 0 (transparent) for values outside the table
+        self.lut = np.zeros(256, dtype=np.uint8)
+        self.lut[values] = np.arange(1, len(values) + 1)
+        self.colors = [[0, 0, 0]] + [_rgb(classes[value]['color']) for value in values]
+
+    def indexes(self, values, valid):
+        return np.where(valid, self.lut[values.astype(np.uint8)], 0).astype(np.uint8)
+
+
+class RampPalette:
+    """A linear colour ramp from `vmin` to `vmax`, quantized to `steps` colours."""
+
+    def __init__(self, colors, vmin, vmax, steps=255):
+        self.vmin = vmin
+        self.vmax = vmax
+        self.steps = steps
+        stops = np.asarray([_rgb(color) for color in colors], dtype=float)
+        positions = np.linspace(0, 1, len(stops))
+        samples = np.linspace(0, 1, steps)
+        ramp = np.stack([np.interp(samples, positions, stops[:, channel]) for channel in range(3)], axis=1)
+        self.colors = [[0, 0, 0]] + np.round(ramp).astype(int).tolist()
+
+    def indexes(self, values, valid):
+        valid = valid & ~np.isnan(values)
+        scaled = (np.nan_to_num(values) - self.vmin) / (self.vmax - self.vmin) * (self.steps - 1)
+        steps = np.clip(np.round(scaled), 0, self.steps - 1).astype(np.uint8) + 1
+        return np.where(valid, steps, 0).astype(np.uint8)
+
+
+_palettes = {}
+
+
+def register_palette(dataset, palette):
+    _palettes[dataset] = palette
+
+
+def _chunk(kind, data):
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+
+
+def encode_png(indexes, colors):
+    """Encode a 2-D uint8 array of palette indexes as a PNG whose index 0 is transparent."""
+    height, width = indexes.shape
+    # Each scanline starts with its filter type, 0 (none)
+    rows = np.hstack([np.zeros((height, 1), dtype=np.uint8), indexes])
+    return b''.join([
+        PNG_SIGNATURE,
+        _chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 3, 0, 0, 0)),
+        _chunk(b'PLTE', bytes(np.asarray(colors, dtype=np.uint8).ravel())),
+        # Alpha of the first palette entry only; the others stay opaque
+        _chunk(b'tRNS', b'\x00'),
+        _chunk(b'IDAT', zlib.compress(rows.tobytes(), PNG_COMPRESSION)),
+        _chunk(b'IEND', b'')
+    ])
+
+
+EMPTY_TILE = encode_png(np.zeros((TILE_SIZE, TILE_SIZE), dtype=np.uint8), [[0, 0, 0]])
+
+
+def tile_pixels(grid, z, x, y):
+    """Grid (rows, cols) sampled at the pixel centres of a tile, with masks of those inside the grid."""
+    minx, miny, maxx, maxy = tile_bounds(z, x, y)
+    centres = (np.arange(TILE_SIZE) + 0.5) / TILE_SIZE
+    # Longitude depends only on the tile column and latitude only on the tile row
+    lons, _ = mercator_to_lonlat(minx + centres * (maxx - minx), 0)
+    _, lats = mercator_to_lonlat(0, maxy - centres * (maxy - miny))
+    cols = np.floor((lons - grid.west) / grid.pixel_size).astype(np.int64)
+    rows = np.floor((grid.north - lats) / grid.pixel_size).astype(np.int64)
+    return rows, cols, (rows >= 0) & (rows < grid.height), (cols >= 0) & (cols < grid.width)
+
+
+class TileLRU:
+    """Encoded tiles by (raster key, clip key, z, x, y), evicted least recently used first beyond max_bytes."""
+
+    def __init__(self, max_bytes=RASTER_TILE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._tiles = collections.OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            tile = self._tiles.get(key)
+            if tile is None:
+                self.misses += 1
+                return None
+            self._tiles.move_to_end(key)
+            self.hits += 1
+            return tile
+
+    def put(self, key, tile):
+        with self._lock:
+            if key in self._tiles or len(tile) > self.max_bytes:
+                return
+            self._tiles[key] = tile
+            self._bytes += len(tile)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._tiles.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def stats(self):
+        with self._lock:
+            return {'tiles': len(self._tiles), 'bytes': self._bytes, 'max_bytes': self.max_bytes,
+                    'hits': self.hits, 'misses': self.misses}
+
+
+class RasterTileRenderer:
+    """Renders PNG tiles of cached rasters through the registered palettes."""
+
+    def __init__(self, cache=raster_cache, tiles=None):
+        self.cache = cache
+        self.tiles = tiles if tiles is not None else TileLRU()
+
+    def render(self, sidecar, z, x, y, clip=None):
+        """Render a tile, leaving pixels outside the `clip` polygon ring transparent."""
+        palette = _palettes[sidecar['dataset']]
+        grid = RasterGrid.from_dict(sidecar['grid'])
+        rows, cols, rows_inside, cols_inside = tile_pixels(grid, z, x, y)
+        if not rows_inside.any() or not cols_inside.any():
+            return EMPTY_TILE
+
+        # Read only the grid rows and columns the tile samples from the memory map
+        rows = np.clip(rows, 0, grid.height - 1)
+        cols = np.clip(cols, 0, grid.width - 1)
+        array = self.cache.open(sidecar)
+        values = np.asarray(array[np.ix_(rows, cols)])
+        valid = rows_inside[:, np.newaxis] & cols_inside[np.newaxis, :] & (values != sidecar['nodata'])
+        if clip is not None:
+            # Test the centres of the grid pixels shown, as /cached_stats does
+            lons = grid.west + (cols[np.newaxis, :] + 0.5) * grid.pixel_size
+            lats = grid.north - (rows[:, np.newaxis] + 0.5) * grid.pixel_size
+            valid &= ring_mask(clip, lons, lats)
+        return encode_png(palette.indexes(values, valid), palette.colors)
+
+    def get_tile(self, key, z, x, y, clip_key=None):
+        """Return (png, cache hit) for a tile of a cached raster, clipped to a stored polygon.
+
+        Raises KeyError for unknown rasters and clip keys.
+        """
+        tile = self.tiles.get((key, clip_key, z, x, y))
+        if tile is not None:
+            return tile, True
+        sidecar = self.cache.lookup(key)
+        if sidecar['dataset'] not in _palettes:
+            raise KeyError(key)
+        clip = self.cache.load_clip(clip_key) if clip_key is not None else None
+        tile = self.render(sidecar, z, x, y, clip)
+        self.tiles.put((key, clip_key, z, x, y), tile)
+        return tile, False
+
+
+raster_tiles = RasterTileRenderer()
+
+
+def tile_url(raster_key, clip_key=None):
+    """Leaflet URL template of the local tiles of a cached raster, optionally clipped to a polygon."""
+    url = f"/raster_tiles/{raster_key}/{{z}}/{{x}}/{{y}}.png"
+    return f"{url}?clip={clip_key}" if clip_key else url
+
+
+def init_raster_tiles(app):
+    """Register `GET /raster_tiles/<raster_key>/<z>/<x>/<y>.png` and `GET /raster_tiles/stats`."""
+
+    @app.route('/raster_tiles/<raster_key>/<int:z>/<int:x>/<int:y>.png')
+    def serve_raster_tile(raster_key, z, x, y):
+        """Serve a PNG tile of a cached raster, rendered locally."""
+        if z > RASTER_TILE_MAX_ZOOM or x >= 2 ** z or y >= 2 ** z:
+            return jsonify({'success': False, 'error': 'Tile out of range'}), 404
+
+        try:
+            tile, cache_hit = raster_tiles.get_tile(raster_key, z, x, y, request.args.get('clip'))
+        except KeyError:
+            return jsonify({'success': False, 'error': 'Raster or clip area not cached'}), 404
+
+        response = make_response(tile)
+        response.headers['Content-Type'] = 'image/png'
+        # Raster keys name immutable arrays, so their tiles never change
+        response.headers['Cache-Control'] = 'public, max-age=86400'
+        response.headers['X-Tile-Cache'] = 'hit' if cache_hit else 'miss'
+        return response
+
+    @app.route('/raster_tiles/stats')
+    def raster_tile_stats():
+        """Show the size and hit rate of the rendered tile LRU."""
+        return jsonify({'success': True, **raster_tiles.tiles.stats()})
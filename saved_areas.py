@@ -0,0 +1,404 @@
+"""Saved areas and the analysis results computed for them.
+
+Areas are kept in a SQLite database at SAVED_AREAS_PATH. Each area is
+identified by a hash of its canonical geometry (see canonical_ring()), so
+saving the same polygon twice, drawn from another vertex or in the other
+direction, updates one area. An R-tree over the areas' bounding boxes serves
+location searches.
+
+Successful analysis responses (NDVI, IGBP, WorldCover, Dynamic World, yearly
+and monthly statistics, transition matrices) for the AOI of a saved area are
+stored against its geometry hash and the rest of the request body; results
+for areas that are not saved are not kept. The request thread only queues the
+response; a background thread checks for the area and writes the result.
+
+- `POST /save_area` saves or renames an area.
+- `GET /saved_areas` lists areas, filtered by `bbox=west,south,east,north`,
+  a point (`lon`, `lat`) inside the area, or a name substring `q`.
+- `GET /saved_areas/<id>` returns an area with its latest result for each
+  analysis and set of parameters, so it can be reopened without recomputing.
+  Tile URLs in stored results expire after a few hours, so check
+  `computed_at` before reusing them.
+- `DELETE /saved_areas/<id>` deletes an area and its results.
+"""
+import hashlib
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+from flask import jsonify, request
+from shapely.geometry import Point, Polygon
+
+from shared_cache import ProcessLocal
+from telemetry import aoi_area_km2
+
+SAVED_AREAS_PATH = os.environ.get(
+    'SAVED_AREAS_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'saved_areas.sqlite3')
+)
+
+# 6 decimal places of a degree is roughly 10 cm on the ground
+GEOMETRY_PRECISION = 6
+# Larger results are not stored
+MAX_RESULT_BYTES = 2 * 1024 * 1024
+# Responses waiting to be stored; more are dropped
+MAX_PENDING_RESULTS = 1000
+DEFAULT_LIST_LIMIT = 100
+MAX_LIST_LIMIT = 500
+
+# Route endpoint -> analysis name of the results it produces
+ANALYSIS_ENDPOINTS = {
+    'get_ndvi': 'ndvi',
+    'get_igbp': 'igbp',
+    'get_worldcover': 'worldcover',
+    'get_dynamic_world_route': 'dynamic_world',
+    'get_dynamic_world_for_year_route': 'dynamic_world_year',
+    'get_dynamic_world_timeseries_route': 'dynamic_world_timeseries',
+    'get_yearly_stats': 'yearly_stats',
+    'get_monthly_profile': 'monthly_profile',
+    'transition_matrix': 'transition_matrix',
+}
+
+SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS areas (
+        id INTEGER PRIMARY KEY,
+        geometry_hash TEXT UNIQUE NOT NULL,
+        name TEXT,
+        description TEXT,
+        coordinates TEXT NOT NULL,
+        area_km2 REAL,
+        created REAL,
+        updated REAL
+    )''',
+    'CREATE VIRTUAL TABLE IF NOT EXISTS area_bbox USING rtree(id, west, east, south, north)',
+    '''CREATE TABLE IF NOT EXISTS results (
+        geometry_hash TEXT NOT NULL,
+        analysis TEXT NOT NULL,
+        params_hash TEXT NOT NULL,
+        params TEXT,
+        result TEXT,
+        computed_at REAL,
+        PRIMARY KEY (geometry_hash, analysis, params_hash)
+    )''',
+]
+
+logger = logging.getLogger(__name__)
+
+
+def canonical_ring(coordinates):
+    """Return a polygon ring rounded, unclosed, counter-clockwise and starting at its smallest vertex."""
+    ring = [(round(float(lon), GEOMETRY_PRECISION), round(float(lat), GEOMETRY_PRECISION)) for lon, lat in coordinates]
+    if len(ring) > 1 and ring[0] == ring[-1]:
+        ring = ring[:-1]
+    ring = [point for i, point in enumerate(ring) if point != ring[i - 1]] or ring
+    if len(ring) < 3:
+        raise ValueError('An area needs at least 3 distinct vertices')
+    signed_area = sum(x1 * y2 - x2 * y1 for (x1, y1), (x2, y2) in zip(ring, ring[1:] + ring[:1]))
+    if signed_area < 0:
+        ring.reverse()
+    start = ring.index(min(ring))
+    return ring[start:] + ring[:start]
+
+
+def geometry_hash(coordinates):
+    """Hash of an area's canonical geometry."""
+    ring = canonical_ring(coordinates)
+    return hashlib.sha256(json.dumps(ring, separators=(',', ':')).encode()).hexdigest()[:32]
+
+
+def _params_hash(params):
+    return hashlib.sha256(json.dumps(params, sort_keys=True, separators=(',', ':')).encode()).hexdigest()[:16]
+
+
+def _timestamp(seconds):
+    return datetime.fromtimestamp(seconds, timezone.utc).isoformat(timespec='seconds') if seconds else None
+
+
+class SavedAreaStore:
+    """Areas, their bounding-box index and attached results, one connection per thread and process."""
+
+    def __init__(self, path=SAVED_AREAS_PATH):
+        self.path = path
+        # Opened at import, so workers forked from a preloaded master need their own connections
+        self._local = ProcessLocal()
+        conn = self._connect()
+        for statement in SCHEMA:
+            conn.execute(statement)
+
+    def _connect(self):
+        local = self._local.get()
+        conn = getattr(local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            local.conn = conn
+        return conn
+
+    def _transaction(self):
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        return conn
+
+    def save(self, coordinates, name=None, description=None):
+        """Save an area, or update the name and description of an identical one; returns (area, created)."""
+        ring = canonical_ring(coordinates)
+        key = geometry_hash(coordinates)
+        west, south = min(lon for lon, _ in ring), min(lat for _, lat in ring)
+        east, north = max(lon for lon, _ in ring), max(lat for _, lat in ring)
+        now = time.time()
+
+        conn = self._transaction()
+        try:
+            row = conn.execute('SELECT id FROM areas WHERE geometry_hash = ?', (key,)).fetchone()
+            if row is None:
+                area_id = conn.execute(
+                    'INSERT INTO areas (geometry_hash, name, description, coordinates, area_km2, created, updated) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (key, name, description, json.dumps(ring + ring[:1]), aoi_area_km2(ring), now, now)
+                ).lastrowid
+                conn.execute('INSERT INTO area_bbox VALUES (?, ?, ?, ?, ?)', (area_id, west, east, south, north))
+            else:
+                area_id = row['id']
+                conn.execute(
+                    'UPDATE areas SET name = COALESCE(?, name), description = COALESCE(?, description), updated = ? '
+                    'WHERE id = ?',
+                    (name, description, now, area_id)
+                )
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return self.get(area_id, with_results=False), row is None
+
+    def _area(self, row, analyses):
+        return {
+            'id': row['id'],
+            'geometry_hash': row['geometry_hash'],
+            'name': row['name'],
+            'description': row['description'],
+            'coordinates': json.loads(row['coordinates']),
+            'area_km2': row['area_km2'],
+            'created': _timestamp(row['created']),
+            'updated': _timestamp(row['updated']),
+            'analyses': analyses
+        }
+
+    def _analyses(self, key):
+        rows = self._connect().execute(
+            'SELECT DISTINCT analysis FROM results WHERE geometry_hash = ? ORDER BY analysis', (key,)
+        )
+        return [row['analysis'] for row in rows]
+
+    def get(self, area_id, with_results=True):
+        """An area with its attached results, or None."""
+        row = self._connect().execute('SELECT * FROM areas WHERE id = ?', (area_id,)).fetchone()
+        if row is None:
+            return None
+        area = self._area(row, self._analyses(row['geometry_hash']))
+        if with_results:
+            area['results'] = [
+                {
+                    'analysis': result['analysis'],
+                    'params': json.loads(result['params']),
+                    'computed_at': _timestamp(result['computed_at']),
+                    'result': json.loads(result['result'])
+                }
+                for result in self._connect().execute(
+                    'SELECT * FROM results WHERE geometry_hash = ? ORDER BY computed_at DESC', (row['geometry_hash'],)
+                )
+            ]
+        return area
+
+    def search(self, bbox=None, point=None, text=None, limit=DEFAULT_LIST_LIMIT):
+        """Areas intersecting a (west, south, east, north) box, containing a (lon, lat) point and/or matching a name."""
+        sql = 'SELECT areas.* FROM areas'
+        where, params = [], []
+        if bbox is not None or point is not None:
+            west, south, east, north = bbox if bbox is not None else (point[0], point[1], point[0], point[1])
+            sql += ' JOIN area_bbox ON area_bbox.id = areas.id'
+            where += ['area_bbox.west <= ?', 'area_bbox.east >= ?', 'area_bbox.south <= ?', 'area_bbox.north >= ?']
+            params += [east, west, north, south]
+        if text:
+            where.append("(areas.name LIKE ? ESCAPE '\\' OR areas.description LIKE ? ESCAPE '\\')")
+            pattern = '%' + text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+            params += [pattern, pattern]
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        sql += ' ORDER BY areas.updated DESC'
+
+        areas = []
+        for row in self._connect().execute(sql, params):
+            # The R-tree only matches bounding boxes; check the polygon itself for point searches
+            if point is not None and not Polygon(json.loads(row['coordinates'])).intersects(Point(point)):
+                continue
+            areas.append(self._area(row, self._analyses(row['geometry_hash'])))
+            if len(areas) >= limit:
+                break
+        return areas
+
+    def delete(self, area_id):
+        conn = self._transaction()
+        try:
+            row = conn.execute('SELECT geometry_hash FROM areas WHERE id = ?', (area_id,)).fetchone()
+            if row is not None:
+                conn.execute('DELETE FROM results WHERE geometry_hash = ?', (row['geometry_hash'],))
+                conn.execute('DELETE FROM area_bbox WHERE id = ?', (area_id,))
+                conn.execute('DELETE FROM areas WHERE id = ?', (area_id,))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return row is not None
+
+    def attach_result(self, coordinates, analysis, params, result):
+        """Store the latest result of an analysis for the saved area of an AOI; returns whether it was stored."""
+        encoded = json.dumps(result, separators=(',', ':'))
+        if len(encoded) > MAX_RESULT_BYTES:
+            return False
+        key = geometry_hash(coordinates)
+        cursor = self._connect().execute(
+            'INSERT OR REPLACE INTO results '
+            'SELECT ?, ?, ?, ?, ?, ? WHERE EXISTS (SELECT 1 FROM areas WHERE geometry_hash = ?)',
+            (key, analysis, _params_hash(params), json.dumps(params), encoded, time.time(), key)
+        )
+        return cursor.rowcount > 0
+
+
+class ResultWriter(threading.Thread):
+    """Stores queued analysis responses from a background thread, off the request path."""
+
+    def __init__(self, store):
+        super().__init__(name='saved-area-results', daemon=True)
+        self.store = store
+        self.queue = queue.Queue(maxsize=MAX_PENDING_RESULTS)
+
+    def submit(self, coordinates, analysis, params, body):
+        try:
+            self.queue.put_nowait((coordinates, analysis, params, body))
+        except queue.Full:
+            logger.warning("Dropped %s result: too many results waiting to be stored", analysis)
+
+    def run(self):
+        while True:
+            coordinates, analysis, params, body = self.queue.get()
+            try:
+                result = json.loads(body)
+                if result.get('success'):
+                    result.pop('success')
+                    self.store.attach_result(coordinates, analysis, params, result)
+            except (sqlite3.Error, ValueError, TypeError, AttributeError) as e:
+                logger.warning("Could not store %s result: %s", analysis, e)
+            finally:
+                self.queue.task_done()
+
+    def flush(self):
+        """Wait until every queued result has been stored or dropped."""
+        self.queue.join()
+
+
+saved_area_store = None
+_result_writer = None
+_result_writer_pid = None
+_result_writer_lock = threading.Lock()
+
+
+def _parse_bbox(value):
+    west, south, east, north = (float(part) for part in value.split(','))
+    return west, south, east, north
+
+
+def result_writer():
+    """This process's result writer, started on first use.
+
+    Threads do not survive a fork, so workers forked from a preloaded master
+    start a writer of their own.
+    """
+    global _result_writer, _result_writer_pid
+    with _result_writer_lock:
+        if _result_writer_pid != os.getpid():
+            _result_writer = ResultWriter(saved_area_store)
+            _result_writer.start()
+            _result_writer_pid = os.getpid()
+        return _result_writer
+
+
+def init_saved_areas(app):
+    """Open the saved-area store, attach analysis results and register the saved-area routes."""
+    global saved_area_store
+    saved_area_store = SavedAreaStore()
+
+    @app.after_request
+    def attach_analysis_result(response):
+        analysis = ANALYSIS_ENDPOINTS.get(request.endpoint)
+        if analysis is None or request.method != 'POST' or response.status_code != 200:
+            return response
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict) or not data.get('coordinates') or response.is_streamed:
+            return response
+        params = {key: value for key, value in data.items() if key != 'coordinates'}
+        # The writer decodes the response and looks up the area
+        result_writer().submit(data['coordinates'], analysis, params, response.get_data())
+        return response
+
+    @app.route('/save_area', methods=['POST'])
+    def save_area():
+        """Save a user-defined area."""
+        data = request.get_json()
+        coords = data.get('coordinates')
+
+        if not coords:
+            return jsonify({'success': False, 'error': 'No coordinates provided'})
+
+        try:
+            area, created = saved_area_store.save(coords, data.get('name'), data.get('description'))
+            return jsonify({
+                'success': True,
+                'message': 'Area saved successfully' if created else 'Area updated successfully',
+                'created': created,
+                'area': area
+            })
+        except Exception as e:
+            return jsonify({'success': False, 'error': str(e)})
+
+    @app.route('/saved_areas')
+    def list_saved_areas():
+        """List saved areas, optionally within a bounding box, around a point or by name."""
+        try:
+            bbox = _parse_bbox(request.args['bbox']) if request.args.get('bbox') else None
+            point = None
+            if request.args.get('lon') is not None and request.args.get('lat') is not None:
+                point = (float(request.args['lon']), float(request.args['lat']))
+            limit = min(int(request.args.get('limit', DEFAULT_LIST_LIMIT)), MAX_LIST_LIMIT)
+        except ValueError:
+            return jsonify({
+                'success': False,
+                'error': 'bbox must be west,south,east,north; lon, lat and limit must be numbers'
+            }), 400
+
+        try:
+            areas = saved_area_store.search(bbox, point, request.args.get('q'), limit)
+            return jsonify({'success': True, 'count': len(areas), 'areas': areas})
+        except Exception as e:
+            return jsonify({'success': False, 'error': str(e)})
+
+    @app.route('/saved_areas/<int:area_id>')
+    def get_saved_area(area_id):
+        """Get a saved area with its stored analysis results."""
+        area = saved_area_store.get(area_id)
+        if area is None:
+            return jsonify({'success': False, 'error': 'Saved area not found'}), 404
+        return jsonify({'success': True, 'area': area})
+
+    @app.route('/saved_areas/<int:area_id>', methods=['DELETE'])
+    def delete_saved_area(area_id):
+        """Delete a saved area and its stored results."""
+        if not saved_area_store.delete(area_id):
+            return jsonify({'success': False, 'error': 'Saved area not found'}), 404
+        return jsonify({'success': True, 'id': area_id})
@@ -0,0 +1,422 @@
+"""Result cache and compute locks shared by all worker processes.
+
+Under gunicorn every worker has its own memory, so the in-process caches only
+help the worker that filled them. This cache sits behind them and is shared
+through one of two backends, chosen with SHARED_CACHE:
+
+- `sqlite` (default): a SQLite database in WAL mode at SHARED_CACHE_PATH, for
+  workers on one machine.
+- `redis`: any server speaking the Redis protocol at REDIS_URL
+  (redis://[:password@]host:port/db). `python shared_cache.py serve` runs a
+  small in-memory stand-in for local use.
+- `none`: disabled.
+
+`SharedCache.get_or_compute()` takes a cross-process lock on a missing key
+(SET NX with an expiry, or a row in the SQLite locks table), so only one worker
+computes it. The other workers wait for the value to appear. If the cache
+backend fails, values are computed locally, as if it were disabled.
+"""
+import argparse
+import json
+import logging
+import os
+import socket
+import socketserver
+import sqlite3
+import threading
+import time
+import urllib.parse
+import uuid
+
+import cancellation
+
+SHARED_CACHE = os.environ.get('SHARED_CACHE', 'sqlite')
+SHARED_CACHE_PATH = os.environ.get(
+    'SHARED_CACHE_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'shared_cache.sqlite3')
+)
+REDIS_URL = os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379/0')
+
+# Larger values are computed but not shared
+MAX_VALUE_BYTES = int(os.environ.get('SHARED_CACHE_MAX_VALUE_BYTES', str(8 * 1024 * 1024)))
+
+# A worker holding a compute lock for longer than this is assumed to have died
+LOCK_TTL_SECONDS = float(os.environ.get('SHARED_CACHE_LOCK_TTL', '300'))
+# How often a worker waiting for another worker's result checks for it
+LOCK_POLL_SECONDS = 0.1
+# Backend failures are logged at most this often
+ERROR_LOG_INTERVAL_SECONDS = 60
+# Expired SQLite rows are deleted after this many writes
+SQLITE_PURGE_EVERY = 500
+
+# Deletes a lock only if it still holds our token
+RELEASE_SCRIPT = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) else return 0 end"
+
+logger = logging.getLogger(__name__)
+
+
+class SharedCacheError(Exception):
+    """The shared cache backend could not be reached or rejected a command."""
+
+
+class ProcessLocal:
+    """A threading.local that starts empty again in a forked child.
+
+    Workers forked from a preloaded master must not use the master's SQLite
+    connections or sockets. The inherited ones are kept referenced rather than
+    closed, since closing them in the child can disturb the parent's use.
+    """
+
+    def __init__(self):
+        self._pid = os.getpid()
+        self._local = threading.local()
+        self._inherited = []
+
+    def get(self):
+        if self._pid != os.getpid():
+            self._inherited.append(self._local)
+            self._pid = os.getpid()
+            self._local = threading.local()
+        return self._local
+
+
+# --- SQLite backend --------------------------------------------------------
+
+class SQLiteBackend:
+    """Entries and locks in a WAL-mode SQLite database, one connection per thread and process."""
+
+    def __init__(self, path=SHARED_CACHE_PATH):
+        self.path = path
+        self._local = ProcessLocal()
+        self._writes = 0
+        with self._connect() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value BLOB, expires REAL)')
+            conn.execute('CREATE TABLE IF NOT EXISTS locks (key TEXT PRIMARY KEY, token TEXT, expires REAL)')
+
+    def _connect(self):
+        conn = getattr(self._local.get(), 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.get().conn = conn
+        return conn
+
+    def _execute(self, sql, params=()):
+        try:
+            return self._connect().execute(sql, params)
+        except sqlite3.Error as e:
+            raise SharedCacheError(str(e))
+
+    def get(self, key):
+        row = self._execute('SELECT value, expires FROM entries WHERE key = ?', (key,)).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return row[0]
+
+    def set(self, key, value, ttl):
+        self._execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?)', (key, value, time.time() + ttl))
+        self._writes += 1
+        if self._writes % SQLITE_PURGE_EVERY == 0:
+            now = time.time()
+            self._execute('DELETE FROM entries WHERE expires < ?', (now,))
+            self._execute('DELETE FROM locks WHERE expires < ?', (now,))
+
+    def acquire(self, key, token, ttl):
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.execute('DELETE FROM locks WHERE key = ? AND expires < ?', (key, time.time()))
+                inserted = conn.execute('INSERT OR IGNORE INTO locks VALUES (?, ?, ?)',
+                                        (key, token, time.time() + ttl)).rowcount
+                conn.execute('COMMIT')
+            except sqlite3.Error:
+                conn.execute('ROLLBACK')
+                raise
+        except sqlite3.Error as e:
+            raise SharedCacheError(str(e))
+        return inserted == 1
+
+    def release(self, key, token):
+        self._execute('DELETE FROM locks WHERE key = ? AND token = ?', (key, token))
+
+    def locked(self, key):
+        row = self._execute('SELECT expires FROM locks WHERE key = ?', (key,)).fetchone()
+        return row is not None and row[0] >= time.time()
+
+
+# --- Redis protocol backend ------------------------------------------------
+
+def _encode_command(args):
+    parts = [b'*%d\r\n' % len(args)]
+    for arg in args:
+        data = arg if isinstance(arg, bytes) else str(arg).encode('utf-8')
+        parts.append(b'$%d\r\n%s\r\n' % (len(data), data))
+    return b''.join(parts)
+
+
+def _read_reply(stream):
+    line = stream.readline()
+    if not line:
+        raise ConnectionError('connection closed')
+    kind, rest = line[:1], line[1:-2]
+    if kind == b'+':
+        return rest.decode('utf-8')
+    if kind == b'-':
+        raise SharedCacheError(rest.decode('utf-8'))
+    if kind == b':':
+        return int(rest)
+    if kind == b'$':
+        length = int(rest)
+        if length < 0:
+            return None
+        data = stream.read(length + 2)
+        return data[:-2]
+    if kind == b'*':
+        count = int(rest)
+        return None if count < 0 else [_read_reply(stream) for _ in range(count)]
+    raise SharedCacheError(f"Unexpected reply {line!r}")
+
+
+class RedisBackend:
+    """A minimal Redis protocol client with one connection per thread and process."""
+
+    def __init__(self, url=REDIS_URL, timeout=5.0):
+        parsed = urllib.parse.urlsplit(url)
+        self.host = parsed.hostname or '127.0.0.1'
+        self.port = parsed.port or 6379
+        self.password = urllib.parse.unquote(parsed.password) if parsed.password else None
+        self.db = int(parsed.path.strip('/') or 0)
+        self.timeout = timeout
+        self._local = ProcessLocal()
+
+    def _connection(self):
+        local = self._local.get()
+        connection = getattr(local, 'connection', None)
+        if connection is None:
+            sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            connection = local.connection = (sock, sock.makefile('rb'))
+            if self.password:
+                self._send(connection, ('AUTH', self.password))
+            if self.db:
+                self._send(connection, ('SELECT', self.db))
+        return connection
+
+    @staticmethod
+    def _send(connection, args):
+        sock, stream = connection
+        sock.sendall(_encode_command(args))
+        return _read_reply(stream)
+
+    def command(self, *args):
+        try:
+            return self._send(self._connection(), args)
+        except (OSError, ConnectionError) as e:
+            local = self._local.get()
+            connection = getattr(local, 'connection', None)
+            if connection is not None:
+                connection[0].close()
+                local.connection = None
+            raise SharedCacheError(f"Redis at {self.host}:{self.port}: {e}")
+
+    def get(self, key):
+        return self.command('GET', key)
+
+    def set(self, key, value, ttl):
+        self.command('SET', key, value, 'PX', max(1, int(ttl * 1000)))
+
+    def acquire(self, key, token, ttl):
+        return self.command('SET', 'lock:' + key, token, 'NX', 'PX', max(1, int(ttl * 1000))) == 'OK'
+
+    def release(self, key, token):
+        self.command('EVAL', RELEASE_SCRIPT, 1, 'lock:' + key, token)
+
+    def locked(self, key):
+        return self.command('GET', 'lock:' + key) is not None
+
+
+# --- Cache -----------------------------------------------------------------
+
+class SharedCache:
+    """JSON values in a shared backend, with single-flight computation across processes."""
+
+    def __init__(self, backend, lock_ttl=LOCK_TTL_SECONDS, max_value_bytes=MAX_VALUE_BYTES):
+        self.backend = backend
+        self.lock_ttl = lock_ttl
+        self.max_value_bytes = max_value_bytes
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.errors = 0
+        self._last_error_log = 0
+
+    def _failed(self, e):
+        self.errors += 1
+        if time.monotonic() - self._last_error_log >= ERROR_LOG_INTERVAL_SECONDS:
+            self._last_error_log = time.monotonic()
+            logger.warning("Shared cache unavailable, computing locally: %s", e)
+
+    def get(self, key):
+        try:
+            value = self.backend.get(key)
+        except SharedCacheError as e:
+            self._failed(e)
+            return None
+        return None if value is None else json.loads(value)
+
+    def set(self, key, value, ttl):
+        encoded = json.dumps(value).encode('utf-8')
+        if len(encoded) > self.max_value_bytes:
+            return
+        try:
+            self.backend.set(key, encoded, ttl)
+        except SharedCacheError as e:
+            self._failed(e)
+
+    def get_or_compute(self, key, compute, ttl):
+        """Return the value for key, letting only one process compute it at a time."""
+        token = uuid.uuid4().hex
+        waited = False
+        try:
+            while True:
+                value = self.backend.get(key)
+                if value is not None:
+                    self.hits += 1
+                    return json.loads(value)
+                if self.backend.acquire(key, token, self.lock_ttl):
+                    break
+                if not waited:
+                    waited = True
+                    self.waits += 1
+                # Another worker is computing this key; wait for its value or for the lock to go
+                while self.backend.locked(key):
+                    cancellation.check_cancelled()
+                    time.sleep(LOCK_POLL_SECONDS)
+                    if self.backend.get(key) is not None:
+                        break
+        except SharedCacheError as e:
+            self._failed(e)
+            return compute()
+
+        self.misses += 1
+        try:
+            value = compute()
+            self.set(key, value, ttl)
+            return value
+        finally:
+            try:
+                self.backend.release(key, token)
+            except SharedCacheError as e:
+                self._failed(e)
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'waits': self.waits, 'errors': self.errors}
+
+
+def open_shared_cache(kind=SHARED_CACHE):
+    """Return the SharedCache configured by SHARED_CACHE, or None when disabled."""
+    if kind == 'none':
+        return None
+    if kind == 'redis':
+        return SharedCache(RedisBackend())
+    if kind == 'sqlite':
+        return SharedCache(SQLiteBackend())
+    raise ValueError(f"Unknown SHARED_CACHE '{kind}'. Expected sqlite, redis or none")
+
+
+# --- Local Redis stand-in --------------------------------------------------
+
+class _StandInStore:
+    def __init__(self):
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def _get(self, key):
+        entry = self.values.get(key)
+        if entry is not None and entry[1] is not None and entry[1] < time.monotonic():
+            del self.values[key]
+            return None
+        return entry[0] if entry is not None else None
+
+    def execute(self, args):
+        name = args[0].decode('utf-8').upper()
+        with self.lock:
+            if name == 'PING':
+                return 'PONG'
+            if name in ('AUTH', 'SELECT'):
+                return 'OK'
+            if name == 'GET':
+                return self._get(args[1])
+            if name == 'SET':
+                key, value, options = args[1], args[2], [a.decode('utf-8').upper() for a in args[3:]]
+                expires = None
+                if 'PX' in options:
+                    expires = time.monotonic() + int(options[options.index('PX') + 1]) / 1000
+                elif 'EX' in options:
+                    expires = time.monotonic() + int(options[options.index('EX') + 1])
+                if 'NX' in options and self._get(key) is not None:
+                    return None
+                self.values[key] = (value, expires)
+                return 'OK'
+            if name == 'DEL':
+                return sum(1 for key in args[1:] if self.values.pop(key, None) is not None)
+            if name == 'EVAL' and args[1].decode('utf-8') == RELEASE_SCRIPT:
+                key, token = args[3], args[4]
+                if self._get(key) == token:
+                    del self.values[key]
+                    return 1
+                return 0
+            if name == 'FLUSHDB':
+                self.values.clear()
+                return 'OK'
+            if name == 'DBSIZE':
+                return len(self.values)
+        return SharedCacheError(f"ERR unsupported command '{name}'")
+
+
+def _encode_reply(value):
+    if isinstance(value, SharedCacheError):
+        return b'-%s\r\n' % str(value).encode('utf-8')
+    if value is None:
+        return b'$-1\r\n'
+    if isinstance(value, int):
+        return b':%d\r\n' % value
+    if isinstance(value, str):
+        return b'+%s\r\n' % value.encode('utf-8')
+    return b'$%d\r\n%s\r\n' % (len(value), value)
+
+
+def serve(host='127.0.0.1', port=6379):
+    """Serve an in-memory stand-in for the Redis commands used by RedisBackend."""
+    store = _StandInStore()
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            while True:
+                try:
+                    args = _read_reply(self.rfile)
+                except (ConnectionError, OSError):
+                    return
+                if not isinstance(args, list) or not args:
+                    return
+                self.wfile.write(_encode_reply(store.execute(args)))
+
+    socketserver.ThreadingTCPServer.allow_reuse_address = True
+    with socketserver.ThreadingTCPServer((host, port), Handler) as server:
+        server.daemon_threads = True
+        logger.info("Shared cache stand-in listening on %s:%d", host, port)
+        server.serve_forever()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Shared cache tools.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    serve_parser = commands.add_parser('serve', help='run an in-memory Redis protocol stand-in')
+    serve_parser.add_argument('--host', default='127.0.0.1')
+    serve_parser.add_argument('--port', type=int, default=6379)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    serve(args.host, args.port)
@@ -0,0 +1,4170 @@
+// Lazily loaded modules. Their fingerprinted URLs are set in index.html.
+const loadedModules = {};
+
+function loadScript(src) {
+    return new Promise((resolve, reject) => {
+        const script = document.createElement('script');
+        script.src = src;
+        script.onload = resolve;
+        script.onerror = () => reject(new Error('Failed to load ' + src));
+        document.head.appendChild(script);
+    });
+}
+
+function loadStylesheet(href) {
+    const link = document.createElement('link');
+    link.rel = 'stylesheet';
+    link.href = href;
+    document.head.appendChild(link);
+}
+
+// Load a module's stylesheets and scripts once; scripts run in order
+function loadModule(name) {
+    if (!loadedModules[name]) {
+        const assets = window.LAZY_ASSETS[name];
+        (assets.styles || []).forEach(loadStylesheet);
+        loadedModules[name] = assets.scripts.reduce(
+            (chain, src) => chain.then(() => loadScript(src)),
+            Promise.resolve()
+        );
+    }
+    return loadedModules[name];
+}
+
+// The tour and intro.js are only downloaded when the tour is started
+function startTour() {
+    loadModule('tour')
+        .then(() => tour.start())
+        .catch(error => console.error('Error loading tour:', error));
+}
+
+// Analysis requests in flight, keyed by URL. Starting a new request to the same
+// URL, or changing the area, aborts the old fetch and asks the server to stop
+// its remaining Earth Engine calls.
+const inFlightRequests = {};
+
+function createRequestId() {
+    if (window.crypto && crypto.randomUUID) {
+        return crypto.randomUUID();
+    }
+    return Date.now().toString(36) + Math.random().toString(36).slice(2);
+}
+
+// Identifies this page to the server so a newer request supersedes an older one
+const CLIENT_SESSION_ID = createRequestId();
+
+function cancelAnalysisRequest(url) {
+    const pending = inFlightRequests[url];
+    if (!pending) return;
+    delete inFlightRequests[url];
+    pending.controller.abort();
+    fetch(`/requests/${pending.requestId}`, { method: 'DELETE', keepalive: true })
+        .catch(() => {});
+}
+
+function cancelAllAnalysisRequests() {
+    Object.keys(inFlightRequests).forEach(cancelAnalysisRequest);
+}
+
+// fetch() for analysis routes. An aborted request rejects with an AbortError whose
+// `superseded` flag is set when a newer request to the same URL replaced it: that
+// request owns the results panel and loading screen, so callers return early.
+// Otherwise (the area changed) callers reset their UI as for any other error.
+function analysisFetch(url, options = {}) {
+    cancelAnalysisRequest(url);
+    const controller = new AbortController();
+    const requestId = createRequestId();
+    inFlightRequests[url] = { controller, requestId };
+
+    const headers = Object.assign({}, options.headers, {
+        'X-Request-ID': requestId,
+        'X-Client-Session': CLIENT_SESSION_ID
+    });
+    return fetch(url, Object.assign({}, options, { headers, signal: controller.signal }))
+        .catch(error => {
+            if (error.name === 'AbortError') {
+                const pending = inFlightRequests[url];
+                const superseded = Boolean(pending && pending.requestId !== requestId);
+                const aborted = new DOMException(
+                    superseded ? 'Analysis superseded by a newer request' : 'Analysis cancelled because the area changed',
+                    'AbortError'
+                );
+                aborted.superseded = superseded;
+                throw aborted;
+            }
+            throw error;
+        })
+        .finally(() => {
+            if (inFlightRequests[url] && inFlightRequests[url].requestId === requestId) {
+                delete inFlightRequests[url];
+            }
+        });
+}
+
+// Check if this is the first visit
+const isFirstVisit = !localStorage.getItem('hasVisitedBefore');
+if (isFirstVisit) {
+    // Start the tour automatically on first visit
+    setTimeout(() => {
+        startTour();
+        localStorage.setItem('hasVisitedBefore', 'true');
+    }, 1000);
+}
+
+// Add event listener for the tour button
+document.getElementById('startTour').addEventListener('click', () => {
+    startTour();
+});
+
+// Calculate and set proper viewport height to handle mobile browser chrome
+function setMobileViewportHeight() {
+    let vh = window.innerHeight * 0.01;
+    document.documentElement.style.setProperty('--vh', `${vh}px`);
+}
+
+// Initialize and update on resize
+window.addEventListener('resize', setMobileViewportHeight);
+window.addEventListener('orientationchange', setMobileViewportHeight);
+
+// Mobile responsiveness and loading screen functionality
+document.addEventListener('DOMContentLoaded', function() {
+    // Set initial viewport height
+    setMobileViewportHeight();
+
+    // Handle sidebar toggle - debug implementation
+    const sidebarToggle = document.querySelector('.sidebar-toggle');
+    const sidebar = document.querySelector('.sidebar');
+
+    if (sidebarToggle && sidebar) {
+        console.log("Sidebar toggle found:", sidebarToggle);
+        console.log("Sidebar found:", sidebar);
+
+        // Function to check if we're on mobile and show/hide toggle accordingly
+        function updateSidebarToggleVisibility() {
+            // Consider devices with width less than 768px as mobile
+            if (window.innerWidth < 768) {
+                sidebarToggle.style.display = 'block';
+            } else {
+                sidebarToggle.style.display = 'none';
+                // Ensure sidebar is expanded on desktop
+                sidebar.classList.remove('collapsed');
+            }
+        }
+
+        // Run initially
+        updateSidebarToggleVisibility();
+
+        // Remove any existing click event listeners
+        const newToggle = sidebarToggle.cloneNode(true);
+        sidebarToggle.parentNode.replaceChild(newToggle, sidebarToggle);
+
+        // Add new event listener
+        newToggle.addEventListener('click', function() {
+            console.log("Toggle clicked");
+            sidebar.classList.toggle('collapsed');
+            this.textContent = sidebar.classList.contains('collapsed') ? '≡' : '×';
+            console.log("Sidebar collapsed:", sidebar.classList.contains('collapsed'));
+
+            // Force map to recalculate its size and fill available space
+            try {
+                if (window.map) {
+                    console.log("Invalidating map size");
+
+                    // Add a container resize observer to ensure map reacts to all size changes
+                    const mapContainer = document.querySelector('.map-container');
+
+                    // Multiple invalidations to ensure proper rendering
+                    // Immediate invalidation
+                    window.map.invalidateSize();
+
+                    // After a short delay to allow initial CSS transitions
+                    setTimeout(function() {
+                        window.map.invalidateSize({animate: true});
+                        console.log("Map size invalidated (first pass)");
+
+                        // And again after the full transition completes
+                        setTimeout(function() {
+                            window.map.invalidateSize({animate: true});
+                            console.log("Map size invalidated (second pass)");
+
+                            // Final invalidation to ensure all map controls and drawing tools are properly positioned
+                            setTimeout(function() {
+                                window.map.invalidateSize(true);
+                                console.log("Map size invalidated (final pass)");
+                            }, 100);
+                        }, 300);
+                    }, 50);
+                } else {
+                    console.warn("Map object not found");
+                }
+            } catch (error) {
+                console.error("Error invalidating map size:", error);
+            }
+        });
+
+        // Listen for window resize events
+        window.addEventListener('resize', updateSidebarToggleVisibility);
+    } else {
+        console.error("Sidebar toggle elements not found", {
+            sidebarToggle: sidebarToggle,
+            sidebar: sidebar
+        });
+    }
+
+    // Handle map resize when orientation changes or window is resized
+    window.addEventListener('resize', function() {
+        if (window.map) {
+            // Immediate invalidation
+            window.map.invalidateSize();
+
+            // Follow-up invalidation after a short delay to ensure all transitions are complete
+            setTimeout(function() {
+                window.map.invalidateSize(true);
+            }, 250);
+        }
+    });
+
+    // Initialize loading screen functions
+    // Loading screen timeout protection
+    let loadingTimeout = null;
+    const MAX_LOADING_TIME = 120000; // 2 minutes maximum loading time
+
+    window.showLoading = function(message, subtext) {
+        const overlay = document.getElementById('loadingOverlay');
+        const textElement = document.getElementById('loadingText');
+        const subtextElement = document.getElementById('loadingSubtext');
+
+        if (message) {
+            textElement.textContent = message;
+        } else {
+            textElement.textContent = 'Processing...';
+        }
+
+        if (subtext) {
+            subtextElement.textContent = subtext;
+            subtextElement.style.display = 'block';
+        } else {
+            subtextElement.textContent = 'This may take a few moments';
+            subtextElement.style.display = 'block';
+        }
+
+        overlay.classList.add('active');
+
+        // Clear any existing timeout
+        if (loadingTimeout) {
+            clearTimeout(loadingTimeout);
+        }
+
+        // Set safety timeout to automatically hide loading after maximum time
+        loadingTimeout = setTimeout(function() {
+            console.warn('Loading screen timeout reached. Force hiding loading screen.');
+            hideLoading();
+            alert('The operation is taking longer than expected. It may still be processing in the background.');
+        }, MAX_LOADING_TIME);
+    };
+
+    window.hideLoading = function() {
+        const overlay = document.getElementById('loadingOverlay');
+        overlay.classList.remove('active');
+
+        // Clear any active loading timeout
+        if (loadingTimeout) {
+            clearTimeout(loadingTimeout);
+            loadingTimeout = null;
+        }
+    };
+});
+
+// Initialize model tooltip functionality
+document.addEventListener('DOMContentLoaded', function() {
+    // Set up tooltip icon click handlers
+    const tooltipIcons = document.querySelectorAll('.tooltip-icon');
+    tooltipIcons.forEach(icon => {
+        icon.addEventListener('click', function() {
+            const modelType = this.getAttribute('data-model');
+            toggleModelDetails(modelType);
+        });
+    });
+
+    // Set up expand buttons
+    const expandButtons = document.querySelectorAll('.expand-button');
+    expandButtons.forEach(button => {
+        button.addEventListener('click', function() {
+            const expandedContent = this.nextElementSibling;
+            if (expandedContent.style.display === 'block') {
+                expandedContent.style.display = 'none';
+                this.textContent = 'Show more details';
+            } else {
+                expandedContent.style.display = 'block';
+                this.textContent = 'Hide details';
+            }
+        });
+    });
+
+    // Show model details based on which model is selected
+    const modelRadios = document.querySelectorAll('input[name="model-type"]');
+    modelRadios.forEach(radio => {
+        radio.addEventListener('change', function() {
+            // Hide all model details first
+            document.querySelectorAll('.model-details').forEach(detail => {
+                detail.style.display = 'none';
+            });
+
+            // Update UI based on model selection
+            updateLegendVisibility(this.value);
+        });
+    });
+
+    // Function to toggle model details
+    function toggleModelDetails(modelType) {
+        const allDetails = document.querySelectorAll('.model-details');
+        const targetDetails = document.getElementById(`${modelType}-details`);
+
+        // Check if the target details are already visible
+        const isVisible = targetDetails.style.display !== 'none';
+
+        // Hide all details first
+        allDetails.forEach(detail => {
+            detail.style.display = 'none';
+        });
+
+        // Toggle target details visibility
+        if (!isVisible) {
+            targetDetails.style.display = 'block';
+        }
+
+        // Reset all expanded content
+        document.querySelectorAll('.expanded-content').forEach(content => {
+            content.style.display = 'none';
+        });
+
+        // Reset all expand buttons
+        document.querySelectorAll('.expand-button').forEach(button => {
+            button.textContent = 'Show more details';
+        });
+    }
+});
+
+// Initialize legend visibility
+window.addEventListener('DOMContentLoaded', function() {
+    // Set initial legend visibility based on default selected model
+    const initialModel = document.querySelector('input[name="model-type"]:checked').value;
+    updateLegendVisibility(initialModel);
+});
+
+// Function to update legend visibility and layer controls based on model selection
+function updateLegendVisibility(modelType) {
+    // Update legend visibility
+    if (modelType === 'ndvi') {
+        document.querySelector('.legend:not(#dynamic-world-legend)').style.display = 'block';
+        document.getElementById('dynamic-world-legend').style.display = 'none';
+
+        // Update layer controls for NDVI
+        document.getElementById('layer-controls-title').textContent = 'NDVI Layer';
+        document.getElementById('layer-toggle-label').textContent = 'NDVI Overlay';
+    } else if (modelType === 'dynamicworld') {
+        document.querySelector('.legend:not(#dynamic-world-legend)').style.display = 'none';
+        document.getElementById('dynamic-world-legend').style.display = 'block';
+
+        // Update layer controls for Dynamic World
+        document.getElementById('layer-controls-title').textContent = 'Land Cover Layer';
+        document.getElementById('layer-toggle-label').textContent = 'Dynamic World Overlay';
+    }
+}
+
+// Initialize map
+const map = L.map('map').setView([13.3288, 123.3432], 11); // User-specified coordinates
+
+// Define Bicol region bounds and view
+const BICOL_CENTER = [13.32231, 123.35415];
+const BICOL_ZOOM = 11;
+
+// Function to reset map view to Bicol region
+function resetMapToBicolView() {
+    map.setView(BICOL_CENTER, BICOL_ZOOM, {
+        animate: true,
+        duration: 1
+    });
+}
+
+// Add a reset view button
+L.Control.ResetView = L.Control.extend({
+    onAdd: function(map) {
+        const container = L.DomUtil.create('div', 'leaflet-bar leaflet-control');
+        const button = L.DomUtil.create('a', 'reset-view-btn', container);
+        button.innerHTML = '⌂';
+        button.title = 'Reset to Bicol Region View';
+        button.style.fontSize = '18px';
+        button.style.fontWeight = 'bold';
+        button.style.textDecoration = 'none';
+        button.style.textAlign = 'center';
+        button.style.lineHeight = '30px';
+        button.href = '#';
+
+        L.DomEvent.on(button, 'click', function(e) {
+            L.DomEvent.stopPropagation(e);
+            L.DomEvent.preventDefault(e);
+            resetMapToBicolView();
+        });
+
+        return container;
+    },
+    onRemove: function(map) {
+        // Nothing to do here
+    }
+});
+
+L.control.resetView = function(opts) {
+    return new L.Control.ResetView(opts);
+};
+
+// Add the reset view control to the map
+L.control.resetView({ position: 'topleft' }).addTo(map);
+
+// Define base maps
+const baseMaps = {
+    topo: L.tileLayer('https://tile.opentopomap.org/{z}/{x}/{y}.png', {
+        attribution: 'Map data: &copy; <a href="https://www.openstreetmap.org/copyright">OpenStreetMap</a> contributors, <a href="http://viewfinderpanoramas.org">SRTM</a> | Map style: &copy; <a href="https://opentopomap.org">OpenTopoMap</a> (<a href="https://creativecommons.org/licenses/by-sa/3.0/">CC-BY-SA</a>)'
+    }),
+    street: L.tileLayer('https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png', {
+        attribution: '&copy; <a href="https://www.openstreetmap.org/copyright">OpenStreetMap</a> contributors'
+    }),
+    satellite: L.tileLayer('https://server.arcgisonline.com/ArcGIS/rest/services/World_Imagery/MapServer/tile/{z}/{y}/{x}', {
+        attribution: 'Imagery &copy; Esri &mdash; Source: Esri, i-cubed, USDA, USGS, AEX, GeoEye, Getmapping, Aerogrid, IGN, IGP, UPR-EGP, and the GIS User Community'
+    })
+};
+
+// Add topo map as default
+let currentBaseMap = 'topo';
+baseMaps[currentBaseMap].addTo(map);
+
+// Create Map Type Control for top-left corner
+L.Control.MapTypeControl = L.Control.extend({
+    options: {
+        position: 'topleft',
+        collapsed: true
+    },
+
+    onAdd: function(map) {
+        const container = L.DomUtil.create('div', 'leaflet-control-maptype');
+        const iconContainer = L.DomUtil.create('div', 'map-type-icon-container', container);
+
+        // Add toggle button
+        const toggleBtn = L.DomUtil.create('div', 'maptype-toggle-btn', container);
+
+        // Add map type buttons
+        const mapTypes = [
+            { type: 'topo', title: 'Topographic Map', icon: 'url(\'data:image/svg+xml;utf8,<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 24 24" fill="%23555"><path d="M22,15.5V17.5H19V21.5H17V17.5H14V21.5H12V17.5H9V21.5H7V17.5H4V15.5H7V11.5H4V9.5H7V5.5H9V9.5H12V5.5H14V9.5H17V5.5H19V9.5H22V11.5H19V15.5H22M17,11.5H14V15.5H17V11.5M12,11.5H9V15.5H12V11.5Z"/></svg>\')' },
+            { type: 'street', title: 'Street Map', icon: 'url(\'data:image/svg+xml;utf8,<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 24 24" fill="%23555"><path d="M18.1 4.8C18.1 4.3 17.6 4 17 4H13.8C13.4 4 13 4.3 13 4.8V10.2H18.1V4.8M19.3 19.2V10.2H20.9V19.2H19.3M4.8 10.2V19.2H3.1V10.2H4.8M10.2 19.2V13.8H13.8V19.2H10.2M5.9 19.2V13.8H9.1V19.2H5.9M13.8 12.7H10.2V10.2H13.8V12.7M9.1 10.2V12.7H5.9V10.2H9.1M4.8 4.8V9.1H3.1V4.8C3.1 4.3 3.6 4 4.1 4H7.3C7.7 4 8.1 4.3 8.1 4.8V9.1H5.9V4.8H4.8M10.2 9.1V4.8H13V9.1H10.2Z"/></svg>\')' },
+            { type: 'satellite', title: 'Satellite', icon: 'url(\'data:image/svg+xml;utf8,<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 24 24" fill="%23555"><path d="M5,18.31L8.9,15.5L6.81,13.41L5,15.54V18.31M13,15.83L9.5,13.5L13,9.8V15.83M18.04,10.4L20.27,8.17L16.31,4.21L14.08,6.44L18.04,10.4M19.93,11.08L13.8,4.96L10.04,8.72L14,12.68L19.93,11.08M4.23,10.55C4.13,11.23 4.31,11.94 4.76,12.4L10.61,18.24C11.07,18.7 11.78,18.88 12.46,18.77L19.87,17.18L14.3,11.61L8.28,14.73L7.8,14.25C6.97,13.42 6.97,12.08 7.8,11.25L12.57,6.47L8.51,6.13L4.23,10.55Z"/></svg>\')' }
+        ];
+
+        // Create buttons for each map type
+        mapTypes.forEach(mapType => {
+            const btn = L.DomUtil.create('div', 'map-type-icon-btn', iconContainer);
+            btn.style.backgroundImage = mapType.icon;
+            btn.title = mapType.title;
+            btn.setAttribute('data-map-type', mapType.type);
+
+            // Set active class for the current map type
+            if (mapType.type === currentBaseMap) {
+                btn.classList.add('active');
+            }
+
+            // Add click handler
+            L.DomEvent.on(btn, 'click', function() {
+                // Remove active class from all buttons
+                document.querySelectorAll('.map-type-icon-btn').forEach(b => {
+                    b.classList.remove('active');
+                });
+
+                // Add active class to clicked button
+                this.classList.add('active');
+
+                // Change base map
+                const mapType = this.getAttribute('data-map-type');
+                changeBaseMap(mapType);
+            });
+
+            // Stop propagation of events
+            L.DomEvent.disableClickPropagation(btn);
+        });
+
+        // Set initial collapsed state
+        if (this.options.collapsed) {
+            container.classList.add('collapsed');
+        }
+
+        // Add toggle click handler
+        L.DomEvent.on(toggleBtn, 'click', function(e) {
+            L.DomEvent.stopPropagation(e);
+            L.DomEvent.preventDefault(e);
+            container.classList.toggle('collapsed');
+        });
+
+        // Prevent map clicks from propagating
+        L.DomEvent.disableClickPropagation(container);
+
+        return container;
+    }
+});
+
+// Initialize MapTypeControl constructor
+L.control.mapTypeControl = function(opts) {
+    return new L.Control.MapTypeControl(opts);
+};
+
+// Add the map type control to the map
+L.control.mapTypeControl({ position: 'topleft' }).addTo(map);
+
+// Function to change base map
+function changeBaseMap(mapType) {
+    // Remove all base layers
+    Object.values(baseMaps).forEach(layer => {
+        if (map.hasLayer(layer)) {
+            map.removeLayer(layer);
+        }
+    });
+
+    // Add selected base layer
+    currentBaseMap = mapType;
+    const baseMapLayer = baseMaps[mapType];
+
+    // Apply current opacity
+    const opacity = parseFloat(document.getElementById('base-map-opacity').value) / 100;
+    baseMapLayer.setOpacity(opacity);
+
+    // Add to map
+    map.addLayer(baseMapLayer);
+
+    // Ensure map is properly sized
+    map.invalidateSize();
+}
+
+// Make map object available globally for proper resizing
+window.map = map;
+
+// Add event handler to fix map after page is fully loaded
+window.addEventListener('load', function() {
+    // Final map size invalidation after everything is loaded
+    setTimeout(function() {
+        if (window.map) {
+            window.map.invalidateSize({animate: true});
+            console.log("Map size invalidated after full page load");
+        }
+    }, 500);
+});
+
+// Map features panel toggle - enhanced collapse/expand
+document.getElementById('mapControlsToggle').addEventListener('click', function() {
+    const panel = document.getElementById('mapControlsPanel');
+    panel.classList.toggle('collapsed');
+
+    // Update icon based on state
+    if (panel.classList.contains('collapsed')) {
+        this.innerHTML = `<svg xmlns="http://www.w3.org/2000/svg" width="20" height="20" fill="currentColor" viewBox="0 0 16 16">
+            <path fill-rule="evenodd" d="M8 3.5a.5.5 0 0 1 .5.5v4a.5.5 0 0 1-1 0V4a.5.5 0 0 1 .5-.5z"/>
+            <path fill-rule="evenodd" d="M7.646 8.646a.5.5 0 0 1 .708 0l2 2a.5.5 0 0 1-.708.708L8 9.707l-1.646 1.647a.5.5 0 0 1-.708-.708l2-2z"/>
+        </svg>`;
+        this.title = "Expand Map Features";
+    } else {
+        this.innerHTML = `<svg xmlns="http://www.w3.org/2000/svg" width="16" height="16" fill="currentColor" viewBox="0 0 16 16">
+            <path d="M4 8a.5.5 0 0 1 .5-.5h7a.5.5 0 0 1 0 1h-7A.5.5 0 0 1 4 8z"/>
+        </svg>`;
+        this.title = "Collapse Map Features";
+
+        // On desktop only, scroll to top when opening
+        const scrollableContent = panel.querySelector('.scrollable-content');
+        if (scrollableContent && window.innerWidth > 768) {
+            scrollableContent.scrollTop = 0;
+        }
+
+        // On mobile, don't reset scroll position - allow user to maintain their place
+        if (window.innerWidth <= 768) {
+            // Give a small delay to allow CSS transitions to complete
+            setTimeout(() => {
+                // Just make sure the panel itself is visible, without changing scroll position
+                if (!panel.getBoundingClientRect().top >= 0) {
+                    panel.scrollIntoView({ behavior: 'smooth', block: 'start' });
+                }
+            }, 100);
+        }
+    }
+});
+
+
+
+// Also allow clicking the header to toggle
+document.querySelector('.map-controls-header').addEventListener('click', function(e) {
+    // Only trigger if clicking directly on the header, not on the toggle button
+    if (!e.target.closest('.map-controls-toggle')) {
+        document.getElementById('mapControlsToggle').click();
+    }
+});
+
+
+
+
+
+// Base map opacity control
+document.getElementById('base-map-opacity').addEventListener('input', function() {
+    const opacity = parseFloat(this.value) / 100;
+    baseMaps[currentBaseMap].setOpacity(opacity);
+    document.getElementById('base-map-opacity-value').textContent = `${this.value}%`;
+});
+
+// Map type toggle buttons
+document.querySelectorAll('.map-type-btn').forEach(button => {
+    button.addEventListener('click', function() {
+        // Remove active class from all buttons
+        document.querySelectorAll('.map-type-btn').forEach(btn => {
+            btn.classList.remove('active');
+        });
+
+        // Add active class to clicked button
+        this.classList.add('active');
+
+        // Switch base layer
+        const mapType = this.getAttribute('data-map-type');
+
+        // Remove all base layers
+        Object.values(baseMaps).forEach(layer => {
+            if (map.hasLayer(layer)) {
+                map.removeLayer(layer);
+            }
+        });
+
+        // Add selected base layer
+        currentBaseMap = mapType;
+        const baseMapLayer = baseMaps[mapType];
+
+        // Apply current opacity
+        const opacity = parseFloat(document.getElementById('base-map-opacity').value) / 100;
+        baseMapLayer.setOpacity(opacity);
+
+        // Add to map
+        map.addLayer(baseMapLayer);
+    });
+});
+
+// Create layers for province boundaries
+const provinceLayers = {
+    camsur: {
+        layer: new L.LayerGroup(),
+        boundary: null,
+        color: '#3388ff',
+        visible: false
+    },
+    albay: {
+        layer: new L.LayerGroup(),
+        boundary: null,
+        color: '#33cc33',
+        visible: false
+    }
+};
+
+// Create waterways layer
+const waterwaysLayer = {
+    layer: new L.LayerGroup(),
+    features: null,
+    clippedFeatures: null,
+    color: 'darkblue',
+    visible: false,
+    clipped: false
+};
+
+// Function to load waterways
+function loadWaterways() {
+    console.log('Loading waterways vector tiles...');
+    initializeWaterwaysLayer();
+}
+
+// Function to initialize waterways layer from vector tiles
+function initializeWaterwaysLayer() {
+    // Get current waterways opacity
+    const opacity = parseFloat(document.getElementById('waterways-opacity').value) / 100;
+
+    try {
+        // Only tiles in the viewport are fetched; geometry is generalized per zoom on the server
+        waterwaysLayer.features = L.vectorGrid.protobuf('/vt/waterways/{z}/{x}/{y}.pbf', {
+            vectorTileLayerStyles: {
+                waterways: {
+                    color: waterwaysLayer.color,
+                    weight: 2,
+                    opacity: 1,
+                    fill: true,
+                    fillColor: waterwaysLayer.color,
+                    fillOpacity: 0.5
+                }
+            },
+            maxNativeZoom: 14,
+            opacity: opacity
+        });
+
+        // Initialize clipped features as null
+        waterwaysLayer.clippedFeatures = null;
+
+        // Check if waterways toggle is checked
+        const waterwaysToggle = document.getElementById('waterways-toggle');
+        if (waterwaysToggle && waterwaysToggle.checked) {
+            console.log('Waterways toggle is checked, setting visible to true');
+            waterwaysLayer.visible = true;
+        }
+
+        // If waterways should be visible, add to map
+        updateWaterwaysDisplay();
+        console.log('Waterways visibility state after update:', waterwaysLayer.visible);
+    } catch (error) {
+        console.error('Error initializing waterways layer:', error);
+    }
+}
+
+// Function to update waterways display based on visibility and clipping
+function updateWaterwaysDisplay() {
+    console.log('Updating waterways display, visible:', waterwaysLayer.visible);
+
+    try {
+        // First, clear the layer
+        waterwaysLayer.layer.clearLayers();
+
+        // Only proceed if waterways are visible
+        if (!waterwaysLayer.visible) {
+            console.log('Waterways not visible, returning');
+            return;
+        }
+
+        let featuresAdded = false;
+
+        // If clipping is enabled and we have both clipped features and area
+        if (waterwaysLayer.clipped && waterwaysLayer.clippedFeatures && currentCoordinates) {
+            console.log('Adding clipped waterways to layer');
+            waterwaysLayer.layer.addLayer(waterwaysLayer.clippedFeatures);
+            featuresAdded = true;
+        } 
+        // Otherwise, show all waterways
+        else if (waterwaysLayer.features) {
+            console.log('Adding all waterways to layer');
+            waterwaysLayer.layer.addLayer(waterwaysLayer.features);
+            featuresAdded = true;
+        } else {
+            console.log('No waterways features available');
+        }
+
+        // Make sure layer is on map if visible and we have features
+        if (waterwaysLayer.visible && featuresAdded) {
+            console.log('Ensuring waterways layer is on map');
+            if (!map.hasLayer(waterwaysLayer.layer)) {
+                console.log('Adding waterways layer to map');
+                map.addLayer(waterwaysLayer.layer);
+            } else {
+                console.log('Waterways layer already on map');
+            }
+        }
+    } catch (err) {
+        console.error('Error updating waterways display:', err);
+    }
+}
+
+// Function to clip waterways to selected area
+function clipWaterways() {
+    if (!currentCoordinates) {
+        console.error('No area selected for clipping');
+        return;
+    }
+
+    // Show loading message
+    const resultsDiv = document.getElementById('results');
+    const previousContent = resultsDiv.innerHTML;
+    resultsDiv.innerHTML = '<p>Clipping waterways to selected area...</p>';
+
+    analysisFetch('/clip_waterways', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify({
+            coordinates: currentCoordinates
+        })
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.success) {
+            // Get current waterways opacity
+            const opacity = parseFloat(document.getElementById('waterways-opacity').value) / 100;
+
+            // Create new GeoJSON layer with clipped waterways
+            waterwaysLayer.clippedFeatures = L.geoJSON(data.clipped_waterways, {
+                style: {
+                    color: waterwaysLayer.color,
+                    weight: 2,
+                    opacity: opacity,
+                    fillColor: waterwaysLayer.color,
+                    fillOpacity: opacity * 0.5
+                }
+            });
+
+            // Update display
+            updateWaterwaysDisplay();
+
+            // Restore previous content
+            resultsDiv.innerHTML = previousContent;
+        } else {
+            resultsDiv.innerHTML = `<p class="error">Error clipping waterways: ${data.error}</p>`;
+            console.error('Error clipping waterways:', data.error);
+        }
+    })
+    .catch(error => {
+        if (error.superseded) {
+            return;
+        }
+        resultsDiv.innerHTML = `<p class="error">Error clipping waterways: ${error.message}</p>`;
+        console.error('Error clipping waterways:', error);
+    });
+}
+
+// Waterways toggle event handler
+document.getElementById('waterways-toggle').addEventListener('change', function() {
+    console.log('Waterways toggle changed to:', this.checked);
+    waterwaysLayer.visible = this.checked;
+
+    updateWaterwaysDisplay();
+
+    if (!this.checked && map.hasLayer(waterwaysLayer.layer)) {
+        map.removeLayer(waterwaysLayer.layer);
+    }
+});
+
+// Ensure waterways are shown after map is fully loaded
+map.whenReady(function() {
+    console.log('Map is ready, rechecking waterways visibility');
+    if (document.getElementById('waterways-toggle').checked) {
+        waterwaysLayer.visible = true;
+        updateWaterwaysDisplay();
+    }
+});
+
+// Clip waterways toggle event handler
+document.getElementById('clip-waterways-toggle').addEventListener('change', function() {
+    waterwaysLayer.clipped = this.checked;
+
+    if (this.checked && currentCoordinates) {
+        // If we haven't already clipped, do it now
+        if (!waterwaysLayer.clippedFeatures) {
+            clipWaterways();
+        } else {
+            // Just update the display
+            updateWaterwaysDisplay();
+        }
+    } else {
+        // Just update to show unclipped
+        updateWaterwaysDisplay();
+    }
+});
+
+// Waterways opacity event handler
+document.getElementById('waterways-opacity').addEventListener('input', function() {
+    const opacity = parseFloat(this.value) / 100;
+    document.getElementById('waterways-opacity-value').textContent = `${this.value}%`;
+
+    // Vector tiles fade as a whole; clipped features are restyled
+    if (waterwaysLayer.features) {
+        waterwaysLayer.features.setOpacity(opacity);
+    }
+
+    if (waterwaysLayer.clippedFeatures) {
+        waterwaysLayer.clippedFeatures.setStyle({
+            opacity: opacity,
+            fillOpacity: opacity * 0.5
+        });
+    }
+});
+
+// Toggle all provinces
+document.getElementById('controls-toggle-all-provinces').addEventListener('change', function() {
+    const checked = this.checked;
+
+    // Update checkboxes in controls panel
+    document.getElementById('controls-camsur-toggle').checked = checked;
+    document.getElementById('controls-albay-toggle').checked = checked;
+
+    // Update map layers
+    Object.keys(provinceLayers).forEach(province => {
+        provinceLayers[province].visible = checked;
+
+        if (checked) {
+            map.addLayer(provinceLayers[province].layer);
+        } else {
+            map.removeLayer(provinceLayers[province].layer);
+        }
+    });
+
+    updateMapView();
+});
+
+// Province opacity control
+document.getElementById('province-opacity').addEventListener('input', function() {
+    const opacity = parseFloat(this.value) / 100;
+    document.getElementById('province-opacity-value').textContent = `${this.value}%`;
+
+    // Update province boundary opacity
+    Object.keys(provinceLayers).forEach(province => {
+        if (provinceLayers[province].boundary) {
+            provinceLayers[province].boundary.setStyle({
+                opacity: opacity,
+                fillOpacity: opacity * 0.2 // Keep fill more transparent
+            });
+        }
+    });
+});
+
+// Dynamic layer toggle and opacity
+document.getElementById('layer-toggle').addEventListener('change', function() {
+    const visible = this.checked;
+
+    if (animationState.currentLayer) {
+        if (visible) {
+            if (!map.hasLayer(animationState.currentLayer)) {
+                map.addLayer(animationState.currentLayer);
+            }
+        } else {
+            if (map.hasLayer(animationState.currentLayer)) {
+                map.removeLayer(animationState.currentLayer);
+            }
+        }
+    }
+
+    if (currentNdviLayer) {
+        if (visible) {
+            if (!map.hasLayer(currentNdviLayer)) {
+                map.addLayer(currentNdviLayer);
+            }
+        } else {
+            if (map.hasLayer(currentNdviLayer)) {
+                map.removeLayer(currentNdviLayer);
+            }
+        }
+    }
+});
+
+document.getElementById('layer-opacity').addEventListener('input', function() {
+    const opacity = parseFloat(this.value) / 100;
+    document.getElementById('layer-opacity-value').textContent = `${this.value}%`;
+
+    if (animationState.currentLayer) {
+        animationState.currentLayer.setOpacity(opacity);
+    }
+
+    if (currentNdviLayer) {
+        currentNdviLayer.setOpacity(opacity);
+    }
+});
+
+// Analysis area toggle and opacity
+document.getElementById('area-toggle').addEventListener('change', function() {
+    const visible = this.checked;
+
+    if (visible) {
+        if (!map.hasLayer(drawnItems)) {
+            map.addLayer(drawnItems);
+        }
+    } else {
+        if (map.hasLayer(drawnItems)) {
+            map.removeLayer(drawnItems);
+        }
+    }
+});
+
+document.getElementById('area-opacity').addEventListener('input', function() {
+    const opacity = parseFloat(this.value) / 100;
+    document.getElementById('area-opacity-value').textContent = `${this.value}%`;
+
+    drawnItems.eachLayer(function(layer) {
+        if (layer.setStyle) {
+            layer.setStyle({
+                fillOpacity: opacity * 0.2,
+                opacity: opacity
+            });
+        }
+    });
+});
+
+// Function to load province boundaries
+function loadProvinceBoundary(province, filename, color) {
+    fetch(filename)
+        .then(response => response.json())
+        .then(data => {
+            // Get current province opacity
+            const opacity = parseFloat(document.getElementById('province-opacity').value) / 100;
+
+            // Create boundary with style
+            provinceLayers[province].boundary = L.geoJSON(data, {
+                style: {
+                    color: color,
+                    weight: 3,
+                    opacity: opacity,
+                    fillOpacity: opacity * 0.2
+                }
+            });
+
+            provinceLayers[province].layer.addLayer(provinceLayers[province].boundary);
+
+            // Only add to map if explicitly set to visible
+            if (provinceLayers[province].visible) {
+                map.addLayer(provinceLayers[province].layer);
+            }
+
+            // Don't auto-update map view when loading boundaries
+            // Let the user choose when to show boundaries
+        })
+        .catch(error => {
+            console.error(`Error loading ${province} GeoJSON:`, error);
+        });
+}
+
+// Load province boundaries
+loadProvinceBoundary('camsur', 'camsur.geojson', provinceLayers.camsur.color);
+loadProvinceBoundary('albay', 'albay.geojson', provinceLayers.albay.color);
+
+// Only need controls panel event handlers since sidebar province selection is removed
+document.getElementById('controls-camsur-toggle').addEventListener('change', function() {
+    provinceLayers.camsur.visible = this.checked;
+
+    if (this.checked) {
+        map.addLayer(provinceLayers.camsur.layer);
+    } else {
+        map.removeLayer(provinceLayers.camsur.layer);
+    }
+
+    updateMapView();
+});
+
+document.getElementById('controls-albay-toggle').addEventListener('change', function() {
+    provinceLayers.albay.visible = this.checked;
+
+    if (this.checked) {
+        map.addLayer(provinceLayers.albay.layer);
+    } else {
+        map.removeLayer(provinceLayers.albay.layer);
+    }
+
+    updateMapView();
+});
+
+// Function to update map view based on visible layers
+function updateMapView() {
+    const visibleBoundaries = [];
+
+    if (provinceLayers.camsur.boundary && provinceLayers.camsur.visible) {
+        visibleBoundaries.push(provinceLayers.camsur.boundary);
+    }
+
+    if (provinceLayers.albay.boundary && provinceLayers.albay.visible) {
+        visibleBoundaries.push(provinceLayers.albay.boundary);
+    }
+
+    if (visibleBoundaries.length > 0) {
+        // Create a feature group with all visible boundaries
+        const group = L.featureGroup(visibleBoundaries);
+        map.fitBounds(group.getBounds());
+    } else {
+        // If no boundaries are selected, reset to Bicol view
+        resetMapToBicolView();
+    }
+}
+
+// Initialize draw control
+const drawnItems = new L.FeatureGroup();
+map.addLayer(drawnItems);
+
+const drawControl = new L.Control.Draw({
+    draw: {
+        marker: false,
+        circle: false,
+        circlemarker: false,
+        rectangle: true,
+        polyline: false,
+        polygon: {
+            allowIntersection: false,
+            drawError: {
+                color: '#e1e100',
+                message: '<strong>Error:</strong> Polygon edges cannot cross!'
+            },
+            shapeOptions: {
+                color: '#3388ff'
+            }
+        }
+    },
+    edit: {
+        featureGroup: drawnItems,
+        remove: true
+    }
+});
+map.addControl(drawControl);
+
+// Fix rectangle drawing when sidebar is collapsed/expanded
+map.on('draw:drawstart', function(e) {
+    // Force map to update its size before drawing starts
+    map.invalidateSize({animate: false});
+    console.log("Invalidating map size before drawing starts");
+});
+
+// Store the current drawn polygon coordinates
+let currentCoordinates = null;
+let currentNdviLayer = null;
+
+function displayStatistics(statistics) {
+    const resultsDiv = document.getElementById('results');
+    const basicStats = statistics.basic_stats;
+    const areaStats = statistics.area_stats;
+
+    let html = `
+        <div class="stats-section">
+            <div class="stats-title">Total Area: ${statistics.total_area_hectares} hectares</div>
+
+            <div class="stats-title">Basic Statistics</div>
+            <div class="stat-item">
+                <span class="stat-label">Mean NDVI:</span>
+                <span class="stat-value">${basicStats.mean_ndvi}</span>
+            </div>
+            <div class="stat-item">
+                <span class="stat-label">Median NDVI:</span>
+                <span class="stat-value">${basicStats.median_ndvi}</span>
+            </div>
+            <div class="stat-item">
+                <span class="stat-label">Min NDVI:</span>
+                <span class="stat-value">${basicStats.min_ndvi}</span>
+            </div>
+            <div class="stat-item">
+                <span class="stat-label">Max NDVI:</span>
+                <span class="stat-value">${basicStats.max_ndvi}</span>
+            </div>
+
+            <div class="stats-title">Vegetation Distribution</div>
+    `;
+
+    // Order the vegetation types
+    const orderedTypes = [
+        'dense_vegetation',
+        'moderate_vegetation',
+        'sparse_vegetation',
+        'water_or_bare'
+    ];
+
+    // Add vegetation type sections in proper order
+    for (const key of orderedTypes) {
+        if (areaStats[key]) {
+            const stat = areaStats[key];
+        const colorMap = {
+            'water_or_bare': '#ff0000',
+            'sparse_vegetation': '#ffff00',
+            'moderate_vegetation': '#90ee90',
+            'dense_vegetation': '#008000'
+        };
+
+        html += `
+            <div class="vegetation-type">
+                <div class="vegetation-header">
+                    <span class="vegetation-name">${stat.description}</span>
+                    <span class="vegetation-area">${stat.area_hectares} ha (${stat.percentage}%)</span>
+                </div>
+                <div class="progress-bar">
+                    <div class="progress-fill" style="width: ${stat.percentage}%; background-color: ${colorMap[key]};"></div>
+                </div>
+            </div>
+        `;
+        }
+    }
+
+    resultsDiv.innerHTML = html;
+}
+
+// Function to update button state based on area selection
+function updateAnalyzeButtonState() {
+    const analyzeBtn = document.getElementById('analyze-time-series-btn');
+
+    if (currentCoordinates) {
+        analyzeBtn.disabled = false;
+    } else {
+        analyzeBtn.disabled = true;
+    }
+    updateSaveAreaButtonState();
+}
+
+// Initialize button state
+updateAnalyzeButtonState();
+
+// Event handler for when a shape is created
+map.on(L.Draw.Event.CREATED, function(event) {
+    cancelAllAnalysisRequests();
+    const layer = event.layer;
+    drawnItems.clearLayers();
+    drawnItems.addLayer(layer);
+
+    // Get coordinates from the drawn shape
+    if (layer instanceof L.Polygon) {
+        const latlngs = layer.getLatLngs()[0];
+        currentCoordinates = latlngs.map(latlng => [latlng.lng, latlng.lat]);
+
+        // Make sure the polygon is closed
+        if (currentCoordinates.length > 0 && 
+            (currentCoordinates[0][0] !== currentCoordinates[currentCoordinates.length-1][0] || 
+             currentCoordinates[0][1] !== currentCoordinates[currentCoordinates.length-1][1])) {
+            currentCoordinates.push(currentCoordinates[0]);
+        }
+
+        document.getElementById('results').innerHTML = '<p>Area selected. Click "Analyze Time Series" to process.</p>';
+        updateAnalyzeButtonState();
+    } else if (layer instanceof L.Rectangle) {
+        const bounds = layer.getBounds();
+        const nw = bounds.getNorthWest();
+        const ne = bounds.getNorthEast();
+        const se = bounds.getSouthEast();
+        const sw = bounds.getSouthWest();
+
+        currentCoordinates = [
+            [nw.lng, nw.lat],
+            [ne.lng, ne.lat],
+            [se.lng, se.lat],
+            [sw.lng, sw.lat],
+            [nw.lng, nw.lat]  // Close the polygon
+        ];
+
+        document.getElementById('results').innerHTML = '<p>Area selected. Click "Analyze Time Series" to process.</p>';
+        updateAnalyzeButtonState();
+    }
+
+    // If waterways clipping is enabled, update clipped waterways
+    if (waterwaysLayer.clipped) {
+        clipWaterways();
+    }
+});
+
+// Event handler for when shapes are edited
+map.on(L.Draw.Event.EDITED, function(event) {
+    cancelAllAnalysisRequests();
+    const layers = event.layers;
+    layers.eachLayer(function(layer) {
+        if (layer instanceof L.Polygon) {
+            const latlngs = layer.getLatLngs()[0];
+            currentCoordinates = latlngs.map(latlng => [latlng.lng, latlng.lat]);
+
+            // Make sure the polygon is closed
+            if (currentCoordinates.length > 0 && 
+                (currentCoordinates[0][0] !== currentCoordinates[currentCoordinates.length-1][0] || 
+                 currentCoordinates[0][1] !== currentCoordinates[currentCoordinates.length-1][1])) {
+                currentCoordinates.push(currentCoordinates[0]);
+            }
+
+            updateAnalyzeButtonState();
+        }
+    });
+
+    // If waterways clipping is enabled, update clipped waterways
+    if (waterwaysLayer.clipped) {
+        clipWaterways();
+    }
+});
+
+// Event handler for when shapes are deleted
+map.on(L.Draw.Event.DELETED, function() {
+    cancelAllAnalysisRequests();
+    stopAnimation();
+    if (animationState.currentLayer) {
+        map.removeLayer(animationState.currentLayer);
+    }
+    document.getElementById('animation-controls').classList.remove('visible');
+
+    currentCoordinates = null;
+    if (currentNdviLayer) {
+        map.removeLayer(currentNdviLayer);
+        currentNdviLayer = null;
+    }
+    document.getElementById('results').innerHTML = '<p>Draw a polygon on the map to select an area for analysis.</p>';
+    updateAnalyzeButtonState();
+
+    // Reset clipped waterways
+    waterwaysLayer.clippedFeatures = null;
+    updateWaterwaysDisplay();
+});
+
+// Initialize year selectors
+function initializeYearSelectors() {
+    const startYearSelect = document.getElementById('start-year');
+    const endYearSelect = document.getElementById('end-year');
+    const currentYear = new Date().getFullYear();
+
+    // Landsat 8 data available from 2013
+    for (let year = 2013; year <= currentYear; year++) {
+        startYearSelect.add(new Option(year, year));
+        endYearSelect.add(new Option(year, year));
+    }
+
+    // Set default values to 2019-2024
+    startYearSelect.value = 2019;
+    endYearSelect.value = 2024;
+}
+
+// Animation state
+let animationState = {
+    mapTiles: [],
+    currentIndex: 0,
+    isPlaying: false,
+    animationSpeed: 1000,
+    animationInterval: null,
+    currentLayer: null
+};
+
+function updateMapLayer(index) {
+    try {
+        // Remove current layer if it exists
+        if (animationState.currentLayer) {
+            map.removeLayer(animationState.currentLayer);
+            animationState.currentLayer = null;
+        }
+
+        // Validate that we have valid map tiles and the index is within range
+        if (!animationState.mapTiles || !animationState.mapTiles.length || index >= animationState.mapTiles.length) {
+            console.error('Invalid map tiles or index out of range', {
+                hasTiles: !!animationState.mapTiles,
+                tileCount: animationState.mapTiles ? animationState.mapTiles.length : 0,
+                requestedIndex: index
+            });
+            return;
+        }
+
+        const tileData = animationState.mapTiles[index];
+
+        // Validate that the tile data has a URL
+        if (!tileData || !tileData.tile_url) {
+            console.error('Invalid tile data or missing URL', tileData);
+            return;
+        }
+
+        // Get current model type
+        const modelType = document.querySelector('input[name="model-type"]:checked')?.value || 'ndvi';
+        console.log(`Updating ${modelType} map for year: ${tileData.year} (index: ${index})`);
+
+        // Create and add the new layer
+        animationState.currentLayer = L.tileLayer(tileData.tile_url);
+        animationState.currentLayer.addTo(map);
+
+        // Update UI
+        document.getElementById('year-display').textContent = `Year: ${tileData.year}`;
+        document.getElementById('timeline-slider').value = index;
+
+        // Update the statistics in the sidebar for the current year
+        if (tileData.statistics) {
+            displayStatistics(tileData.statistics);
+        }
+
+        // Store the current year and index globally to help with synchronization
+        window.currentAnimationYear = tileData.year;
+        window.currentAnimationIndex = index;
+
+        // Highlight the current year in the charts
+        highlightCurrentYearInCharts(tileData.year);
+
+        // Also update the year selector if it exists
+        const yearSelect = document.getElementById('land-cover-year');
+        if (yearSelect) {
+            // Check if the option exists
+            const option = yearSelect.querySelector(`option[value="${tileData.year}"]`);
+            if (option) {
+                yearSelect.value = tileData.year;
+            }
+        }
+    } catch (error) {
+        console.error('Error updating map layer:', error);
+        // Stop animation if there's an error to prevent continuous errors
+        stopAnimation();
+    }
+}
+
+function startAnimation() {
+    if (animationState.animationInterval) {
+        clearInterval(animationState.animationInterval);
+    }
+
+    animationState.animationInterval = setInterval(() => {
+        animationState.currentIndex++;
+        if (animationState.currentIndex >= animationState.mapTiles.length) {
+            animationState.currentIndex = 0;
+        }
+        updateMapLayer(animationState.currentIndex);
+    }, animationState.animationSpeed);
+}
+
+function stopAnimation() {
+    if (animationState.animationInterval) {
+        clearInterval(animationState.animationInterval);
+        animationState.animationInterval = null;
+    }
+}
+
+// Function to synchronize all chart highlighting with animation state
+function synchronizeChartHighlighting() {
+    // Check if we have active animation
+    if (!animationState.mapTiles || animationState.mapTiles.length === 0) {
+        return;
+    }
+
+    // Get the current year from animation state
+    const currentIndex = animationState.currentIndex || 0;
+    const tileData = animationState.mapTiles[currentIndex];
+
+    if (tileData && tileData.year) {
+        console.log(`Synchronizing chart highlighting for year: ${tileData.year}`);
+        highlightCurrentYearInCharts(tileData.year);
+    }
+}
+
+function initializeAnimation(mapTiles) {
+    if (!mapTiles || mapTiles.length === 0) {
+        console.error('No map tiles provided for animation initialization');
+        return;
+    }
+
+    console.log(`Initializing animation with ${mapTiles.length} map tiles`);
+
+    // Reset any existing animation state
+    stopAnimation();
+
+    // Reset the animation state completely
+    animationState = {
+        mapTiles: mapTiles,
+        currentIndex: 0,
+        isPlaying: false,
+        animationSpeed: 1000,
+        animationInterval: null,
+        currentLayer: null
+    };
+
+    const controls = document.getElementById('animation-controls');
+    const slider = document.getElementById('timeline-slider');
+    const playPauseBtn = document.getElementById('play-pause-btn');
+    const collapseBtn = document.getElementById('animation-collapse-btn');
+
+    // Reset play/pause button state
+    playPauseBtn.textContent = 'Play';
+    playPauseBtn.style.backgroundColor = '#4CAF50';
+    playPauseBtn.classList.remove('playing');
+
+    // Show controls and set up slider
+    controls.classList.add('visible');
+    slider.max = mapTiles.length - 1;
+    slider.value = 0;
+
+    // Automatically collapse on very small screens
+    if (window.innerWidth <= 350) {
+        controls.classList.add('collapsed');
+        collapseBtn.textContent = '↓';
+        collapseBtn.title = 'Expand controls';
+    }
+
+    // Initial map display
+    updateMapLayer(0);
+
+    // Remove any existing event listeners by cloning and replacing elements
+    // This prevents duplicate event handlers when re-initializing animations
+
+    // Replace collapse button to remove old listeners
+    const newCollapseBtn = collapseBtn.cloneNode(true);
+    collapseBtn.parentNode.replaceChild(newCollapseBtn, collapseBtn);
+
+    // Replace play/pause button to remove old listeners
+    const newPlayPauseBtn = playPauseBtn.cloneNode(true);
+    playPauseBtn.parentNode.replaceChild(newPlayPauseBtn, playPauseBtn);
+
+    // Replace slider to remove old listeners
+    const newSlider = slider.cloneNode(true);
+    slider.parentNode.replaceChild(newSlider, slider);
+
+    // Replace speed selector to remove old listeners
+    const speedSelector = document.getElementById('animation-speed');
+    const newSpeedSelector = speedSelector.cloneNode(true);
+    speedSelector.parentNode.replaceChild(newSpeedSelector, speedSelector);
+
+    // Get fresh references to the replaced elements
+    const freshCollapseBtn = document.getElementById('animation-collapse-btn');
+    const freshPlayPauseBtn = document.getElementById('play-pause-btn');
+    const freshSlider = document.getElementById('timeline-slider');
+    const freshSpeedSelector = document.getElementById('animation-speed');
+
+    // Setup collapse button functionality
+    freshCollapseBtn.addEventListener('click', function() {
+        controls.classList.toggle('collapsed');
+        this.textContent = controls.classList.contains('collapsed') ? '↓' : '↑';
+        this.title = controls.classList.contains('collapsed') ? 'Expand controls' : 'Collapse controls';
+    });
+
+    // Play/Pause button handler
+    freshPlayPauseBtn.addEventListener('click', () => {
+        animationState.isPlaying = !animationState.isPlaying;
+
+        // Update button appearance and text
+        if (animationState.isPlaying) {
+            freshPlayPauseBtn.textContent = 'Pause';
+            freshPlayPauseBtn.style.backgroundColor = '#ff9800';
+            freshPlayPauseBtn.classList.add('playing');
+        } else {
+            freshPlayPauseBtn.textContent = 'Play';
+            freshPlayPauseBtn.style.backgroundColor = '#4CAF50';
+            freshPlayPauseBtn.classList.remove('playing');
+        }
+
+        if (animationState.isPlaying) {
+            startAnimation();
+        } else {
+            stopAnimation();
+        }
+    });
+
+    // Timeline slider handler
+    freshSlider.addEventListener('input', (e) => {
+        stopAnimation();
+        animationState.currentIndex = parseInt(e.target.value);
+        updateMapLayer(animationState.currentIndex);
+        animationState.isPlaying = false;
+
+        // Update play/pause button appearance
+        freshPlayPauseBtn.textContent = 'Play';
+        freshPlayPauseBtn.style.backgroundColor = '#4CAF50';
+        freshPlayPauseBtn.classList.remove('playing');
+    });
+
+    // Animation speed handler
+    freshSpeedSelector.addEventListener('change', (e) => {
+        animationState.animationSpeed = parseInt(e.target.value);
+        if (animationState.isPlaying) {
+            stopAnimation();
+            startAnimation();
+        }
+    });
+
+    // Always show animation controls
+    controls.classList.add('visible');
+}
+
+let ndviChart = null;
+let vegetationChart = null;
+let forecastData = null;
+
+
+function createTimeSeriesCharts(yearlyStats) {
+    console.log('Initializing NDVI time series visualization');
+
+    // Reset all chart canvases first to prevent any chart conflicts
+    resetChartCanvases();
+
+    // Make sure the time series container is visible
+    const timeSeriesContainer = document.getElementById('time-series-results');
+    if (timeSeriesContainer) {
+        timeSeriesContainer.style.display = 'block';
+        console.log('Showing time series container');
+    }
+
+    const years = yearlyStats.map(stat => stat.year);
+    const meanNdvi = yearlyStats.map(stat => stat.basic_stats.mean_ndvi);
+    const vegetationTypes = ['water_or_bare', 'sparse_vegetation', 'moderate_vegetation', 'dense_vegetation'];
+
+    // Save yearly stats for potential forecasting
+    window.yearlyStatsData = yearlyStats;
+
+    try {
+        console.log('Creating NDVI chart with', years.length, 'data points');
+    // Create NDVI trend chart
+        const ndviCanvas = document.getElementById('ndviChart');
+        const ndviCtx = ndviCanvas.getContext('2d');
+
+        window.ndviChart = new Chart(ndviCtx, {
+        type: 'line',
+        data: {
+            labels: years,
+            datasets: [{
+                label: 'Mean NDVI',
+                data: meanNdvi,
+                borderColor: '#4CAF50',
+                tension: 0.1,
+                pointBackgroundColor: years.map(() => '#4CAF50'),
+                pointRadius: years.map(() => 3),
+                pointHoverRadius: years.map(() => 6)
+            }]
+        },
+        options: {
+            responsive: true,
+            maintainAspectRatio: false,
+            plugins: {
+                title: {
+                    display: true,
+                    text: 'NDVI Trend Over Time'
+                }
+            },
+            scales: {
+                y: {
+                    beginAtZero: true,
+                    title: {
+                        display: true,
+                        text: 'NDVI Value'
+                    }
+                }
+            }
+        }
+    });
+        console.log('NDVI chart created successfully');
+    } catch (error) {
+        console.error('Error creating NDVI chart:', error);
+    }
+
+    try {
+        console.log('Creating vegetation distribution chart');
+    // Create vegetation distribution chart
+    const vegetationData = vegetationTypes.map(type => ({
+        type: type,
+        values: yearlyStats.map(stat => stat.area_stats[type].percentage)
+    }));
+
+        const vegetationCanvas = document.getElementById('vegetationChart');
+        const vegetationCtx = vegetationCanvas.getContext('2d');
+
+        window.vegetationChart = new Chart(vegetationCtx, {
+        type: 'bar',
+        data: {
+            labels: years,
+            datasets: vegetationTypes.map((type, index) => ({
+                label: yearlyStats[0].area_stats[type].description,
+                data: vegetationData[index].values,
+                backgroundColor: {
+                    'water_or_bare': '#ff0000',
+                    'sparse_vegetation': '#ffff00',
+                    'moderate_vegetation': '#90ee90',
+                    'dense_vegetation': '#008000'
+                }[type]
+            }))
+        },
+        options: {
+            responsive: true,
+            maintainAspectRatio: false,
+            plugins: {
+                title: {
+                    display: true,
+                    text: 'Vegetation Distribution Over Time'
+                },
+                tooltip: {
+                    callbacks: {
+                        label: function(context) {
+                            return `${context.dataset.label}: ${context.raw.toFixed(1)}%`;
+                        }
+                    }
+                }
+            },
+            scales: {
+                x: {
+                    stacked: true,
+                    title: {
+                        display: true,
+                        text: 'Year'
+                    }
+                },
+                y: {
+                    stacked: true,
+                    title: {
+                        display: true,
+                        text: 'Percentage'
+                    }
+                }
+            }
+        }
+    });
+        console.log('Vegetation chart created successfully');
+    } catch (error) {
+        console.error('Error creating vegetation chart:', error);
+    }
+}
+
+function highlightCurrentYearInCharts(year) {
+    if (!window.ndviChart || !window.vegetationChart) {
+        console.log(`Cannot highlight year ${year}: charts not initialized`);
+        return;
+    }
+
+    // Get the model type to know which charts we're working with
+    const modelType = document.querySelector('input[name="model-type"]:checked')?.value || 'ndvi';
+
+    // Find the index of the current year in the charts
+    const yearIndex = window.ndviChart.data.labels.findIndex(y => y == year);
+    if (yearIndex === -1) {
+        console.log(`Year ${year} not found in chart labels`);
+        return;
+    }
+
+    console.log(`Highlighting year ${year} (index: ${yearIndex}) in ${modelType} charts`);
+
+    // ----------- Handle Line Charts (NDVI Chart) -----------
+    try {
+        // Apply appropriate highlighting based on chart structure
+        // For NDVI model, we usually have one dataset
+        if (modelType === 'ndvi' && window.ndviChart.data.datasets.length === 1) {
+            // Reset all point styles for NDVI chart
+            window.ndviChart.data.datasets[0].pointBackgroundColor = window.ndviChart.data.labels.map(() => '#4CAF50');
+            window.ndviChart.data.datasets[0].pointRadius = window.ndviChart.data.labels.map(() => 3);
+            window.ndviChart.data.datasets[0].pointBorderWidth = window.ndviChart.data.labels.map(() => 1);
+
+            // Highlight the current year's point
+            window.ndviChart.data.datasets[0].pointBackgroundColor[yearIndex] = '#FF5722';
+            window.ndviChart.data.datasets[0].pointRadius[yearIndex] = 8;
+            window.ndviChart.data.datasets[0].pointBorderWidth[yearIndex] = 2;
+        } else {
+            // For Dynamic World, we have multiple datasets
+            window.ndviChart.data.datasets.forEach(dataset => {
+                // Create point style arrays if they don't exist
+                if (!dataset.pointBackgroundColor) {
+                    dataset.pointBackgroundColor = Array(window.ndviChart.data.labels.length).fill(dataset.borderColor);
+                }
+                if (!dataset.pointRadius) {
+                    dataset.pointRadius = Array(window.ndviChart.data.labels.length).fill(3);
+                }
+                if (!dataset.pointBorderWidth) {
+                    dataset.pointBorderWidth = Array(window.ndviChart.data.labels.length).fill(1);
+                }
+
+                // Reset points to default
+                for (let i = 0; i < dataset.pointBackgroundColor.length; i++) {
+                    dataset.pointBackgroundColor[i] = dataset.borderColor;
+                    dataset.pointRadius[i] = 3;
+                    dataset.pointBorderWidth[i] = 1;
+                }
+
+                // Only highlight points with data (not null or undefined)
+                if (dataset.data[yearIndex] !== null && dataset.data[yearIndex] !== undefined) {
+                    dataset.pointBackgroundColor[yearIndex] = '#FF5722';
+                    dataset.pointRadius[yearIndex] = 6;
+                    dataset.pointBorderWidth[yearIndex] = 2;
+                }
+            });
+        }
+
+        // Update the NDVI/line chart
+        window.ndviChart.update();
+    } catch (error) {
+        console.error("Error highlighting line chart:", error);
+    }
+
+    // ----------- Handle Bar Charts (Vegetation Chart) -----------
+    try {
+        // Reset all bar styles for vegetation chart
+        window.vegetationChart.data.datasets.forEach(dataset => {
+            // Store original colors if not saved yet
+            if (!dataset._originalBackgroundColor) {
+                dataset._originalBackgroundColor = JSON.parse(JSON.stringify(dataset.backgroundColor));
+            }
+
+            // Reset background colors and borders
+            if (Array.isArray(dataset._originalBackgroundColor)) {
+                dataset.backgroundColor = JSON.parse(JSON.stringify(dataset._originalBackgroundColor));
+            } else {
+                dataset.backgroundColor = dataset._originalBackgroundColor;
+            }
+            dataset.borderColor = Array(window.vegetationChart.data.labels.length).fill('#00000000');
+            dataset.borderWidth = Array(window.vegetationChart.data.labels.length).fill(0);
+        });
+
+        // Highlight current year's bars in vegetation chart
+        window.vegetationChart.data.datasets.forEach(dataset => {
+            // Only add border to the current year's bar
+            if (Array.isArray(dataset.borderColor)) {
+                dataset.borderColor[yearIndex] = '#FF5722';
+                dataset.borderWidth[yearIndex] = 2;
+            } else {
+                // Create arrays for per-bar styling
+                const borders = [];
+                const widths = [];
+
+                for (let i = 0; i < window.vegetationChart.data.labels.length; i++) {
+                    borders.push(i === yearIndex ? '#FF5722' : '#00000000');
+                    widths.push(i === yearIndex ? 2 : 0);
+                }
+
+                dataset.borderColor = borders;
+                dataset.borderWidth = widths;
+            }
+        });
+
+        // Create a highlight plugin for the vegetation chart if it doesn't exist
+        if (!window.vegetationChart.options.plugins.highlight) {
+            window.vegetationChart.options.plugins.highlight = {
+                highlightedIndex: -1
+            };
+        }
+
+        // Set the highlighted index
+        window.vegetationChart.options.plugins.highlight.highlightedIndex = yearIndex;
+
+        // Update the vegetation chart
+        window.vegetationChart.update();
+    } catch (error) {
+        console.error("Error highlighting bar chart:", error);
+    }
+
+    // Sync with year selector if it exists
+    try {
+        const yearSelect = document.getElementById('land-cover-year');
+        if (yearSelect && yearSelect.querySelector(`option[value="${year}"]`)) {
+            yearSelect.value = year;
+        }
+    } catch (e) {
+        console.error("Error updating year selector:", e);
+    }
+}
+
+// Register a custom plugin for Chart.js to highlight bars
+Chart.register({
+    id: 'highlightBar',
+    beforeDraw: (chart) => {
+        if (chart.config.type !== 'bar' || 
+            !chart.options.plugins.highlight || 
+            chart.options.plugins.highlight.highlightedIndex === -1) {
+            return;
+        }
+
+        const index = chart.options.plugins.highlight.highlightedIndex;
+        const meta = chart.getDatasetMeta(0);
+        if (!meta.data[index]) return;
+
+        const ctx = chart.ctx;
+        const x = meta.data[index].x;
+        const barWidth = meta.data[index].width * 1.2; // slightly wider than the bar for better visibility
+
+        // Draw a rectangle highlight behind the bars
+        ctx.save();
+        ctx.globalAlpha = 0.1;
+        ctx.fillStyle = '#FF5722';
+        ctx.fillRect(x - barWidth/2, chart.chartArea.top, barWidth, chart.chartArea.bottom - chart.chartArea.top);
+        ctx.restore();
+
+        // Draw vertical highlight lines on both sides of the bar group
+        ctx.save();
+        ctx.beginPath();
+        ctx.moveTo(x - barWidth/2, chart.chartArea.top);
+        ctx.lineTo(x - barWidth/2, chart.chartArea.bottom);
+        ctx.moveTo(x + barWidth/2, chart.chartArea.top);
+        ctx.lineTo(x + barWidth/2, chart.chartArea.bottom);
+        ctx.lineWidth = 2;
+        ctx.strokeStyle = '#FF5722';
+        ctx.setLineDash([5, 3]);
+        ctx.stroke();
+        ctx.restore();
+        }
+    });
+
+// Modify the time series analysis handler
+// Show the charts and map animation of a /get_yearly_stats response
+function displayNdviTimeSeries(data) {
+    document.getElementById('time-series-results').style.display = 'block';
+    createTimeSeriesCharts(data.yearly_stats);
+
+    // Initialize animation with map tiles
+    if (data.map_tiles && data.map_tiles.length > 0) {
+        // Merge yearly_stats with map_tiles to include statistics for each year
+        data.map_tiles.forEach((tile, index) => {
+            const matchingStat = data.yearly_stats.find(stat => stat.year == tile.year);
+            if (matchingStat) {
+                tile.statistics = {
+                    total_area_hectares: matchingStat.total_area_hectares,
+                    basic_stats: matchingStat.basic_stats,
+                    area_stats: matchingStat.area_stats
+                };
+            }
+        });
+
+        initializeAnimation(data.map_tiles);
+
+        // Ensure chart highlighting is synchronized
+        setTimeout(synchronizeChartHighlighting, 500);
+        // Display initial statistics
+        if (data.map_tiles[0].statistics) {
+            displayStatistics(data.map_tiles[0].statistics);
+        }
+    }
+}
+
+document.getElementById('analyze-time-series-btn').addEventListener('click', function() {
+    if (!currentCoordinates) {
+        document.getElementById('results').innerHTML = '<p class="error">Please draw an area on the map first.</p>';
+        return;
+    }
+
+    const startYear = document.getElementById('start-year').value;
+    const endYear = document.getElementById('end-year').value;
+
+    if (!startYear || !endYear) {
+        document.getElementById('results').innerHTML = '<p class="error">Please select start and end years.</p>';
+        return;
+    }
+
+    // Show loading screen
+    showLoading('Analyzing Time Series', `Processing data from ${startYear} to ${endYear}. This may take a while...`);
+
+    // Clear all map layers for a fresh analysis
+    clearAllMapLayers();
+
+    document.getElementById('results').innerHTML = '<p>Processing time series... Please wait.</p>';
+    document.getElementById('time-series-results').style.display = 'none';
+
+    // Get the model type from the global selection
+    const modelType = document.querySelector('input[name="model-type"]:checked').value;
+    const isAnalyzingDynamicWorld = modelType === 'dynamicworld';
+
+    if (isAnalyzingDynamicWorld) {
+        // Process Dynamic World time series
+        getDynamicWorldTimeSeries(currentCoordinates, parseInt(startYear), parseInt(endYear))
+            .then(result => {
+                if (result.timeseriesData.length > 0) {
+                    // Save the data for potential forecasting
+                    window.dynamicWorldTimeseriesData = result.timeseriesData;
+                    displayDynamicWorldTimeSeries(result.timeseriesData, result.mapTiles);
+                    document.getElementById('results').innerHTML = '<p>Dynamic World time series analysis complete!</p>';
+                    // Hide loading screen
+                    hideLoading();
+                } else {
+                    document.getElementById('results').innerHTML = '<p class="error">No Dynamic World data found for the selected time range.</p>';
+                    // Hide loading screen
+                    hideLoading();
+                }
+            })
+            .catch(error => {
+                if (error.superseded) {
+                    return;
+                }
+                document.getElementById('results').innerHTML = `<p class="error">Error: ${error.message}</p>`;
+                // Hide loading screen on error
+                hideLoading();
+            });
+    } else {
+        // Process NDVI time series (default)
+    analysisFetch('/get_yearly_stats', {
+            method: 'POST',
+            headers: {
+            'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({
+            coordinates: currentCoordinates,
+            start_year: parseInt(startYear),
+            end_year: parseInt(endYear)
+        })
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.success) {
+            displayNdviTimeSeries(data);
+
+                document.getElementById('results').innerHTML = '<p>NDVI time series analysis complete!</p>';
+                // Hide loading screen
+                hideLoading();
+        } else {
+            document.getElementById('results').innerHTML = `<p class="error">Error: ${data.error}</p>`;
+            // Hide loading screen
+            hideLoading();
+        }
+    })
+    .catch(error => {
+        if (error.superseded) {
+            return;
+        }
+        document.getElementById('results').innerHTML = `<p class="error">Error: ${error.message}</p>`;
+        // Hide loading screen on error
+        hideLoading();
+    });
+    }
+});
+
+// Clean up animation when tab is cleared
+map.on(L.Draw.Event.DELETED, function() {
+            stopAnimation();
+            if (animationState.currentLayer) {
+                map.removeLayer(animationState.currentLayer);
+            }
+            document.getElementById('animation-controls').classList.remove('visible');
+
+    currentCoordinates = null;
+    if (currentNdviLayer) {
+        map.removeLayer(currentNdviLayer);
+        currentNdviLayer = null;
+    }
+    document.getElementById('results').innerHTML = '<p>Draw a polygon on the map to select an area for analysis.</p>';
+    updateAnalyzeButtonState();
+
+    // Reset clipped waterways
+    waterwaysLayer.clippedFeatures = null;
+    updateWaterwaysDisplay();
+});
+
+// Initialize year selectors when the page loads
+initializeYearSelectors();
+
+// Add event listener for model type change
+document.querySelectorAll('input[name="model-type"]').forEach(radio => {
+    radio.addEventListener('change', function() {
+        console.log('Model type changed to:', this.value);
+
+        // Reset chart canvases immediately when model type changes
+        resetChartCanvases();
+
+        // Also clear any forecast results
+        const existingForecastContainer = document.getElementById('forecast-results-container');
+        if (existingForecastContainer) {
+            existingForecastContainer.remove();
+        }
+
+        const modelType = this.value;
+        // Update legends visibility
+        if (modelType === 'ndvi') {
+            document.querySelector('.legend:not(#dynamic-world-legend)').style.display = 'block';
+            document.getElementById('dynamic-world-legend').style.display = 'none';
+        } else if (modelType === 'dynamicworld') {
+            document.querySelector('.legend:not(#dynamic-world-legend)').style.display = 'none';
+            document.getElementById('dynamic-world-legend').style.display = 'block';
+        }
+    });
+});
+
+// Handle forecast UI controls
+document.getElementById('enable-forecast').addEventListener('change', function() {
+    const forecastYearsSelect = document.getElementById('forecast-years');
+    const runForecastBtn = document.getElementById('run-forecast-btn');
+
+    forecastYearsSelect.disabled = !this.checked;
+    runForecastBtn.disabled = !this.checked;
+});
+
+// Run forecast button handler
+document.getElementById('run-forecast-btn').addEventListener('click', function() {
+    const modelType = document.querySelector('input[name="model-type"]:checked').value;
+
+    // Show loading screen for forecasting
+    showLoading('Generating Forecast', 'Calculating future patterns based on historical data...');
+
+    // The forecast code is downloaded on first use
+    loadModule('forecast').then(() => {
+        if (modelType === 'ndvi') {
+            // Run NDVI forecast
+            if (!window.yearlyStatsData || window.yearlyStatsData.length < 2) {
+                alert('Need time series data to create a forecast. Please run the time series analysis with NDVI first.');
+                hideLoading(); // Hide loading when no data is available
+                return;
+            }
+
+            try {
+                const forecastYears = parseInt(document.getElementById('forecast-years').value);
+                const yearlyStats = window.yearlyStatsData;
+                const years = yearlyStats.map(stat => stat.year);
+                const meanNdvi = yearlyStats.map(stat => stat.basic_stats.mean_ndvi);
+
+                console.log('Generating NDVI forecast with years:', yearlyStats.length, 'forecast years:', forecastYears);
+
+                // Generate the forecast using linear regression
+                const forecast = generateForecast(years, meanNdvi, forecastYears);
+
+                // Update the charts with the forecast data
+                updateChartsWithForecast(yearlyStats, forecast);
+
+                console.log('NDVI forecast completed successfully');
+                // Hide loading screen after forecast is complete
+                hideLoading();
+            } catch (error) {
+                console.error('Error in NDVI forecast generation:', error);
+                alert('Error generating forecast: ' + error.message);
+                // Hide loading screen on error
+                hideLoading();
+            }
+        } else if (modelType === 'dynamicworld') {
+            // Run Dynamic World forecast
+            if (!window.dynamicWorldTimeseriesData || window.dynamicWorldTimeseriesData.length < 2) {
+                alert('Need Dynamic World time series data to create a forecast. Please run the time series analysis with Dynamic World first.');
+                hideLoading(); // Add this to hide loading when no data is available
+                return;
+            }
+
+            const forecastYears = parseInt(document.getElementById('forecast-years').value);
+            const dynamicWorldTimeseries = window.dynamicWorldTimeseriesData;
+
+            try {
+                console.log('Generating Dynamic World forecast with years:', dynamicWorldTimeseries.length, 'forecast years:', forecastYears);
+
+                // Generate and display Dynamic World forecast
+                generateDynamicWorldForecast(dynamicWorldTimeseries, forecastYears);
+                console.log('Dynamic World forecast completed successfully');
+                // Hide loading screen after forecast is complete
+                hideLoading();
+            } catch (error) {
+                console.error('Error in Dynamic World forecast generation:', error);
+                alert('Error generating forecast: ' + error.message);
+                // Hide loading screen on error
+                hideLoading();
+            }
+        }
+    }).catch(error => {
+        console.error('Error loading forecast module:', error);
+        alert('Error loading forecast module: ' + error.message);
+        hideLoading();
+    });
+});
+
+// Saved areas: save the selected area, search saved ones and reopen them with
+// the analysis results stored for them, without running the analyses again
+const saveAreaBtn = document.getElementById('save-area-btn');
+const savedAreasList = document.getElementById('saved-areas-list');
+let activeSavedAreaId = null;
+
+// How each stored analysis is labelled and shown; others (e.g. monthly profiles) have no view here
+const SAVED_RESULT_VIEWS = {
+    yearly_stats: {
+        label: params => `NDVI ${params.start_year}-${params.end_year}`,
+        model: 'ndvi',
+        show: (result, params) => {
+            document.getElementById('start-year').value = params.start_year;
+            document.getElementById('end-year').value = params.end_year;
+            updateLandCoverYearOptions();
+            displayNdviTimeSeries(result);
+        }
+    },
+    ndvi: {
+        label: params => `NDVI ${params.start_date || ''} to ${params.end_date || ''}`,
+        model: 'ndvi',
+        show: result => {
+            displayStatistics(result.statistics);
+            currentNdviLayer = L.tileLayer(result.tile_url).addTo(map);
+        }
+    },
+    dynamic_world_timeseries: {
+        label: params => `Dynamic World ${params.start_year}-${params.end_year}`,
+        model: 'dynamicworld',
+        show: result => {
+            window.dynamicWorldTimeseriesData = result.timeseries_data;
+            displayDynamicWorldTimeSeries(result.timeseries_data, result.map_tiles);
+        }
+    },
+    dynamic_world_year: {
+        label: params => `Dynamic World ${params.year}`,
+        model: 'dynamicworld',
+        show: result => displayDynamicWorldResults(result.dynamicworld_data)
+    },
+    dynamic_world: {
+        label: () => 'Dynamic World (latest)',
+        model: 'dynamicworld',
+        show: result => displayDynamicWorldResults(result.dynamicworld_data)
+    },
+    igbp: {
+        label: params => `IGBP ${params.start_date ? params.start_date.slice(0, 4) : ''}`,
+        model: 'ndvi',
+        show: result => displayIGBPLandCoverResults(result.igbp_data)
+    },
+    worldcover: {
+        label: () => 'ESA WorldCover',
+        model: 'ndvi',
+        show: result => displayESAWorldCoverResults(result.worldcover_data)
+    }
+};
+
+function escapeHtml(text) {
+    const div = document.createElement('div');
+    div.textContent = text == null ? '' : String(text);
+    return div.innerHTML;
+}
+
+// Also called on startup, before saveAreaBtn is defined
+function updateSaveAreaButtonState() {
+    const button = document.getElementById('save-area-btn');
+    if (button) {
+        button.disabled = !currentCoordinates;
+    }
+}
+
+function loadSavedAreas() {
+    if (!savedAreasList) {
+        return;
+    }
+    const query = document.getElementById('saved-areas-search').value.trim();
+    fetch(`/saved_areas?limit=50${query ? `&q=${encodeURIComponent(query)}` : ''}`)
+        .then(response => response.json())
+        .then(data => {
+            if (!data.success) {
+                savedAreasList.innerHTML = `<p class="error">Error: ${escapeHtml(data.error)}</p>`;
+                return;
+            }
+            if (data.areas.length === 0) {
+                savedAreasList.innerHTML = `<p class="saved-area-meta">${query ? 'No saved areas match.' : 'No saved areas yet.'}</p>`;
+                return;
+            }
+            savedAreasList.innerHTML = data.areas.map(area => `
+                <div class="saved-area-item${area.id === activeSavedAreaId ? ' active' : ''}" data-area-id="${area.id}">
+                    <div class="saved-area-header">
+                        <span class="saved-area-name" title="Open this area">${escapeHtml(area.name || `Area #${area.id}`)}</span>
+                        <button class="saved-area-delete" title="Delete this area and its results">Delete</button>
+                    </div>
+                    <div class="saved-area-meta">${area.area_km2 != null ? `${area.area_km2.toFixed(2)} km² · ` : ''}${area.analyses.length} stored analyses</div>
+                    <div class="saved-area-results"></div>
+                </div>
+            `).join('');
+        })
+        .catch(error => {
+            savedAreasList.innerHTML = `<p class="error">Error: ${escapeHtml(error.message)}</p>`;
+        });
+}
+
+// Select the area on the map as if it had just been drawn
+function selectSavedAreaGeometry(area) {
+    cancelAllAnalysisRequests();
+    drawnItems.clearLayers();
+    const polygon = L.polygon(area.coordinates.map(([lng, lat]) => [lat, lng]), {color: '#3388ff'});
+    drawnItems.addLayer(polygon);
+    map.fitBounds(polygon.getBounds());
+    currentCoordinates = area.coordinates;
+    updateAnalyzeButtonState();
+    if (waterwaysLayer.clipped) {
+        clipWaterways();
+    }
+}
+
+function showSavedResult(stored) {
+    const view = SAVED_RESULT_VIEWS[stored.analysis];
+    const radio = document.querySelector(`input[name="model-type"][value="${view.model}"]`);
+    if (radio && !radio.checked) {
+        radio.checked = true;
+        updateLegendVisibility(view.model);
+    }
+    clearAllMapLayers();
+    view.show(stored.result, stored.params);
+}
+
+function openSavedArea(areaId, item) {
+    fetch(`/saved_areas/${areaId}`)
+        .then(response => response.json())
+        .then(data => {
+            if (!data.success) {
+                document.getElementById('results').innerHTML = `<p class="error">Error: ${escapeHtml(data.error)}</p>`;
+                return;
+            }
+            const area = data.area;
+            activeSavedAreaId = area.id;
+            savedAreasList.querySelectorAll('.saved-area-item').forEach(el => el.classList.toggle('active', el === item));
+            document.getElementById('saved-area-name').value = area.name || '';
+            selectSavedAreaGeometry(area);
+
+            // Results come newest first, the latest one for each analysis and set of parameters
+            const results = area.results.filter(stored => SAVED_RESULT_VIEWS[stored.analysis]);
+            const buttons = item.querySelector('.saved-area-results');
+            buttons.innerHTML = results.map((stored, index) => `
+                <button class="saved-area-result-btn" data-index="${index}" title="Computed ${escapeHtml(stored.computed_at)}">
+                    ${escapeHtml(SAVED_RESULT_VIEWS[stored.analysis].label(stored.params))}
+                </button>
+            `).join('');
+            buttons.querySelectorAll('.saved-area-result-btn').forEach(button => {
+                button.addEventListener('click', () => showSavedResult(results[button.dataset.index]));
+            });
+
+            if (results.length > 0) {
+                showSavedResult(results[0]);
+            } else {
+                clearAllMapLayers();
+                document.getElementById('results').innerHTML = '<p>Saved area selected. No stored results yet; run an analysis to attach one.</p>';
+            }
+        })
+        .catch(error => {
+            document.getElementById('results').innerHTML = `<p class="error">Error: ${escapeHtml(error.message)}</p>`;
+        });
+}
+
+function deleteSavedArea(areaId) {
+    if (!confirm('Delete this saved area and its stored results?')) {
+        return;
+    }
+    fetch(`/saved_areas/${areaId}`, {method: 'DELETE'})
+        .then(response => response.json())
+        .then(data => {
+            if (!data.success) {
+                alert(`Error: ${data.error}`);
+            }
+            if (areaId === activeSavedAreaId) {
+                activeSavedAreaId = null;
+            }
+            loadSavedAreas();
+        })
+        .catch(error => alert(`Error: ${error.message}`));
+}
+
+if (savedAreasList) {
+    savedAreasList.addEventListener('click', function(event) {
+        const item = event.target.closest('.saved-area-item');
+        if (!item) {
+            return;
+        }
+        const areaId = parseInt(item.dataset.areaId);
+        if (event.target.classList.contains('saved-area-delete')) {
+            deleteSavedArea(areaId);
+        } else if (event.target.classList.contains('saved-area-name')) {
+            openSavedArea(areaId, item);
+        }
+    });
+
+    let savedAreasSearchTimer = null;
+    document.getElementById('saved-areas-search').addEventListener('input', function() {
+        clearTimeout(savedAreasSearchTimer);
+        savedAreasSearchTimer = setTimeout(loadSavedAreas, 300);
+    });
+
+    loadSavedAreas();
+}
+
+if (saveAreaBtn) {
+    saveAreaBtn.addEventListener('click', function() {
+        if (!currentCoordinates) {
+            document.getElementById('results').innerHTML = '<p class="error">Please draw an area on the map first.</p>';
+            return;
+        }
+        const name = document.getElementById('saved-area-name').value.trim();
+        // Show loading screen
+        showLoading('Saving Selected Area', 'Processing and storing your selected area...');
+
+    // Send request to server
+    fetch('/save_area', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify({
+            coordinates: currentCoordinates,
+            name: name || null
+        })
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.success) {
+            const stored = data.area.analyses.length;
+            document.getElementById('results').innerHTML = `<p>${data.message}${stored ? ` with ${stored} stored analysis result(s)` : ''}!</p>`;
+            activeSavedAreaId = data.area.id;
+            loadSavedAreas();
+            // Hide loading screen
+            hideLoading();
+        } else {
+            document.getElementById('results').innerHTML = `<p class="error">Error: ${escapeHtml(data.error)}</p>`;
+            // Hide loading screen
+            hideLoading();
+        }
+    })
+    .catch(error => {
+        document.getElementById('results').innerHTML = `<p class="error">Error: ${escapeHtml(error.message)}</p>`;
+        // Hide loading screen on error
+        hideLoading();
+    });
+});
+}
+
+// Initialize waterways toggle state first
+const waterwaysToggle = document.getElementById('waterways-toggle');
+if (waterwaysToggle && waterwaysToggle.checked) {
+    console.log('Setting waterways visible to true on initialization');
+    waterwaysLayer.visible = true;
+}
+
+// Then load waterways
+loadWaterways();
+
+// Landcover classification and analysis
+const landCoverClasses = {
+    water: {
+        name: "Water Bodies",
+        color: "#0066ff",
+        description: "Rivers, lakes, ponds, and other water features"
+    },
+    urban: {
+        name: "Urban/Built-up",
+        color: "#ff0000",
+        description: "Buildings, roads, and other human infrastructure"
+    },
+    barren: {
+        name: "Barren Land",
+        color: "#cccccc",
+        description: "Exposed soil, sand, rocks with minimal vegetation"
+    },
+    cropland: {
+        name: "Agriculture/Cropland",
+        color: "#ffff00",
+        description: "Cultivated areas, croplands, and managed fields"
+    },
+    grassland: {
+        name: "Grassland/Shrubland",
+        color: "#ccff66",
+        description: "Areas dominated by grasses and shrubs"
+    },
+    forest: {
+        name: "Forest/Woodland",
+        color: "#009900",
+        description: "Areas dominated by trees and dense vegetation"
+    },
+    wetland: {
+        name: "Wetlands",
+        color: "#33cccc",
+        description: "Areas where water and land intermingle"
+    }
+};
+
+// Classification algorithm for land cover based on NDVI and other rules
+function classifyLandCover(ndviValue, seasonalVariation, waterProximity = false) {
+    // This is a simplified rule-based classifier
+    // In a real application, you would use more sophisticated methods
+    // and additional spectral indices
+
+    if (ndviValue < -0.1) {
+        return 'water'; // Deep water bodies typically have very negative NDVI
+    }
+
+    if (ndviValue < 0.1) {
+        if (waterProximity) {
+            return 'wetland';
+        }
+        // Low NDVI could be urban or barren depending on other factors
+        // Simplified logic for demo purposes
+        return seasonalVariation < 0.1 ? 'urban' : 'barren';
+    }
+
+    if (ndviValue < 0.3) {
+        // Sparse vegetation - could be barren, urban edges, or sparse shrubs
+        return seasonalVariation < 0.15 ? 'urban' : 'barren';
+    }
+
+    if (ndviValue < 0.5) {
+        // Moderate vegetation - likely grassland or cropland
+        return seasonalVariation > 0.25 ? 'cropland' : 'grassland';
+    }
+
+    // High NDVI - likely forest or dense cropland
+    return seasonalVariation < 0.2 ? 'forest' : 'cropland';
+}
+
+// Function to analyze land cover from NDVI data
+function analyzeLandCover(yearlyStats) {
+    // We can only do this if we have the yearly stats data
+    if (!yearlyStats || yearlyStats.length === 0) {
+        alert('No NDVI data available. Please run the time series analysis first.');
+        return null;
+    }
+
+    // Get the data to use - either the selected year or the most recent
+    const latestYearData = yearlyStats[yearlyStats.length - 1];
+
+    // If this is year-specific analysis, add year information to the title
+    const selectedYear = document.getElementById('land-cover-year').value;
+    window.currentLandCoverYear = selectedYear || latestYearData.year;
+
+    // Calculate seasonal variation (simplistic approach - in a real application,
+    // you would use multiple seasons of data)
+    let seasonalVariation = 0.1; // Default value
+    if (yearlyStats.length > 1) {
+        const ndviValues = yearlyStats.map(stat => stat.basic_stats.mean_ndvi);
+        const maxNdvi = Math.max(...ndviValues);
+        const minNdvi = Math.min(...ndviValues);
+        seasonalVariation = maxNdvi - minNdvi;
+    }
+
+    // For demonstration purposes, we'll simulate land cover classes based on NDVI distribution
+    // In a real application, you would use actual multi-spectral satellite data
+    const landCoverDistribution = {};
+    const totalArea = parseFloat(latestYearData.total_area_hectares) || 0;
+
+    // Validate total area - if it's not a valid number, use a default
+    const validTotalArea = isNaN(totalArea) || totalArea <= 0 ? 1000 : totalArea;
+
+    // Initialize counters for each land cover class
+    Object.keys(landCoverClasses).forEach(key => {
+        landCoverDistribution[key] = {
+            area_hectares: 0,
+            percentage: 0
+        };
+    });
+
+    // Use NDVI distribution to estimate land cover
+    // This is simplified for the demo - real classification would be much more complex
+    const ndviRanges = [
+        { min: -1.0, max: -0.1, classify: (v, s) => classifyLandCover(v, s, true) },
+        { min: -0.1, max: 0.1, classify: (v, s) => classifyLandCover(v, s, false) },
+        { min: 0.1, max: 0.3, classify: (v, s) => classifyLandCover(v, s, false) },
+        { min: 0.3, max: 0.5, classify: (v, s) => classifyLandCover(v, s, false) },
+        { min: 0.5, max: 1.0, classify: (v, s) => classifyLandCover(v, s, false) }
+    ];
+
+    // Distribute area based on NDVI distribution
+    // This simulates what would happen with a proper classification
+    ndviRanges.forEach(range => {
+        // Estimate percentage of area in this NDVI range
+        // For simplicity, we'll base this on vegetation distribution from NDVI
+        let percentInRange = 0;
+
+        // Check if area_stats exists and has all required properties
+        if (latestYearData.area_stats) {
+            if (range.min < 0.1 && range.max >= -0.1 && latestYearData.area_stats.water_or_bare) {
+                percentInRange = (latestYearData.area_stats.water_or_bare.percentage || 0) / 100;
+            } else if (range.min < 0.3 && range.max >= 0.1 && latestYearData.area_stats.sparse_vegetation) {
+                percentInRange = (latestYearData.area_stats.sparse_vegetation.percentage || 0) / 100;
+            } else if (range.min < 0.6 && range.max >= 0.3 && latestYearData.area_stats.moderate_vegetation) {
+                percentInRange = (latestYearData.area_stats.moderate_vegetation.percentage || 0) / 100;
+            } else if (latestYearData.area_stats.dense_vegetation) {
+                percentInRange = (latestYearData.area_stats.dense_vegetation.percentage || 0) / 100;
+            }
+        }
+
+        // Validate percentInRange to prevent NaN values
+        percentInRange = isNaN(percentInRange) ? 0 : Math.max(0, Math.min(1, percentInRange));
+
+        // Adjust percentages for demonstration
+        if (range.min < 0) {
+            // Water bodies usually occupy a portion of the lowest NDVI range
+            const landCoverType = 'water';
+            const areaHectares = validTotalArea * (percentInRange * 0.7); // Assume 70% of this range is water
+            landCoverDistribution[landCoverType].area_hectares += areaHectares;
+
+            // The remainder could be wetlands
+            const wetlandHectares = validTotalArea * (percentInRange * 0.3);
+            landCoverDistribution['wetland'].area_hectares += wetlandHectares;
+        } else if (range.min < 0.1) {
+            // Low NDVI areas are often urban or barren
+            const urbanHectares = validTotalArea * (percentInRange * 0.6); // 60% urban
+            landCoverDistribution['urban'].area_hectares += urbanHectares;
+
+            const barrenHectares = validTotalArea * (percentInRange * 0.4); // 40% barren
+            landCoverDistribution['barren'].area_hectares += barrenHectares;
+        } else if (range.min < 0.3) {
+            // Sparse vegetation areas
+            const grasslandHectares = validTotalArea * (percentInRange * 0.7); // 70% grassland
+            landCoverDistribution['grassland'].area_hectares += grasslandHectares;
+
+            const barrenHectares = validTotalArea * (percentInRange * 0.3); // 30% barren
+            landCoverDistribution['barren'].area_hectares += barrenHectares;
+        } else if (range.min < 0.5) {
+            // Moderate vegetation areas
+            const croplandHectares = validTotalArea * (percentInRange * 0.6); // 60% cropland
+            landCoverDistribution['cropland'].area_hectares += croplandHectares;
+
+            const grasslandHectares = validTotalArea * (percentInRange * 0.4); // 40% grassland
+            landCoverDistribution['grassland'].area_hectares += grasslandHectares;
+        } else {
+            // Dense vegetation areas
+            const forestHectares = validTotalArea * (percentInRange * 0.8); // 80% forest
+            landCoverDistribution['forest'].area_hectares += forestHectares;
+
+            const croplandHectares = validTotalArea * (percentInRange * 0.2); // 20% cropland
+            landCoverDistribution['cropland'].area_hectares += croplandHectares;
+        }
+    });
+
+    // Calculate percentages and ensure all values are valid numbers
+    Object.keys(landCoverDistribution).forEach(key => {
+        // Ensure area_hectares is a valid number
+        if (isNaN(landCoverDistribution[key].area_hectares)) {
+            landCoverDistribution[key].area_hectares = 0;
+        }
+
+        // Calculate percentage (avoid division by zero)
+        landCoverDistribution[key].percentage = validTotalArea > 0 ? 
+            (landCoverDistribution[key].area_hectares / validTotalArea) * 100 : 0;
+
+        // Final validation to prevent NaN
+        if (isNaN(landCoverDistribution[key].percentage)) {
+            landCoverDistribution[key].percentage = 0;
+        }
+    });
+
+    return {
+        landCoverDistribution,
+        totalArea: validTotalArea
+    };
+}
+
+// Function to display land cover analysis results
+function displayLandCoverResults(landCoverResults) {
+    if (!landCoverResults) return;
+
+    const { landCoverDistribution, totalArea } = landCoverResults;
+
+    // Sort land cover types by percentage (descending)
+    const sortedLandCover = Object.entries(landCoverDistribution)
+        .map(([key, value]) => ({ 
+            key, 
+            ...value, 
+            name: landCoverClasses[key].name,
+            color: landCoverClasses[key].color,
+            description: landCoverClasses[key].description
+        }))
+        .sort((a, b) => b.percentage - a.percentage);
+
+    // Create a new div for the land cover results
+    const landCoverDiv = document.createElement('div');
+    landCoverDiv.className = 'land-cover-results';
+    landCoverDiv.style.marginTop = '20px';
+    landCoverDiv.style.padding = '15px';
+    landCoverDiv.style.backgroundColor = '#fff';
+    landCoverDiv.style.border = '1px solid #ddd';
+    landCoverDiv.style.borderRadius = '5px';
+
+    // Add a title with year if available
+    const titleDiv = document.createElement('div');
+    titleDiv.className = 'stats-title';
+    titleDiv.textContent = window.currentLandCoverYear ? 
+        `Land Cover Classification (${window.currentLandCoverYear})` : 
+        'Land Cover Classification';
+    landCoverDiv.appendChild(titleDiv);
+
+    // Add a description
+    const descDiv = document.createElement('div');
+    descDiv.style.fontSize = '13px';
+    descDiv.style.marginBottom = '15px';
+    descDiv.style.color = '#666';
+    descDiv.textContent = 'Estimated land cover types based on NDVI patterns and vegetation distribution.';
+    landCoverDiv.appendChild(descDiv);
+
+    // Create a container for the land cover types
+    const landCoverTypesDiv = document.createElement('div');
+    landCoverDiv.appendChild(landCoverTypesDiv);
+
+    // Add each land cover type with its percentage and visualization
+    sortedLandCover.forEach(landCover => {
+        if (landCover.percentage < 0.1) return; // Skip very small percentages
+
+        const landCoverTypeDiv = document.createElement('div');
+        landCoverTypeDiv.className = 'vegetation-type';
+        landCoverTypeDiv.style.marginBottom = '15px';
+        landCoverTypeDiv.style.padding = '10px';
+        landCoverTypeDiv.style.borderRadius = '5px';
+        landCoverTypeDiv.style.backgroundColor = '#f8f9fa';
+        landCoverTypesDiv.appendChild(landCoverTypeDiv);
+
+        // Create the header with name and area
+        const headerDiv = document.createElement('div');
+        headerDiv.className = 'vegetation-header';
+        headerDiv.style.display = 'flex';
+        headerDiv.style.justifyContent = 'space-between';
+        headerDiv.style.marginBottom = '5px';
+        landCoverTypeDiv.appendChild(headerDiv);
+
+        // Add the name with a color indicator
+        const nameDiv = document.createElement('div');
+        nameDiv.className = 'vegetation-name';
+        nameDiv.style.fontWeight = 'bold';
+        nameDiv.style.display = 'flex';
+        nameDiv.style.alignItems = 'center';
+        headerDiv.appendChild(nameDiv);
+
+        const colorIndicator = document.createElement('span');
+        colorIndicator.style.display = 'inline-block';
+        colorIndicator.style.width = '16px';
+        colorIndicator.style.height = '16px';
+        colorIndicator.style.backgroundColor = landCover.color;
+        colorIndicator.style.marginRight = '8px';
+        colorIndicator.style.borderRadius = '3px';
+        nameDiv.appendChild(colorIndicator);
+
+        const nameText = document.createElement('span');
+        nameText.textContent = landCover.name;
+        nameDiv.appendChild(nameText);
+
+        // Add the area information
+        const areaDiv = document.createElement('div');
+        areaDiv.className = 'vegetation-area';
+        areaDiv.style.color = '#666';
+        areaDiv.textContent = `${landCover.area_hectares.toFixed(2)} ha (${landCover.percentage.toFixed(1)}%)`;
+        headerDiv.appendChild(areaDiv);
+
+        // Add a description
+        const descriptionDiv = document.createElement('div');
+        descriptionDiv.style.fontSize = '13px';
+        descriptionDiv.style.marginBottom = '8px';
+        descriptionDiv.style.color = '#666';
+        descriptionDiv.textContent = landCover.description;
+        landCoverTypeDiv.appendChild(descriptionDiv);
+
+        // Add a progress bar
+        const progressBarDiv = document.createElement('div');
+        progressBarDiv.className = 'progress-bar';
+        progressBarDiv.style.height = '10px';
+        progressBarDiv.style.backgroundColor = '#e9ecef';
+        progressBarDiv.style.borderRadius = '5px';
+        progressBarDiv.style.overflow = 'hidden';
+        landCoverTypeDiv.appendChild(progressBarDiv);
+
+        const progressFillDiv = document.createElement('div');
+        progressFillDiv.className = 'progress-fill';
+        progressFillDiv.style.height = '100%';
+        progressFillDiv.style.width = `${landCover.percentage}%`;
+        progressFillDiv.style.backgroundColor = landCover.color;
+        progressFillDiv.style.transition = 'width 0.3s ease';
+        progressBarDiv.appendChild(progressFillDiv);
+    });
+
+    // Create a canvas for the pie chart
+    const chartContainer = document.createElement('div');
+    chartContainer.style.marginTop = '20px';
+    chartContainer.style.height = '300px';
+    landCoverDiv.appendChild(chartContainer);
+
+    const canvas = document.createElement('canvas');
+    canvas.id = 'landCoverChart';
+    chartContainer.appendChild(canvas);
+
+    // Add the land cover div to the results
+    const resultsDiv = document.getElementById('results');
+
+    // Check if there's already a land cover results div and remove it
+    const existingLandCoverDiv = document.querySelector('.land-cover-results');
+    if (existingLandCoverDiv) {
+        resultsDiv.removeChild(existingLandCoverDiv);
+    }
+
+    resultsDiv.appendChild(landCoverDiv);
+
+    // Create the pie chart
+    const ctx = document.getElementById('landCoverChart').getContext('2d');
+    new Chart(ctx, {
+        type: 'pie',
+        data: {
+            labels: sortedLandCover.map(lc => lc.name),
+            datasets: [{
+                data: sortedLandCover.map(lc => lc.percentage),
+                backgroundColor: sortedLandCover.map(lc => lc.color),
+                borderColor: '#fff',
+                borderWidth: 2
+            }]
+        },
+        options: {
+            responsive: true,
+            maintainAspectRatio: false,
+            plugins: {
+                legend: {
+                    position: 'right',
+                    labels: {
+                        boxWidth: 15,
+                        padding: 15
+                    }
+                },
+                title: {
+                    display: true,
+                    text: 'Land Cover Distribution'
+                },
+                tooltip: {
+                    callbacks: {
+                        label: function(context) {
+                            const value = context.raw;
+                            const label = context.label || '';
+                            return `${label}: ${value.toFixed(1)}%`;
+                        }
+                    }
+                }
+            }
+        }
+    });
+}
+
+// Handle land cover UI controls
+document.getElementById('enable-land-cover').addEventListener('change', function() {
+    const runLandCoverBtn = document.getElementById('run-land-cover-btn');
+    runLandCoverBtn.disabled = !this.checked;
+
+    // Show/hide year picker
+    document.getElementById('land-cover-year-container').style.display = this.checked ? 'block' : 'none';
+
+    // Enable/disable the radio buttons based on checkbox state
+    const radioInputs = document.querySelectorAll('input[name="classification-type"]');
+    radioInputs.forEach(radio => {
+        radio.disabled = !this.checked;
+    });
+});
+
+// Initialize radio buttons to be disabled (since checkbox starts unchecked)
+const radioInputs = document.querySelectorAll('input[name="classification-type"]');
+radioInputs.forEach(radio => {
+    radio.disabled = true;
+
+    // Add event listener to toggle legends based on classification type
+    radio.addEventListener('change', function() {
+        const ndviLegend = document.querySelector('.legend:not(#dynamic-world-legend)');
+        const dynamicWorldLegend = document.getElementById('dynamic-world-legend');
+
+        if (this.value === 'ndvi') {
+            ndviLegend.style.display = 'block';
+            dynamicWorldLegend.style.display = 'none';
+        } else if (this.value === 'dynamicworld') {
+            ndviLegend.style.display = 'none';
+            dynamicWorldLegend.style.display = 'block';
+        }
+    });
+});
+
+// Function to get IGBP land cover classification
+function getIGBPLandCover(coordinates, startDate, endDate) {
+    return analysisFetch('/get_igbp_land_cover', {
+method: 'POST',
+headers: {
+    'Content-Type': 'application/json'
+},
+body: JSON.stringify({
+    coordinates: coordinates,
+    start_date: startDate,
+    end_date: endDate
+})
+    })
+    .then(response => response.json())
+    .then(data => {
+if (data.success) {
+    return data.igbp_data;
+            } else {
+    throw new Error(data.error || 'Failed to get IGBP land cover data');
+}
+    });
+}
+
+// Function to get ESA WorldCover classification
+function getESAWorldCover(coordinates) {
+    return analysisFetch('/get_esa_worldcover', {
+method: 'POST',
+headers: {
+    'Content-Type': 'application/json'
+},
+body: JSON.stringify({
+    coordinates: coordinates
+})
+    })
+    .then(response => response.json())
+    .then(data => {
+if (data.success) {
+    return data.worldcover_data;
+} else {
+    throw new Error(data.error || 'Failed to get ESA WorldCover data');
+}
+    });
+}
+
+// Function to get Dynamic World classification
+function getDynamicWorld(coordinates) {
+    return analysisFetch('/get_dynamic_world', {
+method: 'POST',
+headers: {
+    'Content-Type': 'application/json'
+},
+body: JSON.stringify({
+    coordinates: coordinates
+})
+    })
+    .then(response => response.json())
+    .then(data => {
+if (data.success) {
+    return data.dynamicworld_data;
+} else {
+    throw new Error(data.error || 'Failed to get Dynamic World data');
+}
+    });
+}
+
+// Add a raster layer to the map, showing local /raster_tiles (clipped to the current area)
+// instead of its Earth Engine tiles when the server has already cached the raster.
+// The lookup runs before the layer is added so that no Earth Engine tile is requested for
+// a cached raster; `currentLayer` returns the layer the map should show by then, and a
+// layer that has been replaced or cleared in the meantime is not added.
+function addRasterLayer(layer, currentLayer, dataset, params = {}) {
+    if (!currentCoordinates) {
+        layer.addTo(map);
+        return;
+    }
+    fetch('/cached_raster', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify({
+            dataset: dataset,
+            coordinates: currentCoordinates,
+            ...params
+        })
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.success && data.cached) {
+            layer.setUrl(data.tile_url, true);
+        }
+    })
+    .catch(error => console.warn('Cached raster lookup failed:', error))
+    .finally(() => {
+        if (currentLayer() === layer) {
+            layer.addTo(map);
+        }
+    });
+}
+
+// Function to display IGBP land cover results
+function displayIGBPLandCoverResults(igbpData) {
+    // Get the results div
+    const resultsDiv = document.getElementById('results');
+    resultsDiv.innerHTML = ''; // Clear any existing results
+
+    // Create a title for the results
+    const titleDiv = document.createElement('div');
+    titleDiv.className = 'stats-title';
+    titleDiv.textContent = 'IGBP Land Cover Classification';
+    titleDiv.style.fontSize = '18px';
+    titleDiv.style.fontWeight = 'bold';
+    titleDiv.style.marginBottom = '10px';
+    resultsDiv.appendChild(titleDiv);
+
+    // Create the subtitle with year info
+    const subtitleDiv = document.createElement('div');
+    subtitleDiv.className = 'stats-subtitle';
+    subtitleDiv.textContent = `Analysis for year ${igbpData.year}`;
+    subtitleDiv.style.fontSize = '14px';
+    subtitleDiv.style.marginBottom = '15px';
+    subtitleDiv.style.color = '#666';
+    resultsDiv.appendChild(subtitleDiv);
+
+    // Add the description
+    const descDiv = document.createElement('div');
+    descDiv.style.fontSize = '13px';
+    descDiv.style.marginBottom = '20px';
+    descDiv.style.color = '#666';
+    descDiv.textContent = 'Classification based on the International Geosphere-Biosphere Programme (IGBP) land cover categories.';
+    resultsDiv.appendChild(descDiv);
+
+    // Create a container for the IGBP land cover classes
+    const landCoverTypesDiv = document.createElement('div');
+    resultsDiv.appendChild(landCoverTypesDiv);
+
+    // Sort land cover classes by percentage (descending)
+    const sortedLandCover = Object.entries(igbpData.area_stats).map(([name, stats]) => {
+        return {
+            name: name,
+            color: stats.color,
+            area_hectares: stats.area_hectares,
+            percentage: stats.percentage,
+            class_value: stats.class_value
+        };
+    }).sort((a, b) => b.percentage - a.percentage);
+
+    // Add each land cover type with its percentage and visualization
+    sortedLandCover.forEach(landCover => {
+        if (landCover.percentage < 0.1) return; // Skip very small percentages
+
+        const landCoverTypeDiv = document.createElement('div');
+        landCoverTypeDiv.className = 'land-cover-type';
+        landCoverTypeDiv.style.marginBottom = '15px';
+        landCoverTypeDiv.style.padding = '10px';
+        landCoverTypeDiv.style.borderRadius = '5px';
+        landCoverTypeDiv.style.backgroundColor = '#f8f9fa';
+        landCoverTypesDiv.appendChild(landCoverTypeDiv);
+
+        // Create the header with name and area
+        const headerDiv = document.createElement('div');
+        headerDiv.style.display = 'flex';
+        headerDiv.style.justifyContent = 'space-between';
+        headerDiv.style.marginBottom = '5px';
+        landCoverTypeDiv.appendChild(headerDiv);
+
+        // Add the name with a color indicator
+        const nameDiv = document.createElement('div');
+        nameDiv.style.fontWeight = 'bold';
+        nameDiv.style.display = 'flex';
+        nameDiv.style.alignItems = 'center';
+        headerDiv.appendChild(nameDiv);
+
+        const colorIndicator = document.createElement('span');
+        colorIndicator.style.display = 'inline-block';
+        colorIndicator.style.width = '16px';
+        colorIndicator.style.height = '16px';
+        colorIndicator.style.backgroundColor = landCover.color;
+        colorIndicator.style.marginRight = '8px';
+        colorIndicator.style.borderRadius = '3px';
+        nameDiv.appendChild(colorIndicator);
+
+        const nameText = document.createElement('span');
+        nameText.textContent = landCover.name;
+        nameDiv.appendChild(nameText);
+
+        // Add the area information
+        const areaDiv = document.createElement('div');
+        areaDiv.style.color = '#666';
+        areaDiv.textContent = `${landCover.area_hectares.toFixed(2)} ha (${landCover.percentage.toFixed(1)}%)`;
+        headerDiv.appendChild(areaDiv);
+
+        // Create a progress bar to visualize the percentage
+        const progressContainer = document.createElement('div');
+        progressContainer.style.width = '100%';
+        progressContainer.style.height = '6px';
+        progressContainer.style.backgroundColor = '#e0e0e0';
+        progressContainer.style.borderRadius = '3px';
+        progressContainer.style.overflow = 'hidden';
+        progressContainer.style.marginTop = '5px';
+        landCoverTypeDiv.appendChild(progressContainer);
+
+        const progressBar = document.createElement('div');
+        progressBar.style.width = `${landCover.percentage}%`;
+        progressBar.style.height = '100%';
+        progressBar.style.backgroundColor = landCover.color;
+        progressContainer.appendChild(progressBar);
+    });
+
+    // If there are no land cover classes with data, show a message
+    if (sortedLandCover.length === 0) {
+        const noDataDiv = document.createElement('div');
+        noDataDiv.textContent = 'No land cover data available for this area.';
+        noDataDiv.style.fontStyle = 'italic';
+        noDataDiv.style.color = '#666';
+        resultsDiv.appendChild(noDataDiv);
+        return;
+    }
+
+    // Create a pie chart of the land cover distribution
+    const chartContainer = document.createElement('div');
+    chartContainer.style.marginTop = '30px';
+    chartContainer.style.height = '300px';
+    resultsDiv.appendChild(chartContainer);
+
+    const chartCanvas = document.createElement('canvas');
+    chartCanvas.id = 'igbpLandCoverChart';
+    chartContainer.appendChild(chartCanvas);
+
+    // Prepare data for the chart
+    const chartData = {
+        labels: sortedLandCover.map(lc => lc.name),
+        datasets: [{
+            data: sortedLandCover.map(lc => lc.percentage),
+            backgroundColor: sortedLandCover.map(lc => lc.color),
+        }]
+    };
+
+    // Create the chart
+    new Chart(document.getElementById('igbpLandCoverChart').getContext('2d'), {
+        type: 'pie',
+        data: chartData,
+        options: {
+            responsive: true,
+            maintainAspectRatio: false,
+            plugins: {
+                legend: {
+                    position: 'right',
+                    labels: {
+                        boxWidth: 15,
+                        padding: 15
+                    }
+                },
+                title: {
+                    display: true,
+                    text: 'IGBP Land Cover Distribution'
+                },
+                tooltip: {
+                    callbacks: {
+                        label: function(context) {
+                            const value = context.raw;
+                            const label = context.label || '';
+                            return `${label}: ${value.toFixed(1)}%`;
+                        }
+                    }
+                }
+            }
+        }
+    });
+
+    // Add the IGBP layer to the map
+    if (window.igbpLayer) {
+        map.removeLayer(window.igbpLayer);
+    }
+
+    window.igbpLayer = L.tileLayer(igbpData.tile_url);
+    addRasterLayer(window.igbpLayer, () => window.igbpLayer, 'igbp');
+
+    // Add IGBP layer to map controls
+    if (!document.getElementById('igbp-toggle')) {
+        // Add a control for the IGBP layer in the map controls panel
+        const controlsContainer = document.querySelector('.map-controls');
+        const ndviControlSection = document.querySelector('.control-section');
+        const igbpControlSection = document.createElement('div');
+        igbpControlSection.className = 'control-section';
+        igbpControlSection.innerHTML = `
+            <div class="control-section-title">IGBP Land Cover</div>
+            <div class="control-item">
+                <input type="checkbox" id="igbp-toggle" checked>
+                <label for="igbp-toggle">IGBP Land Cover</label>
+            </div>
+            <input type="range" id="igbp-opacity" class="opacity-slider" min="0" max="100" value="80">
+            <div class="opacity-value" id="igbp-opacity-value">80%</div>
+        `;
+
+        if (ndviControlSection && ndviControlSection.parentNode) {
+            ndviControlSection.parentNode.insertBefore(igbpControlSection, ndviControlSection.nextSibling);
+        } else if (controlsContainer) {
+            controlsContainer.appendChild(igbpControlSection);
+        }
+
+        // Add event listener for the IGBP toggle
+        document.getElementById('igbp-toggle').addEventListener('change', function() {
+            if (this.checked && window.igbpLayer) {
+                map.addLayer(window.igbpLayer);
+            } else if (window.igbpLayer) {
+                map.removeLayer(window.igbpLayer);
+            }
+        });
+
+        // Add event listener for opacity control
+        document.getElementById('igbp-opacity').addEventListener('input', function() {
+            const opacity = parseFloat(this.value) / 100;
+            if (window.igbpLayer) {
+                window.igbpLayer.setOpacity(opacity);
+            }
+            document.getElementById('igbp-opacity-value').textContent = `${this.value}%`;
+        });
+    }
+}
+
+// Function to display ESA WorldCover results
+function displayESAWorldCoverResults(worldcoverData) {
+    // Get the results div
+    const resultsDiv = document.getElementById('results');
+    resultsDiv.innerHTML = ''; // Clear any existing results
+
+    // Create a title for the results
+    const titleDiv = document.createElement('div');
+    titleDiv.className = 'stats-title';
+    titleDiv.textContent = 'ESA WorldCover 10m Classification';
+    titleDiv.style.fontSize = '18px';
+    titleDiv.style.fontWeight = 'bold';
+    titleDiv.style.marginBottom = '10px';
+    resultsDiv.appendChild(titleDiv);
+
+    // Create the subtitle with year info
+    const subtitleDiv = document.createElement('div');
+    subtitleDiv.className = 'stats-subtitle';
+    subtitleDiv.textContent = `Analysis for year ${worldcoverData.year}`;
+    subtitleDiv.style.fontSize = '14px';
+    subtitleDiv.style.marginBottom = '15px';
+    subtitleDiv.style.color = '#666';
+    resultsDiv.appendChild(subtitleDiv);
+
+    // Add the description
+    const descDiv = document.createElement('div');
+    descDiv.style.fontSize = '13px';
+    descDiv.style.marginBottom = '20px';
+    descDiv.style.color = '#666';
+    descDiv.textContent = 'Classification based on the ESA WorldCover 10m v100 dataset, which provides a global land cover map at 10m resolution based on Sentinel-1 and Sentinel-2 data.';
+    resultsDiv.appendChild(descDiv);
+
+    // Create a container for the ESA WorldCover classes
+    const landCoverTypesDiv = document.createElement('div');
+    resultsDiv.appendChild(landCoverTypesDiv);
+
+    // Sort land cover classes by percentage (descending)
+    const sortedLandCover = Object.entries(worldcoverData.area_stats).map(([name, stats]) => {
+return {
+    name: name,
+    color: stats.color,
+    area_hectares: stats.area_hectares,
+    percentage: stats.percentage,
+    class_value: stats.class_value
+};
+    }).sort((a, b) => b.percentage - a.percentage);
+
+    // Add each land cover type with its percentage and visualization
+    sortedLandCover.forEach(landCover => {
+if (landCover.percentage < 0.1) return; // Skip very small percentages
+
+const landCoverTypeDiv = document.createElement('div');
+landCoverTypeDiv.className = 'land-cover-type';
+landCoverTypeDiv.style.marginBottom = '15px';
+landCoverTypeDiv.style.padding = '10px';
+landCoverTypeDiv.style.borderRadius = '5px';
+landCoverTypeDiv.style.backgroundColor = '#f8f9fa';
+landCoverTypesDiv.appendChild(landCoverTypeDiv);
+
+// Create the header with name and area
+const headerDiv = document.createElement('div');
+headerDiv.style.display = 'flex';
+headerDiv.style.justifyContent = 'space-between';
+headerDiv.style.marginBottom = '5px';
+landCoverTypeDiv.appendChild(headerDiv);
+
+// Add the name with a color indicator
+const nameDiv = document.createElement('div');
+nameDiv.style.fontWeight = 'bold';
+nameDiv.style.display = 'flex';
+nameDiv.style.alignItems = 'center';
+headerDiv.appendChild(nameDiv);
+
+const colorIndicator = document.createElement('span');
+colorIndicator.style.display = 'inline-block';
+colorIndicator.style.width = '16px';
+colorIndicator.style.height = '16px';
+colorIndicator.style.backgroundColor = landCover.color;
+colorIndicator.style.marginRight = '8px';
+colorIndicator.style.borderRadius = '3px';
+nameDiv.appendChild(colorIndicator);
+
+const nameText = document.createElement('span');
+nameText.textContent = landCover.name;
+nameDiv.appendChild(nameText);
+
+// Add the area information
+const areaDiv = document.createElement('div');
+areaDiv.style.color = '#666';
+areaDiv.textContent = `${landCover.area_hectares.toFixed(2)} ha (${landCover.percentage.toFixed(1)}%)`;
+headerDiv.appendChild(areaDiv);
+
+// Create a progress bar to visualize the percentage
+const progressContainer = document.createElement('div');
+progressContainer.style.width = '100%';
+progressContainer.style.height = '6px';
+progressContainer.style.backgroundColor = '#e0e0e0';
+progressContainer.style.borderRadius = '3px';
+progressContainer.style.overflow = 'hidden';
+progressContainer.style.marginTop = '5px';
+landCoverTypeDiv.appendChild(progressContainer);
+
+const progressBar = document.createElement('div');
+progressBar.style.width = `${landCover.percentage}%`;
+progressBar.style.height = '100%';
+progressBar.style.backgroundColor = landCover.color;
+progressContainer.appendChild(progressBar);
+    });
+
+    // If there are no land cover classes with data, show a message
+    if (sortedLandCover.length === 0) {
+const noDataDiv = document.createElement('div');
+noDataDiv.textContent = 'No land cover data available for this area.';
+noDataDiv.style.fontStyle = 'italic';
+noDataDiv.style.color = '#666';
+resultsDiv.appendChild(noDataDiv);
+return;
+    }
+
+    // Create a pie chart of the land cover distribution
+    const chartContainer = document.createElement('div');
+    chartContainer.style.marginTop = '30px';
+    chartContainer.style.height = '300px';
+    resultsDiv.appendChild(chartContainer);
+
+    const chartCanvas = document.createElement('canvas');
+    chartCanvas.id = 'esaWorldcoverChart';
+    chartContainer.appendChild(chartCanvas);
+
+    // Prepare data for the chart
+    const chartData = {
+labels: sortedLandCover.map(lc => lc.name),
+datasets: [{
+    data: sortedLandCover.map(lc => lc.percentage),
+    backgroundColor: sortedLandCover.map(lc => lc.color),
+}]
+    };
+
+    // Create the chart
+    new Chart(document.getElementById('esaWorldcoverChart').getContext('2d'), {
+type: 'pie',
+data: chartData,
+options: {
+    responsive: true,
+    maintainAspectRatio: false,
+    plugins: {
+        legend: {
+            position: 'right',
+            labels: {
+                boxWidth: 15,
+                padding: 15
+            }
+        },
+        title: {
+            display: true,
+            text: 'ESA WorldCover Distribution'
+        },
+        tooltip: {
+            callbacks: {
+                label: function(context) {
+                    const value = context.raw;
+                    const label = context.label || '';
+                    return `${label}: ${value.toFixed(1)}%`;
+                }
+            }
+        }
+    }
+}
+    });
+
+    // Add the ESA WorldCover layer to the map
+    if (window.worldcoverLayer) {
+map.removeLayer(window.worldcoverLayer);
+    }
+
+    window.worldcoverLayer = L.tileLayer(worldcoverData.tile_url);
+    addRasterLayer(window.worldcoverLayer, () => window.worldcoverLayer, 'worldcover');
+
+    // Add ESA WorldCover layer to map controls
+    if (!document.getElementById('worldcover-toggle')) {
+// Add a control for the ESA WorldCover layer in the map controls panel
+const controlsContainer = document.querySelector('.map-controls');
+const ndviControlSection = document.querySelector('.control-section');
+const worldcoverControlSection = document.createElement('div');
+worldcoverControlSection.className = 'control-section';
+worldcoverControlSection.innerHTML = `
+    <div class="control-section-title">ESA WorldCover Layer</div>
+    <div class="control-item">
+        <input type="checkbox" id="worldcover-toggle" checked>
+        <label for="worldcover-toggle">ESA WorldCover</label>
+    </div>
+    <input type="range" id="worldcover-opacity" class="opacity-slider" min="0" max="100" value="80">
+    <div class="opacity-value" id="worldcover-opacity-value">80%</div>
+`;
+
+if (ndviControlSection && ndviControlSection.parentNode) {
+    ndviControlSection.parentNode.insertBefore(worldcoverControlSection, ndviControlSection.nextSibling);
+} else if (controlsContainer) {
+    controlsContainer.appendChild(worldcoverControlSection);
+}
+
+// Add event listener for the ESA WorldCover toggle
+document.getElementById('worldcover-toggle').addEventListener('change', function() {
+    if (this.checked && window.worldcoverLayer) {
+        map.addLayer(window.worldcoverLayer);
+    } else if (window.worldcoverLayer) {
+        map.removeLayer(window.worldcoverLayer);
+    }
+});
+
+// Add event listener for opacity control
+document.getElementById('worldcover-opacity').addEventListener('input', function() {
+    const opacity = parseFloat(this.value) / 100;
+    if (window.worldcoverLayer) {
+        window.worldcoverLayer.setOpacity(opacity);
+    }
+    document.getElementById('worldcover-opacity-value').textContent = `${this.value}%`;
+});
+    }
+}
+
+// Land cover analysis button handler
+document.getElementById('run-land-cover-btn').addEventListener('click', function() {
+    // Get the model type from the global selection
+    const modelType = document.querySelector('input[name="model-type"]:checked').value;
+
+    // Check if we need time series data for NDVI classification
+    if (modelType === 'ndvi' && (!window.yearlyStatsData || window.yearlyStatsData.length === 0)) {
+        alert('Need time series data to perform NDVI-based land cover analysis. Please run the time series analysis first.');
+        return;
+    }
+
+    // Check if we have coordinates
+    if (!currentCoordinates) {
+        alert('Please draw an area on the map first.');
+        return;
+    }
+
+    // Get the selected year
+    const selectedYear = document.getElementById('land-cover-year').value;
+
+    // Show loading screen
+    showLoading('Analyzing Land Cover', selectedYear ? 
+        `Processing land cover data for ${selectedYear}...` : 
+        'Processing latest land cover data...');
+
+    if (modelType === 'ndvi') {
+        // Run the NDVI-based land cover analysis
+        const selectedYear = document.getElementById('land-cover-year').value;
+        let yearlyData = window.yearlyStatsData;
+
+        // Filter data by selected year if specified
+        if (selectedYear && window.yearlyStatsData) {
+            const selectedYearData = window.yearlyStatsData.find(data => data.year == selectedYear);
+            if (selectedYearData) {
+                yearlyData = [selectedYearData]; // Use only the selected year's data
+                console.log(`Using NDVI data for selected year: ${selectedYear}`);
+            } else {
+                console.warn(`No NDVI data found for year ${selectedYear}`);
+            }
+        }
+
+        const landCoverResults = analyzeLandCover(yearlyData);
+
+    // Display the results
+    displayLandCoverResults(landCoverResults);
+
+    // Hide loading screen
+    hideLoading();
+    } else if (modelType === 'dynamicworld') {
+        // Show loading indicator
+        document.getElementById('results').innerHTML = '<div class="loading">Loading Dynamic World data...</div>';
+
+        if (selectedYear) {
+            // Get Dynamic World data for the specific year
+            analysisFetch('/get_dynamic_world_for_year', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json'
+                },
+                body: JSON.stringify({
+                    coordinates: currentCoordinates,
+                    year: parseInt(selectedYear)
+                })
+            })
+            .then(response => response.json())
+            .then(data => {
+                if (data.success) {
+                    // Display the results
+                    displayDynamicWorldResults(data.dynamicworld_data);
+                    // Hide loading screen
+                    hideLoading();
+                } else {
+                    document.getElementById('results').innerHTML = `<p class="error">Error: ${data.error}</p>`;
+                    // Hide loading screen
+                    hideLoading();
+                }
+            })
+            .catch(error => {
+                if (error.superseded) {
+                    return;
+                }
+                document.getElementById('results').innerHTML = `<p class="error">Error: ${error.message}</p>`;
+                // Hide loading screen on error
+                hideLoading();
+            });
+        } else {
+            // Get latest Dynamic World data
+            getDynamicWorld(currentCoordinates)
+                .then(dynamicWorldData => {
+                    // Display the results
+                    displayDynamicWorldResults(dynamicWorldData);
+                    // Hide loading screen
+                    hideLoading();
+                })
+                .catch(error => {
+                    if (error.superseded) {
+                        return;
+                    }
+                    document.getElementById('results').innerHTML = `<p class="error">Error: ${error.message}</p>`;
+                    // Hide loading screen on error
+                    hideLoading();
+                });
+        }
+    }
+});
+
+// Function to display Dynamic World results
+function displayDynamicWorldResults(dynamicWorldData) {
+    // Get the results div
+    const resultsDiv = document.getElementById('results');
+    resultsDiv.innerHTML = ''; // Clear any existing results
+
+    // Create a title for the results
+    const titleDiv = document.createElement('div');
+    titleDiv.className = 'stats-title';
+    titleDiv.textContent = 'Dynamic World V1 Land Cover Classification';
+    titleDiv.style.fontSize = '18px';
+    titleDiv.style.fontWeight = 'bold';
+    titleDiv.style.marginBottom = '10px';
+    resultsDiv.appendChild(titleDiv);
+
+    // Create the subtitle with date info
+    const subtitleDiv = document.createElement('div');
+    subtitleDiv.className = 'stats-subtitle';
+    subtitleDiv.textContent = `Analysis for date ${dynamicWorldData.date}`;
+    subtitleDiv.style.fontSize = '14px';
+    subtitleDiv.style.marginBottom = '15px';
+    subtitleDiv.style.color = '#666';
+    resultsDiv.appendChild(subtitleDiv);
+
+    // Add the description
+    const descDiv = document.createElement('div');
+    descDiv.style.fontSize = '13px';
+    descDiv.style.marginBottom = '20px';
+    descDiv.style.color = '#666';
+    descDiv.textContent = 'Classification based on Dynamic World V1, a near-real-time 10m land use/land cover dataset.';
+    resultsDiv.appendChild(descDiv);
+
+    // Create a container for the Dynamic World land cover classes
+    const landCoverTypesDiv = document.createElement('div');
+    resultsDiv.appendChild(landCoverTypesDiv);
+
+    // Sort land cover classes by percentage (descending)
+    const sortedLandCover = Object.entries(dynamicWorldData.area_stats).map(([name, stats]) => {
+        return {
+            name: name,
+            color: stats.color,
+            area_hectares: stats.area_hectares,
+            percentage: stats.percentage,
+            class_value: stats.class_value
+        };
+    }).sort((a, b) => b.percentage - a.percentage);
+
+    // Add each land cover type with its percentage and visualization
+    sortedLandCover.forEach(landCover => {
+        if (landCover.percentage < 0.1) return; // Skip very small percentages
+
+        const landCoverTypeDiv = document.createElement('div');
+        landCoverTypeDiv.className = 'land-cover-type';
+        landCoverTypeDiv.style.marginBottom = '15px';
+        landCoverTypeDiv.style.padding = '10px';
+        landCoverTypeDiv.style.borderRadius = '5px';
+        landCoverTypeDiv.style.backgroundColor = '#f8f9fa';
+        landCoverTypesDiv.appendChild(landCoverTypeDiv);
+
+        // Create the header with name and area
+        const headerDiv = document.createElement('div');
+        headerDiv.style.display = 'flex';
+        headerDiv.style.justifyContent = 'space-between';
+        headerDiv.style.marginBottom = '5px';
+        landCoverTypeDiv.appendChild(headerDiv);
+
+        // Add the name with a color indicator
+        const nameDiv = document.createElement('div');
+        nameDiv.style.fontWeight = 'bold';
+        nameDiv.style.display = 'flex';
+        nameDiv.style.alignItems = 'center';
+        headerDiv.appendChild(nameDiv);
+
+        const colorIndicator = document.createElement('span');
+        colorIndicator.style.display = 'inline-block';
+        colorIndicator.style.width = '16px';
+        colorIndicator.style.height = '16px';
+        colorIndicator.style.backgroundColor = landCover.color;
+        colorIndicator.style.marginRight = '8px';
+        colorIndicator.style.borderRadius = '3px';
+        nameDiv.appendChild(colorIndicator);
+
+        const nameText = document.createElement('span');
+        nameText.textContent = landCover.name;
+        nameDiv.appendChild(nameText);
+
+        // Add the area information
+        const areaDiv = document.createElement('div');
+        areaDiv.style.color = '#666';
+        areaDiv.textContent = `${landCover.area_hectares.toFixed(2)} ha (${landCover.percentage.toFixed(1)}%)`;
+        headerDiv.appendChild(areaDiv);
+
+        // Create a progress bar to visualize the percentage
+        const progressContainer = document.createElement('div');
+        progressContainer.style.width = '100%';
+        progressContainer.style.height = '6px';
+        progressContainer.style.backgroundColor = '#e0e0e0';
+        progressContainer.style.borderRadius = '3px';
+        progressContainer.style.overflow = 'hidden';
+        progressContainer.style.marginTop = '5px';
+        landCoverTypeDiv.appendChild(progressContainer);
+
+        const progressBar = document.createElement('div');
+        progressBar.style.width = `${landCover.percentage}%`;
+        progressBar.style.height = '100%';
+        progressBar.style.backgroundColor = landCover.color;
+        progressContainer.appendChild(progressBar);
+    });
+
+    // If there are no land cover classes with data, show a message
+    if (sortedLandCover.length === 0) {
+        const noDataDiv = document.createElement('div');
+        noDataDiv.textContent = 'No land cover data available for this area.';
+        noDataDiv.style.fontStyle = 'italic';
+        noDataDiv.style.color = '#666';
+        resultsDiv.appendChild(noDataDiv);
+        return;
+    }
+
+    // Create a pie chart of the land cover distribution
+    const chartContainer = document.createElement('div');
+    chartContainer.style.marginTop = '30px';
+    chartContainer.style.height = '300px';
+    resultsDiv.appendChild(chartContainer);
+
+    const chartCanvas = document.createElement('canvas');
+    chartCanvas.id = 'dynamicWorldChart';
+    chartContainer.appendChild(chartCanvas);
+
+    // Prepare data for the chart
+    const chartData = {
+        labels: sortedLandCover.map(lc => lc.name),
+        datasets: [{
+            data: sortedLandCover.map(lc => lc.percentage),
+            backgroundColor: sortedLandCover.map(lc => lc.color),
+        }]
+    };
+
+    // Create the chart
+    new Chart(document.getElementById('dynamicWorldChart').getContext('2d'), {
+        type: 'pie',
+        data: chartData,
+        options: {
+            responsive: true,
+            maintainAspectRatio: false,
+            plugins: {
+                legend: {
+                    position: 'right',
+                    labels: {
+                        boxWidth: 15,
+                        padding: 15
+                    }
+                },
+                title: {
+                    display: true,
+                    text: 'Dynamic World Land Cover Distribution'
+                },
+                tooltip: {
+                    callbacks: {
+                        label: function(context) {
+                            const value = context.raw;
+                            const label = context.label || '';
+                            return `${label}: ${value.toFixed(1)}%`;
+                        }
+                    }
+                }
+            }
+        }
+    });
+
+    // Add the Dynamic World layer to the map
+    if (window.dynamicWorldLayer) {
+        map.removeLayer(window.dynamicWorldLayer);
+    }
+
+    window.dynamicWorldLayer = L.tileLayer(dynamicWorldData.tile_url);
+    // The cache holds full-year mode composites; recent-imagery results have no year
+    if (dynamicWorldData.year && dynamicWorldData.composite && dynamicWorldData.composite.strategy === 'mode') {
+        addRasterLayer(window.dynamicWorldLayer, () => window.dynamicWorldLayer, 'dynamic_world', {year: dynamicWorldData.year});
+    } else {
+        window.dynamicWorldLayer.addTo(map);
+    }
+
+    // Add Dynamic World layer to map controls
+    if (!document.getElementById('dynamicworld-toggle')) {
+        // Add a control for the Dynamic World layer in the map controls panel
+        const controlsContainer = document.querySelector('.map-controls');
+        const ndviControlSection = document.querySelector('.control-section');
+        const dynamicWorldControlSection = document.createElement('div');
+        dynamicWorldControlSection.className = 'control-section';
+        dynamicWorldControlSection.innerHTML = `
+            <div class="control-section-title">Dynamic World Layer</div>
+            <div class="control-item">
+                <input type="checkbox" id="dynamicworld-toggle" checked>
+                <label for="dynamicworld-toggle">Dynamic World V1</label>
+            </div>
+            <input type="range" id="dynamicworld-opacity" class="opacity-slider" min="0" max="100" value="80">
+            <div class="opacity-value" id="dynamicworld-opacity-value">80%</div>
+        `;
+
+        if (ndviControlSection && ndviControlSection.parentNode) {
+            ndviControlSection.parentNode.insertBefore(dynamicWorldControlSection, ndviControlSection.nextSibling);
+        } else if (controlsContainer) {
+            controlsContainer.appendChild(dynamicWorldControlSection);
+        }
+
+        // Add event listener for the Dynamic World toggle
+        document.getElementById('dynamicworld-toggle').addEventListener('change', function() {
+            if (this.checked && window.dynamicWorldLayer) {
+                map.addLayer(window.dynamicWorldLayer);
+            } else if (window.dynamicWorldLayer) {
+                map.removeLayer(window.dynamicWorldLayer);
+            }
+        });
+
+        // Add event listener for opacity control
+        document.getElementById('dynamicworld-opacity').addEventListener('input', function() {
+            const opacity = parseFloat(this.value) / 100;
+            if (window.dynamicWorldLayer) {
+                window.dynamicWorldLayer.setOpacity(opacity);
+            }
+            document.getElementById('dynamicworld-opacity-value').textContent = `${this.value}%`;
+        });
+    }
+
+    // Show the Dynamic World legend
+    document.getElementById('dynamic-world-legend').style.display = 'block';
+}
+
+// Function to get Dynamic World time series data
+function getDynamicWorldTimeSeries(coordinates, startYear, endYear) {
+    return analysisFetch('/get_dynamic_world_timeseries', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify({
+            coordinates: coordinates,
+            start_year: startYear,
+            end_year: endYear
+        })
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.success) {
+            return {
+                timeseriesData: data.timeseries_data,
+                mapTiles: data.map_tiles
+            };
+        } else {
+            throw new Error(data.error || 'Failed to get Dynamic World time series data');
+        }
+    });
+}
+
+// Function to display Dynamic World time series results
+         function displayDynamicWorldTimeSeries(timeseriesData, mapTiles) {
+    console.log('Initializing Dynamic World time series visualization');
+
+    // Reset all chart canvases first to prevent any chart conflicts
+    resetChartCanvases();
+
+    // Show the time series container - make sure it's visible
+    const timeSeriesContainer = document.getElementById('time-series-results');
+    timeSeriesContainer.style.display = 'block';
+    console.log('Made time series container visible');
+
+    try {
+        // Extract years
+        const years = timeseriesData.map(data => data.year);
+        console.log('Processing Dynamic World data for years:', years.join(', '));
+
+        // Get the context for the charts
+        const ndviCanvas = document.getElementById('ndviChart');
+        const vegetationCanvas = document.getElementById('vegetationChart');
+
+        if (!ndviCanvas || !vegetationCanvas) {
+            console.error('Canvas elements not found:', 
+                         !ndviCanvas ? 'ndviChart missing' : '', 
+                         !vegetationCanvas ? 'vegetationChart missing' : '');
+            return;
+        }
+
+        const landCoverCtx = ndviCanvas.getContext('2d');
+        const distributionCtx = vegetationCanvas.getContext('2d');
+
+        // Organize data for charts
+        const landCoverClasses = [];
+        const classColors = {};
+    const classData = {};
+
+    // Initialize with all unique land cover classes across all years
+    timeseriesData.forEach(yearData => {
+        Object.entries(yearData.area_stats).forEach(([className, stats]) => {
+            if (!landCoverClasses.includes(className)) {
+                landCoverClasses.push(className);
+                classColors[className] = stats.color;
+                classData[className] = Array(timeseriesData.length).fill(0);
+            }
+        });
+    });
+
+    // Fill in data for each year
+    timeseriesData.forEach((yearData, yearIndex) => {
+        landCoverClasses.forEach(className => {
+            if (yearData.area_stats[className]) {
+                classData[className][yearIndex] = yearData.area_stats[className].percentage;
+            }
+        });
+    });
+
+    // Sort land cover classes by average percentage (descending)
+    landCoverClasses.sort((a, b) => {
+        const avgA = classData[a].reduce((sum, val) => sum + val, 0) / timeseriesData.length;
+        const avgB = classData[b].reduce((sum, val) => sum + val, 0) / timeseriesData.length;
+        return avgB - avgA;
+    });
+
+    // Create datasets for the chart
+    const datasets = landCoverClasses.map(className => ({
+        label: className,
+        data: classData[className],
+        backgroundColor: classColors[className],
+        borderColor: classColors[className],
+        fill: false
+    }));
+
+    // Create the land cover chart (line chart)
+    window.ndviChart = new Chart(landCoverCtx, {
+        type: 'line',
+        data: {
+            labels: years,
+            datasets: datasets
+        },
+        options: {
+            responsive: true,
+            maintainAspectRatio: false,
+            plugins: {
+                title: {
+                    display: true,
+                    text: 'Dynamic World Land Cover Classes Over Time'
+                },
+                tooltip: {
+                    callbacks: {
+                        label: function(context) {
+                            const value = context.raw;
+                            const label = context.dataset.label || '';
+                            return `${label}: ${value.toFixed(1)}%`;
+                        }
+                    }
+                }
+            },
+            scales: {
+                y: {
+                    beginAtZero: true,
+                    title: {
+                        display: true,
+                        text: 'Percentage of Area'
+                    },
+                    stacked: false
+                }
+            }
+        }
+    });
+
+    // Create stacked bar datasets for land cover distribution
+    const stackedDatasets = landCoverClasses.map(className => ({
+        label: className,
+        data: classData[className],
+        backgroundColor: classColors[className],
+        borderWidth: 1,
+        borderColor: '#fff'
+    }));
+
+    // Create the stacked bar chart for land cover distribution
+    window.vegetationChart = new Chart(distributionCtx, {
+        type: 'bar',
+        data: {
+            labels: years,
+            datasets: stackedDatasets
+        },
+        options: {
+            responsive: true,
+            maintainAspectRatio: false,
+            plugins: {
+                title: {
+                    display: true,
+                    text: 'Land Cover Distribution by Year'
+                },
+                tooltip: {
+                    callbacks: {
+                        label: function(context) {
+                            const value = context.raw;
+                            const label = context.dataset.label || '';
+                            return `${label}: ${value.toFixed(1)}%`;
+                        }
+                    }
+                }
+            },
+            scales: {
+                x: {
+                    stacked: true,
+                    title: {
+                        display: true,
+                        text: 'Year'
+                    }
+                },
+                y: {
+                    stacked: true,
+                    beginAtZero: true,
+                    max: 100,
+                    title: {
+                        display: true,
+                        text: 'Percentage'
+                    }
+                }
+            }
+        }
+    });
+
+    // Initialize animation with the map tiles
+    initializeAnimation(mapTiles);
+
+    // Ensure chart highlighting is synchronized
+    setTimeout(synchronizeChartHighlighting, 500);
+
+    // Update the results section
+    const resultsDiv = document.getElementById('results');
+
+    let html = '<div class="stats-section">';
+    html += `<div class="stats-title">Dynamic World Time Series Analysis (${years[0]} - ${years[years.length - 1]})</div>`;
+
+    // Show summary of changes
+    const firstYear = timeseriesData[0];
+    const lastYear = timeseriesData[timeseriesData.length - 1];
+
+    html += '<div class="stats-title" style="margin-top: 20px;">Land Cover Change Summary</div>';
+    html += '<div style="margin-bottom: 20px; font-size: 13px; color: #666;">Showing changes between the first and last year in the selected range.</div>';
+
+    // Show the significant changes
+    landCoverClasses.forEach(className => {
+        const firstYearValue = firstYear.area_stats[className] ? firstYear.area_stats[className].percentage : 0;
+        const lastYearValue = lastYear.area_stats[className] ? lastYear.area_stats[className].percentage : 0;
+        const change = lastYearValue - firstYearValue;
+
+        if (Math.abs(change) >= 1.0) { // Only show significant changes (>=1%)
+            const color = change > 0 ? 'green' : 'red';
+            const symbol = change > 0 ? '+' : '';
+
+            html += `
+                <div class="stat-item">
+                    <span class="stat-label">${className}:</span>
+                    <span class="stat-value" style="color: ${color}">${symbol}${change.toFixed(1)}% (${firstYearValue.toFixed(1)}% → ${lastYearValue.toFixed(1)}%)</span>
+                </div>
+            `;
+        }
+    });
+
+    html += '</div>';
+    resultsDiv.innerHTML = html;
+
+    // Show the Dynamic World legend
+    document.getElementById('dynamic-world-legend').style.display = 'block';
+
+    } catch (error) {
+    console.error('Error displaying Dynamic World time series:', error);
+    const resultsDiv = document.getElementById('results');
+    if (resultsDiv) {
+        resultsDiv.innerHTML = `<p class="error">Error displaying Dynamic World time series: ${error.message}</p>`;
+    }
+}
+    }
+
+
+// Function to fully reset chart canvases and Chart.js registry
+function resetChartCanvases() {
+    console.log('Fully resetting chart canvases and Chart.js registry');
+
+    // Handle all known charts
+    const chartInstances = [
+{ name: 'ndviChart', prop: 'ndviChart' },
+{ name: 'vegetationChart', prop: 'vegetationChart' },
+{ name: 'currentLandCoverPie', prop: 'currentLandCoverPie' },
+{ name: 'forecastLandCoverPie', prop: 'forecastLandCoverPie' },
+{ name: 'currentLandCoverChart', prop: 'currentLandCoverChart' },
+{ name: 'forecastLandCoverChart', prop: 'forecastLandCoverChart' },
+{ name: 'dynamicWorldChart', prop: 'dynamicWorldChart' }
+    ];
+
+    // Destroy all chart instances
+    chartInstances.forEach(chart => {
+try {
+    if (window[chart.prop] instanceof Chart) {
+        console.log(`Destroying chart: ${chart.name}`);
+        window[chart.prop].destroy();
+        window[chart.prop] = null;
+    }
+} catch (e) {
+    console.error(`Error destroying chart ${chart.name}:`, e);
+}
+    });
+
+    // Try to clear the Chart.js internal registry if available
+    try {
+if (Chart.instances) {
+    console.log('Clearing Chart.js registry with', Object.keys(Chart.instances).length, 'instances');
+    Object.keys(Chart.instances).forEach(key => {
+        try {
+            Chart.instances[key].destroy();
+            console.log(`Destroyed chart instance with key: ${key}`);
+        } catch (e) {
+            console.error(`Error destroying chart instance ${key}:`, e);
+        }
+    });
+}
+    } catch (e) {
+console.error('Error clearing Chart.js registry:', e);
+    }
+
+    // Cleanup without removing existing canvases - this is less aggressive but more reliable
+    try {
+// Get all chart containers
+const timeSeriesContainer = document.getElementById('time-series-results');
+const forecastContainer = document.getElementById('forecast-results-container');
+
+// Clear canvas contexts but don't replace elements
+if (timeSeriesContainer) {
+    const canvases = timeSeriesContainer.querySelectorAll('canvas');
+    canvases.forEach(canvas => {
+        try {
+            const ctx = canvas.getContext('2d');
+            ctx.clearRect(0, 0, canvas.width, canvas.height);
+            console.log(`Cleared canvas context: ${canvas.id}`);
+        } catch (e) {
+            console.error(`Error clearing canvas ${canvas.id}:`, e);
+        }
+    });
+}
+
+// Clear forecast canvases
+if (forecastContainer) {
+    const forecastCanvases = forecastContainer.querySelectorAll('canvas');
+    forecastCanvases.forEach(canvas => {
+        try {
+            const ctx = canvas.getContext('2d');
+            ctx.clearRect(0, 0, canvas.width, canvas.height);
+            console.log(`Cleared forecast canvas context: ${canvas.id}`);
+        } catch (e) {
+            console.error(`Error clearing forecast canvas ${canvas.id}:`, e);
+        }
+    });
+}
+    } catch (e) {
+console.error('Error in chart canvas cleanup:', e);
+    }
+}
+
+// Function to clear all map layers for a fresh analysis
+function clearAllMapLayers() {
+    console.log('Clearing all map layers for fresh analysis');
+
+    // Clear NDVI layer
+    if (currentNdviLayer) {
+        map.removeLayer(currentNdviLayer);
+        currentNdviLayer = null;
+        console.log('Cleared current NDVI layer');
+    }
+
+    // Clear animation layer
+    if (animationState.currentLayer) {
+        map.removeLayer(animationState.currentLayer);
+        animationState.currentLayer = null;
+        console.log('Cleared animation layer');
+    }
+
+    // Stop any running animation
+    stopAnimation();
+    document.getElementById('animation-controls').classList.remove('visible');
+
+    // Clear Dynamic World layer
+    if (window.dynamicWorldLayer) {
+        map.removeLayer(window.dynamicWorldLayer);
+        window.dynamicWorldLayer = null;
+        console.log('Cleared Dynamic World layer');
+    }
+
+    // Clear IGBP layer
+    if (window.igbpLayer) {
+        map.removeLayer(window.igbpLayer);
+        window.igbpLayer = null;
+        console.log('Cleared IGBP layer');
+    }
+
+    // Clear WorldCover layer
+    if (window.worldcoverLayer) {
+        map.removeLayer(window.worldcoverLayer);
+        window.worldcoverLayer = null;
+        console.log('Cleared WorldCover layer');
+    }
+
+    // Reset animation state
+    animationState.mapTiles = [];
+    animationState.currentIndex = 0;
+    animationState.isPlaying = false;
+
+    console.log('All map layers cleared');
+}
+
+// Update the year picker options based on time series analysis
+function updateLandCoverYearOptions() {
+    const startYear = parseInt(document.getElementById('start-year').value);
+    const endYear = parseInt(document.getElementById('end-year').value);
+    const yearSelect = document.getElementById('land-cover-year');
+
+    // Clear existing options except the first one
+    while (yearSelect.options.length > 1) {
+        yearSelect.remove(1);
+    }
+
+    // Add options for each year in the range
+    if (!isNaN(startYear) && !isNaN(endYear)) {
+        for (let year = startYear; year <= endYear; year++) {
+            yearSelect.add(new Option(year, year));
+        }
+        // Select the latest year by default
+        yearSelect.value = endYear;
+    }
+}
+
+// Update year options when time series is analyzed
+document.getElementById('analyze-time-series-btn').addEventListener('click', function() {
+    // The existing event handler code remains the same
+    // After the request is complete, update the year options
+    setTimeout(updateLandCoverYearOptions, 1000); // Add a delay to ensure data is loaded
+});
+
+// Add event listener for model type change
+document.querySelector('input[name="model-type"]').addEventListener('change', function() {
+    // Get the current model type
+    const modelType = document.querySelector('input[name="model-type"]:checked').value;
+    console.log(`Model changed to: ${modelType}`);
+
+    // Clear existing map layers for fresh analysis
+    clearAllMapLayers();
+
+    // Reset animation controls
+    const controls = document.getElementById('animation-controls');
+    controls.classList.remove('visible');
+
+    // Reset animation state to prevent issues when switching back
+    animationState = {
+        mapTiles: [],
+        currentIndex: 0,
+        isPlaying: false,
+        animationSpeed: 1000,
+        animationInterval: null,
+        currentLayer: null
+    };
+
+    // Reset any running animations
+    stopAnimation();
+
+    // Reset the play/pause button appearance
+    const playPauseBtn = document.getElementById('play-pause-btn');
+    if (playPauseBtn) {
+        playPauseBtn.textContent = 'Play';
+        playPauseBtn.style.backgroundColor = '#4CAF50';
+        playPauseBtn.classList.remove('playing');
+    }
+
+    // Update the UI based on model selection
+    updateLegendVisibility(modelType);
+
+    console.log('Animation state reset after model change');
+});
+
+// Update the NDVI layer when the year is changed in Land Cover Classification
+document.getElementById('land-cover-year').addEventListener('change', function() {
+    const selectedYear = this.value;
+    const modelType = document.querySelector('input[name="model-type"]:checked') ? 
+        document.querySelector('input[name="model-type"]:checked').value : null;
+
+    // Only update map layer for NDVI model if we have coordinates
+    if (modelType === 'ndvi' && selectedYear && typeof currentCoordinates !== 'undefined' && currentCoordinates) {
+        console.log(`Updating map layer for year: ${selectedYear}`);
+
+        // Check if we have saved map tiles from time series analysis
+        if (animationState.mapTiles && animationState.mapTiles.length > 0) {
+            // Find the map tile for the selected year
+            const selectedTile = animationState.mapTiles.find(tile => tile.year == selectedYear);
+
+            if (selectedTile) {
+                // Clear any existing NDVI layer
+                if (currentNdviLayer) {
+                    map.removeLayer(currentNdviLayer);
+                }
+
+                // Add the new NDVI layer for the selected year
+                currentNdviLayer = L.tileLayer(selectedTile.tile_url);
+
+                // Get the current NDVI opacity with fallback to 100%
+                const opacityElement = document.getElementById('ndvi-opacity');
+                const opacity = opacityElement ? parseFloat(opacityElement.value) / 100 : 1;
+                currentNdviLayer.setOpacity(opacity);
+
+                // Add to map if NDVI toggle is checked (or by default if toggle doesn't exist)
+                const ndviToggle = document.getElementById('ndvi-toggle');
+                if (!ndviToggle || ndviToggle.checked) {
+                    currentNdviLayer.addTo(map);
+                }
+
+                console.log(`Updated NDVI layer to year ${selectedYear}`);
+            } else {
+                console.warn(`No map data available for year ${selectedYear}`);
+            }
+        } else {
+            console.warn('No map tiles available. Run Time Series Analysis first.');
+        }
+    }
+});
+
+// Initialize year selectors when the page loads
+initializeYearSelectors();
@@ -0,0 +1,1420 @@
+// NDVI and Dynamic World forecasting. Loaded on first use by the
+// run-forecast button handler in app.js.
+
+// Linear regression function for forecasting
+function linearRegression(years, values) {
+    const n = years.length;
+
+    // Convert years to numeric values for calculation (e.g., 2020 -> 0, 2021 -> 1, etc.)
+    const normalizedYears = years.map(y => y - years[0]);
+
+    // Calculate means
+    const meanX = normalizedYears.reduce((sum, x) => sum + x, 0) / n;
+    const meanY = values.reduce((sum, y) => sum + y, 0) / n;
+
+    // Calculate coefficients
+    let numerator = 0;
+    let denominator = 0;
+
+    for (let i = 0; i < n; i++) {
+        numerator += (normalizedYears[i] - meanX) * (values[i] - meanY);
+        denominator += Math.pow(normalizedYears[i] - meanX, 2);
+    }
+
+    const slope = numerator / denominator;
+    const intercept = meanY - slope * meanX;
+
+    // Calculate R-squared
+    const predictions = normalizedYears.map(x => slope * x + intercept);
+    const totalSumOfSquares = values.reduce((sum, y) => sum + Math.pow(y - meanY, 2), 0);
+    const residualSumOfSquares = values.reduce((sum, y, i) => sum + Math.pow(y - predictions[i], 2), 0);
+    const rSquared = 1 - (residualSumOfSquares / totalSumOfSquares);
+
+    return {
+        slope,
+        intercept,
+        rSquared,
+        predict: function(futureYear) {
+            // Convert future year to normalized value
+            const normalizedYear = futureYear - years[0];
+            return slope * normalizedYear + intercept;
+        }
+    };
+}
+
+// Function to generate forecast data
+function generateForecast(years, values, numYearsToForecast) {
+    const regression = linearRegression(years, values);
+
+    const lastYear = years[years.length - 1];
+    const forecastYears = [];
+    const forecastValues = [];
+
+    for (let i = 1; i <= numYearsToForecast; i++) {
+        const forecastYear = lastYear + i;
+        const forecastValue = regression.predict(forecastYear);
+
+        // Ensure forecasted NDVI is within valid range (-1 to 1)
+        const boundedValue = Math.max(-1, Math.min(1, forecastValue));
+
+        forecastYears.push(forecastYear);
+        forecastValues.push(boundedValue);
+    }
+
+    return {
+        years: forecastYears,
+        values: forecastValues,
+        regression: regression
+    };
+}
+
+// Calculate forecasted vegetation distribution based on NDVI ranges
+function calculateVegetationDistribution(ndvi) {
+    let distribution = {
+        'water_or_bare': 0,
+        'sparse_vegetation': 0,
+        'moderate_vegetation': 0,
+        'dense_vegetation': 0
+    };
+
+    // Simple classification based on NDVI thresholds
+    if (ndvi <= 0.1) {
+        distribution.water_or_bare = 100;
+    } else if (ndvi <= 0.3) {
+        const percentInRange = (ndvi - 0.1) / 0.2; // 0 at NDVI 0.1, 1 at NDVI 0.3
+        distribution.water_or_bare = 100 - (percentInRange * 100);
+        distribution.sparse_vegetation = percentInRange * 100;
+    } else if (ndvi <= 0.6) {
+        const percentInRange = (ndvi - 0.3) / 0.3; // 0 at NDVI 0.3, 1 at NDVI 0.6
+        distribution.sparse_vegetation = 100 - (percentInRange * 100);
+        distribution.moderate_vegetation = percentInRange * 100;
+    } else {
+        const percentInRange = Math.min(1, (ndvi - 0.6) / 0.4); // 0 at NDVI 0.6, 1 at NDVI 1.0
+        distribution.moderate_vegetation = 100 - (percentInRange * 100);
+        distribution.dense_vegetation = percentInRange * 100;
+    }
+
+    // Ensure we don't have negative values due to rounding
+    Object.keys(distribution).forEach(key => {
+        distribution[key] = Math.max(0, distribution[key]);
+    });
+
+    // Normalize to ensure total is exactly 100%
+    const total = Object.values(distribution).reduce((sum, val) => sum + val, 0);
+    if (total !== 0) { // Avoid division by zero
+        Object.keys(distribution).forEach(key => {
+            distribution[key] = (distribution[key] / total) * 100;
+        });
+    }
+
+    return distribution;
+}
+
+// Function to update charts with forecast data
+function updateChartsWithForecast(yearlyStats, forecast) {
+    // Set up forecasting visualization
+    setupForecastContainer();
+
+    // Helper function to set up the forecast container
+    function setupForecastContainer() {
+        // Clear any existing forecast results from the sidebar
+        const resultsDiv = document.getElementById('results');
+        const existingForecastContainer = document.getElementById('forecast-results-container');
+        if (existingForecastContainer) {
+            existingForecastContainer.remove();
+        }
+
+        // Create a new forecast container
+        const forecastContainer = document.createElement('div');
+        forecastContainer.id = 'forecast-results-container';
+
+        // Add a heading and description to the forecast container
+        forecastContainer.innerHTML = `
+            <div class="stats-section">
+                <div class="stats-title">NDVI Forecast</div>
+                <div style="font-size: 13px; margin-bottom: 15px; color: #666;">
+                    Forecasting vegetation health trends based on historical NDVI data
+                </div>
+            </div>
+        `;
+
+        // Clear the results div and add our new container
+        resultsDiv.innerHTML = '';
+        resultsDiv.appendChild(forecastContainer);
+    }
+
+    const years = yearlyStats.map(stat => stat.year);
+    const meanNdvi = yearlyStats.map(stat => stat.basic_stats.mean_ndvi);
+
+    // Use our comprehensive chart reset function
+    resetChartCanvases();
+
+    // Create NDVI trend chart with forecast
+    const ndviCtx = document.getElementById('ndviChart').getContext('2d');
+    ndviChart = new Chart(ndviCtx, {
+        type: 'line',
+        data: {
+            labels: [...years, ...forecast.years],
+            datasets: [
+                {
+                    label: 'Historical Mean NDVI',
+                    data: [...meanNdvi, ...Array(forecast.years.length).fill(null)],
+                    borderColor: '#4CAF50',
+                    tension: 0.1,
+                    pointBackgroundColor: years.map(() => '#4CAF50'),
+                    pointRadius: years.map(() => 3),
+                    pointHoverRadius: years.map(() => 6)
+                },
+                {
+                    label: `Forecasted NDVI (R² = ${forecast.regression.rSquared.toFixed(3)})`,
+                    data: [...Array(years.length).fill(null), ...forecast.values],
+                    borderColor: '#FF5722',
+                    borderDash: [5, 5],
+                    tension: 0.1,
+                    pointBackgroundColor: forecast.years.map(() => '#FF5722'),
+                    pointRadius: forecast.years.map(() => 4),
+                    pointHoverRadius: forecast.years.map(() => 7)
+                }
+            ]
+        },
+        options: {
+            responsive: true,
+            maintainAspectRatio: false,
+            plugins: {
+                title: {
+                    display: true,
+                    text: 'NDVI Trend Over Time with Forecast'
+                }
+            },
+            scales: {
+                y: {
+                    beginAtZero: true,
+                    title: {
+                        display: true,
+                        text: 'NDVI Value'
+                    }
+                }
+            }
+        }
+    });
+
+    // Calculate forecasted vegetation distribution based on NDVI ranges
+    const vegetationTypes = ['water_or_bare', 'sparse_vegetation', 'moderate_vegetation', 'dense_vegetation'];
+    const forecastVegetation = forecast.values.map(ndvi => calculateVegetationDistribution(ndvi));
+
+    // Chart reset already handled above
+
+    const vegetationData = vegetationTypes.map(type => ({
+        type: type,
+        values: yearlyStats.map(stat => stat.area_stats[type].percentage)
+    }));
+
+    // Transpose the forecast data for charting
+    const forecastVegValues = vegetationTypes.map(type => ({
+        type: type,
+        values: forecastVegetation.map(dist => dist[type])
+    }));
+
+    const combinedLabels = [...years, ...forecast.years];
+
+    const vegetationCtx = document.getElementById('vegetationChart').getContext('2d');
+    window.vegetationChart = new Chart(vegetationCtx, {
+        type: 'bar',
+        data: {
+            labels: combinedLabels,
+            datasets: [
+                // Historical data sets
+                ...vegetationTypes.map((type, index) => ({
+                    label: yearlyStats[0].area_stats[type].description + ' (Historical)',
+                    data: [...vegetationData[index].values, ...Array(forecast.years.length).fill(null)],
+                    backgroundColor: {
+                        'water_or_bare': '#ff0000',
+                        'sparse_vegetation': '#ffff00',
+                        'moderate_vegetation': '#90ee90',
+                        'dense_vegetation': '#008000'
+                    }[type],
+                    stack: 'Historical'
+                })),
+                // Forecast data sets
+                ...vegetationTypes.map((type, index) => ({
+                    label: yearlyStats[0].area_stats[type].description + ' (Forecast)',
+                    data: [...Array(years.length).fill(null), ...forecastVegValues[index].values],
+                    backgroundColor: {
+                        'water_or_bare': '#ff9999',
+                        'sparse_vegetation': '#ffffaa',
+                        'moderate_vegetation': '#c5f7c5',
+                        'dense_vegetation': '#99cc99'
+                    }[type],
+                    stack: 'Forecast',
+                    borderWidth: 1,
+                    borderColor: '#555'
+                }))
+            ]
+        },
+        options: {
+            responsive: true,
+            maintainAspectRatio: false,
+            plugins: {
+                title: {
+                    display: true,
+                    text: 'Vegetation Distribution Over Time with Forecast'
+                },
+                tooltip: {
+                    callbacks: {
+                        label: function(context) {
+                            return `${context.dataset.label}: ${context.raw !== null ? context.raw.toFixed(1) : 0}%`;
+                        }
+                    }
+                }
+            },
+            scales: {
+                x: {
+                    stacked: true,
+                    title: {
+                        display: true,
+                        text: 'Year'
+                    }
+                },
+                y: {
+                    stacked: true,
+                    title: {
+                        display: true,
+                        text: 'Percentage'
+                    }
+                }
+            }
+        }
+    });
+
+    // Add highlight capability back for the actual data
+    Chart.register({
+        id: 'highlightBar',
+        beforeDraw: (chart) => {
+            if (chart.config.type !== 'bar' || 
+                !chart.options.plugins.highlight || 
+                chart.options.plugins.highlight.highlightedIndex === -1) {
+                return;
+            }
+
+            const index = chart.options.plugins.highlight.highlightedIndex;
+            if (index >= years.length) return; // Don't highlight forecast years
+
+            const meta = chart.getDatasetMeta(0);
+            if (!meta.data[index]) return;
+
+            const ctx = chart.ctx;
+            const x = meta.data[index].x;
+            const barWidth = meta.data[index].width * 1.2;
+
+            // Draw a rectangle highlight behind the bars
+            ctx.save();
+            ctx.globalAlpha = 0.1;
+            ctx.fillStyle = '#FF5722';
+            ctx.fillRect(x - barWidth/2, chart.chartArea.top, barWidth, chart.chartArea.bottom - chart.chartArea.top);
+            ctx.restore();
+
+            // Draw vertical highlight lines on both sides of the bar group
+            ctx.save();
+            ctx.beginPath();
+            ctx.moveTo(x - barWidth/2, chart.chartArea.top);
+            ctx.lineTo(x - barWidth/2, chart.chartArea.bottom);
+            ctx.moveTo(x + barWidth/2, chart.chartArea.top);
+            ctx.lineTo(x + barWidth/2, chart.chartArea.bottom);
+            ctx.lineWidth = 2;
+            ctx.strokeStyle = '#FF5722';
+            ctx.setLineDash([5, 3]);
+            ctx.stroke();
+            ctx.restore();
+        }
+    });
+
+    // Get current vs forecasted vegetation distribution for comparison
+    const currentYear = years[years.length - 1];
+    const currentDistribution = {};
+    vegetationTypes.forEach((type, index) => {
+        currentDistribution[type] = vegetationData[index].values[vegetationData[index].values.length - 1];
+    });
+
+    const forecastYear = forecast.years[forecast.years.length - 1];
+    const forecastDistribution = {};
+    vegetationTypes.forEach((type, index) => {
+        forecastDistribution[type] = forecastVegValues[index].values[forecastVegValues[index].values.length - 1];
+    });
+
+    // Calculate changes
+    const changes = {};
+    vegetationTypes.forEach(type => {
+        changes[type] = forecastDistribution[type] - currentDistribution[type];
+    });
+
+    // Create forecast land cover distributions based on NDVI forecasts
+    // Calculate seasonal variation (simplistic approach)
+    let seasonalVariation = 0.1; // Default value
+    if (yearlyStats.length > 1) {
+        const ndviValues = yearlyStats.map(stat => stat.basic_stats.mean_ndvi).filter(val => !isNaN(val));
+        if (ndviValues.length > 0) {
+            const maxNdvi = Math.max(...ndviValues);
+            const minNdvi = Math.min(...ndviValues);
+            seasonalVariation = maxNdvi - minNdvi;
+        }
+    }
+
+    // Get current land cover distribution
+    const latestYearData = yearlyStats[yearlyStats.length - 1];
+    const totalArea = parseFloat(latestYearData.total_area_hectares) || 0;
+
+    // Get current land cover as a baseline
+    const currentLandCover = analyzeLandCover(yearlyStats);
+    if (!currentLandCover) return; // Safety check
+
+    // Need to enhance the forecast sensitivity to ensure changes are visible
+    // This function will translate NDVI changes to more pronounced land cover changes
+    function forecastLandCoverFromNDVI(ndviValue, currentLandCover, totalArea) {
+        // Create a copy of the current land cover distribution to modify
+        const forecastDistribution = {};
+        Object.keys(landCoverClasses).forEach(key => {
+            forecastDistribution[key] = {
+                area_hectares: currentLandCover.landCoverDistribution[key]?.area_hectares || 0,
+                percentage: currentLandCover.landCoverDistribution[key]?.percentage || 0
+            };
+        });
+
+        // Get baseline NDVI for comparison
+        const baselineNDVI = latestYearData.basic_stats.mean_ndvi || 0;
+
+        // Calculate NDVI change magnitude (normalized to range -1 to 1)
+        const ndviChange = ndviValue - baselineNDVI;
+        const changeMagnitude = Math.abs(ndviChange) * 5; // Amplify the effect for visibility
+
+        // Apply changes based on NDVI trend direction
+        if (ndviChange > 0) {
+            // NDVI increasing: more vegetation, less urban/barren
+            // Increase forest
+            forecastDistribution['forest'].percentage += changeMagnitude * 5;
+            // Increase cropland a bit less
+            forecastDistribution['cropland'].percentage += changeMagnitude * 3;
+            // Increase grassland slightly
+            forecastDistribution['grassland'].percentage += changeMagnitude * 2;
+            // Decrease urban and barren
+            forecastDistribution['urban'].percentage -= changeMagnitude * 4;
+            forecastDistribution['barren'].percentage -= changeMagnitude * 6;
+        } else {
+            // NDVI decreasing: less vegetation, more urban/barren
+            // Decrease forest significantly
+            forecastDistribution['forest'].percentage -= changeMagnitude * 5;
+            // Decrease cropland a bit less
+            forecastDistribution['cropland'].percentage -= changeMagnitude * 3;
+            // Decrease grassland slightly
+            forecastDistribution['grassland'].percentage -= changeMagnitude * 2;
+            // Increase urban and barren
+            forecastDistribution['urban'].percentage += changeMagnitude * 4;
+            forecastDistribution['barren'].percentage += changeMagnitude * 6;
+        }
+
+        // Keep water and wetlands relatively stable but with some small changes
+        forecastDistribution['water'].percentage += (Math.random() - 0.5) * changeMagnitude;
+        forecastDistribution['wetland'].percentage += (Math.random() - 0.5) * changeMagnitude;
+
+        // Ensure all percentages are between 0 and 100
+        Object.keys(forecastDistribution).forEach(key => {
+            forecastDistribution[key].percentage = Math.max(0, Math.min(100, forecastDistribution[key].percentage));
+        });
+
+        // Normalize to ensure sum is 100%
+        const totalPercentage = Object.values(forecastDistribution).reduce((sum, item) => sum + item.percentage, 0);
+        if (totalPercentage > 0) {
+            const normalizationFactor = 100 / totalPercentage;
+            Object.keys(forecastDistribution).forEach(key => {
+                forecastDistribution[key].percentage *= normalizationFactor;
+                forecastDistribution[key].area_hectares = (forecastDistribution[key].percentage / 100) * totalArea;
+            });
+        }
+
+        return {
+            landCoverDistribution: forecastDistribution,
+            totalArea: totalArea
+        };
+    }
+
+    // Calculate forecasted land cover for each future year with enhanced sensitivity
+    const forecastLandCover = forecast.values.map((ndviValue, index) => {
+        // Ensure ndviValue is valid
+        const validNdviValue = isNaN(ndviValue) ? 0 : Math.max(-1, Math.min(1, ndviValue));
+
+        // Use the new forecast function that creates more pronounced changes
+        return forecastLandCoverFromNDVI(validNdviValue, currentLandCover, totalArea);
+    });
+
+    // Get final forecasted land cover
+    const finalForecastLandCover = forecastLandCover[forecastLandCover.length - 1];
+
+    // Prepare data for land cover time series visualization
+    function prepareLandCoverTimeSeriesData() {
+        // This function prepares data for a line chart showing land cover changes over time
+
+        // Extract years for x-axis
+        const historicalYears = yearlyStats.map(stat => stat.year);
+        const allYears = [...historicalYears, ...forecast.years];
+
+        // We need to simulate historical land cover data since we don't have actual historical data
+        // We'll use the current land cover as a baseline and apply small variations based on NDVI
+        const historicalNdvi = yearlyStats.map(stat => stat.basic_stats.mean_ndvi);
+        const baselineNDVI = historicalNdvi[historicalNdvi.length - 1];
+
+        const historicalLandCover = historicalNdvi.map(ndvi => {
+            const ndviChange = ndvi - baselineNDVI;
+            // Create a simulated historical distribution with less pronounced changes than the forecast
+            // This is just to show a trend; in a real application you would use actual historical data
+            return forecastLandCoverFromNDVI(ndvi, currentLandCover, totalArea);
+        });
+
+        // Combine historical and forecast data
+        const landCoverTimeSeries = {};
+
+        // Initialize series for each land cover type
+        Object.keys(landCoverClasses).forEach(key => {
+            landCoverTimeSeries[key] = {
+                label: landCoverClasses[key].name,
+                color: landCoverClasses[key].color,
+                historicalData: historicalLandCover.map(lc => lc.landCoverDistribution[key].percentage),
+                forecastData: forecastLandCover.map(lc => lc.landCoverDistribution[key].percentage)
+            };
+        });
+
+        return {
+            years: allYears,
+            historicalYears: historicalYears,
+            forecastYears: forecast.years,
+            landCoverTimeSeries: landCoverTimeSeries
+        };
+    }
+
+    // Add a forecast section to results
+    // Create a new container for the forecast results
+    const forecastResultsContainer = document.createElement('div');
+    forecastResultsContainer.id = 'forecast-results-container';
+    const forecastHtml = `
+        <div class="stats-section">
+            <div class="stats-title">NDVI Forecast</div>
+            <div class="stat-item">
+                <span class="stat-label">Linear Regression R²:</span>
+                <span class="stat-value">${forecast.regression.rSquared.toFixed(3)}</span>
+            </div>
+            <div class="stat-item">
+                <span class="stat-label">Trend:</span>
+                <span class="stat-value">${forecast.regression.slope > 0 ? 'Increasing' : 'Decreasing'} (${forecast.regression.slope.toFixed(4)} per year)</span>
+            </div>
+            <div class="stats-title">Projected NDVI (${forecast.years[forecast.years.length - 1]})</div>
+            <div class="stat-item">
+                <span class="stat-label">Value:</span>
+                <span class="stat-value">${forecast.values[forecast.values.length-1].toFixed(3)}</span>
+            </div>
+
+            <div class="stats-title">Vegetation Change (${yearlyStats[yearlyStats.length - 1].year} → ${forecast.years[forecast.years.length - 1]})</div>
+            <div class="vegetation-type">
+                <div class="vegetation-header">
+                    <span class="vegetation-name">${yearlyStats[0].area_stats.dense_vegetation.description}</span>
+                    <span class="vegetation-area" style="color: ${changes.dense_vegetation >= 0 ? 'green' : 'red'}">
+                        ${changes.dense_vegetation >= 0 ? '+' : ''}${changes.dense_vegetation.toFixed(1)}%
+                    </span>
+                </div>
+                <div class="progress-bar">
+                    <div class="progress-fill" style="width: ${forecastDistribution.dense_vegetation}%; background-color: #008000;"></div>
+                </div>
+            </div>
+            <div class="vegetation-type">
+                <div class="vegetation-header">
+                    <span class="vegetation-name">${yearlyStats[0].area_stats.moderate_vegetation.description}</span>
+                    <span class="vegetation-area" style="color: ${changes.moderate_vegetation >= 0 ? 'green' : 'red'}">
+                        ${changes.moderate_vegetation >= 0 ? '+' : ''}${changes.moderate_vegetation.toFixed(1)}%
+                    </span>
+                </div>
+                <div class="progress-bar">
+                    <div class="progress-fill" style="width: ${forecastDistribution.moderate_vegetation}%; background-color: #90ee90;"></div>
+                </div>
+            </div>
+            <div class="vegetation-type">
+                <div class="vegetation-header">
+                    <span class="vegetation-name">${yearlyStats[0].area_stats.sparse_vegetation.description}</span>
+                    <span class="vegetation-area" style="color: ${changes.sparse_vegetation >= 0 ? 'green' : 'red'}">
+                        ${changes.sparse_vegetation >= 0 ? '+' : ''}${changes.sparse_vegetation.toFixed(1)}%
+                    </span>
+                </div>
+                <div class="progress-bar">
+                    <div class="progress-fill" style="width: ${forecastDistribution.sparse_vegetation}%; background-color: #ffff00;"></div>
+                </div>
+            </div>
+            <div class="vegetation-type">
+                <div class="vegetation-header">
+                    <span class="vegetation-name">${yearlyStats[0].area_stats.water_or_bare.description}</span>
+                    <span class="vegetation-area" style="color: ${changes.water_or_bare >= 0 ? 'green' : 'red'}">
+                        ${changes.water_or_bare >= 0 ? '+' : ''}${changes.water_or_bare.toFixed(1)}%
+                    </span>
+                </div>
+                <div class="progress-bar">
+                    <div class="progress-fill" style="width: ${forecastDistribution.water_or_bare}%; background-color: #ff0000;"></div>
+                </div>
+            </div>
+        </div>
+    `;
+
+    // Add forecast content to results container
+    forecastResultsContainer.innerHTML = forecastHtml;
+
+    // Clear any existing results and add the forecast container
+    const resultsDiv = document.getElementById('results');
+    resultsDiv.innerHTML = '';
+    resultsDiv.appendChild(forecastResultsContainer);
+
+    // Add Land Cover forecast section
+    if (finalForecastLandCover) {
+        // Create land cover forecast div
+        const landCoverForecastDiv = document.createElement('div');
+        landCoverForecastDiv.className = 'land-cover-forecast-results';
+        landCoverForecastDiv.style.marginTop = '20px';
+        landCoverForecastDiv.style.padding = '15px';
+        landCoverForecastDiv.style.backgroundColor = '#fff';
+        landCoverForecastDiv.style.border = '1px solid #ddd';
+        landCoverForecastDiv.style.borderRadius = '5px';
+
+        // Append to the forecast container instead of results div directly
+        document.getElementById('forecast-results-container').appendChild(landCoverForecastDiv);
+
+        // Add a title
+        const titleDiv = document.createElement('div');
+        titleDiv.className = 'stats-title';
+        titleDiv.textContent = `Land Cover Forecast (${forecast.years[forecast.years.length - 1]})`;
+        landCoverForecastDiv.appendChild(titleDiv);
+
+        // Add a description
+        const descDiv = document.createElement('div');
+        descDiv.style.fontSize = '13px';
+        descDiv.style.marginBottom = '15px';
+        descDiv.style.color = '#666';
+        descDiv.textContent = 'Projected land cover based on NDVI forecast and current distribution patterns.';
+        landCoverForecastDiv.appendChild(descDiv);
+
+        // Create comparison section for current vs forecasted
+        const comparisonDiv = document.createElement('div');
+        comparisonDiv.style.display = 'flex';
+        comparisonDiv.style.gap = '10px';
+        comparisonDiv.style.flexWrap = 'wrap';
+        landCoverForecastDiv.appendChild(comparisonDiv);
+
+        // Current land cover chart
+        const currentChartContainer = document.createElement('div');
+        currentChartContainer.style.flex = '1';
+        currentChartContainer.style.minWidth = '300px';
+        currentChartContainer.style.height = '300px';
+        comparisonDiv.appendChild(currentChartContainer);
+
+        const currentCanvas = document.createElement('canvas');
+        currentCanvas.id = 'currentLandCoverChart';
+        currentChartContainer.appendChild(currentCanvas);
+
+        // Forecast land cover chart
+        const forecastChartContainer = document.createElement('div');
+        forecastChartContainer.style.flex = '1';
+        forecastChartContainer.style.minWidth = '300px';
+        forecastChartContainer.style.height = '300px';
+        comparisonDiv.appendChild(forecastChartContainer);
+
+        const forecastCanvas = document.createElement('canvas');
+        forecastCanvas.id = 'forecastLandCoverChart';
+        forecastChartContainer.appendChild(forecastCanvas);
+
+        // Land cover changes section
+        const changesDiv = document.createElement('div');
+        changesDiv.style.marginTop = '20px';
+        landCoverForecastDiv.appendChild(changesDiv);
+
+        const changesTitle = document.createElement('div');
+        changesTitle.className = 'stats-title';
+        changesTitle.textContent = 'Projected Land Cover Changes';
+        changesDiv.appendChild(changesTitle);
+
+        // Sort land cover types for current and forecast
+        const sortedCurrentLandCover = Object.entries(currentLandCover.landCoverDistribution)
+            .map(([key, value]) => ({ 
+                key, 
+                ...value, 
+                name: landCoverClasses[key].name,
+                color: landCoverClasses[key].color,
+                description: landCoverClasses[key].description
+            }))
+            .sort((a, b) => b.percentage - a.percentage);
+
+        const sortedForecastLandCover = Object.entries(finalForecastLandCover.landCoverDistribution)
+            .map(([key, value]) => ({ 
+                key, 
+                ...value, 
+                name: landCoverClasses[key].name,
+                color: landCoverClasses[key].color,
+                description: landCoverClasses[key].description
+            }))
+            .sort((a, b) => b.percentage - a.percentage);
+
+        // Calculate changes in land cover
+        const landCoverChanges = {};
+        Object.keys(landCoverClasses).forEach(key => {
+            const currentPercentage = currentLandCover.landCoverDistribution[key]?.percentage || 0;
+            const forecastPercentage = finalForecastLandCover.landCoverDistribution[key]?.percentage || 0;
+
+            // Ensure all values are valid numbers
+            const validCurrentPercentage = isNaN(currentPercentage) ? 0 : currentPercentage;
+            const validForecastPercentage = isNaN(forecastPercentage) ? 0 : forecastPercentage;
+            const validChange = validForecastPercentage - validCurrentPercentage;
+
+            landCoverChanges[key] = {
+                key,
+                name: landCoverClasses[key].name,
+                color: landCoverClasses[key].color,
+                currentPercentage: validCurrentPercentage,
+                forecastPercentage: validForecastPercentage,
+                change: validChange
+            };
+        });
+
+        // Create a scrollable container for the table
+        const tableContainer = document.createElement('div');
+        tableContainer.style.overflowX = 'auto';
+        tableContainer.style.width = '100%';
+        tableContainer.style.marginTop = '10px';
+        tableContainer.style.position = 'relative';
+
+        // Create a table for changes
+        const changesTable = document.createElement('table');
+        changesTable.style.width = '100%';
+        changesTable.style.minWidth = '600px'; // Ensure minimum width for content
+        changesTable.style.borderCollapse = 'collapse';
+
+        tableContainer.appendChild(changesTable);
+        changesDiv.appendChild(tableContainer);
+
+        // Table header
+        const thead = document.createElement('thead');
+        changesTable.appendChild(thead);
+
+        const headerRow = document.createElement('tr');
+        thead.appendChild(headerRow);
+
+        ['Land Cover Type', `Current (${yearlyStats[yearlyStats.length - 1].year})`, `Forecast (${forecast.years[forecast.years.length - 1]})`, 'Change'].forEach(text => {
+            const th = document.createElement('th');
+            th.textContent = text;
+            th.style.padding = '8px';
+            th.style.textAlign = 'left';
+            th.style.borderBottom = '2px solid #ddd';
+            headerRow.appendChild(th);
+        });
+
+        // Table body
+        const tbody = document.createElement('tbody');
+        changesTable.appendChild(tbody);
+
+        // Sort by absolute change magnitude
+        const sortedChanges = Object.values(landCoverChanges)
+            .sort((a, b) => Math.abs(b.change) - Math.abs(a.change));
+
+        sortedChanges.forEach(item => {
+            const row = document.createElement('tr');
+            tbody.appendChild(row);
+
+            // Land cover type column with color
+            const typeCell = document.createElement('td');
+            typeCell.style.padding = '8px';
+            typeCell.style.borderBottom = '1px solid #ddd';
+            typeCell.style.display = 'flex';
+            typeCell.style.alignItems = 'center';
+            row.appendChild(typeCell);
+
+            const colorBox = document.createElement('span');
+            colorBox.style.display = 'inline-block';
+            colorBox.style.width = '12px';
+            colorBox.style.height = '12px';
+            colorBox.style.backgroundColor = item.color;
+            colorBox.style.marginRight = '8px';
+            colorBox.style.borderRadius = '2px';
+            typeCell.appendChild(colorBox);
+
+            const typeName = document.createElement('span');
+            typeName.textContent = item.name;
+            typeCell.appendChild(typeName);
+
+            // Current percentage
+            const currentCell = document.createElement('td');
+            currentCell.textContent = `${item.currentPercentage.toFixed(1)}%`;
+            currentCell.style.padding = '8px';
+            currentCell.style.borderBottom = '1px solid #ddd';
+            row.appendChild(currentCell);
+
+            // Forecast percentage
+            const forecastCell = document.createElement('td');
+            forecastCell.textContent = `${item.forecastPercentage.toFixed(1)}%`;
+            forecastCell.style.padding = '8px';
+            forecastCell.style.borderBottom = '1px solid #ddd';
+            row.appendChild(forecastCell);
+
+            // Change
+            const changeCell = document.createElement('td');
+            changeCell.textContent = `${item.change >= 0 ? '+' : ''}${item.change.toFixed(1)}%`;
+            changeCell.style.padding = '8px';
+            changeCell.style.color = item.change >= 0 ? 'green' : 'red';
+            changeCell.style.fontWeight = 'bold';
+            changeCell.style.borderBottom = '1px solid #ddd';
+            row.appendChild(changeCell);
+        });
+
+        // Add the land cover forecast div to results
+        resultsDiv.appendChild(landCoverForecastDiv);
+
+        // Create the current land cover pie chart
+        const currentCtx = document.getElementById('currentLandCoverChart').getContext('2d');
+        new Chart(currentCtx, {
+            type: 'pie',
+            data: {
+                labels: sortedCurrentLandCover.map(lc => lc.name),
+                datasets: [{
+                    data: sortedCurrentLandCover.map(lc => lc.percentage),
+                    backgroundColor: sortedCurrentLandCover.map(lc => lc.color),
+                    borderColor: '#fff',
+                    borderWidth: 2
+                }]
+            },
+            options: {
+                responsive: true,
+                maintainAspectRatio: false,
+                plugins: {
+                    legend: {
+                        position: 'bottom',
+                        labels: {
+                            boxWidth: 12,
+                            padding: 15,
+                            font: {
+                                size: 11
+                            }
+                        }
+                    },
+                    title: {
+                        display: true,
+                        text: `Current Land Cover (${yearlyStats[yearlyStats.length - 1].year})`
+                    }
+                }
+            }
+        });
+
+        // Create the forecast land cover pie chart
+        const forecastCtx = document.getElementById('forecastLandCoverChart').getContext('2d');
+        new Chart(forecastCtx, {
+            type: 'pie',
+            data: {
+                labels: sortedForecastLandCover.map(lc => lc.name),
+                datasets: [{
+                    data: sortedForecastLandCover.map(lc => lc.percentage),
+                    backgroundColor: sortedForecastLandCover.map(lc => lc.color),
+                    borderColor: '#fff',
+                    borderWidth: 2
+                }]
+            },
+            options: {
+                responsive: true,
+                maintainAspectRatio: false,
+                plugins: {
+                    legend: {
+                        position: 'bottom',
+                        labels: {
+                            boxWidth: 12,
+                            padding: 15,
+                            font: {
+                                size: 11
+                            }
+                        }
+                    },
+                    title: {
+                        display: true,
+                        text: `Forecasted Land Cover (${forecast.years[forecast.years.length - 1]})`
+                    }
+                }
+            }
+        });
+
+        // Add time series chart for land cover changes
+        const timeSeriesContainer = document.createElement('div');
+        timeSeriesContainer.style.marginTop = '30px';
+        landCoverForecastDiv.appendChild(timeSeriesContainer);
+
+        const timeSeriesTitle = document.createElement('div');
+        timeSeriesTitle.className = 'stats-title';
+        timeSeriesTitle.textContent = 'Land Cover Changes Over Time';
+        timeSeriesContainer.appendChild(timeSeriesTitle);
+
+        const timeSeriesDescription = document.createElement('div');
+        timeSeriesDescription.style.fontSize = '13px';
+        timeSeriesDescription.style.marginBottom = '15px';
+        timeSeriesDescription.style.color = '#666';
+        timeSeriesDescription.textContent = 'Trends and projections of land cover changes over the time period.';
+        timeSeriesContainer.appendChild(timeSeriesDescription);
+
+        const chartContainer = document.createElement('div');
+        chartContainer.style.height = '400px';
+        timeSeriesContainer.appendChild(chartContainer);
+
+        const canvas = document.createElement('canvas');
+        canvas.id = 'landCoverTimeSeriesChart';
+        chartContainer.appendChild(canvas);
+
+        // Get time series data
+        const timeSeriesData = prepareLandCoverTimeSeriesData();
+
+        // Create datasets for the chart - show top 5 most significant land cover types
+        const significantLandCoverTypes = sortedChanges
+            .filter(item => Math.abs(item.change) > 0.1) // Only include types with meaningful changes
+            .slice(0, 5) // Limit to top 5 for clarity
+            .map(item => item.key);
+
+        // If we have fewer than 2 significant types, include the top 2 by current percentage
+        if (significantLandCoverTypes.length < 2) {
+            const topByPercentage = sortedCurrentLandCover
+                .filter(item => !significantLandCoverTypes.includes(item.key))
+                .slice(0, 2)
+                .map(item => item.key);
+
+            significantLandCoverTypes.push(...topByPercentage);
+        }
+
+        // Prepare datasets for the line chart
+        const datasets = significantLandCoverTypes.map(key => {
+            const series = timeSeriesData.landCoverTimeSeries[key];
+            return [
+                // Historical data
+                {
+                    label: `${series.label} (Historical)`,
+                    data: series.historicalData,
+                    borderColor: series.color,
+                    backgroundColor: series.color + '20', // Add transparency
+                    pointRadius: 3,
+                    pointHoverRadius: 5,
+                    tension: 0.1
+                },
+                // Forecast data with dashed line
+                {
+                    label: `${series.label} (Forecast)`,
+                    data: Array(timeSeriesData.historicalYears.length).fill(null).concat(series.forecastData),
+                    borderColor: series.color,
+                    borderDash: [5, 5],
+                    pointRadius: 3,
+                    pointHoverRadius: 5,
+                    tension: 0.1
+                }
+            ];
+        }).flat();
+
+        // Create the line chart
+        const timeSeriesCtx = document.getElementById('landCoverTimeSeriesChart').getContext('2d');
+        new Chart(timeSeriesCtx, {
+            type: 'line',
+            data: {
+                labels: timeSeriesData.years,
+                datasets: datasets
+            },
+            options: {
+                responsive: true,
+                maintainAspectRatio: false,
+                interaction: {
+                    mode: 'index',
+                    intersect: false
+                },
+                plugins: {
+                    title: {
+                        display: true,
+                        text: 'Land Cover Changes Over Time'
+                    },
+                    tooltip: {
+                        callbacks: {
+                            label: function(context) {
+                                return `${context.dataset.label}: ${context.raw !== null ? context.raw.toFixed(1) : 0}%`;
+                            }
+                        }
+                    }
+                },
+                scales: {
+                    y: {
+                        title: {
+                            display: true,
+                            text: 'Percentage of Total Area'
+                        },
+                        min: 0,
+                        max: 100
+                    },
+                    x: {
+                        title: {
+                            display: true,
+                            text: 'Year'
+                        }
+                    }
+                }
+            }
+        });
+    }
+}
+
+// Function to generate Dynamic World forecast
+function generateDynamicWorldForecast(timeseriesData, numYearsToForecast) {
+    const resultsDiv = document.getElementById('results');
+    resultsDiv.innerHTML = '<p>Generating Dynamic World forecast...</p>';
+
+    try {
+// Use our comprehensive chart reset function
+resetChartCanvases();
+
+        // Extract years
+        const years = timeseriesData.map(data => data.year);
+        const lastYear = Math.max(...years);
+
+        // Get all unique land cover classes from the time series
+        const landCoverClasses = [];
+        const classColors = {};
+        const classData = {};
+
+        // Initialize with all unique land cover classes across all years
+        timeseriesData.forEach(yearData => {
+            Object.entries(yearData.area_stats).forEach(([className, stats]) => {
+                if (!landCoverClasses.includes(className)) {
+                    landCoverClasses.push(className);
+                    classColors[className] = stats.color;
+                    classData[className] = Array(timeseriesData.length).fill(0);
+                }
+            });
+        });
+
+        // Fill in historical data for each year
+        timeseriesData.forEach((yearData, yearIndex) => {
+            landCoverClasses.forEach(className => {
+                if (yearData.area_stats[className]) {
+                    classData[className][yearIndex] = yearData.area_stats[className].percentage;
+                }
+            });
+        });
+
+        // Generate forecast years
+        const forecastYears = [];
+        for (let i = 1; i <= numYearsToForecast; i++) {
+            forecastYears.push(lastYear + i);
+        }
+
+        // For each land cover class, calculate trend and forecast future values
+        const forecasts = {};
+        landCoverClasses.forEach(className => {
+            const values = classData[className];
+
+            // Use linear regression to predict future values
+            const regression = linearRegression(years, values);
+
+            // Generate forecast
+            const forecastValues = [];
+            for (let i = 1; i <= numYearsToForecast; i++) {
+                const forecastYear = lastYear + i;
+                const forecastValue = regression.predict(forecastYear);
+                // Ensure values are between 0 and 100
+                forecastValues.push(Math.max(0, Math.min(100, forecastValue)));
+            }
+
+            forecasts[className] = {
+                historical: values,
+                forecast: forecastValues,
+                regression: regression
+            };
+        });
+
+        // Create charts showing the forecasts
+        createDynamicWorldForecastCharts(years, forecastYears, landCoverClasses, classColors, forecasts);
+
+        // Create a summary of significant changes
+        displayDynamicWorldForecastSummary(years, forecastYears, landCoverClasses, forecasts, classColors);
+
+// Hide loading screen after successfully generating forecast
+hideLoading();
+    } catch (error) {
+        console.error('Error generating Dynamic World forecast:', error);
+        resultsDiv.innerHTML = `<p class="error">Error generating forecast: ${error.message}</p>`;
+
+// Make sure to hide loading screen on error
+hideLoading();
+    }
+}
+
+// Function to create Dynamic World forecast charts
+function createDynamicWorldForecastCharts(historicalYears, forecastYears, landCoverClasses, classColors, forecasts) {
+    try {
+    // Show the time series container
+    const timeSeriesContainer = document.getElementById('time-series-results');
+    timeSeriesContainer.style.display = 'block';
+
+    // Use our comprehensive chart reset function
+    resetChartCanvases();
+
+    // Get the context for the charts
+    const landCoverCtx = document.getElementById('ndviChart').getContext('2d');
+    const distributionCtx = document.getElementById('vegetationChart').getContext('2d');
+
+    // Combine years
+    const allYears = [...historicalYears, ...forecastYears];
+
+    // Sort land cover classes by importance (average percentage)
+    const sortedClasses = [...landCoverClasses].sort((a, b) => {
+        const avgA = forecasts[a].historical.reduce((sum, val) => sum + val, 0) / historicalYears.length;
+        const avgB = forecasts[b].historical.reduce((sum, val) => sum + val, 0) / historicalYears.length;
+        return avgB - avgA;
+    });
+
+    // Limit to top 6 classes for better visualization
+    const topClasses = sortedClasses.slice(0, 6);
+
+    // Create datasets for each class (historical and forecast)
+    const lineDatasets = [];
+
+    topClasses.forEach(className => {
+        // Historical dataset
+        lineDatasets.push({
+            label: `${className} (Historical)`,
+            data: [...forecasts[className].historical, ...Array(forecastYears.length).fill(null)],
+            borderColor: classColors[className],
+            backgroundColor: classColors[className] + '20',
+            tension: 0.1,
+            fill: false,
+            pointRadius: 3
+        });
+
+        // Forecast dataset
+        lineDatasets.push({
+            label: `${className} (Forecast)`,
+            data: [...Array(historicalYears.length).fill(null), ...forecasts[className].forecast],
+            borderColor: classColors[className],
+            borderDash: [5, 5],
+            tension: 0.1,
+            fill: false,
+            pointRadius: 3
+        });
+    });
+
+    // Create the line chart for trends
+    window.ndviChart = new Chart(landCoverCtx, {
+        type: 'line',
+        data: {
+            labels: allYears,
+            datasets: lineDatasets
+        },
+        options: {
+            responsive: true,
+            maintainAspectRatio: false,
+            plugins: {
+                title: {
+                    display: true,
+                    text: 'Dynamic World Land Cover Forecast'
+                },
+                tooltip: {
+                    mode: 'index',
+                    intersect: false
+                },
+                legend: {
+                    position: 'right',
+                    labels: {
+                        boxWidth: 12,
+                        font: {
+                            size: 10
+                        }
+                    }
+                }
+            },
+            scales: {
+                y: {
+                    stacked: false,
+                    title: {
+                        display: true,
+                        text: 'Percentage of Area (%)'
+                    },
+                    min: 0,
+                    max: 100
+                }
+            }
+        }
+    });
+
+    // Create stacked bar chart datasets for visualization
+    // Historical stacked bars
+    const stackedHistoricalDatasets = topClasses.map(className => ({
+        label: `${className} (Historical)`,
+        data: [...forecasts[className].historical, ...Array(forecastYears.length).fill(null)],
+        backgroundColor: classColors[className],
+        stack: 'Historical'
+    }));
+
+    // Forecast stacked bars
+    const stackedForecastDatasets = topClasses.map(className => ({
+        label: `${className} (Forecast)`,
+        data: [...Array(historicalYears.length).fill(null), ...forecasts[className].forecast],
+        backgroundColor: classColors[className] + '90', // More transparent
+        stack: 'Forecast',
+        borderWidth: 1,
+        borderColor: '#555'
+    }));
+
+    // Combine datasets
+    const stackedDatasets = [...stackedHistoricalDatasets, ...stackedForecastDatasets];
+
+    // Create the stacked bar chart
+    window.vegetationChart = new Chart(distributionCtx, {
+        type: 'bar',
+        data: {
+            labels: allYears,
+            datasets: stackedDatasets
+        },
+        options: {
+            responsive: true,
+            maintainAspectRatio: false,
+            plugins: {
+                title: {
+                    display: true,
+                    text: 'Land Cover Distribution Forecast'
+                },
+                tooltip: {
+                    mode: 'index',
+                    intersect: false
+                },
+                legend: {
+                    display: false
+                }
+            },
+            scales: {
+                x: {
+                    stacked: true,
+                    title: {
+                        display: true,
+                        text: 'Year'
+                    }
+                },
+                y: {
+                    stacked: true,
+                    title: {
+                        display: true,
+                        text: 'Percentage'
+                    },
+                    min: 0,
+                    max: 100
+                }
+            }
+        }
+    });
+    } catch (error) {
+console.error('Error creating Dynamic World forecast charts:', error);
+document.getElementById('results').innerHTML = `<p class="error">Error creating forecast charts: ${error.message}</p>`;
+// Add this to ensure loading screen is hidden if chart creation fails
+hideLoading();
+    }
+}
+
+// Function to display Dynamic World forecast summary
+function displayDynamicWorldForecastSummary(historicalYears, forecastYears, landCoverClasses, forecasts, classColors) {
+    try {
+    const resultsDiv = document.getElementById('results');
+
+    // Create a forecast summary (replace any existing content)
+    let summaryHtml = '<div class="stats-section">';
+    summaryHtml += `<div class="stats-title">Dynamic World Land Cover Forecast</div>`;
+    summaryHtml += `<div style="font-size: 13px; margin-bottom: 15px; color: #666;">Forecast from ${historicalYears[historicalYears.length-1]} to ${forecastYears[forecastYears.length-1]} based on historical trends.</div>`;
+
+    summaryHtml += '<div class="stats-title" style="margin-top: 20px;">Projected Changes</div>';
+
+    // Calculate significant changes between last historical year and last forecast year
+    const changes = [];
+
+    landCoverClasses.forEach(className => {
+        const historical = forecasts[className].historical;
+        const forecast = forecasts[className].forecast;
+
+        const currentValue = historical[historical.length - 1] || 0;
+        const futureValue = forecast[forecast.length - 1] || 0;
+        const change = futureValue - currentValue;
+
+        // Only include significant changes
+        if (Math.abs(change) >= 1.0) {
+            changes.push({
+                className,
+                currentValue,
+                futureValue,
+                change,
+                color: classColors[className]
+            });
+        }
+    });
+
+    // Sort by absolute magnitude of change
+    changes.sort((a, b) => Math.abs(b.change) - Math.abs(a.change));
+
+    // Add significant changes to summary
+    if (changes.length > 0) {
+        changes.forEach(change => {
+            const changeDirection = change.change > 0 ? 'increase' : 'decrease';
+            const symbol = change.change > 0 ? '+' : '';
+
+            summaryHtml += `
+                <div class="stat-item">
+                    <span class="stat-label">${change.className}:</span>
+                    <span class="stat-value" style="color: ${change.change > 0 ? 'green' : 'red'}">
+                        ${symbol}${change.change.toFixed(1)}% (${change.currentValue.toFixed(1)}% → ${change.futureValue.toFixed(1)}%)
+                    </span>
+                </div>
+            `;
+        });
+    } else {
+        summaryHtml += '<p>No significant changes (≥1%) projected in land cover distribution.</p>';
+    }
+
+    summaryHtml += '</div>';
+
+    // First, check if a forecast container already exists and remove it
+    const existingForecastContainer = document.getElementById('forecast-results-container');
+    if (existingForecastContainer) {
+        existingForecastContainer.remove();
+    }
+
+    // Create a new container for all forecast-related content
+    const forecastContainer = document.createElement('div');
+    forecastContainer.id = 'forecast-results-container';
+
+    // Add the summary HTML to the container
+    forecastContainer.innerHTML = summaryHtml;
+
+    // Clear the results div and add our new container
+    resultsDiv.innerHTML = '';
+    resultsDiv.appendChild(forecastContainer);
+
+    // Create pie charts comparing current vs. forecasted distribution
+    createComparisonPieCharts(historicalYears, forecastYears, landCoverClasses, forecasts, classColors, forecastContainer);
+    } catch (error) {
+console.error('Error displaying Dynamic World forecast summary:', error);
+document.getElementById('results').innerHTML = `<p class="error">Error displaying forecast summary: ${error.message}</p>`;
+// Add this to ensure loading screen is hidden if summary creation fails
+hideLoading();
+    }
+}
+
+// Function to create comparison pie charts
+function createComparisonPieCharts(historicalYears, forecastYears, landCoverClasses, forecasts, classColors, parentContainer) {
+    // Create container for pie charts
+    const chartsContainer = document.createElement('div');
+    chartsContainer.style.display = 'flex';
+    chartsContainer.style.flexWrap = 'wrap';
+    chartsContainer.style.gap = '20px';
+    chartsContainer.style.justifyContent = 'center';
+    chartsContainer.style.marginTop = '30px';
+
+    // Current (last historical year) container
+    const currentContainer = document.createElement('div');
+    currentContainer.style.width = '350px';
+    currentContainer.style.height = '350px';
+
+    // Forecast (last forecast year) container  
+    const forecastChartContainer = document.createElement('div');
+    forecastChartContainer.style.width = '350px';
+    forecastChartContainer.style.height = '350px';
+
+    chartsContainer.appendChild(currentContainer);
+    chartsContainer.appendChild(forecastChartContainer);
+    parentContainer.appendChild(chartsContainer);
+
+        // Create canvas elements
+    const currentCanvas = document.createElement('canvas');
+    currentCanvas.id = 'currentLandCoverPie';
+    currentContainer.appendChild(currentCanvas);
+
+    const forecastCanvas = document.createElement('canvas');
+    forecastCanvas.id = 'forecastLandCoverPie';
+    forecastChartContainer.appendChild(forecastCanvas);
+
+    // Prepare data for current pie chart
+    const currentData = [];
+    const forecastData = [];
+    const labels = [];
+    const backgroundColors = [];
+
+    // Filter classes with significant percentage
+    landCoverClasses.forEach(className => {
+        const historical = forecasts[className].historical;
+        const forecast = forecasts[className].forecast;
+
+        const currentValue = historical[historical.length - 1] || 0;
+        const futureValue = forecast[forecast.length - 1] || 0;
+
+        // Only include classes with at least 1% in either current or forecast
+        if (currentValue >= 1.0 || futureValue >= 1.0) {
+            labels.push(className);
+            currentData.push(currentValue);
+            forecastData.push(futureValue);
+            backgroundColors.push(classColors[className]);
+        }
+    });
+
+    // Create current distribution pie chart
+    new Chart(document.getElementById('currentLandCoverPie').getContext('2d'), {
+        type: 'pie',
+        data: {
+            labels: labels,
+            datasets: [{
+                data: currentData,
+                backgroundColor: backgroundColors,
+                borderWidth: 1
+            }]
+        },
+        options: {
+            responsive: true,
+            maintainAspectRatio: false,
+            plugins: {
+                title: {
+                    display: true,
+                    text: `Current Land Cover (${historicalYears[historicalYears.length-1]})`
+                },
+                legend: {
+                    position: 'right',
+                    labels: {
+                        boxWidth: 12,
+                        font: {
+                            size: 11
+                        }
+                    }
+                }
+            }
+        }
+    });
+
+    // Create forecast distribution pie chart
+    new Chart(document.getElementById('forecastLandCoverPie').getContext('2d'), {
+        type: 'pie',
+        data: {
+            labels: labels,
+            datasets: [{
+                data: forecastData,
+                backgroundColor: backgroundColors,
+                borderWidth: 1
+            }]
+        },
+        options: {
+            responsive: true,
+            maintainAspectRatio: false,
+            plugins: {
+                title: {
+                    display: true,
+                    text: `Forecasted Land Cover (${forecastYears[forecastYears.length-1]})`
+                },
+                legend: {
+                    position: 'right',
+                    labels: {
+                        boxWidth: 12,
+                        font: {
+                            size: 11
+                        }
+                    }
+                }
+            }
+        }
+    });
+}
@@ -0,0 +1,107 @@
+// Guided intro tour. Loaded on first use by startTour() in app.js, after intro.js.
+
+// Tour configuration
+const tourSteps = [
+    {
+        element: '#startTour',
+        intro: 'Welcome to the Land Area Analysis Tool! Click this button anytime to restart the tour.',
+        position: 'left'
+    },
+    {
+        element: '.sidebar',
+        intro: 'This is your control panel where you can configure all analysis settings.',
+        position: 'right'
+    },
+    {
+        intro: 'To pan around the map, click and drag anywhere on the map. You can also use arrow keys for precise movements.',
+        position: 'bottom-middle-aligned',
+        tooltipClass: 'no-element-tooltip'
+    },
+    {
+        element: '.leaflet-control-zoom',
+        intro: 'Use these controls to zoom in and out of the map. You can also use your mouse wheel or touchpad gestures.',
+        position: 'right'
+    },
+    {
+        element: '.map-controls-toggle',
+        intro: 'Click this button to show or hide the map controls panel.',
+        position: 'right'
+    },
+    {
+        element: '.maptype-toggle-btn',
+        intro: 'Click here to toggle between different map types (Satellite and Street View) to better visualize the area.',
+        position: 'right'
+    },
+    {
+        element: '.leaflet-draw-toolbar',
+        intro: 'This is your drawing toolbar. It contains various tools for selecting areas on the map.',
+        position: 'left'
+    },
+    {
+        element: '.leaflet-draw-draw-polygon',
+        intro: 'Click this to draw a polygon. Click points on the map to create your area, and double-click to finish.',
+        position: 'right'
+    },
+    {
+        element: '.leaflet-draw-draw-rectangle',
+        intro: 'Use this to draw a rectangle. Click and drag to define your area.',
+        position: 'right'
+    },
+    {
+        element: '.leaflet-draw-edit-edit',
+        intro: 'After drawing, use this tool to modify your shapes by dragging the white squares.',
+        position: 'right'
+    },
+    {
+        element: '.leaflet-draw-edit-remove',
+        intro: 'Use this to delete your drawn shapes and start over.',
+        position: 'right'
+    },
+    {
+        element: '.model-details-container',
+        intro: 'Choose between two powerful analysis models: NDVI for vegetation analysis or Dynamic World for comprehensive land cover classification.',
+        position: 'right'
+    },
+    {
+        element: '.expand-button',
+        intro: 'Click "Show more details" to learn more about each analysis model\'s features and capabilities.',
+        position: 'right'
+    },
+    {
+        element: '.year-selector',
+        intro: 'Select a time range to analyze changes in land cover over time.',
+        position: 'right'
+    },
+    {
+        element: '#enable-forecast',
+        intro: 'Enable forecasting to predict future land cover changes based on historical data.',
+        position: 'right'
+    },
+    {
+        element: '#enable-land-cover',
+        intro: 'Enable land cover analysis to get detailed classification of different land types in your selected area.',
+        position: 'right'
+    },
+    {
+        element: '.legend',
+        intro: 'Reference this legend to understand the visualization of your analysis results.',
+        position: 'right'
+    }
+];
+
+// Initialize the tour
+const tour = introJs();
+tour.setOptions({
+    steps: tourSteps,
+    showProgress: true,
+    showBullets: false,
+    showStepNumbers: true,
+    exitOnOverlayClick: false,
+    exitOnEsc: true,
+    nextLabel: 'Next →',
+    prevLabel: '← Back',
+    doneLabel: 'Finish',
+    overlayOpacity: 0.5,
+    scrollToElement: true,
+    disableInteraction: false
+});
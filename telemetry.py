@@ -0,0 +1,385 @@
+"""Structured logging and tracing spans.
+
+Logging: `configure_logging()` sets up the root logger. LOG_LEVEL defaults to
+INFO, and LOG_FORMAT is `text` (default) or `json`. Every record carries the
+current request id from the cancellation token, so log lines can be matched to
+a request. Fields passed with `extra={...}` are kept in JSON output and appended
+as key=value pairs in text output.
+
+Tracing: every request gets a root span. Analysis functions decorated with
+`@traced(...)` and every Earth Engine round trip get child spans. A span records
+its duration, its attributes (dataset, scale, AOI area) and the number of EE
+round trips made inside it. TRACE_EXPORTER chooses where finished spans go:
+
+- `none` (default): spans are only logged at DEBUG.
+- `file`: one JSON object per span is appended to TRACE_FILE.
+- `otlp`: spans are batched and POSTed as OTLP/JSON to
+  OTEL_EXPORTER_OTLP_ENDPOINT + /v1/traces.
+"""
+import contextlib
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import math
+import os
+import queue
+import threading
+import time
+import urllib.request
+import uuid
+
+from flask import g, request
+
+import cancellation
+import ee_calls
+
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text')
+
+TRACE_EXPORTER = os.environ.get('TRACE_EXPORTER', 'none')
+TRACE_FILE = os.environ.get('TRACE_FILE', 'traces.jsonl')
+OTLP_ENDPOINT = os.environ.get('OTEL_EXPORTER_OTLP_ENDPOINT', 'http://localhost:4318')
+SERVICE_NAME = os.environ.get('OTEL_SERVICE_NAME', 'land-area-analysis')
+
+# Static assets and map tiles are requested many times per page view; their
+# request lines are logged at DEBUG unless they fail
+QUIET_PATH_PREFIXES = ('/assets/', '/static/', '/vt/', '/raster_tiles/')
+
+# Spans are exported in batches of up to this many, at least this often
+EXPORT_BATCH_SIZE = 256
+EXPORT_INTERVAL_SECONDS = 5.0
+
+EARTH_RADIUS_KM = 6371.0088
+
+# LogRecord attributes that are not user-supplied `extra` fields
+_RECORD_FIELDS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'request_id'}
+
+logger = logging.getLogger(__name__)
+
+
+# --- Logging ---------------------------------------------------------------
+
+class RequestIdFilter(logging.Filter):
+    """Adds the current request id to every record."""
+
+    def filter(self, record):
+        token = cancellation.current_token()
+        record.request_id = token.request_id if token is not None else '-'
+        return True
+
+
+def _extra_fields(record):
+    return {key: value for key, value in vars(record).items() if key not in _RECORD_FIELDS}
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s')
+
+    def format(self, record):
+        line = super().format(record)
+        extra = _extra_fields(record)
+        if extra:
+            line += ' ' + ' '.join(f"{key}={value}" for key, value in extra.items())
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'request_id': record.request_id,
+            'message': record.getMessage()
+        }
+        entry.update(_extra_fields(record))
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(level=LOG_LEVEL, fmt=LOG_FORMAT):
+    """Send all logging to stderr with the request id attached. Safe to call repeatedly."""
+    root = logging.getLogger()
+    for handler in root.handlers:
+        if getattr(handler, '_landarea', False):
+            return
+    handler = logging.StreamHandler()
+    handler._landarea = True
+    handler.addFilter(RequestIdFilter())
+    handler.setFormatter(JsonFormatter() if fmt == 'json' else TextFormatter())
+    root.addHandler(handler)
+    root.setLevel(level)
+
+
+# --- Spans -----------------------------------------------------------------
+
+class Span:
+    """A timed operation with attributes, nested under the span that was current when it started."""
+
+    def __init__(self, name, trace_id, parent=None, attributes=None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent = parent
+        self.attributes = dict(attributes or {})
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.error = None
+        self.round_trips = 0
+        self.ee_time_ms = 0.0
+
+    @property
+    def duration_ms(self):
+        end = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end - self.start_ns) / 1e6
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def to_dict(self):
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent.span_id if self.parent else None,
+            'name': self.name,
+            'start_time_ns': self.start_ns,
+            'end_time_ns': self.end_ns,
+            'duration_ms': round(self.duration_ms, 2),
+            'ee_round_trips': self.round_trips,
+            'ee_time_ms': round(self.ee_time_ms, 2),
+            'attributes': self.attributes,
+            'error': self.error
+        }
+
+
+_current_span = contextvars.ContextVar('current_span', default=None)
+
+
+def current_span():
+    return _current_span.get()
+
+
+@contextlib.contextmanager
+def span(name, **attributes):
+    """Run the block inside a child span of the current span (or a new trace)."""
+    parent = _current_span.get()
+    trace_id = parent.trace_id if parent is not None else uuid.uuid4().hex
+    current = Span(name, trace_id, parent, attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except Exception as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current_span.reset(token)
+        _finish(current)
+
+
+def aoi_area_km2(coordinates):
+    """Approximate area of a lon/lat ring in km², computed locally without an EE call."""
+    if not coordinates or len(coordinates) < 3:
+        return 0.0
+    mean_lat = math.radians(sum(lat for _, lat in coordinates) / len(coordinates))
+    points = [
+        (math.radians(lon) * math.cos(mean_lat) * EARTH_RADIUS_KM, math.radians(lat) * EARTH_RADIUS_KM)
+        for lon, lat in coordinates
+    ]
+    twice_area = sum(x1 * y2 - x2 * y1 for (x1, y1), (x2, y2) in zip(points, points[1:] + points[:1]))
+    return round(abs(twice_area) / 2, 3)
+
+
+def traced(name=None, **attributes):
+    """Decorator running a function in a span, with the AOI area taken from its `coordinates` argument.
+
+    Arguments of the call (or their defaults) such as `scale` or `dataset`
+    override the attributes given to the decorator.
+    """
+    def decorator(func):
+        span_name = name or func.__name__
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            span_attributes = dict(attributes)
+            bound = signature.bind_partial(*args, **kwargs)
+            bound.apply_defaults()
+            for key in ('dataset', 'scale', 'year', 'start_year', 'end_year', 'mode'):
+                if bound.arguments.get(key) is not None:
+                    span_attributes[key] = bound.arguments[key]
+            if 'coordinates' in bound.arguments:
+                span_attributes['aoi_area_km2'] = aoi_area_km2(bound.arguments['coordinates'])
+            with span(span_name, **span_attributes):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _tracing_interceptor(name, call, *args, **kwargs):
+    parent = _current_span.get()
+    if parent is None:
+        return call(*args, **kwargs)
+    with span(f"ee.{name}") as ee_span:
+        try:
+            return call(*args, **kwargs)
+        finally:
+            # Count the round trip on every enclosing span
+            ancestor = parent
+            while ancestor is not None:
+                ancestor.round_trips += 1
+                ancestor.ee_time_ms += ee_span.duration_ms
+                ancestor = ancestor.parent
+
+
+def _finish(finished):
+    finished.end_ns = time.time_ns()
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("span %s finished", finished.name, extra={
+            'duration_ms': round(finished.duration_ms, 2),
+            'ee_round_trips': finished.round_trips,
+            **finished.attributes
+        })
+    if _exporter is not None:
+        _exporter.submit(finished)
+
+
+# --- Exporters -------------------------------------------------------------
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def _otlp_span(finished):
+    attributes = dict(finished.attributes)
+    attributes['ee.round_trips'] = finished.round_trips
+    attributes['ee.time_ms'] = round(finished.ee_time_ms, 2)
+    otlp = {
+        'traceId': finished.trace_id,
+        'spanId': finished.span_id,
+        'name': finished.name,
+        'kind': 2 if finished.parent is None else 1,
+        'startTimeUnixNano': str(finished.start_ns),
+        'endTimeUnixNano': str(finished.end_ns),
+        'attributes': [{'key': key, 'value': _otlp_value(value)} for key, value in attributes.items()],
+        'status': {'code': 2, 'message': finished.error} if finished.error else {'code': 1}
+    }
+    if finished.parent is not None:
+        otlp['parentSpanId'] = finished.parent.span_id
+    return otlp
+
+
+class SpanExporter(threading.Thread):
+    """Exports finished spans in batches from a background thread."""
+
+    def __init__(self, kind):
+        super().__init__(name=f"span-exporter-{kind}", daemon=True)
+        self.kind = kind
+        self.queue = queue.Queue(maxsize=10000)
+
+    def submit(self, finished):
+        try:
+            self.queue.put_nowait(finished)
+        except queue.Full:
+            pass
+
+    def run(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + EXPORT_INTERVAL_SECONDS
+            while len(batch) < EXPORT_BATCH_SIZE:
+                try:
+                    batch.append(self.queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            try:
+                self.export(batch)
+            except Exception as e:
+                logger.warning("Failed to export %d spans: %s", len(batch), e)
+
+    def export(self, batch):
+        if self.kind == 'file':
+            with open(TRACE_FILE, 'a') as f:
+                for finished in batch:
+                    f.write(json.dumps(finished.to_dict(), default=str) + '\n')
+            return
+
+        payload = {
+            'resourceSpans': [{
+                'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': SERVICE_NAME}}]},
+                'scopeSpans': [{'scope': {'name': 'landarea'}, 'spans': [_otlp_span(s) for s in batch]}]
+            }]
+        }
+        req = urllib.request.Request(
+            OTLP_ENDPOINT.rstrip('/') + '/v1/traces',
+            data=json.dumps(payload, default=str).encode('utf-8'),
+            headers={'Content-Type': 'application/json'},
+            method='POST'
+        )
+        urllib.request.urlopen(req, timeout=10).close()
+
+
+_exporter = None
+
+
+def _start_exporter(kind=TRACE_EXPORTER):
+    global _exporter
+    if kind in ('file', 'otlp') and _exporter is None:
+        _exporter = SpanExporter(kind)
+        _exporter.start()
+
+
+# --- Flask integration -----------------------------------------------------
+
+def init_telemetry(app):
+    """Configure logging, the span exporter and a root span for every request."""
+    configure_logging()
+    _start_exporter()
+    ee_calls.add_interceptor(_tracing_interceptor)
+    request_logger = logging.getLogger('request')
+
+    @app.before_request
+    def start_request_span():
+        token = g.get('cancellation_token')
+        root = Span(f"{request.method} {request.url_rule.rule if request.url_rule else request.path}",
+                    uuid.uuid4().hex, attributes={
+                        'http.method': request.method,
+                        'http.route': request.url_rule.rule if request.url_rule else request.path,
+                        'request_id': token.request_id if token is not None else None
+                    })
+        g.request_span = root
+        _current_span.set(root)
+
+    @app.after_request
+    def record_status(response):
+        root = g.get('request_span')
+        if root is not None:
+            root.set_attribute('http.status_code', response.status_code)
+        return response
+
+    @app.teardown_request
+    def finish_request_span(exc=None):
+        root = g.pop('request_span', None)
+        if root is None:
+            return
+        _current_span.set(None)
+        if exc is not None:
+            root.error = f"{type(exc).__name__}: {exc}"
+        _finish(root)
+        status = root.attributes.get('http.status_code', 500)
+        quiet = status < 500 and request.path.startswith(QUIET_PATH_PREFIXES)
+        request_logger.log(logging.DEBUG if quiet else logging.INFO, "%s %s", request.method, request.path, extra={
+            'status': status,
+            'duration_ms': round(root.duration_ms, 2),
+            'ee_round_trips': root.round_trips,
+            'ee_time_ms': round(root.ee_time_ms, 2)
+        })
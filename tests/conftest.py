@@ -0,0 +1,35 @@
+"""Run the tests against the synthetic Earth Engine backend, without credentials."""
+import importlib
+import os
+import sys
+import tempfile
+
+import pytest
+
+_state_dir = tempfile.mkdtemp(prefix='landarea-tests-')
+os.environ.setdefault('EE_BACKEND', 'stub')
+os.environ.setdefault('EE_STUB_LATENCY_SCALE', '0')
+os.environ.setdefault('EE_MEMO', '0')
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+os.environ.setdefault('SAVED_AREAS_PATH', os.path.join(_state_dir, 'saved_areas.sqlite3'))
+os.environ.setdefault('RASTER_CACHE_DIR', os.path.join(_state_dir, 'raster_cache'))
+os.environ.setdefault('SHARED_CACHE_PATH', os.path.join(_state_dir, 'shared_cache.sqlite3'))
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='session', autouse=True)
+def ee_backend():
+    """Initialize ee against the synthetic backend, which importing app does."""
+    importlib.import_module('app')
+
+
+@pytest.fixture
+def computed_values():
+    """Answer getInfo() calls with the values appended to the returned list, in order."""
+    import ee_calls
+    original = ee_calls.get_backend('computeValue')
+    answers = []
+    ee_calls.set_backend('computeValue', lambda obj: answers.pop(0))
+    yield answers
+    ee_calls.set_backend('computeValue', original)
@@ -0,0 +1,92 @@
+import time
+
+import pytest
+
+import admission
+import app
+from admission import ADMISSION_AGING_SECONDS, AdmissionController, AdmissionRejected, _Ticket
+
+RING = [[120.9, 14.5], [121.0, 14.5], [121.0, 14.6], [120.9, 14.6], [120.9, 14.5]]
+
+
+@pytest.fixture(autouse=True)
+def fast_polling(monkeypatch):
+    monkeypatch.setattr(admission, 'QUEUE_POLL_SECONDS', 0.01)
+
+
+def queue_ticket(controller, cost, waited):
+    ticket = _Ticket(next(controller._seq), 'get_ndvi', cost)
+    ticket.enqueued -= waited
+    controller.queue.append(ticket)
+    return ticket
+
+
+def test_waiting_halves_the_effective_cost():
+    ticket = _Ticket(0, 'get_ndvi', 80)
+    now = ticket.enqueued + 3 * ADMISSION_AGING_SECONDS
+    cost, seq = ticket.priority(now)
+    # now - enqueued is not exactly three periods in floating point
+    assert cost == pytest.approx(10)
+    assert seq == 0
+
+
+def test_aged_heavy_request_is_admitted_before_a_fresh_lighter_one():
+    controller = AdmissionController(max_running=4, max_running_cost=100)
+    running = controller.acquire('get_ndvi', 100)
+    # 80 after waiting three aging periods counts as 10, less than the fresh 30
+    heavy = queue_ticket(controller, 80, 3 * ADMISSION_AGING_SECONDS)
+    light = queue_ticket(controller, 30, 0)
+
+    controller.release(running)
+    assert heavy.admitted.is_set()
+    # 80 + 30 is over the running budget, so the lighter one keeps waiting
+    assert not light.admitted.is_set()
+
+    controller.release(heavy)
+    assert light.admitted.is_set()
+
+
+def test_without_waiting_the_cheapest_request_goes_first():
+    controller = AdmissionController(max_running=4, max_running_cost=100)
+    running = controller.acquire('get_ndvi', 100)
+    heavy = queue_ticket(controller, 80, 0)
+    light = queue_ticket(controller, 30, 0)
+
+    controller.release(running)
+    assert light.admitted.is_set() and not heavy.admitted.is_set()
+
+
+def test_fast_lane_skips_the_cost_budget_but_not_the_slot_limit():
+    controller = AdmissionController(max_running=2, max_running_cost=100)
+    controller.acquire('get_worldcover', 100)
+
+    # The cost budget is used up, but a tiny request only needs a free slot
+    started = time.monotonic()
+    controller.acquire('get_igbp', admission.ADMISSION_FAST_LANE_COST)
+    assert time.monotonic() - started < 0.05
+
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.acquire('get_igbp', admission.ADMISSION_FAST_LANE_COST, timeout=0.05)
+    assert rejected.value.status == 503 and rejected.value.retry_after == 10
+    assert controller.queue == []
+
+
+def test_budget_request_waits_then_times_out_with_retry_after():
+    controller = AdmissionController(max_running=4, max_running_cost=100)
+    controller.acquire('get_worldcover', 100)
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.acquire('get_ndvi', 5, timeout=0.05)
+    assert rejected.value.status == 503 and rejected.value.retry_after == 10
+    assert controller.rejected_total == 1
+
+
+def test_full_queue_is_rejected_with_503_and_retry_after(monkeypatch):
+    controller = AdmissionController(max_running=4, max_running_cost=100, max_queue=0)
+    controller.acquire('get_worldcover', 100)
+    monkeypatch.setattr(admission, 'admission_controller', controller)
+
+    response = app.app.test_client().post('/get_esa_worldcover', json={'coordinates': RING})
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '5'
+    assert response.get_json()['success'] is False
+    assert controller.queue == [] and controller.rejected_total == 1
@@ -0,0 +1,106 @@
+import json
+import socket
+import ssl
+
+import pytest
+from ee import serializer
+
+import app
+import cancellation
+import ee_calls
+from cancellation import CancelledError
+
+RING = [[120.9, 14.5], [121.0, 14.5], [121.0, 14.6], [120.9, 14.6], [120.9, 14.5]]
+
+
+class CancellingBackend:
+    """Cancels the current request after `after` computeValue calls; histograms come back empty."""
+
+    def __init__(self, token, after):
+        self.token = token
+        self.after = after
+        self.calls = 0
+        self.original = ee_calls.get_backend('computeValue')
+
+    def __call__(self, obj, *args, **kwargs):
+        self.calls += 1
+        if self.calls == self.after:
+            self.token.cancel('superseded')
+        if 'frequencyHistogram' in json.dumps(serializer.encode(obj, for_cloud_api=True)):
+            # Forces the per-class fallback loops
+            return {}
+        return self.original(obj, *args, **kwargs)
+
+
+@pytest.fixture
+def cancel_after(monkeypatch):
+    tokens = []
+
+    def install(after):
+        token = cancellation.register('test-request')
+        tokens.append(token)
+        backend = CancellingBackend(token, after)
+        monkeypatch.setitem(ee_calls._originals, 'computeValue', backend)
+        return backend
+
+    yield install
+    for token in tokens:
+        cancellation.release(token)
+
+
+@pytest.mark.parametrize('analysis', [
+    lambda: app.get_igbp_land_cover('2020-01-01', '2020-12-31', RING),
+    lambda: app.get_esa_worldcover(RING),
+], ids=['igbp', 'worldcover'])
+def test_cancellation_in_per_class_loop_reaches_caller(cancel_after, analysis):
+    # Area, histogram, then two classes of the fallback loop before the cancel
+    backend = cancel_after(4)
+    with pytest.raises(CancelledError):
+        analysis()
+    # Nothing is evaluated after the cancellation
+    assert backend.calls == 4
+
+
+def test_cancelled_year_is_not_reported_as_missing_data(cancel_after):
+    cancel_after(1)
+    with pytest.raises(CancelledError):
+        app.get_dynamic_world_for_year(2022, RING)
+
+
+def test_cancelled_transition_matrix_is_not_wrapped(cancel_after):
+    # Cancelled during the histogram, before the map id of the changed pixels
+    cancel_after(1)
+    with pytest.raises(CancelledError):
+        app.get_land_cover_transitions('dynamic_world', 2020, 2022, RING, include_map=True)
+
+
+def test_client_disconnected_peeks_at_the_request_socket():
+    server, client = socket.socketpair()
+    with server:
+        environ = {'werkzeug.socket': server}
+        assert not cancellation.client_disconnected(environ)
+        client.sendall(b'x')
+        assert not cancellation.client_disconnected(environ)
+        server.recv(1)
+        client.close()
+        assert cancellation.client_disconnected(environ)
+    assert not cancellation.client_disconnected({})
+
+
+def test_tls_sockets_are_never_reported_as_disconnected():
+    server, client = socket.socketpair()
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    with context.wrap_socket(server, server_hostname='localhost', do_handshake_on_connect=False) as tls:
+        # SSLSocket.recv() rejects the peek flags with ValueError
+        with pytest.raises(ValueError):
+            tls.recv(1, socket.MSG_PEEK | socket.MSG_DONTWAIT)
+        client.close()
+        assert not cancellation.client_disconnected({'gunicorn.socket': tls})
+
+
+def test_value_errors_from_the_socket_are_not_a_disconnect():
+    class Unpeekable:
+        def recv(self, size, flags):
+            raise ValueError('non-zero flags not allowed')
+
+    assert not cancellation.client_disconnected({'gunicorn.socket': Unpeekable()})
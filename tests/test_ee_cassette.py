@@ -0,0 +1,94 @@
+import json
+
+import ee
+import pytest
+
+import app
+import ee_calls
+from ee_cassette import CassettePlayer, CassetteRecorder
+
+RING = [[122.9, 13.5], [123.0, 13.5], [123.0, 13.6], [122.9, 13.6], [122.9, 13.5]]
+
+
+@pytest.fixture
+def backends():
+    """Restore the stub backends after a test swaps them for a recorder or player."""
+    saved = {name: ee_calls.get_backend(name) for name in ee_calls.INTERCEPTED_CALLS}
+    yield saved
+    for name, backend in saved.items():
+        ee_calls.set_backend(name, backend)
+
+
+def record(path, backends):
+    recorder = CassetteRecorder(str(path))
+    for name, backend in backends.items():
+        ee_calls.set_backend(name, recorder.wrap(name, backend))
+    return recorder
+
+
+def play(path):
+    player = CassettePlayer(str(path), latency_scale=0)
+    for name in ee_calls.INTERCEPTED_CALLS:
+        ee_calls.set_backend(name, player.play(name))
+    return player
+
+
+def test_recorded_route_replays_the_same_response(tmp_path, backends):
+    cassette = tmp_path / 'cassette.jsonl'
+    client = app.app.test_client()
+    body = {'coordinates': RING, 'start_date': '2021-01-01', 'end_date': '2021-12-31'}
+
+    record(cassette, backends)
+    recorded = client.post('/get_esa_worldcover', json=body).get_json()
+    assert recorded['success']
+    entries = [json.loads(line) for line in cassette.read_text().splitlines()]
+    assert {entry['call'] for entry in entries} == {'computeValue', 'getMapId'}
+    assert all(entry['latency_ms'] >= 0 for entry in entries)
+
+    # The stub is out of the loop now; every call must come from the cassette
+    play(cassette)
+    assert client.post('/get_esa_worldcover', json=body).get_json() == recorded
+
+
+def test_replay_miss_raises_ee_exception(tmp_path, backends):
+    cassette = tmp_path / 'cassette.jsonl'
+    record(cassette, backends)
+    ee.Number(1).add(2).getInfo()
+
+    play(cassette)
+    with pytest.raises(ee.EEException, match='computeValue call not found in the cassette'):
+        ee.Number(1).add(3).getInfo()
+
+    data = app.app.test_client().post('/get_esa_worldcover', json={'coordinates': RING}).get_json()
+    assert not data['success'] and 'not found in the cassette' in data['error']
+
+
+def test_repeated_calls_and_errors_replay_in_recorded_order(tmp_path):
+    answers = iter([1, ee.EEException('Computation timed out.'), 3])
+
+    def flaky(obj):
+        answer = next(answers)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+    recorder = CassetteRecorder(str(tmp_path / 'cassette.jsonl'))
+    call = recorder.wrap('computeValue', flaky)
+    expression = ee.Number(5)
+    results = []
+    for _ in range(3):
+        try:
+            results.append(call(expression))
+        except ee.EEException as e:
+            results.append(str(e))
+    assert results == [1, 'Computation timed out.', 3]
+
+    replay = CassettePlayer(str(tmp_path / 'cassette.jsonl'), latency_scale=0).play('computeValue')
+    replayed = []
+    for _ in range(4):
+        try:
+            replayed.append(replay(expression))
+        except ee.EEException as e:
+            replayed.append(str(e))
+    # After the last recording, replay starts over
+    assert replayed == [1, 'Computation timed out.', 3, 1]
@@ -0,0 +1,55 @@
+import datetime
+import os
+
+import google.auth.credentials
+import pytest
+
+from ee_credentials import ManagedCredentials, _utcnow
+
+
+class FakeCredentials(google.auth.credentials.Credentials):
+    def refresh(self, request):
+        self.token = f"token-{_utcnow().timestamp()}"
+        self.expiry = _utcnow() + datetime.timedelta(hours=1)
+
+
+def run_in_child(check):
+    """Fork, run `check()` in the child and return whether it returned True."""
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os._exit(0 if check() else 1)
+        except BaseException:
+            os._exit(2)
+    _, status = os.waitpid(pid, 0)
+    return os.waitstatus_to_exitcode(status) == 0
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs fork')
+def test_child_forked_mid_refresh_gets_its_own_lock_and_refresher():
+    credentials = ManagedCredentials(FakeCredentials()).start()
+    # The parent is refreshing when it forks, so the inherited lock stays held in the child
+    credentials._refresh_lock.acquire()
+    try:
+        def check():
+            credentials._after_fork_in_child()
+            return (credentials._refresh_lock.acquire(timeout=1)
+                    and not credentials._stopped.is_set()
+                    and credentials._thread.is_alive())
+
+        assert run_in_child(check)
+    finally:
+        credentials._refresh_lock.release()
+        credentials.stop()
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs fork')
+def test_stopped_refresher_stays_stopped_in_the_child():
+    credentials = ManagedCredentials(FakeCredentials()).start()
+    credentials.stop()
+
+    def check():
+        credentials._after_fork_in_child()
+        return credentials._thread is None and credentials.valid
+
+    assert run_in_child(check)
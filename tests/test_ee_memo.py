@@ -0,0 +1,153 @@
+import json
+import threading
+import time
+
+import ee
+import pytest
+
+import ee_memo
+from ee_memo import ExpressionCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeComputeValue:
+    """Counts calls and answers with the serialized expression it was given."""
+
+    def __init__(self, delay=0):
+        self.delay = delay
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, obj):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        return {'expression': json.dumps(ee.serializer.encode(obj), sort_keys=True)}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(ee_memo.time, 'monotonic', clock)
+    return clock
+
+
+@pytest.fixture
+def memo(monkeypatch):
+    """A fresh in-process cache behind the interceptor, without the shared cache."""
+    cache = ExpressionCache(ttl=60)
+    monkeypatch.setattr(ee_memo, 'expression_cache', cache)
+    monkeypatch.setattr(ee_memo, 'shared_cache', None)
+    return cache
+
+
+def memoized(compute_value, obj):
+    return ee_memo._memo_interceptor('computeValue', compute_value, obj)
+
+
+def test_identical_expressions_are_computed_once(memo):
+    compute_value = FakeComputeValue()
+    first = memoized(compute_value, ee.Number(1).add(2))
+    # Built again from scratch, the graph serializes the same
+    second = memoized(compute_value, ee.Number(1).add(2))
+    assert first == second and compute_value.calls == 1
+
+    memoized(compute_value, ee.Number(1).add(3))
+    assert compute_value.calls == 2
+    assert memo.stats()['hits'] == 1 and memo.stats()['misses'] == 2
+
+
+def test_callers_get_their_own_copy(memo):
+    result = memoized(FakeComputeValue(), ee.Number(5))
+    result['expression'] = 'changed'
+    assert memoized(FakeComputeValue(), ee.Number(5))['expression'] != 'changed'
+
+
+def test_entries_expire_after_the_ttl(clock):
+    cache = ExpressionCache(ttl=60)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return len(calls)
+
+    assert cache.get_or_compute('k', compute) == 1
+    clock.now += 59
+    assert cache.get_or_compute('k', compute) == 1
+    clock.now += 2
+    assert cache.get_or_compute('k', compute) == 2
+    assert cache.stats()['entries'] == 1
+
+
+def test_least_recently_used_entries_are_evicted_beyond_the_byte_budget():
+    # Each value encodes to 3 bytes, so the budget holds two
+    cache = ExpressionCache(max_bytes=6)
+    for key in ('a', 'b'):
+        cache.get_or_compute(key, lambda: 100)
+    # Using "a" makes "b" the least recently used
+    cache.get_or_compute('a', lambda: pytest.fail('a should be cached'))
+    cache.get_or_compute('c', lambda: 100)
+
+    assert list(cache._entries) == ['a', 'c']
+    assert cache.stats()['bytes'] == 6 and cache.stats()['evictions'] == 1
+
+
+def test_results_over_the_entry_limit_are_not_kept():
+    cache = ExpressionCache(max_entry_bytes=4)
+    cache.get_or_compute('small', lambda: 1)
+    cache.get_or_compute('large', lambda: 'x' * 10)
+    assert list(cache._entries) == ['small']
+
+
+def test_concurrent_identical_calls_share_one_evaluation(memo):
+    compute_value = FakeComputeValue(delay=0.1)
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(memoized(compute_value, ee.Number(7).multiply(6))))
+        for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert compute_value.calls == 1
+    assert len(results) == 5 and all(result == results[0] for result in results)
+    assert memo.stats()['misses'] == 1 and memo.stats()['hits'] == 4
+
+
+def test_errors_are_not_cached_and_waiting_callers_retry(monkeypatch):
+    monkeypatch.setattr(ee_memo, 'WAIT_POLL_SECONDS', 0.01)
+    cache = ExpressionCache()
+    leader_started = threading.Event()
+    calls = []
+
+    def failing():
+        calls.append('failed')
+        leader_started.set()
+        time.sleep(0.05)
+        raise ee.EEException('Computation timed out.')
+
+    def succeeding():
+        calls.append('ok')
+        return 42
+
+    follower_result = []
+    leader = threading.Thread(target=lambda: pytest.raises(ee.EEException, cache.get_or_compute, 'k', failing))
+    leader.start()
+    leader_started.wait()
+    follower = threading.Thread(target=lambda: follower_result.append(cache.get_or_compute('k', succeeding)))
+    follower.start()
+    leader.join()
+    follower.join()
+
+    # The follower waited for the failed call, then evaluated the expression itself
+    assert calls == ['failed', 'ok'] and follower_result == [42]
+    assert cache.get_or_compute('k', failing) == 42
@@ -0,0 +1,50 @@
+import ee
+import numpy as np
+import pytest
+
+import app
+import ee_stub
+from raster_cache import RasterGrid, fetch_with_sample_rectangle
+
+RING = [[120.9, 14.5], [121.0, 14.5], [121.0, 14.6], [120.9, 14.6], [120.9, 14.5]]
+
+
+def test_sample_rectangle_returns_a_block_of_the_requested_grid():
+    grid = RasterGrid(120.9, 14.6, 0.001, 40, 25)
+    block = fetch_with_sample_rectangle(ee.Image('ESA/WorldCover/v100').select('Map'), grid, 'Map', 255)
+    assert block.shape == (25, 40)
+    assert set(np.unique(block)) <= set(ee_stub.BAND_CLASSES['Map'])
+
+
+def test_sample_rectangle_enforces_the_pixel_limit():
+    grid = RasterGrid(120.9, 14.6, 0.0001, 600, 600)
+    with pytest.raises(ee.EEException, match='Too many pixels'):
+        fetch_with_sample_rectangle(ee.Image('ESA/WorldCover/v100').select('Map'), grid, 'Map', 255)
+
+
+def test_compute_pixels_returns_a_structured_array_per_band():
+    image = ee.Image('GOOGLE/DYNAMICWORLD/V1').select(['label'])
+    result = ee_stub.SyntheticBackend().compute_pixels({
+        'expression': image,
+        'grid': {'dimensions': {'width': 7, 'height': 3}}
+    })
+    assert result.dtype.names == ('label',)
+    assert result['label'].shape == (3, 7)
+    assert set(np.unique(result['label'])) <= set(ee_stub.BAND_CLASSES['label'])
+
+
+@pytest.mark.parametrize('dataset, params', [
+    ('ndvi', {'start_date': '2022-01-01', 'end_date': '2022-12-31'}),
+    ('igbp', {}),
+    ('worldcover', {}),
+    ('dynamic_world', {'year': 2022}),
+])
+def test_cached_stats_run_under_the_stub(dataset, params):
+    client = app.app.test_client()
+    body = {'dataset': dataset, 'coordinates': RING, **params}
+    first = client.post('/cached_stats', json=body).get_json()
+    assert first['success'], first.get('error')
+    assert first['statistics']['area_stats']
+
+    second = client.post('/cached_stats', json=body).get_json()
+    assert second['cache_hit'] and second['raster_key'] == first['raster_key']
@@ -0,0 +1,119 @@
+import gzip
+import http.server
+import os
+import socketserver
+import threading
+
+import httplib2
+import pytest
+
+from ee_transport import PooledHttp
+
+BODY = b'{"result": {"value": 42}}'
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def _respond(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+        status = 404 if self.path == '/missing' else 200
+        body = gzip.compress(BODY) if self.path == '/gzip' else BODY
+        self.send_response(status, 'Not Here' if status == 404 else None)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('X-Request-Path', self.path)
+        if self.path == '/gzip':
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    do_GET = do_POST = do_HEAD = _respond
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Server(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+
+@pytest.fixture(scope='module')
+def base_url():
+    server = Server(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+def test_response_status_headers_and_body_match_httplib2(base_url):
+    http = PooledHttp(pool_size=2)
+    response, content = http.request(base_url + '/value', 'POST', body='{}',
+                                      headers={'Content-Type': 'application/json'})
+    assert isinstance(response, httplib2.Response)
+    assert response.status == 200 and response['status'] == '200'
+    assert response['content-type'] == 'application/json'
+    # Header names are lower-cased, as httplib2 does
+    assert response['x-request-path'] == '/value'
+    assert content == BODY
+
+    response, content = http.request(base_url + '/missing')
+    assert response.status == 404 and response.reason == 'Not Here'
+    assert content == BODY
+
+
+def test_compressed_bodies_are_decoded_like_httplib2(base_url):
+    http = PooledHttp(pool_size=2)
+    response, content = http.request(base_url + '/gzip')
+    assert content == BODY
+    assert 'content-encoding' not in response
+    assert response['-content-encoding'] == 'gzip'
+    assert response['content-length'] == str(len(BODY))
+
+    response, content = http.request(base_url + '/gzip', 'HEAD')
+    assert response['content-encoding'] == 'gzip' and content == b''
+
+
+def test_connections_are_reused(base_url):
+    http = PooledHttp(pool_size=2)
+    for _ in range(5):
+        http.request(base_url + '/value')
+    snapshot = http.metrics.snapshot()
+    assert snapshot['requests'] == 5 and snapshot['connections_opened'] == 1
+    assert snapshot['in_use'] == 0 and snapshot['connection_reuse'] == 0.8
+
+
+def test_connection_failures_raise_what_httplib2_raises():
+    http = PooledHttp(pool_size=1, timeout=1)
+    with socketserver.TCPServer(('127.0.0.1', 0), None) as closed:
+        port = closed.server_address[1]
+    with pytest.raises(ConnectionError):
+        http.request(f"http://127.0.0.1:{port}/value")
+    assert http.metrics.snapshot()['errors'] == 1
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs fork')
+def test_pool_is_created_lazily_and_again_in_a_forked_child(base_url):
+    http = PooledHttp(pool_size=2)
+    assert http._pool is None
+    # The master sends requests before forking, as ee.Initialize() does
+    http.request(base_url + '/value')
+    parent_pool = http.pool
+
+    pid = os.fork()
+    if pid == 0:
+        try:
+            response, _ = http.request(base_url + '/value')
+            ok = http.pool is not parent_pool and response.status == 200
+            ok = ok and http.metrics.snapshot()['requests'] == 1
+            os._exit(0 if ok else 1)
+        except BaseException:
+            os._exit(2)
+    _, status = os.waitpid(pid, 0)
+
+    assert os.waitstatus_to_exitcode(status) == 0
+    assert http.pool is parent_pool
+    assert http.metrics.snapshot()['requests'] == 1
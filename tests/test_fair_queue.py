@@ -0,0 +1,120 @@
+import collections
+import threading
+import types
+
+import pytest
+
+import app
+import fair_queue
+from fair_queue import FairScheduler
+
+WEIGHTS = {'interactive': 4, 'api': 1, 'other': 2}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = Clock()
+    monkeypatch.setattr(fair_queue, 'time', types.SimpleNamespace(monotonic=fake.monotonic))
+    return fake
+
+
+def enqueue(scheduler, client_id, client_class, calls):
+    """Queue `calls` waiting EE calls for a client, as blocked acquire() calls would."""
+    with scheduler._lock:
+        client = scheduler._client(client_id, client_class)
+        waiters = [{'event': threading.Event(), 'charge': None} for _ in range(calls)]
+        client.waiting.extend(waiters)
+    return waiters
+
+
+def run_calls(scheduler, clock, grant, count, seconds=1.0):
+    """Run `count` one-second calls on a single slot; returns the client id of each granted call."""
+    order = []
+    for _ in range(count):
+        clock.now += seconds
+        waiting = {id(w): (c, w) for c in scheduler.clients.values() for w in c.waiting}
+        scheduler.release(grant)
+        granted = [(c, w) for c, w in waiting.values() if w['event'].is_set()]
+        assert len(granted) == 1
+        client, waiter = granted[0]
+        order.append(client.client_id)
+        grant = (client, waiter['charge'], clock.now)
+    return order, grant
+
+
+def test_batch_client_uses_every_slot_while_alone(clock):
+    scheduler = FairScheduler(slots=2, weights=WEIGHTS)
+    first = scheduler.acquire('batch', 'api')
+    second = scheduler.acquire('batch', 'api')
+    assert scheduler.in_use == 2
+    scheduler.release(first)
+    scheduler.release(second)
+    assert scheduler.in_use == 0
+
+
+def test_equal_weights_share_the_slot_equally(clock):
+    scheduler = FairScheduler(slots=1, weights=WEIGHTS)
+    grant = scheduler.acquire('a', 'other')
+    enqueue(scheduler, 'a', 'other', 30)
+    enqueue(scheduler, 'b', 'other', 30)
+
+    order, _ = run_calls(scheduler, clock, grant, 40)
+    counts = collections.Counter(order)
+    assert abs(counts['a'] - counts['b']) <= 1
+    # No client gets more than one call ahead of the other
+    assert all(order[i] != order[i + 1] or order[i] != order[i + 2] for i in range(len(order) - 2))
+
+
+def test_interactive_client_gets_its_weighted_share_against_a_batch(clock):
+    scheduler = FairScheduler(slots=1, weights=WEIGHTS)
+    grant = scheduler.acquire('batch', 'api')
+    enqueue(scheduler, 'batch', 'api', 100)
+    enqueue(scheduler, 'ui', 'interactive', 100)
+
+    order, _ = run_calls(scheduler, clock, grant, 50)
+    # Weights 4:1, so the interactive client gets four of every five calls
+    assert collections.Counter(order)['ui'] == 40
+    assert 'batch' in order[:5]
+
+
+def test_returning_client_does_not_bank_idle_time(clock):
+    scheduler = FairScheduler(slots=1, weights=WEIGHTS)
+    grant = scheduler.acquire('a', 'other')
+    enqueue(scheduler, 'a', 'other', 60)
+    _, grant = run_calls(scheduler, clock, grant, 20)
+
+    # b was idle while a ran 20 calls; it starts level with a instead of 20 calls ahead
+    enqueue(scheduler, 'b', 'other', 30)
+    order, _ = run_calls(scheduler, clock, grant, 10)
+    assert collections.Counter(order)['b'] in (5, 6)
+
+
+def test_only_server_issued_sessions_are_interactive():
+    cookie = fair_queue.issue_session()
+    assert fair_queue.identify_client({}, '10.0.0.1', {'fair_session': cookie})[1] == 'interactive'
+    # A header, or a cookie the server did not sign, is an ordinary client
+    assert fair_queue.identify_client({'X-Client-Session': 'abc'}, '10.0.0.1') == ('addr:10.0.0.1', 'other')
+    forged = cookie.rsplit('.', 1)[0] + '.' + '0' * 64
+    assert fair_queue.identify_client({}, '10.0.0.1', {'fair_session': forged})[1] == 'other'
+    assert fair_queue.identify_client({}, '10.0.0.1', {'fair_session': 'no-signature'})[1] == 'other'
+    # API keys take precedence
+    assert fair_queue.identify_client({'X-API-Key': 'k'}, '10.0.0.1', {'fair_session': cookie})[1] == 'api'
+
+
+def test_pages_issue_the_session_cookie_once():
+    client = app.app.test_client()
+    first = client.get('/')
+    cookie = first.headers['Set-Cookie']
+    assert cookie.startswith('fair_session=') and 'HttpOnly' in cookie
+    assert fair_queue.verify_session(client.get_cookie('fair_session').value)
+    # The browser sends it back, so it is not issued again; JSON routes never issue it
+    assert 'Set-Cookie' not in client.get('/').headers
+    assert 'Set-Cookie' not in app.app.test_client().get('/fair-queue').headers
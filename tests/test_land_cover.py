@@ -0,0 +1,121 @@
+import json
+
+import ee
+import pytest
+from ee import serializer
+
+import app
+
+RING = [[120.9, 14.5], [121.0, 14.5], [121.0, 14.6], [120.9, 14.6], [120.9, 14.5]]
+
+
+def test_packed_transition_codes_decode_into_class_pairs(computed_values):
+    # IGBP packs from * 100 + to; 17 -> 1 and 12 -> 12 are kept, unknown classes are dropped
+    computed_values.append({'transition': {'1701': 4, '1212': 10, '101': 2.5, '1899': 7, '5': 1}})
+    result = app.get_land_cover_transitions('igbp', 2015, 2020, RING)
+    matrix = result['matrix_hectares']
+    pixel_hectares = 500 * 500 / 10000
+
+    assert matrix[16][0] == 4 * pixel_hectares
+    assert matrix[11][11] == 10 * pixel_hectares
+    assert matrix[0][0] == 2.5 * pixel_hectares
+    assert sum(map(sum, matrix)) == 16.5 * pixel_hectares
+    assert result['unchanged_area_hectares'] == 12.5 * pixel_hectares
+    assert result['changed_area_hectares'] == 4 * pixel_hectares
+    assert result['from_totals_hectares']['Water Bodies'] == 4 * pixel_hectares
+    assert result['to_totals_hectares']['Evergreen Needleleaf Forest'] == 6.5 * pixel_hectares
+
+
+def test_dynamic_world_transitions_use_a_multiplier_of_ten(computed_values):
+    # Float keys as frequencyHistogram returns them: 6.0 is water (0) -> built (6)
+    computed_values.append({'transition': {'6.0': 3, '16': 5}})
+    result = app.get_land_cover_transitions('dynamic_world', 2018, 2023, RING)
+    assert [c['class_value'] for c in result['classes']] == list(range(9))
+    assert result['matrix_hectares'][0][6] == 0.03
+    assert result['matrix_hectares'][1][6] == 0.05
+    assert result['unchanged_area_hectares'] == 0
+
+
+@pytest.mark.parametrize('dataset', list(app.TRANSITION_DATASETS))
+def test_transition_matrix_route_against_the_stub(dataset):
+    data = app.app.test_client().post('/transition_matrix', json={
+        'coordinates': RING, 'dataset': dataset, 'from_year': 2018, 'to_year': 2022, 'include_map': True
+    }).get_json()
+    assert data['success']
+    transitions = data['transition_data']
+    size = len(app.TRANSITION_DATASETS[dataset]['classes'])
+    assert len(transitions['matrix_hectares']) == size
+    assert all(len(row) == size for row in transitions['matrix_hectares'])
+    # The stub packs the class values of both years, so its codes decode to known class pairs
+    assert transitions['total_area_hectares'] > 0
+    assert sum(transitions['from_totals_hectares'].values()) == pytest.approx(transitions['total_area_hectares'], abs=0.1)
+    assert transitions['tile_url']
+
+
+def test_transition_matrix_route_validates_its_input():
+    client = app.app.test_client()
+    data = client.post('/transition_matrix', json={'coordinates': RING, 'dataset': 'worldcover',
+                                                   'from_year': 2018, 'to_year': 2022}).get_json()
+    assert not data['success'] and "Unknown dataset 'worldcover'" in data['error']
+    data = client.post('/transition_matrix', json={'coordinates': RING, 'from_year': 2018}).get_json()
+    assert not data['success'] and 'from_year and to_year' in data['error']
+
+
+@pytest.fixture
+def image_counts():
+    """Make the stub report 120 Dynamic World images available and 30 used."""
+    import ee_calls
+    stub = ee_calls.get_backend('computeValue')
+
+    def compute_value(obj):
+        result = stub(obj)
+        if isinstance(result, dict) and set(result) == {'available', 'used'}:
+            return {'available': 120, 'used': 30}
+        return result
+
+    ee_calls.set_backend('computeValue', compute_value)
+    yield
+    ee_calls.set_backend('computeValue', stub)
+
+
+@pytest.mark.parametrize('strategy, sampling', [
+    ('mode', {}),
+    ('monthly_sample', {'images_per_month': app.DYNAMIC_WORLD_IMAGES_PER_MONTH}),
+    ('mean_probability', {'max_images': app.DYNAMIC_WORLD_MAX_IMAGES}),
+])
+def test_each_composite_reports_its_sampling(image_counts, strategy, sampling):
+    result = app.get_dynamic_world_for_year(2022, RING, strategy)
+    assert result['composite'] == {'strategy': strategy, 'images_available': 120, 'images_used': 30, **sampling}
+    assert result['area_stats']
+
+
+def test_monthly_sample_ranks_only_the_source_scenes_of_each_month():
+    aoi = ee.Geometry.Polygon([RING])
+    dw_col = ee.ImageCollection('GOOGLE/DYNAMICWORLD/V1').filterBounds(aoi).filterDate('2022-01-01', '2022-12-31')
+    sampled = app.sample_dynamic_world_images(dw_col, 2022, aoi, 'monthly_sample')
+    graph = json.dumps(serializer.encode(sampled, is_compound=False, for_cloud_api=True))
+    # Sentinel-2 scenes are filtered to the Dynamic World ids instead of joined to them
+    assert 'Join.apply' not in graph
+    # ee.Filter.inList() serializes as Filter.listContains
+    assert '"Filter.listContains"' in graph and '"CLOUDY_PIXEL_PERCENTAGE"' in graph
+
+
+@pytest.mark.parametrize('strategy, bound', [
+    ('monthly_sample', 12 * app.DYNAMIC_WORLD_IMAGES_PER_MONTH),
+    ('mean_probability', app.DYNAMIC_WORLD_MAX_IMAGES),
+])
+def test_sampled_composites_use_at_most_their_image_budget(strategy, bound):
+    data = app.app.test_client().post('/get_dynamic_world_for_year', json={
+        'coordinates': RING, 'year': 2021, 'composite': strategy
+    }).get_json()
+    assert data['success']
+    composite = data['dynamicworld_data']['composite']
+    assert composite['strategy'] == strategy
+    assert 0 < composite['images_used'] <= bound
+
+
+def test_unknown_composite_is_rejected():
+    data = app.app.test_client().post('/get_dynamic_world_for_year', json={
+        'coordinates': RING, 'year': 2021, 'composite': 'median'
+    }).get_json()
+    assert not data['success'] and "Unknown composite 'median'" in data['error']
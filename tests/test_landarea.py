@@ -0,0 +1,127 @@
+import json
+
+import pandas as pd
+import pytest
+
+import landarea
+from landarea import flatten_result, plan_tasks, read_checkpoint
+
+SQUARE = [[120.9, 14.5], [121.0, 14.5], [121.0, 14.6], [120.9, 14.6], [120.9, 14.5]]
+
+
+@pytest.fixture
+def aoi_file(tmp_path):
+    features = [
+        {'type': 'Feature', 'properties': {'name': name},
+         'geometry': {'type': 'Polygon', 'coordinates': [[[lon + offset, lat] for lon, lat in SQUARE]]}}
+        for name, offset in (('north', 0), ('south', 1))
+    ]
+    path = tmp_path / 'aois.geojson'
+    path.write_text(json.dumps({'type': 'FeatureCollection', 'features': features}))
+    return path
+
+
+def test_plan_has_one_task_per_aoi_analysis_and_year():
+    aois = [('a', SQUARE), ('b', SQUARE[::-1])]
+    tasks = plan_tasks(aois, ['ndvi', 'worldcover'], [2020, 2021])
+    assert [(t['aoi_id'], t['analysis'], t['year']) for t in tasks] == [
+        ('a', 'ndvi', 2020), ('a', 'ndvi', 2021), ('a', 'worldcover', None),
+        ('b', 'ndvi', 2020), ('b', 'ndvi', 2021), ('b', 'worldcover', None),
+    ]
+    assert len({t['key'] for t in tasks}) == 6
+    # The key changes with the geometry, so an edited AOI is not resumed from old results
+    assert tasks[0]['key'].split('|')[1] != tasks[3]['key'].split('|')[1]
+
+    # IGBP always analyses the latest MODIS year, so it runs once per AOI like WorldCover
+    igbp = plan_tasks(aois[:1], ['igbp'], [2015, 2016, 2017])
+    assert len(igbp) == 1 and igbp[0]['year'] is None and igbp[0]['key'].endswith('|igbp|-')
+
+    sampled = plan_tasks(aois[:1], ['dynamic_world'], [2020], 'monthly_sample')[0]
+    assert sampled['key'].endswith('|dynamic_world|2020|monthly_sample')
+    assert sampled['composite'] == 'monthly_sample'
+    assert 'composite' not in plan_tasks(aois[:1], ['dynamic_world'], [2020])[0]
+
+
+def test_results_flatten_to_one_row_per_metric():
+    task = {'aoi_id': 'a', 'analysis': 'ndvi', 'year': 2020}
+    result = {
+        'basic_stats': {'mean_ndvi': 0.41, 'max_ndvi': 0.9},
+        'area_stats': {'dense': {'area_hectares': 12.5, 'percentage': 80.0},
+                       'sparse': {'area_hectares': 3.1, 'percentage': None}},
+        'total_area_hectares': 15.6
+    }
+    assert flatten_result(task, result) == [
+        {'aoi_id': 'a', 'analysis': 'ndvi', 'year': 2020, 'data_year': 2020, 'class': None, 'metric': 'mean_ndvi', 'value': 0.41},
+        {'aoi_id': 'a', 'analysis': 'ndvi', 'year': 2020, 'data_year': 2020, 'class': None, 'metric': 'max_ndvi', 'value': 0.9},
+        {'aoi_id': 'a', 'analysis': 'ndvi', 'year': 2020, 'data_year': 2020, 'class': None, 'metric': 'total_area_hectares', 'value': 15.6},
+        {'aoi_id': 'a', 'analysis': 'ndvi', 'year': 2020, 'data_year': 2020, 'class': 'dense', 'metric': 'area_hectares', 'value': 12.5},
+        {'aoi_id': 'a', 'analysis': 'ndvi', 'year': 2020, 'data_year': 2020, 'class': 'dense', 'metric': 'percentage', 'value': 80.0},
+        {'aoi_id': 'a', 'analysis': 'ndvi', 'year': 2020, 'data_year': 2020, 'class': 'sparse', 'metric': 'area_hectares', 'value': 3.1},
+    ]
+    # Results name the year of the data they used, e.g. the latest IGBP year
+    igbp = flatten_result({'aoi_id': 'a', 'analysis': 'igbp', 'year': None}, {'year': 2023, 'total_area_hectares': 1})
+    assert igbp == [{'aoi_id': 'a', 'analysis': 'igbp', 'year': None, 'data_year': 2023,
+                     'class': None, 'metric': 'total_area_hectares', 'value': 1}]
+
+
+def test_read_checkpoint_keeps_successes_and_skips_failed_and_cut_lines(tmp_path):
+    path = tmp_path / 'run.checkpoint.jsonl'
+    assert read_checkpoint(str(path)) == {}
+    path.write_text('\n'.join([
+        json.dumps({'key': 'done', 'rows': [], 'seconds': 1}),
+        json.dumps({'key': 'failed', 'error': 'Computation timed out.', 'seconds': 2}),
+        '{"key": "cut", "ro',
+    ]))
+    assert list(read_checkpoint(str(path))) == ['done']
+
+
+def test_resumed_run_skips_finished_tasks_and_retries_failed_ones(tmp_path, aoi_file, monkeypatch):
+    output = tmp_path / 'results.csv'
+    argv = ['batch', '--aoi', str(aoi_file), '--analyses', 'ndvi,worldcover', '--years', '2020-2021',
+            '--output', str(output), '--workers', '2', '--backend', 'stub']
+    tasks = plan_tasks(landarea.load_aois(str(aoi_file)), ['ndvi', 'worldcover'], [2020, 2021])
+    assert len(tasks) == 6
+
+    ran = []
+    failing = {tasks[1]['key']}
+
+    def fake_run_task(task):
+        ran.append(task['key'])
+        if task['key'] in failing:
+            return {'key': task['key'], 'error': 'Computation timed out.', 'seconds': 0.1}
+        rows = flatten_result(task, {'total_area_hectares': 100.0})
+        return {'key': task['key'], 'rows': rows, 'seconds': 0.1}
+
+    monkeypatch.setattr(landarea, 'run_task', fake_run_task)
+
+    assert landarea.main(argv) == 1
+    assert sorted(ran) == sorted(t['key'] for t in tasks)
+    # Only the successful tasks are written
+    assert len(pd.read_csv(output)) == 5
+
+    ran.clear()
+    failing.clear()
+    assert landarea.main(argv) == 0
+    assert ran == [tasks[1]['key']]
+    frame = pd.read_csv(output)
+    assert len(frame) == 6
+    assert list(frame.columns) == landarea.OUTPUT_COLUMNS
+    assert sorted(frame['aoi_id'].unique()) == ['north', 'south']
+    assert frame.loc[frame['analysis'] == 'worldcover', 'year'].isna().all()
+
+    ran.clear()
+    assert landarea.main(argv) == 0
+    assert ran == []
+
+
+def test_batch_against_the_stub_writes_long_format_rows(tmp_path, aoi_file):
+    output = tmp_path / 'results.csv'
+    assert landarea.main(['batch', '--aoi', str(aoi_file), '--analyses', 'ndvi,igbp', '--years', '2020-2021',
+                          '--output', str(output), '--workers', '2', '--backend', 'stub']) == 0
+    frame = pd.read_csv(output)
+    assert set(frame['analysis']) == {'ndvi', 'igbp'}
+    assert frame.loc[frame['analysis'] == 'igbp', 'year'].isna().all()
+    ndvi = frame[frame['analysis'] == 'ndvi']
+    assert {'mean_ndvi', 'total_area_hectares', 'area_hectares', 'percentage'} <= set(ndvi['metric'])
+    assert ndvi.loc[ndvi['metric'] == 'mean_ndvi', 'class'].isna().all()
+    assert ndvi.loc[ndvi['metric'] == 'area_hectares', 'class'].notna().all()
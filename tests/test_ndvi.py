@@ -0,0 +1,192 @@
+import json
+
+import ee
+import pytest
+from ee import serializer
+
+import app
+
+RING = [[120.9, 14.5], [121.0, 14.5], [121.0, 14.6], [120.9, 14.6], [120.9, 14.5]]
+
+
+def invocations(obj, function_name):
+    """Arguments of every call to function_name in the serialized expression of obj."""
+    found = []
+
+    def walk(node):
+        if isinstance(node, dict):
+            invocation = node.get('functionInvocationValue')
+            if invocation and invocation.get('functionName') == function_name:
+                found.append(invocation['arguments'])
+            for value in node.values():
+                walk(value)
+        elif isinstance(node, list):
+            for value in node:
+                walk(value)
+
+    # Not compound, so shared values are inlined rather than referenced
+    walk(serializer.encode(obj, is_compound=False, for_cloud_api=True))
+    return found
+
+
+@pytest.mark.parametrize('mode', app.NDVI_COMPOSITE_MODES)
+def test_every_composite_mode_returns_statistics(mode):
+    ndvi, statistics = app.calculate_ndvi('2022-01-01', '2022-12-31', RING, mode)
+    assert isinstance(ndvi, ee.Image)
+    assert statistics['total_area_hectares'] > 0
+    assert list(statistics['area_stats']) == [name for name, _, _, _ in app.NDVI_RANGES]
+
+
+def test_get_ndvi_defaults_to_the_least_cloudy_scene():
+    client = app.app.test_client()
+    data = client.post('/get_ndvi', json={
+        'coordinates': RING, 'start_date': '2022-01-01', 'end_date': '2022-12-31'
+    }).get_json()
+    assert data['success'] and data['mode'] == 'least_cloudy'
+
+    data = client.post('/get_ndvi', json={
+        'coordinates': RING, 'start_date': '2022-01-01', 'end_date': '2022-12-31', 'mode': 'sharpest'
+    }).get_json()
+    assert not data['success'] and "Unknown composite mode 'sharpest'" in data['error']
+
+
+@pytest.mark.parametrize('mode, count', [
+    ('least_cloudy', 1),
+    ('median', app.MAX_COMPOSITE_IMAGES),
+    ('greenest', app.MAX_COMPOSITE_IMAGES),
+])
+def test_composites_keep_the_least_cloudy_scenes_without_counting_them(computed_values, mode, count):
+    aoi = ee.Geometry.Polygon([RING])
+    # Building the image makes no round trip; computed_values has no answers to give
+    image = app.build_ndvi_image('2021-01-01', '2021-12-31', aoi, mode)
+    limits = invocations(image, 'Collection.limit')
+    # A single top-k by CLOUD_COVER, and no sort() (a limit without a count)
+    assert len(limits) == 1
+    assert json.dumps(limits[0]['key']) == json.dumps({'constantValue': 'CLOUD_COVER'})
+    assert json.dumps(limits[0]['limit']) == json.dumps({'constantValue': count})
+    assert not invocations(image, 'Collection.size')
+
+
+def test_empty_composites_raise_a_readable_error(computed_values):
+    # The composite of an empty collection is fully masked, so its statistics are null
+    computed_values.append({
+        'stats': {'NDVI_mean': None, 'NDVI_min': None, 'NDVI_max': None,
+                  'NDVI_p25': None, 'NDVI_p50': None, 'NDVI_p75': None},
+        'histogram': {'bin': None}
+    })
+    with pytest.raises(Exception, match='No usable Landsat imagery found'):
+        app.calculate_ndvi('2016-02-01', '2016-02-02', RING, 'median')
+    assert not computed_values
+
+
+@pytest.mark.parametrize('edges, labels, message', [
+    ([0.5, 0.2, 0.8], None, 'strictly increasing'),
+    ([0.0, 0.3, 0.3, 0.9], None, 'strictly increasing'),
+    ([0.2], None, 'at least two values'),
+    ([-1.5, 0.0, 1.0], None, 'between -1 and 1'),
+    (['low', 0.5], None, 'list of numbers'),
+    ([0.0, 0.3, 0.9], ['sparse'], 'Expected 2 bin_labels for 3 bin_edges, got 1'),
+    ([0.0, 0.3, 0.9], ['sparse', 'dense', 'extra'], 'Expected 2 bin_labels'),
+])
+def test_invalid_bins_are_rejected(edges, labels, message):
+    with pytest.raises(Exception, match=message):
+        app.parse_ndvi_bins(edges, labels)
+
+
+def test_bins_default_to_the_standard_ranges_and_interval_labels():
+    assert app.parse_ndvi_bins() == app.NDVI_RANGES
+    assert app.parse_ndvi_bins([-0.2, 0, 0.45]) == [
+        ('ndvi_-0.2_to_0', -0.2, 0.0, 'NDVI -0.2 to 0'),
+        ('ndvi_0_to_0.45', 0.0, 0.45, 'NDVI 0 to 0.45'),
+    ]
+
+
+def test_bin_areas_come_from_one_histogram_over_the_bin_indexes(computed_values):
+    ranges = app.parse_ndvi_bins([-1, 0.2, 0.5, 1], ['bare', 'sparse', 'dense'])
+    # Bin 1 has no pixels, so fixedHistogram leaves it at zero
+    computed_values.append({
+        'stats': {'NDVI_mean': 0.41, 'NDVI_min': -0.1, 'NDVI_max': 0.9,
+                  'NDVI_p25': 0.2, 'NDVI_p50': 0.4, 'NDVI_p75': 0.6},
+        'histogram': {'bin': [[0, 100], [1, 0], [2, 300]]}
+    })
+    statistics = app.get_ndvi_statistics(ee.Image.constant(0.4), ee.Geometry.Polygon([RING]), ranges)
+
+    assert not computed_values
+    assert {name: stat['area_hectares'] for name, stat in statistics['area_stats'].items()} == {
+        'bare': 9.0, 'sparse': 0.0, 'dense': 27.0
+    }
+    assert statistics['area_stats']['dense']['percentage'] == 75.0
+    assert statistics['total_area_hectares'] == 36.0
+    assert statistics['basic_stats']['median_ndvi'] == 0.4
+
+
+def test_get_ndvi_reports_custom_bins():
+    data = app.app.test_client().post('/get_ndvi', json={
+        'coordinates': RING, 'start_date': '2022-01-01', 'end_date': '2022-12-31',
+        'bin_edges': [-1, 0.3, 1], 'bin_labels': ['open', 'vegetated']
+    }).get_json()
+    assert data['success']
+    assert list(data['statistics']['area_stats']) == ['open', 'vegetated']
+
+    data = app.app.test_client().post('/get_ndvi', json={
+        'coordinates': RING, 'start_date': '2022-01-01', 'end_date': '2022-12-31', 'bin_edges': [0.3, 0.3]
+    }).get_json()
+    assert not data['success'] and 'strictly increasing' in data['error']
+
+
+def month_entry(scenes, mean=None):
+    if mean is None:
+        # Empty months reduce to an empty dictionary; fully masked ones to null statistics
+        return {'scenes': scenes, 'stats': {} if scenes == 0 else {'NDVI_mean': None, 'NDVI_count': 0}}
+    stats = {'NDVI_mean': mean, 'NDVI_count': 1200}
+    stats.update({f"NDVI_p{p}": mean + (p - 50) / 1000 for p in app.MONTHLY_PROFILE_PERCENTILES})
+    return {'scenes': scenes, 'stats': stats}
+
+
+def test_monthly_profile_lists_empty_months(computed_values):
+    months = [month_entry(2, 0.5 + month / 100) for month in range(24)]
+    months[0] = month_entry(0)
+    months[7] = month_entry(3)
+    months[23] = month_entry(0)
+    computed_values.append(months)
+
+    profile = app.get_monthly_ndvi_profile(RING, 2020, 2021)
+    assert profile['years'] == [2020, 2021] and profile['months'] == list(range(1, 13))
+    assert profile['empty_months'] == [
+        {'year': 2020, 'month': 1, 'reason': 'no_scenes'},
+        {'year': 2020, 'month': 8, 'reason': 'all_pixels_masked'},
+        {'year': 2021, 'month': 12, 'reason': 'no_scenes'},
+    ]
+    assert profile['mean'][0][:3] == [None, 0.51, 0.52]
+    assert profile['p90'][1][11] is None and profile['p90'][1][0] == 0.66
+    assert profile['scene_count'][0][:2] == [0, 2]
+    assert profile['valid_pixels'][0][7] == 0 and profile['valid_pixels'][1][0] == 1200
+
+
+def test_monthly_profile_route_against_the_stub():
+    client = app.app.test_client()
+    data = client.post('/get_monthly_profile', json={
+        'coordinates': RING, 'start_year': 2019, 'end_year': 2021
+    }).get_json()
+    assert data['success']
+    profile = data['profile']
+    for key in ('mean', 'scene_count', 'valid_pixels', *(f"p{p}" for p in app.MONTHLY_PROFILE_PERCENTILES)):
+        assert len(profile[key]) == 3 and all(len(row) == 12 for row in profile[key])
+    assert profile['empty_months'] == []
+
+    data = client.post('/get_monthly_profile', json={
+        'coordinates': RING, 'start_year': 2010, 'end_year': 2010 + app.MAX_MONTHLY_PROFILE_YEARS
+    }).get_json()
+    assert not data['success'] and 'year range' in data['error']
+
+
+@pytest.mark.parametrize('body', [
+    {'start_year': 'last year'},
+    {'end_year': None},
+    {'scale': '30m'},
+])
+def test_monthly_profile_rejects_non_numeric_input(body):
+    response = app.app.test_client().post('/get_monthly_profile', json={'coordinates': RING, **body})
+    assert response.status_code == 200
+    data = response.get_json()
+    assert not data['success'] and 'must be whole numbers' in data['error']
@@ -0,0 +1,77 @@
+import time
+
+import pytest
+
+import app
+import cancellation
+import fair_queue
+import profiling
+import progressive
+import telemetry
+from progressive import ProgressiveAnalysis
+
+RING = [[120.9, 14.5], [121.0, 14.5], [121.0, 14.6], [120.9, 14.6], [120.9, 14.5]]
+
+
+class CollectingExporter:
+    def __init__(self):
+        self.spans = []
+
+    def submit(self, finished):
+        self.spans.append(finished)
+
+
+@pytest.fixture
+def probe(monkeypatch):
+    """A worldcover analysis that records the context each pass runs in."""
+    runs = {}
+    original = progressive._analyses['worldcover'].run
+
+    def run(data, scale):
+        runs[scale] = {
+            'client': fair_queue.current_client(),
+            'span': telemetry.current_span(),
+            'profile': profiling._current.get(),
+            'token': cancellation.current_token()
+        }
+        return original(data, scale)
+
+    monkeypatch.setitem(progressive._analyses, 'probe', ProgressiveAnalysis('probe', 'get_worldcover', 10, run))
+    return runs
+
+
+def wait_for_job(client, job_id, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = client.get(f"/progressive/jobs/{job_id}").get_json()
+        if job['stage'] in ('done', 'error'):
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def test_refinement_runs_in_its_own_trace_as_the_same_client(monkeypatch, probe):
+    exporter = CollectingExporter()
+    monkeypatch.setattr(telemetry, '_exporter', exporter)
+    client = app.app.test_client()
+
+    started = client.post('/progressive/probe', json={'coordinates': RING}, headers={'X-API-Key': 'secret'})
+    job_id = started.get_json()['job_id']
+    assert wait_for_job(client, job_id)['stage'] == 'done'
+
+    coarse, refine = probe[80], probe[10]
+    assert coarse['client'] == refine['client'] == fair_queue.identify_client({'X-API-Key': 'secret'}, None)
+
+    # Nothing else of the finished request leaks into the refinement
+    assert refine['profile'] is None
+    assert refine['token'].request_id == job_id
+    assert refine['token'] is not coarse['token']
+
+    refine_span = refine['span']
+    assert refine_span.name == 'progressive.refine' and refine_span.parent is None
+    assert refine_span.trace_id != coarse['span'].trace_id
+    assert refine_span.attributes['job_id'] == job_id
+    assert refine_span.attributes['request_trace_id'] == coarse['span'].trace_id
+
+    coarse_span = next(s for s in exporter.spans if s.name == 'progressive.coarse')
+    assert coarse_span.attributes['job_id'] == job_id
@@ -0,0 +1,165 @@
+import os
+
+import ee
+import numpy as np
+import pytest
+
+import raster_cache
+from raster_cache import RasterCache, RasterGrid
+
+BBOX = (120.9, 14.5, 120.91, 14.51)
+
+
+class FakeImage:
+    """Stands in for an ee.Image; sampleRectangle chains return `payload`."""
+
+    def __init__(self, payload=None):
+        self.payload = payload
+
+    def unmask(self, value):
+        return self
+
+    def select(self, bands):
+        return self
+
+    def reproject(self, **kwargs):
+        return self
+
+    def sampleRectangle(self, **kwargs):
+        return self
+
+    def get(self, band):
+        return self
+
+    def getInfo(self):
+        return self.payload
+
+
+def zeros_fetcher(image, grid, band, nodata):
+    return np.zeros((grid.height, grid.width), dtype=np.uint8)
+
+
+def cache_raster(cache, year):
+    return cache.get_or_fetch('dynamic_world', {'year': year}, BBOX, FakeImage(), 'label', 10, 'uint8', 255)
+
+
+def test_least_recently_used_rasters_are_evicted_beyond_the_budget(tmp_path):
+    cache = RasterCache(str(tmp_path), fetch_pixels=zeros_fetcher)
+    first = cache_raster(cache, 2020)
+    size = os.path.getsize(os.path.join(str(tmp_path), first['key'] + '.npy'))
+    cache.max_bytes = 2 * size
+
+    second = cache_raster(cache, 2021)
+    # Use the older raster last, so the newer one is the least recently used
+    os.utime(os.path.join(str(tmp_path), second['key'] + '.npy'), (1000, 1000))
+    os.utime(os.path.join(str(tmp_path), first['key'] + '.npy'), (2000, 2000))
+    cache.open(first)
+
+    third = cache_raster(cache, 2022)
+    assert set(cache.index) == {first['key'], third['key']}
+    assert sorted(os.listdir(str(tmp_path))) == sorted(
+        key + ext for key in (first['key'], third['key']) for ext in ('.json', '.npy')
+    )
+    # Reloading from disk sees the same rasters
+    assert set(RasterCache(str(tmp_path)).index) == {first['key'], third['key']}
+
+
+def test_new_raster_is_kept_even_when_larger_than_the_budget(tmp_path):
+    cache = RasterCache(str(tmp_path), fetch_pixels=zeros_fetcher, max_bytes=1)
+    cache_raster(cache, 2020)
+    latest = cache_raster(cache, 2021)
+    assert list(cache.index) == [latest['key']]
+
+
+def test_raster_evicted_by_another_process_is_fetched_again(tmp_path):
+    fetches = []
+
+    def counting_fetcher(image, grid, band, nodata):
+        fetches.append(grid)
+        return zeros_fetcher(image, grid, band, nodata)
+
+    cache = RasterCache(str(tmp_path), fetch_pixels=counting_fetcher)
+    first = cache_raster(cache, 2020)
+    # Another worker evicts the raster; this one still has it in its index
+    RasterCache(str(tmp_path))._remove(first['key'])
+    assert first['key'] in cache.index
+
+    with pytest.raises(FileNotFoundError):
+        cache.open(first)
+    assert first['key'] not in cache.index
+
+    cache.index[first['key']] = first
+    assert cache.find('dynamic_world', {'year': 2020}, BBOX) is None
+    assert first['key'] not in cache.index
+
+    refetched = cache_raster(cache, 2020)
+    assert refetched['key'] == first['key'] and len(fetches) == 2
+    grid = RasterGrid.for_bbox(BBOX, 10)
+    assert cache.open(refetched).shape == (grid.height, grid.width)
+
+
+def test_workers_fetching_the_same_raster_write_separate_temporary_files(tmp_path):
+    other = RasterCache(str(tmp_path), fetch_pixels=lambda image, grid, band, nodata: np.full(
+        (grid.height, grid.width), 2, dtype=np.uint8))
+    written_by_other = []
+
+    def fetcher(image, grid, band, nodata):
+        # Another worker, outside this process's key lock, fetches and writes the same raster meanwhile
+        if not written_by_other:
+            written_by_other.append(cache_raster(other, 2020))
+        return np.ones((grid.height, grid.width), dtype=np.uint8)
+
+    cache = RasterCache(str(tmp_path), fetch_pixels=fetcher)
+    sidecar = cache_raster(cache, 2020)
+    assert sidecar['key'] == written_by_other[0]['key']
+    # Whole rasters replace each other; neither write sees the other's partial file
+    assert (np.asarray(cache.open(sidecar)) == 1).all()
+    assert sorted(os.listdir(str(tmp_path))) == [sidecar['key'] + '.json', sidecar['key'] + '.npy']
+
+
+def test_failed_fetch_leaves_no_temporary_file(tmp_path):
+    def failing_fetcher(image, grid, band, nodata):
+        raise ee.EEException('Computation timed out.')
+
+    with pytest.raises(ee.EEException):
+        cache_raster(RasterCache(str(tmp_path), fetch_pixels=failing_fetcher), 2020)
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_lookup_finds_rasters_written_by_another_process(tmp_path):
+    reader = RasterCache(str(tmp_path), fetch_pixels=zeros_fetcher)
+    # The reader loads its (empty) index before the other worker writes anything
+    assert reader.index == {}
+
+    written = cache_raster(RasterCache(str(tmp_path), fetch_pixels=zeros_fetcher), 2020)
+    assert reader.lookup(written['key']) == written
+    assert written['key'] in reader.index
+
+    for key in ('0' * 24, '../' + written['key'], ''):
+        with pytest.raises(KeyError):
+            reader.lookup(key)
+
+
+def test_sample_rectangle_rejects_payloads_that_are_not_2d():
+    grid = RasterGrid.for_bbox(BBOX, 10)
+    with pytest.raises(Exception, match='1-D payload'):
+        raster_cache.fetch_with_sample_rectangle(FakeImage([1, 2, 3]), grid, 'label', 255)
+
+
+def test_sample_rectangle_pads_edge_blocks_with_nodata():
+    grid = RasterGrid(120.9, 14.51, 0.001, 3, 2)
+    block = raster_cache.fetch_with_sample_rectangle(FakeImage([[1, 2]]), grid, 'label', 255)
+    np.testing.assert_array_equal(block, [[1, 2, 255], [255, 255, 255]])
+
+
+@pytest.mark.parametrize('has_compute_pixels', [True, False])
+def test_default_fetcher_uses_compute_pixels_when_available(monkeypatch, has_compute_pixels):
+    if has_compute_pixels:
+        monkeypatch.setattr(ee.data, 'computePixels', lambda request: None, raising=False)
+    else:
+        monkeypatch.delattr(ee.data, 'computePixels', raising=False)
+    monkeypatch.setattr(raster_cache, 'fetch_with_compute_pixels', lambda *args: 'computePixels')
+    monkeypatch.setattr(raster_cache, 'fetch_with_sample_rectangle', lambda *args: 'sampleRectangle')
+
+    fetched = raster_cache.default_fetcher(None, None, 'label', 255)
+    assert fetched == ('computePixels' if has_compute_pixels else 'sampleRectangle')
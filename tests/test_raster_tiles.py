@@ -0,0 +1,188 @@
+import math
+import struct
+import zlib
+
+import numpy as np
+import pytest
+
+import app
+import raster_tiles
+from raster_cache import RasterGrid
+from raster_tiles import TILE_SIZE, ClassPalette, RampPalette, RasterTileRenderer, TileLRU, encode_png
+
+CLASSES = {1: {'color': 'ff0000'}, 3: {'color': '00ff00'}, 7: {'color': '0000ff'}}
+NODATA = 255
+
+
+def decode_png(png):
+    """Return (indexes, palette, transparency) of an 8-bit indexed PNG, checking every chunk CRC."""
+    assert png[:8] == b'\x89PNG\r\n\x1a\n'
+    chunks = {}
+    offset = 8
+    while offset < len(png):
+        length, = struct.unpack('>I', png[offset:offset + 4])
+        kind = png[offset + 4:offset + 8]
+        data = png[offset + 8:offset + 8 + length]
+        crc, = struct.unpack('>I', png[offset + 8 + length:offset + 12 + length])
+        assert crc == zlib.crc32(kind + data) & 0xffffffff
+        chunks.setdefault(kind, b'')
+        chunks[kind] += data
+        offset += 12 + length
+
+    width, height, depth, color_type, _, _, _ = struct.unpack('>IIBBBBB', chunks[b'IHDR'])
+    assert (depth, color_type) == (8, 3)
+    rows = np.frombuffer(zlib.decompress(chunks[b'IDAT']), dtype=np.uint8).reshape(height, width + 1)
+    # Every scanline uses filter type 0, so the rest of the row is the raw indexes
+    assert not rows[:, 0].any()
+    palette = np.frombuffer(chunks[b'PLTE'], dtype=np.uint8).reshape(-1, 3)
+    return rows[:, 1:], palette, chunks[b'tRNS']
+
+
+def test_encode_png_round_trips_indexes_and_palette():
+    indexes = np.arange(12, dtype=np.uint8).reshape(3, 4) % 3
+    colors = [[0, 0, 0], [255, 0, 0], [0, 255, 0]]
+    decoded, palette, transparency = decode_png(encode_png(indexes, colors))
+    np.testing.assert_array_equal(decoded, indexes)
+    np.testing.assert_array_equal(palette, colors)
+    # Only index 0 is transparent
+    assert transparency == b'\x00'
+
+
+def test_class_palette_indexes_known_classes_and_hides_the_rest():
+    palette = ClassPalette(CLASSES)
+    values = np.array([[1, 3, 7], [2, NODATA, 0]], dtype=np.uint8)
+    indexes = palette.indexes(values, values != NODATA)
+    # Unknown classes (2, 0) and nodata are transparent
+    np.testing.assert_array_equal(indexes, [[1, 2, 3], [0, 0, 0]])
+
+    decoded, colors, _ = decode_png(encode_png(indexes, palette.colors))
+    np.testing.assert_array_equal(decoded, indexes)
+    np.testing.assert_array_equal(colors[decoded[0]], [[255, 0, 0], [0, 255, 0], [0, 0, 255]])
+
+
+def test_ramp_palette_quantizes_ndvi_and_masks_nodata():
+    palette = RampPalette(['ff0000', 'ffff00', '008000'], -1, 1)
+    values = np.array([-1.0, 0.0, 1.0, 2.0, -3.0, np.nan, -9999.0], dtype=np.float32)
+    indexes = palette.indexes(values, values != -9999.0)
+    # Out-of-range values clip to the ends of the ramp; NaN and nodata are transparent
+    np.testing.assert_array_equal(indexes, [1, 128, 255, 255, 1, 0, 0])
+
+    assert len(palette.colors) == 256
+    assert palette.colors[1] == [255, 0, 0]
+    assert palette.colors[128] == [255, 255, 0]
+    assert palette.colors[255] == [0, 128, 0]
+
+
+class ArrayCache:
+    """Serves one in-memory raster in place of the on-disk raster cache."""
+
+    def __init__(self, sidecar, array, clips=None):
+        self.index = {sidecar['key']: sidecar}
+        self.array = array
+        self.clips = clips or {}
+
+    def lookup(self, key):
+        return self.index[key]
+
+    def load_clip(self, clip_key):
+        return self.clips[clip_key]
+
+    def open(self, sidecar):
+        return self.array
+
+
+def pixel_centres():
+    """Longitudes of the columns and latitudes of the rows of the z=0 tile."""
+    centres = (np.arange(TILE_SIZE) + 0.5) / TILE_SIZE
+    lons = -180 + centres * 360
+    lats = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * centres))))
+    return lons, lats
+
+
+@pytest.fixture
+def renderer(monkeypatch):
+    monkeypatch.setitem(raster_tiles._palettes, 'classes', ClassPalette(CLASSES))
+    grid = RasterGrid(west=0, north=40, pixel_size=10, width=3, height=4)
+    array = np.array([[1, 3, 7], [7, NODATA, 1], [3, 3, 2], [1, 1, 1]], dtype=np.uint8)
+    sidecar = {'key': 'abc', 'dataset': 'classes', 'nodata': NODATA, 'grid': grid.to_dict()}
+    # The west column of the grid, as a polygon ring
+    clips = {'west': [[0, 0], [10, 0], [10, 40], [0, 40], [0, 0]]}
+    return RasterTileRenderer(cache=ArrayCache(sidecar, array, clips), tiles=TileLRU()), grid, array
+
+
+def expected_indexes(grid, array, inside=lambda grid_row, grid_col: True):
+    """Palette indexes of the z=0 tile, sampling the grid at each tile pixel centre."""
+    palette = raster_tiles._palettes['classes']
+    lons, lats = pixel_centres()
+    expected = np.zeros((TILE_SIZE, TILE_SIZE), dtype=np.uint8)
+    for row, lat in enumerate(lats):
+        for col, lon in enumerate(lons):
+            grid_row = math.floor((grid.north - lat) / grid.pixel_size)
+            grid_col = math.floor((lon - grid.west) / grid.pixel_size)
+            if 0 <= grid_row < grid.height and 0 <= grid_col < grid.width and inside(grid_row, grid_col):
+                value = array[grid_row, grid_col]
+                expected[row, col] = palette.lut[value] if value != NODATA else 0
+    return expected
+
+
+def test_rendered_tile_is_transparent_outside_the_cached_bbox(renderer):
+    renderer, grid, array = renderer
+    png, cache_hit = renderer.get_tile('abc', 0, 0, 0)
+    assert not cache_hit
+    indexes, _, _ = decode_png(png)
+
+    expected = expected_indexes(grid, array)
+    np.testing.assert_array_equal(indexes, expected)
+    # The cached box covers a few pixels near the centre of the world tile, nothing else
+    assert expected[0, 0] == 0 and expected[-1, -1] == 0
+    assert set(np.unique(expected)) == {0, 1, 2, 3}
+
+    assert renderer.get_tile('abc', 0, 0, 0) == (png, True)
+
+
+def test_clipped_tile_is_transparent_outside_the_polygon(renderer):
+    renderer, grid, array = renderer
+    png, cache_hit = renderer.get_tile('abc', 0, 0, 0, 'west')
+    assert not cache_hit
+    expected = expected_indexes(grid, array, inside=lambda grid_row, grid_col: grid_col == 0)
+    np.testing.assert_array_equal(decode_png(png)[0], expected)
+    assert set(np.unique(expected)) == {0, 1, 2, 3}
+
+    # Clipped and unclipped tiles are kept apart
+    assert renderer.get_tile('abc', 0, 0, 0)[1] is False
+    assert renderer.get_tile('abc', 0, 0, 0, 'west') == (png, True)
+    with pytest.raises(KeyError):
+        renderer.get_tile('abc', 0, 0, 0, 'missing')
+
+
+def test_tiles_away_from_the_cached_bbox_are_empty(renderer):
+    renderer, _, _ = renderer
+    png, _ = renderer.get_tile('abc', 1, 0, 0)
+    assert png == raster_tiles.EMPTY_TILE
+    assert not decode_png(png)[0].any()
+
+
+def test_unknown_raster_raises_key_error(renderer):
+    renderer, _, _ = renderer
+    with pytest.raises(KeyError):
+        renderer.get_tile('missing', 0, 0, 0)
+
+
+def test_cached_raster_lookup_returns_local_tile_url(monkeypatch, tmp_path):
+    monkeypatch.setattr(app.raster_cache, 'cache_dir', str(tmp_path))
+    client = app.app.test_client()
+    ring = [[120.9, 14.5], [121.0, 14.5], [121.0, 14.6], [120.9, 14.6], [120.9, 14.5]]
+
+    monkeypatch.setattr(app.raster_cache, 'find', lambda dataset, params, bbox: None)
+    data = client.post('/cached_raster', json={'dataset': 'worldcover', 'coordinates': ring}).get_json()
+    assert data == {'success': True, 'cached': False}
+
+    found = []
+    monkeypatch.setattr(app.raster_cache, 'find', lambda *args: found.append(args) or {'key': 'abc'})
+    data = client.post('/cached_raster', json={'dataset': 'dynamic_world', 'year': 2022, 'coordinates': ring}).get_json()
+    assert data['cached'] and data['tile_url'].startswith('/raster_tiles/abc/{z}/{x}/{y}.png?clip=')
+    assert found == [('dynamic_world', {'year': 2022}, (120.9, 14.5, 121.0, 14.6))]
+    # Tiles are clipped to the area looked up, stored for whichever worker serves them
+    clip_key = data['tile_url'].split('?clip=')[1]
+    assert app.raster_cache.load_clip(clip_key) == ring
+    assert app.raster_cache.save_clip(ring) == clip_key
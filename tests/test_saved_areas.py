@@ -0,0 +1,143 @@
+import os
+
+import pytest
+
+import app
+import saved_areas
+from saved_areas import SavedAreaStore, canonical_ring, geometry_hash
+
+SQUARE = [[120.9, 14.5], [121.0, 14.5], [121.0, 14.6], [120.9, 14.6], [120.9, 14.5]]
+# An L-shaped area whose bounding box covers (121.25, 14.75) although the polygon does not
+ELL = [[121.0, 14.7], [121.4, 14.7], [121.4, 14.72], [121.02, 14.72], [121.02, 14.9], [121.0, 14.9]]
+FAR = [[124.0, 13.0], [124.1, 13.0], [124.1, 13.1], [124.0, 13.0]]
+
+
+def rotations(ring):
+    """Every starting vertex of a closed ring, in both directions, each closed again."""
+    points = ring[:-1]
+    variants = []
+    for sequence in (points, points[::-1]):
+        for start in range(len(sequence)):
+            rotated = sequence[start:] + sequence[:start]
+            variants.append(rotated + rotated[:1])
+    return variants
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SavedAreaStore(str(tmp_path / 'areas.sqlite3'))
+
+
+def test_geometry_hash_ignores_start_vertex_direction_and_closing_point():
+    expected = geometry_hash(SQUARE)
+    for variant in rotations(SQUARE):
+        assert geometry_hash(variant) == expected
+        # An unclosed ring is the same area
+        assert geometry_hash(variant[:-1]) == expected
+    # Differences below the stored precision do not matter, others do
+    assert geometry_hash([[lon + 1e-8, lat] for lon, lat in SQUARE]) == expected
+    assert geometry_hash([[lon + 1e-4, lat] for lon, lat in SQUARE]) != expected
+
+
+def test_canonical_ring_is_counter_clockwise_from_the_smallest_vertex():
+    ring = canonical_ring(SQUARE[::-1])
+    assert ring == [(120.9, 14.5), (121.0, 14.5), (121.0, 14.6), (120.9, 14.6)]
+    with pytest.raises(ValueError):
+        canonical_ring([[120.9, 14.5], [121.0, 14.5], [120.9, 14.5]])
+
+
+def test_saving_the_same_area_again_updates_it(store):
+    first, created = store.save(SQUARE, 'Field')
+    assert created
+    again, created = store.save(rotations(SQUARE)[5], description='North field')
+    assert not created
+    assert again['id'] == first['id']
+    assert (again['name'], again['description']) == ('Field', 'North field')
+
+
+def test_bbox_point_and_name_search(store):
+    square, _ = store.save(SQUARE, 'Rice paddy')
+    ell, _ = store.save(ELL, 'Levee 50%')
+    far, _ = store.save(FAR, 'Far away')
+
+    def ids(**kwargs):
+        return sorted(area['id'] for area in store.search(**kwargs))
+
+    assert ids(bbox=(120.95, 14.55, 121.1, 14.8)) == sorted([square['id'], ell['id']])
+    assert ids(bbox=(123.9, 12.9, 124.2, 13.2)) == [far['id']]
+    assert ids(bbox=(100.0, 0.0, 101.0, 1.0)) == []
+
+    # Inside the L's bounding box but outside the polygon itself
+    assert ids(point=(121.25, 14.75)) == []
+    assert ids(point=(121.01, 14.8)) == [ell['id']]
+
+    assert ids(text='paddy') == [square['id']]
+    # LIKE wildcards in the query are matched literally
+    assert ids(text='50%') == [ell['id']]
+    assert ids(text='_') == []
+    assert ids(bbox=(120.0, 14.0, 122.0, 15.0), text='levee') == [ell['id']]
+
+    assert store.delete(ell['id'])
+    assert ids(point=(121.01, 14.8)) == []
+
+
+def test_results_are_only_stored_for_saved_areas(store):
+    assert not store.attach_result(SQUARE, 'ndvi', {'mode': 'median'}, {'statistics': {}})
+    area, _ = store.save(SQUARE, 'Field')
+    assert store.attach_result(rotations(SQUARE)[3], 'ndvi', {'mode': 'median'}, {'statistics': {}})
+    assert store.get(area['id'])['analyses'] == ['ndvi']
+    # Results computed before the area was saved were not kept
+    assert [result['params'] for result in store.get(area['id'])['results']] == [{'mode': 'median'}]
+
+
+def test_analysis_results_are_attached_to_the_saved_area():
+    client = app.app.test_client()
+    # Other test modules analyse SQUARE too, so use an area of its own
+    square = [[lon + 2, lat] for lon, lat in SQUARE]
+    assert client.post('/get_esa_worldcover', json={'coordinates': square}).get_json()['success']
+    saved_areas.result_writer().flush()
+    assert saved_areas.saved_area_store.search(point=(122.95, 14.55)) == []
+    assert saved_areas.saved_area_store._connect().execute(
+        'SELECT COUNT(*) FROM results WHERE geometry_hash = ?', (geometry_hash(square),)
+    ).fetchone()[0] == 0
+
+    # Saved from another vertex and in the other direction, then analysed
+    saved = client.post('/save_area', json={'coordinates': rotations(square)[6], 'name': 'Test'}).get_json()
+    assert client.post('/get_esa_worldcover', json={'coordinates': square}).get_json()['success']
+    # Failed analyses are not stored
+    client.post('/get_ndvi', json={'coordinates': square, 'mode': 'sharpest'})
+    saved_areas.result_writer().flush()
+
+    area = client.get(f"/saved_areas/{saved['area']['id']}").get_json()['area']
+    assert area['analyses'] == ['worldcover']
+    worldcover = area['results'][0]
+    assert worldcover['params'] == {}
+    assert 'success' not in worldcover['result']
+
+
+def test_a_full_queue_drops_results_without_blocking(store):
+    writer = saved_areas.ResultWriter(store)
+    for _ in range(saved_areas.MAX_PENDING_RESULTS + 5):
+        writer.submit(SQUARE, 'ndvi', {}, b'{"success": true}')
+    # Not started, so nothing is drained
+    assert writer.queue.qsize() == saved_areas.MAX_PENDING_RESULTS
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs fork')
+def test_forked_child_opens_its_own_connection(store):
+    store.save(SQUARE, 'Parent')
+    parent_conn = store._connect()
+
+    pid = os.fork()
+    if pid == 0:
+        try:
+            ok = store._connect() is not parent_conn and store.search(text='Parent')
+            store.save(FAR, 'Child')
+            os._exit(0 if ok else 1)
+        except BaseException:
+            os._exit(2)
+    _, status = os.waitpid(pid, 0)
+
+    assert os.waitstatus_to_exitcode(status) == 0
+    assert store._connect() is parent_conn
+    assert [area['name'] for area in store.search(text='Child')] == ['Child']
@@ -0,0 +1,137 @@
+import os
+import socket
+import threading
+import time
+
+import pytest
+
+import shared_cache
+from shared_cache import RedisBackend, SharedCache, SharedCacheError, SQLiteBackend
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture(scope='module')
+def redis_url():
+    port = free_port()
+    threading.Thread(target=shared_cache.serve, args=('127.0.0.1', port), daemon=True).start()
+    for _ in range(100):
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            break
+        except OSError:
+            time.sleep(0.02)
+    return f"redis://127.0.0.1:{port}/1"
+
+
+@pytest.fixture(params=['sqlite', 'redis'])
+def backend(request, tmp_path):
+    if request.param == 'sqlite':
+        return SQLiteBackend(str(tmp_path / 'shared.sqlite3'))
+    backend = RedisBackend(request.getfixturevalue('redis_url'))
+    backend.command('FLUSHDB')
+    return backend
+
+
+def test_values_expire(backend):
+    assert backend.get('k') is None
+    backend.set('k', b'{"a": 1}', 60)
+    assert backend.get('k') == b'{"a": 1}'
+
+    backend.set('short', b'1', 0.05)
+    time.sleep(0.1)
+    assert backend.get('short') is None
+
+
+def test_lock_is_exclusive_until_released_or_expired(backend):
+    assert backend.acquire('k', 'first', 60)
+    assert not backend.acquire('k', 'second', 60)
+    assert backend.locked('k')
+
+    # Only the holder's token releases the lock
+    backend.release('k', 'second')
+    assert backend.locked('k')
+    backend.release('k', 'first')
+    assert not backend.locked('k')
+
+    assert backend.acquire('stale', 'dead-worker', 0.05)
+    time.sleep(0.1)
+    assert backend.acquire('stale', 'next', 60)
+
+
+def test_only_one_caller_computes_a_missing_key(backend, monkeypatch):
+    monkeypatch.setattr(shared_cache, 'LOCK_POLL_SECONDS', 0.01)
+    cache = SharedCache(backend)
+    calls = []
+    started = threading.Event()
+
+    def compute():
+        calls.append(1)
+        started.set()
+        time.sleep(0.1)
+        return {'value': 42}
+
+    results = []
+    workers = [threading.Thread(target=lambda: results.append(cache.get_or_compute('k', compute, 60)))
+               for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert len(calls) == 1 and started.is_set()
+    assert results == [{'value': 42}] * 4
+    assert cache.stats()['misses'] == 1
+    assert not backend.locked('k')
+
+
+def test_values_over_the_size_limit_are_not_shared(backend):
+    cache = SharedCache(backend, max_value_bytes=10)
+    assert cache.get_or_compute('big', lambda: 'x' * 100, 60) == 'x' * 100
+    assert cache.get('big') is None
+
+
+def test_backend_failures_fall_back_to_computing_locally():
+    class BrokenBackend:
+        def get(self, key):
+            raise SharedCacheError('down')
+
+        def set(self, key, value, ttl):
+            raise SharedCacheError('down')
+
+    cache = SharedCache(BrokenBackend())
+    assert cache.get_or_compute('k', lambda: [1, 2], 60) == [1, 2]
+    assert cache.get('k') is None
+    cache.set('k', 1, 60)
+    assert cache.stats()['errors'] == 3
+
+
+def test_unreachable_redis_raises_shared_cache_error():
+    backend = RedisBackend(f"redis://127.0.0.1:{free_port()}/0", timeout=0.5)
+    with pytest.raises(SharedCacheError):
+        backend.get('k')
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs fork')
+def test_forked_child_opens_its_own_connection(backend):
+    backend.set('k', b'"parent"', 60)
+    # The parent's connection exists before the fork, as with gunicorn --preload
+    parent_local = backend._local.get()
+
+    pid = os.fork()
+    if pid == 0:
+        try:
+            ok = backend._local.get() is not parent_local and backend.get('k') == b'"parent"'
+            backend.set('k', b'"child"', 60)
+            os._exit(0 if ok else 1)
+        except BaseException:
+            os._exit(2)
+    _, status = os.waitpid(pid, 0)
+
+    assert os.waitstatus_to_exitcode(status) == 0
+    assert backend._local.get() is parent_local
+    assert backend.get('k') == b'"child"'
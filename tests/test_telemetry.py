@@ -0,0 +1,57 @@
+import logging
+
+import pytest
+
+import app
+import telemetry
+from telemetry import traced
+
+
+class CollectingExporter:
+    def __init__(self):
+        self.spans = []
+
+    def submit(self, finished):
+        self.spans.append(finished)
+
+
+@pytest.fixture
+def exporter(monkeypatch):
+    collecting = CollectingExporter()
+    monkeypatch.setattr(telemetry, '_exporter', collecting)
+    return collecting
+
+
+@traced(dataset='dynamic_world', scale=10)
+def preview(coordinates, scale=10):
+    return scale
+
+
+@traced(dataset='landsat8_ndvi', scale=30)
+def fixed_scale(coordinates):
+    return None
+
+
+def test_traced_scale_comes_from_the_call(exporter):
+    preview([], scale=100)
+    preview([], 250)
+    preview([])
+    fixed_scale([])
+    assert [s.attributes['scale'] for s in exporter.spans] == [100, 250, 10, 30]
+
+
+@pytest.mark.parametrize('path, level', [
+    ('/raster_tiles/missing/0/0/0.png', logging.DEBUG),
+    ('/vt/waterways/30/0/0.pbf', logging.DEBUG),
+    ('/assets/missing.js', logging.DEBUG),
+    ('/cached_raster', logging.INFO),
+])
+def test_static_and_tile_requests_are_logged_at_debug(caplog, path, level):
+    client = app.app.test_client()
+    caplog.set_level(logging.DEBUG, logger='request')
+    if path == '/cached_raster':
+        client.post(path, json={})
+    else:
+        client.get(path)
+    records = [r for r in caplog.records if r.name == 'request' and r.getMessage().endswith(path)]
+    assert [r.levelno for r in records] == [level]
@@ -0,0 +1,68 @@
+import pytest
+from shapely.geometry import LineString, Polygon
+
+from vector_tiles import (CLOSE_PATH, EXTENT, GEOM_LINESTRING, GEOM_POLYGON, LINE_TO, MOVE_TO, _command,
+                          _packed_field, _varint, _zigzag, encode_geometry, encode_tile)
+
+# Web Mercator bounds whose units map one-to-one onto tile units (with y flipped)
+BOUNDS = (0, 0, EXTENT, EXTENT)
+
+
+@pytest.mark.parametrize('value, encoded', [
+    (0, 0), (-1, 1), (1, 2), (-2, 3), (2, 4), (2147483647, 4294967294), (-2147483648, 4294967295)
+])
+def test_zigzag(value, encoded):
+    assert _zigzag(value) == encoded
+
+
+def test_varint():
+    assert _varint(1) == b'\x01'
+    assert _varint(127) == b'\x7f'
+    assert _varint(300) == b'\xac\x02'
+
+
+def test_command_packs_id_and_count():
+    assert _command(MOVE_TO, 1) == 9
+    assert _command(LINE_TO, 3) == 26
+    assert _command(CLOSE_PATH, 1) == 15
+
+
+def test_square_polygon_commands():
+    # Counter-clockwise in Web Mercator is clockwise once y points down, so the ring is rewound
+    square = Polygon([(0, 0), (10, 0), (10, 10), (0, 10), (0, 0)])
+    geom_type, commands = encode_geometry(square, BOUNDS)
+    assert geom_type == GEOM_POLYGON
+    assert commands == [
+        9, 0, 8172,  # MoveTo (0, 4086)
+        26, 20, 0, 0, 20, 19, 0,  # LineTo +(10, 0), +(0, 10), +(-10, 0)
+        15  # ClosePath
+    ]
+
+
+def test_hole_is_wound_opposite_to_the_exterior_and_continues_the_cursor():
+    polygon = Polygon(
+        [(0, 0), (10, 0), (10, 10), (0, 10), (0, 0)],
+        [[(2, 2), (4, 2), (4, 4), (2, 4), (2, 2)]]
+    )
+    _, commands = encode_geometry(polygon, BOUNDS)
+    hole = commands[11:]
+    # The hole starts relative to the end of the exterior ring, at (0, 4096)
+    assert hole[:3] == [9, _zigzag(2), _zigzag(4094 - 4096)]
+    assert hole[3] == 26 and hole[-1] == 15
+    # The exterior runs +(10, 0), +(0, 10) (positive area in tile units); the hole
+    # runs +(2, 0), +(0, -2), +(-2, 0) (negative area)
+    assert hole[4:10] == [_zigzag(2), _zigzag(0), _zigzag(0), _zigzag(-2), _zigzag(-2), _zigzag(0)]
+
+
+def test_linestring_drops_repeated_points():
+    line = LineString([(0, 4096), (0, 4096), (3, 4096), (3, 4090)])
+    assert encode_geometry(line, BOUNDS) == (GEOM_LINESTRING, [9, 0, 0, 18, 6, 0, 0, 12])
+
+
+def test_tile_contains_the_feature_geometry():
+    square = Polygon([(0, 0), (10, 0), (10, 10), (0, 10), (0, 0)])
+    tile = encode_tile('waterways', [(square, {'name': 'Bicol River'})], BOUNDS)
+    _, commands = encode_geometry(square, BOUNDS)
+    assert _packed_field(4, commands) in tile
+    assert b'waterways' in tile and b'Bicol River' in tile
+    assert encode_tile('waterways', [], BOUNDS) == b''
@@ -0,0 +1,93 @@
+import random
+
+import geopandas as gpd
+import numpy as np
+import pyarrow.parquet as pq
+import pytest
+from shapely.geometry import LineString
+
+import waterways_store
+from waterways_store import hilbert_index, ingest, intersecting_row_groups, read_waterways
+
+GRID = 20
+ROW_GROUP_SIZE = 25
+
+
+def test_hilbert_index_first_order_visits_quadrants_in_order():
+    x, y = np.array([0, 0, 1, 1]), np.array([0, 1, 1, 0])
+    assert hilbert_index(x, y, order=1).tolist() == [0, 1, 2, 3]
+
+
+def test_hilbert_index_is_a_continuous_path_over_the_grid():
+    order = 4
+    side = 1 << order
+    x, y = np.meshgrid(np.arange(side), np.arange(side))
+    distances = hilbert_index(x.ravel(), y.ravel(), order=order)
+    assert sorted(distances.tolist()) == list(range(side * side))
+
+    # Cells with consecutive distances are neighbours
+    path = np.empty((side * side, 2), dtype=np.int64)
+    path[distances] = np.column_stack([x.ravel(), y.ravel()])
+    steps = np.abs(np.diff(path, axis=0)).sum(axis=1)
+    assert (steps == 1).all()
+
+
+@pytest.fixture
+def waterways(tmp_path):
+    """A GRID x GRID lattice of short streams in shuffled order, ingested as GeoParquet."""
+    cells = [(i, j) for i in range(GRID) for j in range(GRID)]
+    random.Random(7).shuffle(cells)
+    gdf = gpd.GeoDataFrame(
+        {'name': [f"stream {i}-{j}" for i, j in cells]},
+        geometry=[LineString([(123 + i * 0.01, 13 + j * 0.01), (123 + i * 0.01 + 0.005, 13 + j * 0.01 + 0.005)])
+                  for i, j in cells],
+        crs='EPSG:4326'
+    )
+    source = tmp_path / 'waterways.geojson'
+    gdf.to_file(source, driver='GeoJSON')
+    output = str(tmp_path / 'waterways.parquet')
+    assert ingest(str(source), output, row_group_size=ROW_GROUP_SIZE) == GRID * GRID
+    return gdf, output
+
+
+def test_ingested_rows_follow_the_hilbert_curve(waterways):
+    _, output = waterways
+    bbox = pq.read_table(output, columns=['bbox']).column('bbox').combine_chunks()
+    x = ((bbox.field('xmin').to_numpy() - 123) / 0.01).round().astype(np.int64)
+    y = ((bbox.field('ymin').to_numpy() - 13) / 0.01).round().astype(np.int64)
+    # Neighbouring rows are nearby streams; the 20x20 lattice only samples the curve,
+    # so a step can skip a cell, but it never jumps across the layer like the input order
+    steps = np.abs(np.diff(x)) + np.abs(np.diff(y))
+    assert steps.max() <= 2
+
+
+def test_small_area_reads_only_the_row_groups_it_intersects(waterways):
+    gdf, output = waterways
+    parquet_file = pq.ParquetFile(output)
+    assert parquet_file.metadata.num_row_groups == GRID * GRID // ROW_GROUP_SIZE
+
+    bbox = (123.0, 13.0, 123.035, 13.035)
+    groups = intersecting_row_groups(parquet_file, bbox)
+    assert 0 < len(groups) <= 2
+
+    # Same answer as checking every feature's bbox
+    result = read_waterways(bbox, path=output)
+    bounds = gdf.geometry.bounds
+    expected = gdf[(bounds['minx'] <= bbox[2]) & (bounds['maxx'] >= bbox[0]) &
+                   (bounds['miny'] <= bbox[3]) & (bounds['maxy'] >= bbox[1])]
+    assert sorted(result['name']) == sorted(expected['name'])
+    assert len(result) == 16
+
+
+def test_area_outside_the_layer_reads_nothing(waterways):
+    _, output = waterways
+    bbox = (100.0, 0.0, 101.0, 1.0)
+    assert intersecting_row_groups(pq.ParquetFile(output), bbox) == []
+    assert read_waterways(bbox, path=output).empty
+
+
+def test_missing_parquet_falls_back_to_geojson(waterways, monkeypatch, tmp_path):
+    # The waterways fixture writes the GeoJSON source next to the parquet
+    monkeypatch.setattr(waterways_store, 'WATERWAYS_PARQUET', str(tmp_path / 'missing.parquet'))
+    monkeypatch.setattr(waterways_store, 'WATERWAYS_GEOJSON', str(tmp_path / 'waterways.geojson'))
+    assert len(waterways_store.load_waterways((123.0, 13.0, 123.035, 13.035))) == 16
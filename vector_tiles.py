@@ -0,0 +1,465 @@
+"""Mapbox Vector Tiles for the waterways layer.
+
+Waterway geometry is projected to Web Mercator once, generalized separately for
+every zoom level (simplified to about a tile pixel, with features too small to
+see dropped) and indexed with an STRtree. Tiles are encoded to MVT protobuf and
+written to an on-disk cache keyed by the source file version, so each tile is
+only built once. When the GeoParquet store from waterways_store.py exists,
+tiles read just the row groups around them instead of holding the whole layer
+in memory. The whole pyramid can be built ahead of time with:
+
+    python vector_tiles.py build [--max-zoom N]
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import threading
+
+import numpy as np
+from shapely.geometry import box, shape
+from shapely.ops import transform
+from shapely.strtree import STRtree
+
+from waterways_store import WATERWAYS_PARQUET, dataset_bounds, read_waterways
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+WATERWAYS_PATH = os.path.join(BASE_DIR, 'waterways.geojson')
+TILE_CACHE_DIR = os.environ.get('TILE_CACHE_DIR', os.path.join(BASE_DIR, 'tile_cache'))
+
+# Name of the layer inside each tile, used by the client for styling
+WATERWAYS_LAYER = 'waterways'
+
+# Tile coordinate space and the overlap kept around each tile (in tile units)
+EXTENT = 4096
+BUFFER = 64
+
+# Deepest zoom served; the client overzooms beyond it
+MAX_ZOOM = 14
+
+# Deepest zoom built by `python vector_tiles.py build`
+PREBUILD_MAX_ZOOM = 12
+
+# Geometry is simplified to this many tile units at each zoom
+SIMPLIFY_UNITS = 8
+
+# Web Mercator world half-width in metres
+ORIGIN_SHIFT = 20037508.342789244
+MAX_LATITUDE = 85.0511287798
+
+
+def lonlat_to_mercator(x, y, z=None):
+    """Project lon/lat arrays to Web Mercator metres."""
+    x = np.asarray(x, dtype=float)
+    y = np.clip(np.asarray(y, dtype=float), -MAX_LATITUDE, MAX_LATITUDE)
+    mx = x * ORIGIN_SHIFT / 180.0
+    my = np.log(np.tan((90.0 + y) * np.pi / 360.0)) * ORIGIN_SHIFT / math.pi
+    return mx, my
+
+
+def mercator_to_lonlat(x, y):
+    """Unproject Web Mercator metres to lon/lat."""
+    lon = np.asarray(x, dtype=float) * 180.0 / ORIGIN_SHIFT
+    lat = np.degrees(2 * np.arctan(np.exp(np.asarray(y, dtype=float) * math.pi / ORIGIN_SHIFT)) - math.pi / 2)
+    return lon, lat
+
+
+def tile_bounds(z, x, y):
+    """Return the Web Mercator (minx, miny, maxx, maxy) of a tile."""
+    size = 2 * ORIGIN_SHIFT / (2 ** z)
+    minx = -ORIGIN_SHIFT + x * size
+    maxy = ORIGIN_SHIFT - y * size
+    return minx, maxy - size, minx + size, maxy
+
+
+def tile_range(bounds, z):
+    """Return the inclusive (x0, y0, x1, y1) tile range covering Web Mercator bounds."""
+    size = 2 * ORIGIN_SHIFT / (2 ** z)
+    last = 2 ** z - 1
+    x0 = min(last, max(0, int((bounds[0] + ORIGIN_SHIFT) // size)))
+    x1 = min(last, max(0, int((bounds[2] + ORIGIN_SHIFT) // size)))
+    y0 = min(last, max(0, int((ORIGIN_SHIFT - bounds[3]) // size)))
+    y1 = min(last, max(0, int((ORIGIN_SHIFT - bounds[1]) // size)))
+    return x0, y0, x1, y1
+
+
+# --- Protobuf encoding -----------------------------------------------------
+
+def _varint(value):
+    out = bytearray()
+    while True:
+        bits = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(bits | 0x80)
+        else:
+            out.append(bits)
+            return bytes(out)
+
+
+def _zigzag(value):
+    return (value << 1) ^ (value >> 31)
+
+
+def _field(number, wire_type):
+    return _varint((number << 3) | wire_type)
+
+
+def _bytes_field(number, payload):
+    return _field(number, 2) + _varint(len(payload)) + payload
+
+
+def _uint_field(number, value):
+    return _field(number, 0) + _varint(value)
+
+
+def _packed_field(number, values):
+    return _bytes_field(number, b''.join(_varint(v) for v in values))
+
+
+def _encode_value(value):
+    """Encode a property value as an MVT Value message."""
+    if isinstance(value, bool):
+        return _uint_field(7, int(value))
+    if isinstance(value, int):
+        if value >= 0:
+            return _uint_field(5, value)
+        return _field(6, 0) + _varint((value << 1) ^ (value >> 63))
+    if isinstance(value, float):
+        return _field(3, 1) + np.float64(value).tobytes()
+    return _bytes_field(1, str(value).encode('utf-8'))
+
+
+# --- Geometry encoding -----------------------------------------------------
+
+MOVE_TO, LINE_TO, CLOSE_PATH = 1, 2, 7
+GEOM_POINT, GEOM_LINESTRING, GEOM_POLYGON = 1, 2, 3
+
+
+def _command(command_id, count):
+    return (command_id & 0x7) | (count << 3)
+
+
+def _to_tile_coords(coords, bounds):
+    """Convert Web Mercator coordinates to integer tile units, dropping repeated points."""
+    minx, miny, maxx, maxy = bounds
+    array = np.asarray(coords, dtype=float)[:, :2]
+    px = np.round((array[:, 0] - minx) / (maxx - minx) * EXTENT).astype(np.int64)
+    py = np.round((maxy - array[:, 1]) / (maxy - miny) * EXTENT).astype(np.int64)
+    points = np.column_stack([px, py])
+    if len(points) > 1:
+        keep = np.ones(len(points), dtype=bool)
+        keep[1:] = np.any(points[1:] != points[:-1], axis=1)
+        points = points[keep]
+    return points
+
+
+class _GeometryWriter:
+    """Accumulates MVT geometry commands with a running cursor."""
+
+    def __init__(self):
+        self.commands = []
+        self.cursor = (0, 0)
+
+    def _delta(self, point):
+        dx = int(point[0]) - self.cursor[0]
+        dy = int(point[1]) - self.cursor[1]
+        self.cursor = (int(point[0]), int(point[1]))
+        return [_zigzag(dx), _zigzag(dy)]
+
+    def path(self, points, closed=False):
+        self.commands.append(_command(MOVE_TO, 1))
+        self.commands.extend(self._delta(points[0]))
+        self.commands.append(_command(LINE_TO, len(points) - 1))
+        for point in points[1:]:
+            self.commands.extend(self._delta(point))
+        if closed:
+            self.commands.append(_command(CLOSE_PATH, 1))
+
+    def points(self, points):
+        self.commands.append(_command(MOVE_TO, len(points)))
+        for point in points:
+            self.commands.extend(self._delta(point))
+
+
+def _signed_area(points):
+    x, y = points[:, 0], points[:, 1]
+    return 0.5 * float(np.sum(x * np.roll(y, -1) - np.roll(x, -1) * y))
+
+
+def _parts(geometry, geom_type):
+    if geometry.geom_type == geom_type:
+        return [geometry]
+    if geometry.geom_type == 'Multi' + geom_type or geometry.geom_type == 'GeometryCollection':
+        return [part for part in geometry.geoms if part.geom_type == geom_type]
+    return []
+
+
+def encode_geometry(geometry, bounds):
+    """Encode a clipped Web Mercator geometry as (MVT geometry type, commands), or None."""
+    writer = _GeometryWriter()
+    geom_type = geometry.geom_type.replace('Multi', '')
+
+    if geom_type == 'LineString' or geometry.geom_type == 'GeometryCollection':
+        for line in _parts(geometry, 'LineString'):
+            points = _to_tile_coords(line.coords, bounds)
+            if len(points) >= 2:
+                writer.path(points)
+        return (GEOM_LINESTRING, writer.commands) if writer.commands else None
+
+    if geom_type == 'Polygon':
+        for polygon in _parts(geometry, 'Polygon'):
+            rings = [polygon.exterior] + list(polygon.interiors)
+            for i, ring in enumerate(rings):
+                # Drop the closing point; ClosePath implies it
+                points = _to_tile_coords(ring.coords, bounds)[:-1]
+                if len(points) < 3:
+                    if i == 0:
+                        break
+                    continue
+                # Exterior rings must have positive area in tile coordinates, holes negative
+                area = _signed_area(points)
+                if area == 0:
+                    continue
+                if (area < 0) == (i == 0):
+                    points = points[::-1]
+                writer.path(points, closed=True)
+        return (GEOM_POLYGON, writer.commands) if writer.commands else None
+
+    if geom_type == 'Point':
+        points = np.vstack([_to_tile_coords(point.coords, bounds) for point in _parts(geometry, 'Point')])
+        if len(points):
+            writer.points(points)
+        return (GEOM_POINT, writer.commands) if writer.commands else None
+
+    return None
+
+
+def encode_tile(layer_name, features, bounds):
+    """Encode (geometry, properties) pairs in Web Mercator as a single-layer MVT tile."""
+    keys, key_index = [], {}
+    values, value_index = [], {}
+    encoded_features = []
+
+    for feature_id, (geometry, properties) in enumerate(features):
+        encoded = encode_geometry(geometry, bounds)
+        if encoded is None:
+            continue
+        geom_type, commands = encoded
+
+        tags = []
+        for key, value in properties.items():
+            if value is None:
+                continue
+            if key not in key_index:
+                key_index[key] = len(keys)
+                keys.append(key)
+            value_key = (type(value).__name__, value)
+            if value_key not in value_index:
+                value_index[value_key] = len(values)
+                values.append(value)
+            tags.extend([key_index[key], value_index[value_key]])
+
+        message = _uint_field(1, feature_id + 1)
+        if tags:
+            message += _packed_field(2, tags)
+        message += _uint_field(3, geom_type) + _packed_field(4, commands)
+        encoded_features.append(message)
+
+    if not encoded_features:
+        return b''
+
+    layer = _uint_field(15, 2) + _bytes_field(1, layer_name.encode('utf-8'))
+    layer += b''.join(_bytes_field(2, feature) for feature in encoded_features)
+    layer += b''.join(_bytes_field(3, key.encode('utf-8')) for key in keys)
+    layer += b''.join(_bytes_field(4, _encode_value(value)) for value in values)
+    layer += _uint_field(5, EXTENT)
+    return _bytes_field(3, layer)
+
+
+# --- Tile source -----------------------------------------------------------
+
+def _query(tree, geometries, area):
+    """Return indexes of tree geometries intersecting area (shapely 1.8 and 2.x)."""
+    hits = tree.query(area)
+    if len(hits) and not isinstance(hits[0], (int, np.integer)):
+        ids = {id(geometry): i for i, geometry in enumerate(geometries)}
+        return [ids[id(geometry)] for geometry in hits]
+    return [int(i) for i in hits]
+
+
+def _clean_properties(properties):
+    """Keep only scalar properties that can be stored in a tile."""
+    return {
+        key: value for key, value in (properties or {}).items()
+        if isinstance(value, (str, int, float, bool)) and value != '' and value == value
+    }
+
+
+def generalize(features, z):
+    """Simplify (geometry, properties) pairs for zoom z, dropping features too small to see."""
+    tolerance = 2 * ORIGIN_SHIFT / (2 ** z) / EXTENT * SIMPLIFY_UNITS
+    geometries, properties = [], []
+    for geometry, props in features:
+        minx, miny, maxx, maxy = geometry.bounds
+        # Features smaller than the tolerance would collapse to a point
+        if max(maxx - minx, maxy - miny) < tolerance:
+            continue
+        simplified = geometry.simplify(tolerance, preserve_topology=False)
+        if not simplified.is_empty:
+            geometries.append(simplified)
+            properties.append(props)
+    return geometries, properties
+
+
+class VectorTileSource:
+    """Builds and caches MVT tiles for one GeoJSON layer."""
+
+    def __init__(self, path=WATERWAYS_PATH, layer_name=WATERWAYS_LAYER, cache_dir=TILE_CACHE_DIR,
+                 store_path=None):
+        self.path = path
+        self.store_path = store_path
+        self.layer_name = layer_name
+        self.cache_dir = cache_dir
+        self._lock = threading.Lock()
+        self._features = None
+        self._bounds = None
+        self._zooms = {}
+        self._version = None
+
+    @property
+    def version(self):
+        """Short hash of the source file's path, size and mtime; changes invalidate the cache."""
+        path = self.store_path if self.uses_store else self.path
+        stat = os.stat(path)
+        return hashlib.sha256(f"{path}:{stat.st_size}:{stat.st_mtime_ns}".encode()).hexdigest()[:12]
+
+    @property
+    def uses_store(self):
+        """Whether tiles are read from the GeoParquet store rather than the in-memory layer."""
+        return bool(self.store_path) and os.path.exists(self.store_path)
+
+    def _load(self):
+        if self._features is not None and self._version == self.version:
+            return
+        with open(self.path) as f:
+            collection = json.load(f)
+
+        features = []
+        for feature in collection.get('features', []):
+            if not feature.get('geometry'):
+                continue
+            geometry = transform(lonlat_to_mercator, shape(feature['geometry']))
+            if not geometry.is_empty:
+                features.append((geometry, _clean_properties(feature.get('properties'))))
+
+        self._features = features
+        self._bounds = (
+            min(g.bounds[0] for g, _ in features), min(g.bounds[1] for g, _ in features),
+            max(g.bounds[2] for g, _ in features), max(g.bounds[3] for g, _ in features)
+        ) if features else None
+        self._zooms = {}
+        self._version = self.version
+
+    def _zoom_layer(self, z):
+        """Return (geometries, properties, tree) generalized for zoom z."""
+        with self._lock:
+            self._load()
+            if z not in self._zooms:
+                geometries, properties = generalize(self._features, z)
+                tree = STRtree(geometries) if geometries else None
+                self._zooms[z] = (geometries, properties, tree)
+            return self._zooms[z]
+
+    def _store_layer(self, clip_box):
+        """Read the features around a tile from the GeoParquet store, projected to Web Mercator."""
+        west, south = mercator_to_lonlat(clip_box.bounds[0], clip_box.bounds[1])
+        east, north = mercator_to_lonlat(clip_box.bounds[2], clip_box.bounds[3])
+        gdf = read_waterways((float(west), float(south), float(east), float(north)), self.store_path)
+        records = gdf.drop(columns=gdf.geometry.name).to_dict('records')
+        return [
+            (transform(lonlat_to_mercator, geometry), _clean_properties(props))
+            for geometry, props in zip(gdf.geometry, records)
+            if geometry is not None and not geometry.is_empty
+        ]
+
+    def build_tile(self, z, x, y):
+        """Encode a tile from the generalized layer without touching the cache."""
+        bounds = tile_bounds(z, x, y)
+        margin = (bounds[2] - bounds[0]) * BUFFER / EXTENT
+        clip_box = box(bounds[0] - margin, bounds[1] - margin, bounds[2] + margin, bounds[3] + margin)
+
+        if self.uses_store:
+            geometries, properties = generalize(self._store_layer(clip_box), z)
+            candidates = range(len(geometries))
+        else:
+            geometries, properties, tree = self._zoom_layer(z)
+            if tree is None:
+                return b''
+            candidates = _query(tree, geometries, clip_box)
+
+        features = []
+        for i in candidates:
+            clipped = geometries[i].intersection(clip_box)
+            if not clipped.is_empty:
+                features.append((clipped, properties[i]))
+        return encode_tile(self.layer_name, features, bounds)
+
+    def _tile_path(self, z, x, y):
+        return os.path.join(self.cache_dir, self.layer_name, self.version, str(z), str(x), f"{y}.pbf")
+
+    def get_tile(self, z, x, y):
+        """Return the encoded tile, building and caching it on a miss."""
+        path = self._tile_path(z, x, y)
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                return f.read()
+
+        data = self.build_tile(z, x, y)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return data
+
+    def build_pyramid(self, min_zoom=0, max_zoom=PREBUILD_MAX_ZOOM):
+        """Build every tile covering the layer from min_zoom to max_zoom; returns tiles written."""
+        if self.uses_store:
+            west, south, east, north = dataset_bounds(self.store_path)
+            minx, miny = lonlat_to_mercator(west, south)
+            maxx, maxy = lonlat_to_mercator(east, north)
+            layer_bounds = (float(minx), float(miny), float(maxx), float(maxy))
+        else:
+            with self._lock:
+                self._load()
+            layer_bounds = self._bounds
+        if layer_bounds is None:
+            return 0
+
+        written = 0
+        for z in range(min_zoom, max_zoom + 1):
+            x0, y0, x1, y1 = tile_range(layer_bounds, z)
+            for x in range(x0, x1 + 1):
+                for y in range(y0, y1 + 1):
+                    self.get_tile(z, x, y)
+                    written += 1
+            print(f"Zoom {z}: {(x1 - x0 + 1) * (y1 - y0 + 1)} tiles")
+        return written
+
+
+# Shared waterways tile source used by the Flask route
+waterways_tiles = VectorTileSource(store_path=WATERWAYS_PARQUET)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the waterways vector tile pyramid.')
+    parser.add_argument('command', choices=['build'])
+    parser.add_argument('--min-zoom', type=int, default=0)
+    parser.add_argument('--max-zoom', type=int, default=PREBUILD_MAX_ZOOM)
+    args = parser.parse_args()
+
+    count = waterways_tiles.build_pyramid(args.min_zoom, min(args.max_zoom, MAX_ZOOM))
+    print(f"Built {count} tiles in {os.path.join(TILE_CACHE_DIR, WATERWAYS_LAYER)}")
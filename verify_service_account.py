@@ -3,6 +3,8 @@ import ee
 import os
 import json
 
+from ee_credentials import ManagedCredentials
+
 print("Earth Engine Service Account Verification Script")
 print("===============================================")
 
@@ -27,7 +29,11 @@ try:
     print("3. Testing authentication using service-account.json...")
     
     try:
-        credentials = ee.ServiceAccountCredentials(service_account, 'service-account.json')
+        credentials = ManagedCredentials(ee.ServiceAccountCredentials(service_account, 'service-account.json')).start()
+        status = credentials.status()
+        if not status['valid']:
+            raise RuntimeError(f"Could not fetch an access token: {status['last_error']}")
+        print(f"   ✓ Access token fetched in {status['last_refresh_ms']} ms, expires in {status['expires_in_seconds']:.0f} s")
         ee.Initialize(credentials)
         print("   ✓ Authentication successful using service-account.json!")
     except Exception as e:
@@ -40,6 +46,13 @@ try:
     info = image.getInfo()
     print(f"   ✓ Successfully retrieved image info. Image ID: {info['id']}")
     
+    # Refresh the token the way the background refresher does in the app
+    print("\n5. Testing access token refresh...")
+    credentials.refresh_now()
+    status = credentials.status()
+    print(f"   ✓ Token refreshed in {status['last_refresh_ms']} ms, expires in {status['expires_in_seconds']:.0f} s")
+    credentials.stop()
+    
     print("\nSERVICE ACCOUNT VERIFICATION SUCCESSFUL!")
     print("You can now deploy your application to a web server.")
     
@@ -0,0 +1,194 @@
+"""Spatially sorted GeoParquet storage for the waterways layer.
+
+`python waterways_store.py ingest` converts waterways.geojson into GeoParquet
+sorted along a Hilbert curve, with a GeoParquet 1.1 `bbox` covering column.
+Because neighbouring features land in the same row groups, the min/max
+statistics of the bbox column give each row group a tight extent, and readers
+only load the row groups that intersect their area of interest instead of the
+whole layer.
+"""
+import argparse
+import json
+import logging
+import os
+
+import geopandas as gpd
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+WATERWAYS_GEOJSON = os.path.join(BASE_DIR, 'waterways.geojson')
+WATERWAYS_PARQUET = os.environ.get('WATERWAYS_PARQUET', os.path.join(BASE_DIR, 'waterways.parquet'))
+
+# Features per row group; smaller groups prune more precisely but add overhead
+DEFAULT_ROW_GROUP_SIZE = 2000
+
+# Hilbert curve order used for sorting (2**order cells per side)
+HILBERT_ORDER = 16
+
+BBOX_FIELDS = ('xmin', 'ymin', 'xmax', 'ymax')
+
+
+def hilbert_index(x, y, order=HILBERT_ORDER):
+    """Vectorized Hilbert curve distance for integer cell coordinates in [0, 2**order)."""
+    x = np.asarray(x, dtype=np.int64).copy()
+    y = np.asarray(y, dtype=np.int64).copy()
+    d = np.zeros_like(x)
+    s = 1 << (order - 1)
+    while s > 0:
+        rx = ((x & s) > 0).astype(np.int64)
+        ry = ((y & s) > 0).astype(np.int64)
+        d += s * s * ((3 * rx) ^ ry)
+        # Rotate the quadrant so the curve stays continuous
+        flip = ry == 0
+        swap_back = flip & (rx == 1)
+        x = np.where(swap_back, s - 1 - x, x)
+        y = np.where(swap_back, s - 1 - y, y)
+        x, y = np.where(flip, y, x), np.where(flip, x, y)
+        s >>= 1
+    return d
+
+
+def ingest(source=WATERWAYS_GEOJSON, output=WATERWAYS_PARQUET, row_group_size=DEFAULT_ROW_GROUP_SIZE):
+    """Convert a waterways GeoJSON file into Hilbert-sorted GeoParquet. Returns the feature count."""
+    gdf = gpd.read_file(source)
+    gdf = gdf[gdf.geometry.notna() & ~gdf.geometry.is_empty]
+    if gdf.crs is not None:
+        gdf = gdf.to_crs('EPSG:4326')
+
+    bounds = gdf.geometry.bounds
+    total = gdf.total_bounds
+
+    # Sort by the Hilbert index of each feature's bbox centre
+    cells = (1 << HILBERT_ORDER) - 1
+    width = max(total[2] - total[0], 1e-12)
+    height = max(total[3] - total[1], 1e-12)
+    cx = ((bounds['minx'] + bounds['maxx']) / 2 - total[0]) / width * cells
+    cy = ((bounds['miny'] + bounds['maxy']) / 2 - total[1]) / height * cells
+    order = np.argsort(hilbert_index(cx.values, cy.values), kind='stable')
+    gdf = gdf.iloc[order].reset_index(drop=True)
+    bounds = bounds.iloc[order].reset_index(drop=True)
+
+    properties = pa.Table.from_pandas(_property_frame(gdf), preserve_index=False)
+    bbox = pa.StructArray.from_arrays(
+        [pa.array(bounds[column].values, pa.float64()) for column in ('minx', 'miny', 'maxx', 'maxy')],
+        names=list(BBOX_FIELDS)
+    )
+    geometry = pa.array([geom.wkb for geom in gdf.geometry], pa.binary())
+    table = properties.append_column('bbox', bbox).append_column('geometry', geometry)
+
+    geo_metadata = {
+        'version': '1.1.0',
+        'primary_column': 'geometry',
+        'columns': {
+            'geometry': {
+                'encoding': 'WKB',
+                'geometry_types': sorted(set(gdf.geometry.geom_type)),
+                'bbox': [float(v) for v in total],
+                'covering': {'bbox': {field: ['bbox', field] for field in BBOX_FIELDS}}
+            }
+        }
+    }
+    table = table.replace_schema_metadata({
+        **(table.schema.metadata or {}),
+        b'geo': json.dumps(geo_metadata).encode('utf-8')
+    })
+
+    tmp_path = f"{output}.tmp"
+    pq.write_table(table, tmp_path, row_group_size=row_group_size, compression='zstd', write_statistics=True)
+    os.replace(tmp_path, output)
+    return len(gdf)
+
+
+def _property_frame(gdf):
+    """Return the non-geometry columns of a GeoDataFrame as a plain DataFrame."""
+    return gdf.drop(columns=gdf.geometry.name).copy()
+
+
+def _bbox_column_indexes(metadata):
+    """Map bbox field names to their leaf column indexes in the Parquet schema."""
+    indexes = {}
+    for i in range(metadata.num_columns):
+        path = metadata.schema.column(i).path
+        if path.startswith('bbox.'):
+            indexes[path.split('.', 1)[1]] = i
+    return indexes
+
+
+def intersecting_row_groups(parquet_file, bbox):
+    """Return indexes of row groups whose bbox statistics intersect (west, south, east, north)."""
+    west, south, east, north = bbox
+    metadata = parquet_file.metadata
+    columns = _bbox_column_indexes(metadata)
+
+    groups = []
+    for i in range(metadata.num_row_groups):
+        row_group = metadata.row_group(i)
+        stats = {field: row_group.column(columns[field]).statistics for field in BBOX_FIELDS}
+        if any(s is None or not s.has_min_max for s in stats.values()):
+            groups.append(i)
+            continue
+        if (stats['xmin'].min <= east and stats['xmax'].max >= west and
+                stats['ymin'].min <= north and stats['ymax'].max >= south):
+            groups.append(i)
+    return groups
+
+
+def dataset_bounds(path=WATERWAYS_PARQUET):
+    """Return the layer's (west, south, east, north) from the GeoParquet metadata."""
+    metadata = pq.read_schema(path).metadata or {}
+    geo = json.loads(metadata[b'geo'])
+    return tuple(geo['columns'][geo['primary_column']]['bbox'])
+
+
+def read_waterways(bbox, path=WATERWAYS_PARQUET, columns=None):
+    """Read the waterways whose bboxes intersect bbox, loading only the matching row groups."""
+    parquet_file = pq.ParquetFile(path)
+    groups = intersecting_row_groups(parquet_file, bbox)
+    if columns is not None:
+        columns = list(columns) + ['bbox', 'geometry']
+
+    if groups:
+        table = parquet_file.read_row_groups(groups, columns=columns)
+    else:
+        table = parquet_file.schema_arrow.empty_table()
+        if columns is not None:
+            table = table.select(columns)
+
+    # Row groups are coarse; filter individual features by their own bbox
+    west, south, east, north = bbox
+    xmin, ymin, xmax, ymax = [
+        table.column('bbox').combine_chunks().field(field).to_numpy(zero_copy_only=False)
+        for field in BBOX_FIELDS
+    ]
+    keep = (xmin <= east) & (xmax >= west) & (ymin <= north) & (ymax >= south)
+    table = table.filter(pa.array(keep))
+
+    geometry = gpd.GeoSeries.from_wkb(table.column('geometry').to_pylist(), crs='EPSG:4326')
+    frame = table.select([name for name in table.column_names if name not in ('bbox', 'geometry')]).to_pandas()
+    return gpd.GeoDataFrame(frame, geometry=geometry.values, crs='EPSG:4326')
+
+
+def load_waterways(bbox):
+    """Read waterways intersecting bbox from GeoParquet, falling back to the GeoJSON file."""
+    if os.path.exists(WATERWAYS_PARQUET):
+        return read_waterways(bbox)
+    logger.warning("%s not found, reading %s; run `python waterways_store.py ingest`", WATERWAYS_PARQUET, WATERWAYS_GEOJSON)
+    return gpd.read_file(WATERWAYS_GEOJSON, bbox=tuple(bbox))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Convert waterways GeoJSON into spatially sorted GeoParquet.')
+    parser.add_argument('command', choices=['ingest'])
+    parser.add_argument('source', nargs='?', default=WATERWAYS_GEOJSON)
+    parser.add_argument('--output', default=WATERWAYS_PARQUET)
+    parser.add_argument('--row-group-size', type=int, default=DEFAULT_ROW_GROUP_SIZE)
+    args = parser.parse_args()
+
+    count = ingest(args.source, args.output, args.row_group_size)
+    metadata = pq.ParquetFile(args.output).metadata
+    print(f"Wrote {count} features in {metadata.num_row_groups} row groups to {args.output}")